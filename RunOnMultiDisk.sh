@@ -16,6 +16,9 @@ function run_script(){
 }
 
 # diskname=(optane PM9A3 ssd hdd)
+# To aggregate the IOPS of several disks in one run, stripe the data pages over
+# their directories instead (README 4.11), e.g.
+# LID_DATA_DIRS=../../../../../optane/SOSD/:../../../../../PM9A3/SOSD/ run_script PM9A3 $lookup
 
 diskname=(PM9A3)
 lookup=10000000
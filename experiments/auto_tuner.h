@@ -0,0 +1,277 @@
+/**
+ * @file auto_tuner.h
+ * @brief Picks the parameter of DI-V4 (lambda), PGM-Index-Page and
+ * RS-DISK-ORIENTED (the error bound) and LecoPage (the fixed / sliding pages
+ * and the block number) for a dataset from partial builds, instead of sweeping
+ * full builds (--auto-tune mem=<MiB> or rp=<pages>). Every candidate is built
+ * on kWindowNum windows of kWindowKeys consecutive records spread over the
+ * data, so that the local shape of the key CDF the models fit is kept; the
+ * number of models and the memory are scaled up to the whole data, and the
+ * pages per lookup (avg_page of the worst-case fetch) are counted over sampled
+ * keys of the windows. The tuner then takes the candidate with the least memory
+ * that reads at most rp pages per lookup, or the one that reads the fewest
+ * pages within mem MiB.
+ */
+#ifndef EXPERIMENTS_AUTO_TUNER_H_
+#define EXPERIMENTS_AUTO_TUNER_H_
+
+#include <stdint.h>
+
+#include <algorithm>
+#include <iostream>
+#include <stdexcept>
+#include <string>
+#include <utility>
+#include <vector>
+
+#include "../indexes/DI-v4.h"
+#include "../indexes/leco-page.h"
+#include "../indexes/pgm-index-disk.h"
+#include "../indexes/rs-disk-oriented.h"
+
+struct TuneTarget {
+  enum Kind { kMemory, kPages };
+  Kind kind = kPages;
+  double value = 0;  // MiB, or pages per lookup
+};
+
+static inline TuneTarget ParseTuneTarget(const std::string& arg) {
+  TuneTarget target;
+  const size_t eq = arg.find('=');
+  const std::string kind = arg.substr(0, eq);
+  if (eq != std::string::npos && (kind == "mem" || kind == "rp")) {
+    target.kind = kind == "mem" ? TuneTarget::kMemory : TuneTarget::kPages;
+    char* end = nullptr;
+    target.value = strtod(arg.c_str() + eq + 1, &end);
+    if (*end == '\0' && target.value > 0) {
+      return target;
+    }
+  }
+  throw std::runtime_error("The auto-tune target must be mem=<MiB> or "
+                           "rp=<pages per lookup>, got " + arg);
+}
+
+// The predicted cost of one candidate over the whole data.
+template <typename P>
+struct TuneEstimate {
+  P param;
+  std::string name;
+  double model_num = 0;
+  double memory_bytes = 0;
+  double avg_page = 0;
+};
+
+template <typename K, typename V>
+class AutoTuner {
+ public:
+  typedef std::vector<std::pair<K, V>> DataVec_;
+
+  static constexpr size_t kWindowNum = 16;
+  static constexpr size_t kWindowKeys = 1 << 20;
+  static constexpr size_t kLookupsPerWindow = 4096;
+  static constexpr size_t kMaxLecoPages = 8;
+
+  AutoTuner(const DataVec_& data, const Params<K>& params)
+      : record_per_page_(params.record_num_per_page_),
+        pred_gran_(params.pred_granularity_),
+        data_num_(data.size()) {
+    if (params.is_compression_mode_) {
+      throw std::runtime_error("Auto-tuning needs the normal mode!");
+    }
+    // page-aligned windows, evenly spaced
+    const size_t window_num = std::max<size_t>(
+        1, std::min(kWindowNum, data.size() / kWindowKeys));
+    const size_t window_keys = std::min(data.size(), kWindowKeys);
+    for (size_t w = 0; w < window_num; w++) {
+      size_t start = (data.size() - window_keys) * w /
+                     std::max<size_t>(1, window_num - 1);
+      start -= start % record_per_page_;
+      DataVec_ window(window_keys);
+      for (size_t i = 0; i < window_keys; i++) {
+        window[i] = {data[start + i].first, i / pred_gran_};
+      }
+      windows_.push_back(std::move(window));
+      sample_num_ += window_keys;
+    }
+  }
+
+  float TuneDIV4(const TuneTarget& target) {
+    std::vector<TuneEstimate<typename DI_V4<K, V>::param_t>> estimates;
+    for (float lambda : {1.016f, 1.05f, 1.1f, 1.25f, 1.5f, 1.75f, 2.0f, 2.5f,
+                         3.0f, 4.0f, 5.0f, 6.0f, 8.0f}) {
+      // DI-V4 needs an error bound of at least 0
+      if ((lambda - 1) * record_per_page_ / 2 >= 1) {
+        estimates.push_back(Estimate<DI_V4<K, V>>({lambda, record_per_page_}));
+      }
+    }
+    return Choose(estimates, target).lambda;
+  }
+
+  int TunePGMIndexPage(const TuneTarget& target) {
+    std::vector<TuneEstimate<int>> estimates;
+    for (int eps : {1, 3, 7, 15, 31, 63, 127, 255, 383, 511, 1023}) {
+      estimates.push_back(Estimate<PGMIndexPage<K, V>>(eps));
+    }
+    return Choose(estimates, target);
+  }
+
+  size_t TuneRSDisk(const TuneTarget& target) {
+    std::vector<TuneEstimate<typename RSDiskIndex<K, V>::param_t>> estimates;
+    for (size_t error : {2, 4, 8, 16, 32, 64, 128, 192, 256, 512}) {
+      estimates.push_back(
+          Estimate<RSDiskIndex<K, V>>({12, error, record_per_page_}));
+    }
+    return Choose(estimates, target).max_error;
+  }
+
+  // Over the split of up to kMaxLecoPages pages into fixed and sliding ones.
+  typename LecoPage<K, V>::param_t TuneLecoPage(const TuneTarget& target) {
+    std::vector<TuneEstimate<typename LecoPage<K, V>::param_t>> estimates;
+    for (size_t total_pages = 1; total_pages <= kMaxLecoPages; total_pages++) {
+      AddLecoPageEstimates(total_pages, &estimates);
+    }
+    return Choose(estimates, target);
+  }
+
+  // The least memory for a search range of total_pages pages.
+  typename LecoPage<K, V>::param_t TuneLecoPage(size_t total_pages) {
+    std::vector<TuneEstimate<typename LecoPage<K, V>::param_t>> estimates;
+    AddLecoPageEstimates(total_pages, &estimates);
+    return Choose(estimates, {TuneTarget::kMemory, 0});
+  }
+
+ private:
+  // Silences std::cout while a candidate is built; the builds print progress.
+  class QuietScope {
+   public:
+    QuietScope() : buf_(std::cout.rdbuf(nullptr)) {}
+    ~QuietScope() { std::cout.rdbuf(buf_); }
+
+   private:
+    std::streambuf* buf_;
+  };
+
+  /**
+   * @brief The candidates of LecoPage are block widths (points per block): the
+   * block number is set per window and then for the whole data, so that the
+   * blocks hold as many points in the windows as over the data.
+   */
+  void AddLecoPageEstimates(
+      size_t total_pages,
+      std::vector<TuneEstimate<typename LecoPage<K, V>::param_t>>* estimates) {
+    for (size_t slide = 0; slide * 2 <= total_pages; slide++) {
+      const size_t fix = total_pages - slide * 2;
+      const size_t group_keys = record_per_page_ * (fix + slide);
+      if (windows_[0].size() < group_keys * 2) {
+        continue;
+      }
+      for (size_t width : {32, 64, 128, 192, 256, 384, 512, 1024}) {
+        const size_t points = windows_[0].size() / group_keys;
+        if (points < width * 2) {
+          continue;
+        }
+        auto estimate = Estimate<LecoPage<K, V>>(
+            {record_per_page_, fix, slide, (points + width - 1) / width});
+        estimate.param.block_num_ =
+            std::max<size_t>(1, (data_num_ / group_keys + width - 1) / width);
+        estimate.name += "_" + std::to_string(fix) + "_" +
+                         std::to_string(slide) + "_" +
+                         std::to_string(estimate.param.block_num_);
+        estimates->push_back(estimate);
+      }
+    }
+  }
+
+  template <typename IndexType>
+  TuneEstimate<typename IndexType::param_t> Estimate(
+      const typename IndexType::param_t& p) {
+    TuneEstimate<typename IndexType::param_t> estimate;
+    estimate.param = p;
+    uint64_t page_sum = 0, lookup_cnt = 0;
+    for (DataVec_& window : windows_) {
+      IndexType index(p);
+      {
+        QuietScope quiet;
+        index.Build(window);
+      }
+      estimate.name = index.GetIndexName();
+      estimate.model_num += index.GetModelNum();
+      estimate.memory_bytes += index.GetInMemorySize();
+      const size_t step =
+          std::max<size_t>(1, (window.size() - 1) / kLookupsPerWindow);
+      for (size_t i = 0; i + 1 < window.size(); i += step) {
+        if (i > 0 && window[i].first == window[i - 1].first) {
+          continue;
+        }
+        SearchRange range = index.Lookup(window[i].first);
+        GetItemRange(&range, pred_gran_, window.size());
+        page_sum += (range.stop - 1) / record_per_page_ -
+                    range.start / record_per_page_ + 1;
+        lookup_cnt++;
+      }
+    }
+    const double scale = data_num_ * 1.0 / sample_num_;
+    estimate.model_num *= scale;
+    estimate.memory_bytes *= scale;
+    estimate.avg_page = lookup_cnt ? page_sum * 1.0 / lookup_cnt : 0;
+    return estimate;
+  }
+
+  /**
+   * @brief The least memory within target.value pages per lookup, or the
+   * fewest pages within target.value MiB (the least memory for 0); the
+   * closest candidate if none meets the target.
+   */
+  template <typename P>
+  static P Choose(const std::vector<TuneEstimate<P>>& estimates,
+                  const TuneTarget& target) {
+    if (estimates.empty()) {
+      throw std::runtime_error("The data is too small to auto-tune!");
+    }
+    auto better = [&](const TuneEstimate<P>& a, const TuneEstimate<P>& b) {
+      if (target.kind == TuneTarget::kPages) {
+        const bool a_in = a.avg_page <= target.value;
+        const bool b_in = b.avg_page <= target.value;
+        if (a_in != b_in) {
+          return a_in;
+        }
+        return a_in ? a.memory_bytes < b.memory_bytes : a.avg_page < b.avg_page;
+      }
+      const double budget = target.value * 1024 * 1024;
+      const bool a_in = a.memory_bytes <= budget;
+      const bool b_in = b.memory_bytes <= budget;
+      if (a_in != b_in) {
+        return a_in;
+      }
+      if (!a_in || a.avg_page == b.avg_page) {
+        return a.memory_bytes < b.memory_bytes;
+      }
+      return a.avg_page < b.avg_page;
+    };
+    for (const TuneEstimate<P>& e : estimates) {
+      PrintEstimate("auto-tune estimate:, ", e);
+    }
+    const TuneEstimate<P>& best =
+        *std::min_element(estimates.begin(), estimates.end(), better);
+    std::cout << "auto-tune target:, "
+              << (target.kind == TuneTarget::kPages ? "rp" : "mem") << ", "
+              << target.value << std::endl;
+    PrintEstimate("auto-tune choice:, ", best);
+    return best.param;
+  }
+
+  template <typename P>
+  static void PrintEstimate(const char* title, const TuneEstimate<P>& e) {
+    std::cout << title << e.name << ", #model:," << e.model_num
+              << ", space/MiB:," << e.memory_bytes / 1024.0 / 1024.0
+              << ", avg_page:," << e.avg_page << std::endl;
+  }
+
+  const size_t record_per_page_;
+  const uint64_t pred_gran_;
+  const size_t data_num_;
+  size_t sample_num_ = 0;
+  std::vector<DataVec_> windows_;
+};
+
+#endif  // EXPERIMENTS_AUTO_TUNER_H_
@@ -1,6 +1,9 @@
+#include <memory>
 #include <string>
 #include <utility>
 
+#include "../indexes/PGM-index-disk/piecewise_linear_model.hpp"
+#include "../indexes/snapshot.h"
 #include "./test_disk.h"
 #include "./util.h"
 
@@ -60,6 +63,39 @@ PageStats CalculatePageStats(typename IndexType::DataVev_& data,
   return stats;
 }
 
+/**
+ * @brief Learns the read-ahead direction of kSpeculativeFetch for each segment
+ * of pages from about 8 sampled keys per page, as CalculatePageStats: the page
+ * of a key against the page of the middle of its predicted range.
+ */
+template <typename IndexType>
+std::shared_ptr<const PrefetchHints> LearnPrefetchHints(
+    typename IndexType::DataVev_& data, IndexType& index,
+    const Params<typename IndexType::K_>& params) {
+  const uint64_t size = data.size() - 1;
+  const uint64_t page_num =
+      params.leco_pages_
+          ? params.leco_pages_->GetPageNum()
+          : (data.size() + params.record_num_per_page_ - 1) /
+                params.record_num_per_page_;
+  auto hints = std::make_shared<PrefetchHints>(page_num);
+  const uint64_t step = std::max<uint64_t>(params.record_num_per_page_ / 8, 1);
+  for (uint64_t i = 0; i < size; i += step) {
+    if (i > 0 && data[i].first == data[i - 1].first) {
+      continue;
+    }
+    SearchRange range = index.Lookup(data[i].first);
+    GetItemRange(&range, params.pred_granularity_, data.size());
+    if (params.pred_granularity_ > 1) {
+      range.stop--;
+    }
+    hints->Record(GetGlobalPageID(params, (range.start + range.stop) >> 1),
+                  GetGlobalPageID(params, i));
+  }
+  hints->Finish();
+  return hints;
+}
+
 template <typename IndexType>
 typename IndexType::param_t GetLecoParams(size_t total_pages,
                                           uint64_t record_per_page,
@@ -286,20 +322,118 @@ typename IndexType::param_t GetLecoPageParams(size_t total_pages,
         break;
     }
   } else {
-    std::cout << "Please remove the last parameter to tune the leco-page!"
-              << std::endl;
+    std::cout << "No tuned leco-page parameters for " << dataset
+              << ", auto-tuning them!" << std::endl;
   }
   return p;
 }
 
+// A hash of all the records: a snapshot is only reused for the same keys at
+// the same positions, which also depend on the layout of the data on disk.
+template <typename K, typename V>
+uint64_t GetDataFingerprint(const std::vector<std::pair<K, V>>& data) {
+  uint64_t h = data.size();
+  for (const auto& record : data) {
+    h = (h ^ static_cast<uint64_t>(record.first)) * 0x9E3779B97F4A7C15ull;
+    h = (h ^ static_cast<uint64_t>(record.second)) * 0xC2B2AE3D27D4EB4Full;
+  }
+  return h;
+}
+
+template <typename IndexType>
+std::string GetSnapshotFilename(
+    const IndexType& index, const Params<typename IndexType::K_>& params) {
+  const std::string& dataset = params.dataset_filename_;
+  std::string name = dataset.substr(dataset.find_last_of('/') + 1) + "_" +
+                     index.GetSnapshotName() + ".lidx";
+  std::replace(name.begin(), name.end(), ' ', '-');
+  return params.index_cache_dir_ + "/" + name;
+}
+
+/**
+ * @brief Restores the index from its snapshot in params.index_cache_dir_ if
+ * the snapshot was saved for the same index and records. Otherwise builds the
+ * index, and saves a snapshot of it if there is a cache directory. Returns
+ * whether the index is loaded. build_ns only covers the Build or the Load
+ * (with the mapping of the snapshot), not the fingerprint of the records nor
+ * the save, so it stays comparable with the runs without a cache.
+ */
+template <typename IndexType>
+bool BuildOrLoadIndex(IndexType* index, typename IndexType::DataVev_& data,
+                      const Params<typename IndexType::K_>& params,
+                      const typename IndexType::param_t& index_params,
+                      double* build_ns) {
+  if (params.index_cache_dir_.empty()) {
+    *build_ns = GetNsTime([&] { index->Build(data); });
+    return false;
+  }
+  const std::string filename = GetSnapshotFilename(*index, params);
+  const std::string name = index->GetSnapshotName();
+  const uint64_t fingerprint = GetDataFingerprint(data);
+  if (access(filename.c_str(), R_OK) == 0) {
+    try {
+      std::unique_ptr<SnapshotReader> in;
+      bool loaded = false;
+      const double load_ns = GetNsTime([&] {
+        in.reset(new SnapshotReader(filename));
+        loaded = in->GetString() == name &&
+                 in->Get<uint64_t>() == fingerprint && index->Load(in.get());
+      });
+      if (loaded) {
+        *build_ns = load_ns;
+        std::cout << "load the index snapshot:, " << filename << std::endl;
+        return true;
+      }
+      std::cout << "stale index snapshot:, " << filename << std::endl;
+    } catch (const std::runtime_error& e) {
+      std::cout << "invalid index snapshot:, " << filename << ", " << e.what()
+                << std::endl;
+    }
+    *index = IndexType(index_params);  // drop a partially loaded index
+  }
+  *build_ns = GetNsTime([&] { index->Build(data); });
+  bool saved = false;
+  const double save_ns = GetNsTime([&] {
+    SnapshotWriter out(filename);
+    out.PutString(name);
+    out.Put(fingerprint);
+    if (index->Save(&out)) {
+      out.Commit();
+      saved = true;
+    }
+  });
+  if (saved) {
+    std::cout << "save the index snapshot:, " << filename
+              << ", save_time/ms:, " << save_ns / 1e6 << std::endl;
+  }
+  return false;
+}
+
 template <typename IndexType>
 size_t Evaluate(typename IndexType::DataVev_& data,
                 const typename IndexType::DataVev_& lookups,
                 const LookupInfo<typename IndexType::V_>& lookup_info,
                 const Params<typename IndexType::K_>& params,
-                const typename IndexType::param_t index_params) {
+                const typename IndexType::param_t index_params,
+                size_t lookup_batch = GetConfiguredLookupBatch()) {
   IndexType index(index_params);
-  const uint64_t build_time = GetNsTime([&] { index.Build(data); }) / 1e6;
+  bool index_loaded = false;
+  pgm_page::internal::build_threads = params.build_threads_;
+  double build_ns = 0;
+  index_loaded =
+      BuildOrLoadIndex(&index, data, params, index_params, &build_ns);
+  const uint64_t build_time = build_ns / 1e6;
+
+  // The sequential reference of a parallel build.
+  double seq_build_ns = 0;
+  size_t seq_model_num = 0;
+  if (params.build_compare_) {
+    pgm_page::internal::build_threads = 1;
+    IndexType seq_index(index_params);
+    seq_build_ns = GetNsTime([&] { seq_index.Build(data); });
+    seq_model_num = seq_index.GetModelNum();
+    pgm_page::internal::build_threads = params.build_threads_;
+  }
 
   std::cout << "\nBuild index: " << index.GetIndexName() << " over"
             << std::endl;
@@ -311,7 +445,8 @@ size_t Evaluate(typename IndexType::DataVev_& data,
   } else {
     std::cout << ", #training data:," << data.size();
   }
-  std::cout << ", build_time/ms:," << build_time << ", #model:,"
+  std::cout << ", build_time/ms:," << build_time << ", index_loaded:,"
+            << index_loaded << ", #model:,"
             << index.GetModelNum() << ", space/MiB:,"
             << index.GetInMemorySize() / 1024.0 / 1024.0 << "\n"
             << std::endl;
@@ -331,7 +466,15 @@ size_t Evaluate(typename IndexType::DataVev_& data,
                std::default_random_engine(seed));
 
   ResultInfo<typename IndexType::K_> res_info;
+  LookupStats stats;  // filled by the lookup threads when profiling
   uint64_t ns;
+  // the read-ahead directions are learned per index
+  Params<typename IndexType::K_> disk_params(params);
+  if (params.is_on_disk_ && !params.is_compression_mode_ &&
+      params.fetch_strategy_ == kSpeculativeFetch) {
+    disk_params.prefetch_hints_ =
+        LearnPrefetchHints<IndexType>(data, index, params);
+  }
   if (params.is_on_disk_) {
 #ifdef TEST_SEARCH
     const uint64_t kGapCnt =
@@ -341,7 +484,8 @@ size_t Evaluate(typename IndexType::DataVev_& data,
       GetItemRange(&range, params.pred_granularity_, data.size());
       ResultInfo<typename IndexType::K_> read_res;
       if (!params.is_compression_mode_) {
-        read_res = NormalCoreLookup(range, data[i].first, params, kGapCnt);
+        read_res =
+            NormalCoreLookup(range, data[i].first, disk_params, kGapCnt);
       } else {
         read_res = CompressionCoreLookup(range, data[i].first, params, kGapCnt);
       }
@@ -353,7 +497,8 @@ size_t Evaluate(typename IndexType::DataVev_& data,
                   << std::endl;
         range = index.Lookup(data[i].first);
         if (!params.is_compression_mode_) {
-          read_res = NormalCoreLookup(range, data[i].first, params, kGapCnt);
+          read_res =
+              NormalCoreLookup(range, data[i].first, disk_params, kGapCnt);
         } else {
           read_res =
               CompressionCoreLookup(range, data[i].first, params, kGapCnt);
@@ -362,9 +507,14 @@ size_t Evaluate(typename IndexType::DataVev_& data,
     }
     std::cout << "TEST ON-DISK SEARCH OVER" << std::endl;
 #endif
+    // Every index starts with a cold page cache.
+    if (params.page_cache_) {
+      params.page_cache_->Clear();
+    }
     ns = GetNsTime([&] {
-      res_info = DoLookups<IndexType>(index, tmp_lookups, params,
-                                      GetConfiguredThreadCount());
+      res_info = DoLookups<IndexType>(index, tmp_lookups, disk_params,
+                                      GetConfiguredThreadCount(), lookup_batch,
+                                      &stats);
     });
 
     std::cout << "Evaluate index on disk:,";
@@ -399,7 +549,17 @@ size_t Evaluate(typename IndexType::DataVev_& data,
     std::cout << "Evaluate index in memory:,";
   }
   std::cout << index.GetIndexName() << ", build_time:," << build_time
-            << ", ms, avg_time:," << ns * 1.0 / res_info.ops << ", ns,"
+            << ", ms, index_loaded:," << index_loaded << ", build_threads:,"
+            << params.build_threads_;
+  if (params.build_compare_) {
+    std::cout << ", seq_build_time/ms:," << seq_build_ns / 1e6
+              << ", build_speedup:,"
+              << (build_ns > 0 ? seq_build_ns / build_ns : 0)
+              << ", seq_model_num:," << seq_model_num << ", model_delta:,"
+              << static_cast<int64_t>(index.GetModelNum()) -
+                     static_cast<int64_t>(seq_model_num);
+  }
+  std::cout << ", avg_time:," << ns * 1.0 / res_info.ops << ", ns,"
             << " in-memory_size:," << index.GetInMemorySize() / 1024.0 / 1024.0
             << ", MiB, #ops," << res_info.ops << ",, avg_page:,"
             << res_info.fetch_page_num * 1.0 / res_info.ops << ", avg_range:,"
@@ -421,14 +581,70 @@ size_t Evaluate(typename IndexType::DataVev_& data,
               << ", max_len:," << lookup_info.max_len;
   }
 
-#ifdef PROF_CPU_IO
-  res_info.cpu_time +=
-      res_info.index_predict_time + prof_file_cpu_time + last_mile_search_time;
-  res_info.io_time += prof_io_time;
-#endif  // PROF_CPU_IO
+  if (lookup_profiling) {
+    res_info.cpu_time += res_info.index_predict_time + stats.file_cpu_time +
+                         stats.last_mile_time;
+    res_info.io_time += stats.io_time;
+  }
 
   const size_t thread_num = params.is_on_disk_ ? GetConfiguredThreadCount() : 1;
-  std::cout << ", #threads:," << thread_num << ", throughput:,"
+  std::cout << ", #threads:," << thread_num << ", lookup_batch:,"
+            << (params.is_on_disk_ ? lookup_batch : 1) << ", numa_nodes:,"
+            << (params.is_on_disk_ && thread_num > 1 && GetConfiguredNumaMode()
+                    ? NumaTopology::Detect().GetNodeNum()
+                    : 0);
+  if (params.is_on_disk_) {
+    std::cout << ", last_mile:," << LastMileModeName(last_mile_mode);
+    std::cout << ", io_backend:," << IOBackendName(params.io_backend_)
+              << ", io_depth:," << params.io_depth_ << ", avg_queue_depth:,"
+              << (res_info.total_io
+                      ? res_info.io_inflight_sum * 1.0 / res_info.total_io
+                      : 0);
+    const double cache_mib =
+        params.page_cache_
+            ? params.page_cache_->GetCapacityBytes() / 1024.0 / 1024.0
+            : 0;
+    const uint64_t cache_lookups = res_info.cache_hits + res_info.cache_misses;
+    std::cout << ", page_cache/MiB:," << cache_mib << ", cache_policy:,"
+              << (params.page_cache_
+                      ? PageCachePolicyName(params.page_cache_->GetPolicy())
+                      : "none")
+              << ", cache_hits:," << res_info.cache_hits << ", cache_misses:,"
+              << res_info.cache_misses << ", cache_hit_ratio:,"
+              << (cache_lookups ? res_info.cache_hits * 1.0 / cache_lookups
+                                : 0)
+              << ", index+cache/MiB:,"
+              << index.GetInMemorySize() / 1024.0 / 1024.0 + cache_mib;
+    std::cout << ", page_format:," << (params.leco_pages_ ? "leco" : "raw")
+              << ", keys/page:,"
+              << (params.leco_pages_ ? params.leco_pages_->GetKeysPerPage()
+                                     : params.record_num_per_page_)
+              << ", page_table/MiB:,"
+              << (params.leco_pages_
+                      ? params.leco_pages_->GetSizeInBytes() / 1024.0 / 1024.0
+                      : 0);
+    std::cout << ", coalesce_window:," << params.coalesce_window_
+              << ", pages_saved:," << res_info.coalesce_pages_saved
+              << ", pages_saved/batch:,"
+              << (res_info.coalesce_batches
+                      ? res_info.coalesce_pages_saved * 1.0 /
+                            res_info.coalesce_batches
+                      : 0);
+    std::cout << ", data_dirs:," << params.stripe_->GetDeviceNum()
+              << ", stripe:," << (params.stripe_->IsHashed() ? "hash" : "rr")
+              << ", stripe_pages:," << params.stripe_->GetStripePages();
+    std::cout << ", prefetch_segments:,"
+              << (disk_params.prefetch_hints_
+                      ? disk_params.prefetch_hints_->GetPrefetchRatio()
+                      : 0)
+              << ", prefetch_pages:," << res_info.prefetch_pages
+              << ", prefetch_wasted:," << res_info.prefetch_wasted
+              << ", wasted_ratio:,"
+              << (res_info.prefetch_pages
+                      ? res_info.prefetch_wasted * 1.0 / res_info.prefetch_pages
+                      : 0);
+  }
+  std::cout << ", throughput:,"
             << res_info.ops * 1.0 / ns * 1e9 << ", ops/sec, avg_io:,"
             << res_info.total_io * 1.0 / res_info.ops << ", total IO:,"
             << res_info.total_io << ", IOPS:,"
@@ -438,12 +654,23 @@ size_t Evaluate(typename IndexType::DataVev_& data,
             << ", ns, predict time:,"
             << res_info.index_predict_time * 1.0 / res_info.ops << ", ns,"
             << " directIO file cpu time:,"
-            << prof_file_cpu_time * 1.0 / res_info.ops << ", ns,"
+            << stats.file_cpu_time * 1.0 / res_info.ops << ", ns,"
             << " last-mile search cpu time:,"
-            << last_mile_search_time * 1.0 / res_info.ops << ", ns,"
+            << stats.last_mile_time * 1.0 / res_info.ops << ", ns,"
             << " cpu total time:," << res_info.cpu_time * 1.0 / res_info.ops
             << ", ns,"
             << " io time:," << res_info.io_time * 1.0 / res_info.ops << ", ns,";
+  if (lookup_profiling && params.is_on_disk_) {
+    for (int i = 0; i < kLookupStageNum; i++) {
+      const char* name = LookupStageName(i);
+      std::cout << " " << name << "_p50/ns:," << stats.hist[i].GetPercentile(0.5)
+                << ", " << name << "_p95/ns:,"
+                << stats.hist[i].GetPercentile(0.95) << ", " << name
+                << "_p99/ns:," << stats.hist[i].GetPercentile(0.99) << ", "
+                << name << "_p999/ns:," << stats.hist[i].GetPercentile(0.999)
+                << ",";
+    }
+  }
   std::cout << std::endl;
   return index.GetInMemorySize();
 }
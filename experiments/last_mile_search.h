@@ -0,0 +1,275 @@
+/**
+ * @file last_mile_search.h
+ * @brief Last-mile search kernels over the gap_cnt-strided keys of the fetched
+ * pages: the binary/linear searches of LAST_MILE_SEARCH, a branchless binary
+ * search, and AVX2/AVX-512 k-ary searches. All of them return the position of
+ * the first key >= the lookup key (the linear search stops at the first equal
+ * key). The SIMD kernels are compiled with target attributes, so they need no
+ * global -mavx flags, and are only selected if the CPU supports them.
+ */
+#ifndef EXPERIMENTS_LAST_MILE_SEARCH_H_
+#define EXPERIMENTS_LAST_MILE_SEARCH_H_
+
+#include <stdint.h>
+
+#include <stdexcept>
+#include <string>
+#include <type_traits>
+
+#include "macro.h"
+
+#if defined(__x86_64__) && (defined(__GNUC__) || defined(__clang__))
+#define LID_X86_SIMD
+#include <immintrin.h>
+#endif
+
+enum LastMileMode {
+  kLastMileBinary,
+  kLastMileLinear,
+  kLastMileBranchless,
+  kLastMileAVX2,
+  kLastMileAVX512
+};
+
+#if LAST_MILE_SEARCH == 0
+LastMileMode last_mile_mode = kLastMileBinary;
+#else
+LastMileMode last_mile_mode = kLastMileLinear;
+#endif
+
+inline const char* LastMileModeName(LastMileMode mode) {
+  switch (mode) {
+    case kLastMileBinary:
+      return "binary";
+    case kLastMileLinear:
+      return "linear";
+    case kLastMileBranchless:
+      return "branchless";
+    case kLastMileAVX2:
+      return "avx2";
+    case kLastMileAVX512:
+      return "avx512";
+  }
+  return "unknown";
+}
+
+inline bool LastMileModeSupported(LastMileMode mode) {
+#ifdef LID_X86_SIMD
+  if (mode == kLastMileAVX512) {
+    return __builtin_cpu_supports("avx512f");
+  }
+  if (mode == kLastMileAVX2) {
+    return __builtin_cpu_supports("avx2");
+  }
+  return true;
+#else
+  return mode != kLastMileAVX2 && mode != kLastMileAVX512;
+#endif
+}
+
+/**
+ * @brief Parses binary, linear, branchless, avx2, avx512 or simd (the widest
+ * one the CPU supports). A SIMD mode the CPU lacks falls back to the next
+ * narrower one, down to the branchless scalar search.
+ */
+inline LastMileMode ParseLastMileMode(const std::string& name) {
+  LastMileMode mode;
+  if (name == "binary") {
+    mode = kLastMileBinary;
+  } else if (name == "linear") {
+    mode = kLastMileLinear;
+  } else if (name == "branchless") {
+    mode = kLastMileBranchless;
+  } else if (name == "avx2") {
+    mode = kLastMileAVX2;
+  } else if (name == "avx512" || name == "simd") {
+    mode = kLastMileAVX512;
+  } else {
+    throw std::runtime_error("Unknown last-mile search mode: " + name);
+  }
+  if (mode == kLastMileAVX512 && !LastMileModeSupported(mode)) {
+    mode = kLastMileAVX2;
+  }
+  if (mode == kLastMileAVX2 && !LastMileModeSupported(mode)) {
+    mode = kLastMileBranchless;
+  }
+  return mode;
+}
+
+template <typename K>
+inline uint64_t BinaryLastMileSearch(const K* data, uint64_t record_num,
+                                     uint64_t gap_cnt, K key) {
+  uint64_t s = 0, e = record_num;
+  while (s < e) {
+    uint64_t mid = (s + e) >> 1;
+    if (*(data + mid * gap_cnt) < key)
+      s = mid + 1;
+    else
+      e = mid;
+  }
+  return s;
+}
+
+template <typename K>
+inline uint64_t LinearLastMileSearch(const K* data, uint64_t record_num,
+                                     uint64_t gap_cnt, K key) {
+  uint64_t s = 0;
+  while (s < record_num) {
+    if (*(data + s * gap_cnt) == key)
+      return s;
+    else
+      s++;
+  }
+  return s;
+}
+
+template <typename K>
+inline uint64_t BranchlessLastMileSearch(const K* data, uint64_t record_num,
+                                         uint64_t gap_cnt, K key) {
+  // data[lo] < key holds for every lo moved to, so the answer stays in
+  // [lo, lo + n]; the select compiles to a cmov
+  uint64_t lo = 0, n = record_num;
+  while (n > 1) {
+    uint64_t half = n >> 1;
+    lo = *(data + (lo + half) * gap_cnt) < key ? lo + half : lo;
+    n -= half;
+  }
+  return lo + (*(data + lo * gap_cnt) < key);
+}
+
+#ifdef LID_X86_SIMD
+/**
+ * @brief 17-ary search: each step gathers 16 separators of [lo, lo + n) with
+ * 4 independent gathers, counts the ones < key and keeps the part between two
+ * separators, until at most 16 keys are left; those are compared 4 at a time
+ * and the keys < key counted. On pages fresh from the disk, the loads of one
+ * step miss the cache together, so a 4 KiB page costs two rounds of misses
+ * instead of one per level of a binary search. Keys are unsigned, so both
+ * sides are shifted by 2^63 before the signed compare. Positions * gap_cnt
+ * are assumed to fit in 32 bits (the buffer holds a few pages).
+ */
+__attribute__((target("avx2,popcnt"))) inline uint64_t AVX2LastMileSearch(
+    const uint64_t* data, uint64_t record_num, uint64_t gap_cnt,
+    uint64_t key) {
+  const auto* base = reinterpret_cast<const long long*>(data);
+  const __m256i sign = _mm256_set1_epi64x(INT64_MIN);
+  const __m256i k = _mm256_xor_si256(_mm256_set1_epi64x(key), sign);
+  uint64_t lo = 0, n = record_num;
+  const __m256i lanes = _mm256_setr_epi64x(0, 1, 2, 3);
+  while (n > 16) {
+    const uint64_t step = n / 17;
+    const __m256i stride = _mm256_set1_epi64x(step * gap_cnt);
+    __m256i idx = _mm256_add_epi64(_mm256_set1_epi64x((lo + step - 1) * gap_cnt),
+                                   _mm256_mul_epu32(lanes, stride));
+    const __m256i next = _mm256_slli_epi64(stride, 2);
+    uint64_t c = 0;
+    for (int j = 0; j < 4; j++) {
+      const __m256i v = _mm256_xor_si256(
+          _mm256_i64gather_epi64(base, idx, sizeof(uint64_t)), sign);
+      c += __builtin_popcount(
+          _mm256_movemask_pd(_mm256_castsi256_pd(_mm256_cmpgt_epi64(k, v))));
+      idx = _mm256_add_epi64(idx, next);
+    }
+    lo += c * step;
+    n = step + (c == 16) * (n - 17 * step);
+  }
+
+  uint64_t cnt = 0;
+  for (uint64_t i = 0; i < n; i += 4) {
+    const __m256i valid =
+        _mm256_cmpgt_epi64(_mm256_set1_epi64x(n - i), lanes);
+    __m256i v;
+    if (gap_cnt == 1) {
+      v = _mm256_maskload_epi64(base + lo + i, valid);
+    } else {
+      const long long first = (lo + i) * gap_cnt;
+      const __m256i idx = _mm256_add_epi64(
+          _mm256_set1_epi64x(first),
+          _mm256_mul_epu32(lanes, _mm256_set1_epi64x(gap_cnt)));
+      v = _mm256_mask_i64gather_epi64(_mm256_setzero_si256(), base, idx,
+                                      valid, sizeof(uint64_t));
+    }
+    const __m256i lt =
+        _mm256_and_si256(_mm256_cmpgt_epi64(k, _mm256_xor_si256(v, sign)),
+                         valid);
+    cnt += __builtin_popcount(_mm256_movemask_pd(_mm256_castsi256_pd(lt)));
+  }
+  return lo + cnt;
+}
+
+/**
+ * @brief The same as AVX2LastMileSearch with 2 gathers of 8 separators per
+ * step and 8 keys per compare, until at most 32 keys are left.
+ */
+__attribute__((target("avx512f,popcnt"))) inline uint64_t
+AVX512LastMileSearch(const uint64_t* data, uint64_t record_num,
+                     uint64_t gap_cnt, uint64_t key) {
+  const __m512i k = _mm512_set1_epi64(key);
+  const __m512i lanes = _mm512_set_epi64(7, 6, 5, 4, 3, 2, 1, 0);
+  const __m512i gap = _mm512_set1_epi64(gap_cnt);
+  uint64_t lo = 0, n = record_num;
+  while (n > 32) {
+    const uint64_t step = n / 17;
+    const __m512i stride = _mm512_set1_epi64(step * gap_cnt);
+    const __m512i idx = _mm512_add_epi64(
+        _mm512_set1_epi64((lo + step - 1) * gap_cnt),
+        _mm512_mul_epu32(lanes, stride));
+    const __m512i idx2 = _mm512_add_epi64(idx, _mm512_slli_epi64(stride, 3));
+    const __m512i v = _mm512_i64gather_epi64(idx, data, sizeof(uint64_t));
+    const __m512i v2 = _mm512_i64gather_epi64(idx2, data, sizeof(uint64_t));
+    const uint64_t c = __builtin_popcount(_mm512_cmplt_epu64_mask(v, k)) +
+                       __builtin_popcount(_mm512_cmplt_epu64_mask(v2, k));
+    lo += c * step;
+    n = step + (c == 16) * (n - 17 * step);
+  }
+
+  uint64_t cnt = 0;
+  for (uint64_t i = 0; i < n; i += 8) {
+    const __mmask8 valid =
+        n - i >= 8 ? 0xFF : static_cast<__mmask8>((1u << (n - i)) - 1);
+    __m512i v;
+    if (gap_cnt == 1) {
+      v = _mm512_maskz_loadu_epi64(valid, data + lo + i);
+    } else {
+      const __m512i idx = _mm512_add_epi64(
+          _mm512_set1_epi64((lo + i) * gap_cnt), _mm512_mul_epu32(lanes, gap));
+      v = _mm512_mask_i64gather_epi64(_mm512_setzero_si512(), valid, idx, data,
+                                      sizeof(uint64_t));
+    }
+    cnt += __builtin_popcount(_mm512_mask_cmplt_epu64_mask(valid, v, k));
+  }
+  return lo + cnt;
+}
+#endif  // LID_X86_SIMD
+
+template <typename K>
+inline uint64_t LastMileSearch(const K* data, uint64_t record_num,
+                               uint64_t gap_cnt, K key) {
+  // Here assuming that each location has a meaningful value
+  if (*(data + (record_num - 1) * gap_cnt) < key) {
+    return record_num - 1;
+  }
+  switch (last_mile_mode) {
+    case kLastMileLinear:
+      return LinearLastMileSearch(data, record_num, gap_cnt, key);
+    case kLastMileBranchless:
+      return BranchlessLastMileSearch(data, record_num, gap_cnt, key);
+#ifdef LID_X86_SIMD
+    case kLastMileAVX2:
+    case kLastMileAVX512:
+      // the kernels compare unsigned 64-bit keys
+      if constexpr (std::is_integral<K>::value &&
+                    std::is_unsigned<K>::value && sizeof(K) == 8) {
+        const auto* keys = reinterpret_cast<const uint64_t*>(data);
+        return last_mile_mode == kLastMileAVX512
+                   ? AVX512LastMileSearch(keys, record_num, gap_cnt, key)
+                   : AVX2LastMileSearch(keys, record_num, gap_cnt, key);
+      }
+      return BranchlessLastMileSearch(data, record_num, gap_cnt, key);
+#endif  // LID_X86_SIMD
+    default:
+      return BinaryLastMileSearch(data, record_num, gap_cnt, key);
+  }
+}
+
+#endif  // EXPERIMENTS_LAST_MILE_SEARCH_H_
@@ -0,0 +1,88 @@
+/**
+ * @file latency_histogram.h
+ * @brief The latency histogram shared by the lookup profiling of LID
+ * (lookup_stats.h) and the open-loop YCSB runs (ycsb_utils/open_loop.h).
+ */
+#ifndef EXPERIMENTS_LATENCY_HISTOGRAM_H_
+#define EXPERIMENTS_LATENCY_HISTOGRAM_H_
+
+#include <stdint.h>
+
+#include <algorithm>
+
+/**
+ * @brief HDR-style histogram of nanosecond latencies: values below 16 have
+ * their own bucket, every larger power of two is split into 16 buckets, so a
+ * percentile is within 1/16 of the recorded value.
+ */
+class LatencyHistogram {
+ public:
+  static constexpr int kSubBits = 4;
+  static constexpr uint64_t kSubBuckets = 1ULL << kSubBits;
+  static constexpr size_t kBucketNum = (64 - kSubBits + 1) * kSubBuckets;
+
+  inline void Record(uint64_t ns, uint64_t cnt = 1) {
+    counts_[GetBucket(ns)] += cnt;
+    total_ += cnt;
+    sum_ += ns * cnt;
+    max_ = std::max(max_, ns);
+  }
+
+  void Merge(const LatencyHistogram& other) {
+    for (size_t i = 0; i < kBucketNum; i++) {
+      counts_[i] += other.counts_[i];
+    }
+    total_ += other.total_;
+    sum_ += other.sum_;
+    max_ = std::max(max_, other.max_);
+  }
+
+  /**
+   * @brief The highest value of the bucket holding the q-quantile (0 < q <=
+   * 1), capped by the largest recorded value; 0 if nothing is recorded.
+   */
+  uint64_t GetPercentile(double q) const {
+    if (total_ == 0) {
+      return 0;
+    }
+    const uint64_t rank =
+        std::max<uint64_t>(1, static_cast<uint64_t>(q * total_ + 0.5));
+    uint64_t seen = 0;
+    for (size_t i = 0; i < kBucketNum; i++) {
+      seen += counts_[i];
+      if (seen >= rank) {
+        return std::min(GetBucketMax(i), max_);
+      }
+    }
+    return max_;
+  }
+
+  inline uint64_t size() const { return total_; }
+  inline uint64_t GetMax() const { return max_; }
+  inline double GetAvg() const { return total_ ? sum_ * 1.0 / total_ : 0; }
+
+ private:
+  static inline size_t GetBucket(uint64_t ns) {
+    if (ns < kSubBuckets) {
+      return ns;
+    }
+    const int shift = 63 - __builtin_clzll(ns) - kSubBits;
+    return (shift + 1) * kSubBuckets + ((ns >> shift) & (kSubBuckets - 1));
+  }
+
+  static inline uint64_t GetBucketMax(size_t bucket) {
+    if (bucket < kSubBuckets) {
+      return bucket;
+    }
+    const int shift = bucket / kSubBuckets - 1;
+    const uint64_t lower = (kSubBuckets + bucket % kSubBuckets) << shift;
+    return lower + ((1ULL << shift) - 1);
+  }
+
+  uint64_t counts_[kBucketNum] = {};
+  uint64_t total_ = 0;
+  uint64_t sum_ = 0;
+  uint64_t max_ = 0;
+};
+
+#endif  // EXPERIMENTS_LATENCY_HISTOGRAM_H_
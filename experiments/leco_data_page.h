@@ -0,0 +1,513 @@
+/**
+ * @file leco_data_page.h
+ * @brief LeCo-compressed data pages (--page-format leco). Each page holds as
+ * many consecutive keys as fit: a header with the first key (the base) and the
+ * key count, a block of the keys - base in the format of Codecset::Leco_int (a
+ * linear model and bit-packed sign-magnitude residuals), and the payloads at
+ * the end of the page. A page falls back to the raw keys if that holds more of
+ * them. Since the pages hold different numbers of keys, the first record of
+ * every page is kept in memory (LecoPageTable) to map the predicted record
+ * ranges to pages. A lookup decodes only the keys whose model envelope can
+ * hold the lookup key, with AVX-512 or AVX2 if the last-mile search mode is a
+ * SIMD one.
+ */
+#ifndef EXPERIMENTS_LECO_DATA_PAGE_H_
+#define EXPERIMENTS_LECO_DATA_PAGE_H_
+
+#include <stdint.h>
+#include <string.h>
+#include <unistd.h>
+
+#include <algorithm>
+#include <cmath>
+#include <fstream>
+#include <memory>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+// common.h first: it defines uint128_t for the bit readers
+#include "../libraries/LeCo/headers/common.h"
+#include "../libraries/LeCo/headers/bit_read.h"
+#include "../libraries/LeCo/headers/bit_write.h"
+#include "../libraries/LeCo/headers/lr.h"
+#include "last_mile_search.h"
+#include "stripe_layout.h"
+
+#define LECO_PAGE_META "leco_pages.meta"
+
+struct LecoPageHeader {
+  uint64_t base;  // the first key
+  uint32_t num;   // #keys
+  uint32_t raw;   // 1: the keys are stored uncompressed
+};
+
+// The keys - base of a compressed page are below 2^50, so that the SIMD
+// decoders can convert the predictions exactly, and a page holds fewer than
+// 2^16 keys, so that (double)i * theta1 is exact with the 37-bit slope and
+// gives the same prediction with or without FMA.
+static constexpr uint64_t kLecoPageMaxSpan = 1ULL << 50;
+static constexpr size_t kLecoPageMaxKeys = (1 << 16) - 1;
+// The decoders load up to 16 bytes from the last residual.
+static constexpr size_t kLecoPageSlack = 16;
+
+/**
+ * @brief Codecset::Leco_int::encodeArray8_int over the n values (below
+ * kLecoPageMaxSpan), with the slope rounded to 37 significant bits.
+ */
+static uint8_t* EncodeLecoBlock(const uint64_t* values, size_t n,
+                                uint8_t* out) {
+  lr_int_T<uint64_t> mylr;
+  mylr.caltheta(values, n);
+  int exp;
+  const double mantissa = std::frexp(mylr.theta1, &exp);
+  double theta0 = mylr.theta0;
+  const double theta1 = std::ldexp(std::round(std::ldexp(mantissa, 36)),
+                                   exp - 36);
+
+  int64_t max_error_delta = INT64_MIN;
+  int64_t min_error_delta = INT64_MAX;
+  for (size_t i = 0; i < n; i++) {
+    int64_t tmp_val =
+        (int64_t)values[i] - (int64_t)(theta0 + theta1 * (double)i);
+    max_error_delta = std::max(max_error_delta, tmp_val);
+    min_error_delta = std::min(min_error_delta, tmp_val);
+  }
+  theta0 += (max_error_delta + min_error_delta) / 2.;
+
+  std::vector<uint64_t> delta(n);
+  std::vector<bool> signvec(n);
+  uint64_t max_error = 0;
+  for (size_t i = 0; i < n; i++) {
+    int64_t pred = theta0 + theta1 * (double)i;
+    signvec[i] = (int64_t)values[i] > pred;
+    delta[i] = signvec[i] ? values[i] - pred : pred - values[i];
+    max_error = std::max(max_error, delta[i]);
+  }
+  uint8_t max_bit = max_error ? bits_int_T(max_error) + 1 : 0;
+  *out++ = max_bit;
+  memcpy(out, &theta0, sizeof(double));
+  out += sizeof(double);
+  memcpy(out, &theta1, sizeof(double));
+  out += sizeof(double);
+  if (max_bit) {
+    out = write_delta_int_T(delta, signvec, out, max_bit, n);
+  }
+  return out;
+}
+
+struct LecoBlock {
+  uint8_t bits;
+  double theta0, theta1;
+  const uint8_t* residuals;
+
+  explicit LecoBlock(const uint8_t* in) : bits(in[0]) {
+    memcpy(&theta0, in + 1, sizeof(double));
+    memcpy(&theta1, in + 1 + sizeof(double), sizeof(double));
+    residuals = in + 1 + 2 * sizeof(double);
+  }
+
+  // As Codecset::Leco_int::randomdecodeArray8.
+  inline int64_t Get(uint64_t i) const {
+    if (bits == 0) {
+      return (int64_t)(theta0 + (double)i * theta1);
+    }
+    return read_bit_fix_int_wo_round<uint64_t>(residuals, bits, i, theta1,
+                                               theta0);
+  }
+};
+
+/**
+ * @brief Encodes the n keys with their payloads into the page, as a LeCo block
+ * if it fits and decodes back, else as raw keys; returns whether they fit.
+ * values and block are scratch buffers.
+ */
+static bool EncodeLecoPage(const uint64_t* keys, size_t n, size_t payload_bytes,
+                           size_t page_bytes, char* page,
+                           std::vector<uint64_t>* values,
+                           std::vector<uint8_t>* block) {
+  if (n * payload_bytes + sizeof(LecoPageHeader) > page_bytes) {
+    return false;
+  }
+  const size_t payload_start = page_bytes - n * payload_bytes;
+  memset(page, 0, page_bytes);
+  auto* header = reinterpret_cast<LecoPageHeader*>(page);
+  header->base = keys[0];
+  header->num = n;
+  header->raw = 1;
+  if (n >= 2 && keys[n - 1] - keys[0] < kLecoPageMaxSpan) {
+    values->resize(n);
+    for (size_t i = 0; i < n; i++) {
+      (*values)[i] = keys[i] - keys[0];
+    }
+    block->resize(n * sizeof(uint64_t) + 64);
+    const size_t block_bytes =
+        EncodeLecoBlock(values->data(), n, block->data()) - block->data();
+    if (sizeof(LecoPageHeader) + block_bytes + kLecoPageSlack <=
+        payload_start) {
+      memcpy(page + sizeof(LecoPageHeader), block->data(), block_bytes);
+      const LecoBlock decoder(reinterpret_cast<const uint8_t*>(page) +
+                              sizeof(LecoPageHeader));
+      header->raw = 0;
+      for (size_t i = 0; i < n && !header->raw; i++) {
+        header->raw = decoder.Get(i) != static_cast<int64_t>((*values)[i]);
+      }
+    }
+  }
+  if (header->raw) {
+    if (sizeof(LecoPageHeader) + n * sizeof(uint64_t) > payload_start) {
+      return false;
+    }
+    memset(page + sizeof(LecoPageHeader), 0,
+           payload_start - sizeof(LecoPageHeader));
+    memcpy(page + sizeof(LecoPageHeader), keys, n * sizeof(uint64_t));
+  }
+  memset(page + payload_start, 'a', n * payload_bytes);
+  return true;
+}
+
+#ifdef LID_X86_SIMD
+/**
+ * @brief #keys < key among the keys [lo, hi) of the block, decoded 8 at a
+ * time: the predictions are converted from theta0 + i * theta1 and each
+ * residual is gathered from its byte, shifted and masked.
+ */
+__attribute__((target("avx512f,avx512dq,popcnt"))) inline uint64_t
+AVX512LecoCountLess(const LecoBlock& block, int64_t key, uint64_t lo,
+                    uint64_t hi) {
+  const __m512i k = _mm512_set1_epi64(key);
+  const __m512d t0 = _mm512_set1_pd(block.theta0);
+  const __m512d t1 = _mm512_set1_pd(block.theta1);
+  const uint64_t l = block.bits;
+  const __m512i bits = _mm512_set1_epi64(l);
+  const __m512i value_mask = _mm512_set1_epi64(l ? (1ULL << l) - 1 : 0);
+  const __m512i mag_mask = _mm512_set1_epi64(l ? (1ULL << (l - 1)) - 1 : 0);
+  const __m512i sign_bit = _mm512_set1_epi64(l ? 1ULL << (l - 1) : 0);
+  __m512i idx =
+      _mm512_add_epi64(_mm512_set1_epi64(lo), _mm512_set_epi64(7, 6, 5, 4, 3,
+                                                               2, 1, 0));
+  uint64_t cnt = 0;
+  for (uint64_t i = lo; i < hi; i += 8) {
+    const __mmask8 valid =
+        hi - i >= 8 ? 0xFF : static_cast<__mmask8>((1u << (hi - i)) - 1);
+    const __m512d x = _mm512_add_pd(t0, _mm512_mul_pd(_mm512_cvtepi64_pd(idx),
+                                                      t1));
+    __m512i v = _mm512_cvttpd_epi64(x);
+    if (l) {
+      const __m512i bit_pos = _mm512_mullo_epi64(idx, bits);
+      const __m512i word = _mm512_mask_i64gather_epi64(
+          _mm512_setzero_si512(), valid, _mm512_srli_epi64(bit_pos, 3),
+          block.residuals, 1);
+      const __m512i code = _mm512_and_si512(
+          _mm512_srlv_epi64(word,
+                            _mm512_and_si512(bit_pos, _mm512_set1_epi64(7))),
+          value_mask);
+      const __m512i mag = _mm512_and_si512(code, mag_mask);
+      const __mmask8 positive = _mm512_test_epi64_mask(code, sign_bit);
+      v = _mm512_mask_add_epi64(_mm512_sub_epi64(v, mag), positive, v, mag);
+    }
+    cnt += __builtin_popcount(_mm512_mask_cmplt_epi64_mask(valid, v, k));
+    idx = _mm512_add_epi64(idx, _mm512_set1_epi64(8));
+  }
+  return cnt;
+}
+
+/**
+ * @brief The same as AVX512LecoCountLess with 4 keys at a time; the
+ * predictions are truncated and converted with the 2^52 + 2^51 trick.
+ */
+__attribute__((target("avx2,popcnt"))) inline uint64_t AVX2LecoCountLess(
+    const LecoBlock& block, int64_t key, uint64_t lo, uint64_t hi) {
+  const __m256i k = _mm256_set1_epi64x(key);
+  const __m256d t0 = _mm256_set1_pd(block.theta0);
+  const __m256d t1 = _mm256_set1_pd(block.theta1);
+  const __m256d magic = _mm256_set1_pd(6755399441055744.0);
+  const uint64_t l = block.bits;
+  const __m256i bits = _mm256_set1_epi64x(l);
+  const __m256i value_mask = _mm256_set1_epi64x(l ? (1ULL << l) - 1 : 0);
+  const __m256i mag_mask = _mm256_set1_epi64x(l ? (1ULL << (l - 1)) - 1 : 0);
+  const __m256i sign_bit = _mm256_set1_epi64x(l ? 1ULL << (l - 1) : 0);
+  const __m256i lanes = _mm256_setr_epi64x(0, 1, 2, 3);
+  const auto* base = reinterpret_cast<const long long*>(block.residuals);
+  __m256i idx = _mm256_add_epi64(_mm256_set1_epi64x(lo), lanes);
+  __m256d idx_pd = _mm256_add_pd(_mm256_set1_pd(lo),
+                                 _mm256_setr_pd(0, 1, 2, 3));
+  uint64_t cnt = 0;
+  for (uint64_t i = lo; i < hi; i += 4) {
+    const __m256i valid = _mm256_cmpgt_epi64(_mm256_set1_epi64x(hi - i), lanes);
+    const __m256d x = _mm256_round_pd(
+        _mm256_add_pd(t0, _mm256_mul_pd(idx_pd, t1)),
+        _MM_FROUND_TO_ZERO | _MM_FROUND_NO_EXC);
+    __m256i v = _mm256_sub_epi64(
+        _mm256_castpd_si256(_mm256_add_pd(x, magic)), _mm256_castpd_si256(magic));
+    if (l) {
+      const __m256i bit_pos = _mm256_mul_epu32(idx, bits);
+      const __m256i word = _mm256_mask_i64gather_epi64(
+          _mm256_setzero_si256(), base, _mm256_srli_epi64(bit_pos, 3), valid,
+          1);
+      const __m256i code = _mm256_and_si256(
+          _mm256_srlv_epi64(word,
+                            _mm256_and_si256(bit_pos, _mm256_set1_epi64x(7))),
+          value_mask);
+      const __m256i mag = _mm256_and_si256(code, mag_mask);
+      const __m256i positive =
+          _mm256_cmpeq_epi64(_mm256_and_si256(code, sign_bit), sign_bit);
+      v = _mm256_blendv_epi8(_mm256_sub_epi64(v, mag), _mm256_add_epi64(v, mag),
+                             positive);
+    }
+    const __m256i lt = _mm256_and_si256(_mm256_cmpgt_epi64(k, v), valid);
+    cnt += __builtin_popcount(_mm256_movemask_pd(_mm256_castsi256_pd(lt)));
+    idx = _mm256_add_epi64(idx, _mm256_set1_epi64x(4));
+    idx_pd = _mm256_add_pd(idx_pd, _mm256_set1_pd(4));
+  }
+  return cnt;
+}
+#endif  // LID_X86_SIMD
+
+/**
+ * @brief Position of the first key >= key in the page (its #keys if none).
+ */
+inline uint64_t LecoPageLowerBound(const char* page, uint64_t key) {
+  const auto* header = reinterpret_cast<const LecoPageHeader*>(page);
+  const uint64_t n = header->num;
+  if (key <= header->base) {
+    return 0;
+  }
+  if (header->raw) {
+    const auto* keys =
+        reinterpret_cast<const uint64_t*>(page + sizeof(LecoPageHeader));
+    const uint64_t idx = LastMileSearch(keys, n, 1, key);
+    return keys[idx] < key ? n : idx;
+  }
+  const LecoBlock block(reinterpret_cast<const uint8_t*>(page) +
+                        sizeof(LecoPageHeader));
+  const int64_t k =
+      static_cast<int64_t>(std::min(key - header->base, 4 * kLecoPageMaxSpan));
+
+  // key_i is within the residual bound of the prediction, which is within 1
+  // of theta0 + i * theta1, so only the keys of [lo, hi) can be on either
+  // side of k
+  uint64_t lo = 0, hi = n;
+  if (block.theta1 > 0) {
+    const double bound = block.bits ? (1ULL << (block.bits - 1)) + 1.0 : 1.0;
+    const double first = (k - bound - block.theta0) / block.theta1 - 1;
+    const double last = (k + bound - block.theta0) / block.theta1 + 2;
+    lo = first <= 0 ? 0 : std::min<double>(first, n);
+    hi = last <= 0 ? 0 : std::min<double>(last, n);
+    if (lo > 0 && block.Get(lo - 1) >= k) {
+      lo = 0;
+    }
+    if (hi < n && block.Get(hi) < k) {
+      hi = n;
+    }
+    hi = std::max(lo, hi);
+  }
+
+  switch (last_mile_mode) {
+#ifdef LID_X86_SIMD
+    case kLastMileAVX512:
+      return lo + AVX512LecoCountLess(block, k, lo, hi);
+    case kLastMileAVX2:
+      return lo + AVX2LecoCountLess(block, k, lo, hi);
+#endif  // LID_X86_SIMD
+    default: {
+      // branchless binary search over the decoded keys
+      uint64_t len = hi - lo;
+      if (len == 0) {
+        return lo;
+      }
+      while (len > 1) {
+        const uint64_t half = len >> 1;
+        lo = block.Get(lo + half) < k ? lo + half : lo;
+        len -= half;
+      }
+      return lo + (block.Get(lo) < k);
+    }
+  }
+}
+
+inline uint64_t LecoPageKey(const char* page, uint64_t i) {
+  const auto* header = reinterpret_cast<const LecoPageHeader*>(page);
+  if (header->raw) {
+    return reinterpret_cast<const uint64_t*>(page +
+                                             sizeof(LecoPageHeader))[i];
+  }
+  const LecoBlock block(reinterpret_cast<const uint8_t*>(page) +
+                        sizeof(LecoPageHeader));
+  return header->base + block.Get(i);
+}
+
+/**
+ * @brief The first key >= key in the page_num pages of buf, or their last key
+ * if there is none (as LastMileSearch).
+ */
+inline uint64_t LecoPagesSearch(const char* buf, size_t page_num,
+                                size_t page_bytes, uint64_t key) {
+  // the last page whose first key is <= key
+  size_t p = 0;
+  while (p + 1 < page_num &&
+         reinterpret_cast<const LecoPageHeader*>(buf + (p + 1) * page_bytes)
+                 ->base <= key) {
+    p++;
+  }
+  const char* page = buf + p * page_bytes;
+  const uint64_t idx = LecoPageLowerBound(page, key);
+  const uint64_t n = reinterpret_cast<const LecoPageHeader*>(page)->num;
+  if (idx < n) {
+    return LecoPageKey(page, idx);
+  }
+  if (p + 1 < page_num) {
+    return reinterpret_cast<const LecoPageHeader*>(page + page_bytes)->base;
+  }
+  return LecoPageKey(page, n - 1);
+}
+
+/**
+ * @brief The first record of every LeCo-compressed data page; pages are
+ * stored page_num_per_file to a file, as the raw pages.
+ */
+class LecoPageTable {
+ public:
+  /**
+   * @brief Writes the keys as compressed pages to the data files <i>.data of
+   * the stripe layout and the table to <dir>leco_pages.meta.
+   */
+  static std::shared_ptr<LecoPageTable> Store(const std::vector<uint64_t>& keys,
+                                              const std::string& dir,
+                                              const StripeLayout& stripe,
+                                              size_t page_bytes,
+                                              size_t payload_bytes,
+                                              size_t page_num_per_file) {
+    auto table = std::make_shared<LecoPageTable>();
+    std::vector<char> page(page_bytes);
+    std::vector<uint64_t> values;
+    std::vector<uint8_t> block;
+    // the copies of the current file on all the devices
+    std::vector<std::ofstream> out(stripe.GetDeviceNum());
+    size_t n = 1;  // the #keys of the last page, to start from
+    for (size_t s = 0; s < keys.size();) {
+      const size_t page_id = table->first_record_.size();
+      const size_t fid = page_id / page_num_per_file;
+      const size_t pid = page_id % page_num_per_file;
+      if (pid == 0) {
+        for (size_t dev = 0; dev < out.size(); dev++) {
+          out[dev].close();
+          out[dev].open(stripe.GetFile(fid, dev),
+                        std::ios::binary | std::ios::trunc);
+          if (!out[dev]) {
+            throw std::runtime_error("Failed to write the LeCo data pages in " +
+                                     stripe.GetDir(dev));
+          }
+        }
+      }
+      const size_t left = std::min(keys.size() - s, kLecoPageMaxKeys);
+      auto fits = [&](size_t m) {
+        return EncodeLecoPage(keys.data() + s, m, payload_bytes, page_bytes,
+                              page.data(), &values, &block);
+      };
+      // the largest fitting count, searched from the previous one
+      n = std::min(n, left);
+      size_t ok = 0, fail = left + 1;
+      if (fits(n)) {
+        ok = n;
+        for (size_t step = 1; ok < left; step *= 2) {
+          const size_t m = std::min(left, ok + step);
+          if (!fits(m)) {
+            fail = m;
+            break;
+          }
+          ok = m;
+        }
+      } else {
+        fail = n;
+      }
+      while (fail - ok > 1 && ok < left) {
+        const size_t m = (ok + fail) / 2;
+        if (fits(m)) {
+          ok = m;
+        } else {
+          fail = m;
+        }
+      }
+      if (ok == 0) {
+        throw std::runtime_error("A record does not fit in a LeCo data page!");
+      }
+      n = ok;
+      fits(n);
+      std::ofstream& dev_out = out[stripe.GetDevice(fid, pid)];
+      dev_out.seekp(pid * page_bytes);
+      dev_out.write(page.data(), page_bytes);
+      table->first_record_.push_back(s);
+      s += n;
+    }
+    for (auto& dev_out : out) {
+      dev_out.close();
+    }
+    table->key_num_ = keys.size();
+
+    std::ofstream meta(dir + LECO_PAGE_META, std::ios::binary);
+    const uint64_t head[4] = {page_bytes, payload_bytes, keys.size(),
+                              table->first_record_.size()};
+    meta.write(reinterpret_cast<const char*>(head), sizeof(head));
+    meta.write(reinterpret_cast<const char*>(table->first_record_.data()),
+               table->first_record_.size() * sizeof(uint64_t));
+    if (!meta) {
+      throw std::runtime_error("Failed to write " + dir + LECO_PAGE_META);
+    }
+    return table;
+  }
+
+  // Loads the table stored with the same page size, payload and #keys.
+  static std::shared_ptr<LecoPageTable> Load(const std::string& dir,
+                                             size_t page_bytes,
+                                             size_t payload_bytes,
+                                             size_t key_num) {
+    std::ifstream meta(dir + LECO_PAGE_META, std::ios::binary);
+    uint64_t head[4];
+    if (!meta.read(reinterpret_cast<char*>(head), sizeof(head)) ||
+        head[0] != page_bytes || head[1] != payload_bytes ||
+        head[2] != key_num) {
+      throw std::runtime_error("No LeCo data pages of this dataset in " + dir +
+                               ", store them with first_run = 1!");
+    }
+    auto table = std::make_shared<LecoPageTable>();
+    table->key_num_ = key_num;
+    table->first_record_.resize(head[3]);
+    if (!meta.read(reinterpret_cast<char*>(table->first_record_.data()),
+                   head[3] * sizeof(uint64_t))) {
+      throw std::runtime_error("Failed to read " + dir + LECO_PAGE_META);
+    }
+    return table;
+  }
+
+  // Removes the table, once the raw pages are stored over the LeCo ones.
+  static void Remove(const std::string& dir) {
+    unlink((dir + LECO_PAGE_META).c_str());
+  }
+
+  inline uint64_t GetPage(uint64_t record) const {
+    return std::upper_bound(first_record_.begin(), first_record_.end(),
+                            record) -
+           first_record_.begin() - 1;
+  }
+
+  size_t GetPageNum() const { return first_record_.size(); }
+
+  size_t GetFileNum(size_t page_num_per_file) const {
+    return (first_record_.size() + page_num_per_file - 1) / page_num_per_file;
+  }
+
+  double GetKeysPerPage() const {
+    return first_record_.empty() ? 0 : key_num_ * 1.0 / first_record_.size();
+  }
+
+  size_t GetSizeInBytes() const {
+    return first_record_.size() * sizeof(uint64_t);
+  }
+
+ private:
+  std::vector<uint64_t> first_record_;
+  size_t key_num_ = 0;
+};
+
+#endif  // EXPERIMENTS_LECO_DATA_PAGE_H_
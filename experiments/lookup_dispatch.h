@@ -0,0 +1,60 @@
+/**
+ * @file lookup_dispatch.h
+ * @brief Zero-copy distribution of the lookups among the lookup threads. All
+ * threads read the one shuffled lookup array through LookupSpan views; instead
+ * of a fixed size / thread_num slice each, they claim chunks of it from a
+ * shared ChunkDispatcher until none is left, so a thread that is done early
+ * keeps taking work while a slower one is still busy.
+ */
+#ifndef EXPERIMENTS_LOOKUP_DISPATCH_H_
+#define EXPERIMENTS_LOOKUP_DISPATCH_H_
+
+#include <stddef.h>
+
+#include <algorithm>
+#include <atomic>
+
+// A read-only view of size elements from data, as std::span (C++20).
+template <typename T>
+class LookupSpan {
+ public:
+  LookupSpan() {}
+  LookupSpan(const T* data, size_t size) : data_(data), size_(size) {}
+
+  inline const T* begin() const { return data_; }
+  inline const T* end() const { return data_ + size_; }
+  inline size_t size() const { return size_; }
+  inline bool empty() const { return size_ == 0; }
+  inline const T& operator[](size_t i) const { return data_[i]; }
+
+ private:
+  const T* data_ = nullptr;
+  size_t size_ = 0;
+};
+
+template <typename T>
+class ChunkDispatcher {
+ public:
+  ChunkDispatcher(const T* data, size_t size, size_t chunk)
+      : data_(data), size_(size), chunk_(std::max<size_t>(1, chunk)) {}
+
+  ChunkDispatcher(const ChunkDispatcher&) = delete;
+  ChunkDispatcher& operator=(const ChunkDispatcher&) = delete;
+
+  // The next unclaimed chunk; empty once the whole array is handed out.
+  inline LookupSpan<T> Next() {
+    const size_t begin = next_.fetch_add(chunk_, std::memory_order_relaxed);
+    if (begin >= size_) {
+      return LookupSpan<T>();
+    }
+    return LookupSpan<T>(data_ + begin, std::min(chunk_, size_ - begin));
+  }
+
+ private:
+  const T* data_;
+  const size_t size_;
+  const size_t chunk_;
+  alignas(64) std::atomic<size_t> next_{0};  // claimed by every thread
+};
+
+#endif  // EXPERIMENTS_LOOKUP_DISPATCH_H_
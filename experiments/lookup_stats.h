@@ -0,0 +1,69 @@
+/**
+ * @file lookup_stats.h
+ * @brief Per-thread profiling of the on-disk lookups: CPU/IO time sums and
+ * log-bucketed latency histograms of the predict, IO and last-mile search
+ * stages. Each lookup thread writes only its own (cache-line aligned)
+ * LookupStats, reached through the thread-local lookup_stats, and the threads'
+ * stats are merged after they are joined. Profiling is compiled in and turned
+ * on at run time (--profile, or PROF_CPU_IO by default); it costs two clock
+ * reads per stage, about as much as a last-mile search, so the last-mile modes
+ * are compared without it.
+ */
+#ifndef EXPERIMENTS_LOOKUP_STATS_H_
+#define EXPERIMENTS_LOOKUP_STATS_H_
+
+#include <stdint.h>
+
+#include <algorithm>
+#include <chrono>
+
+#include "latency_histogram.h"
+#include "macro.h"
+
+enum LookupStage { kPredictStage, kIOStage, kSearchStage, kLookupStageNum };
+
+inline const char* LookupStageName(int stage) {
+  switch (stage) {
+    case kPredictStage:
+      return "predict";
+    case kIOStage:
+      return "io";
+    default:
+      return "search";
+  }
+}
+
+struct alignas(64) LookupStats {
+  uint64_t io_time = 0;         // in read(), or from submission to reaping
+  uint64_t file_cpu_time = 0;   // in lseek()
+  uint64_t last_mile_time = 0;  // in the last-mile search
+  // predict: per key (a batch's time split over its keys); io: per read;
+  // search: per last-mile search
+  LatencyHistogram hist[kLookupStageNum];
+
+  void Merge(const LookupStats& other) {
+    io_time += other.io_time;
+    file_cpu_time += other.file_cpu_time;
+    last_mile_time += other.last_mile_time;
+    for (int i = 0; i < kLookupStageNum; i++) {
+      hist[i].Merge(other.hist[i]);
+    }
+  }
+};
+
+#ifdef PROF_CPU_IO
+bool lookup_profiling = true;
+#else
+bool lookup_profiling = false;
+#endif  // PROF_CPU_IO
+
+// The stats of the calling lookup thread; nullptr when not profiling.
+thread_local LookupStats* lookup_stats = nullptr;
+
+inline uint64_t GetProfNs() {
+  return std::chrono::duration_cast<std::chrono::nanoseconds>(
+             std::chrono::high_resolution_clock::now().time_since_epoch())
+      .count();
+}
+
+#endif  // EXPERIMENTS_LOOKUP_STATS_H_
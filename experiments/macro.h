@@ -34,6 +34,37 @@ inline size_t GetConfiguredThreadCount() {
   return GetDefaultThreadCount();
 }
 
+// Number of lookup keys whose search ranges are predicted by one LookupBatch
+// call in DoCoreLookups.
+inline size_t GetConfiguredLookupBatch() {
+  const char* env = std::getenv("LID_LOOKUP_BATCH");
+  if (env && *env) {
+    char* end = nullptr;
+    auto v = std::strtoul(env, &end, 10);
+    if (end != env && v > 0) return static_cast<size_t>(v);
+  }
+  return 32;
+}
+
+// Number of lookups a lookup thread claims at a time from the shared lookup
+// array (see lookup_dispatch.h).
+inline size_t GetConfiguredLookupChunk() {
+  const char* env = std::getenv("LID_LOOKUP_CHUNK");
+  if (env && *env) {
+    char* end = nullptr;
+    auto v = std::strtoul(env, &end, 10);
+    if (end != env && v > 0) return static_cast<size_t>(v);
+  }
+  return 1024;
+}
+
+// LID_NUMA=1: pin the lookup threads to the CPUs of the NUMA nodes and share
+// one index replica per node instead of copying the index into every thread.
+inline bool GetConfiguredNumaMode() {
+  const char* env = std::getenv("LID_NUMA");
+  return env && *env && std::strtoul(env, nullptr, 10) > 0;
+}
+
 #define ALLOCATED_BUF_SIZE 10  // #pages (the size of buffer)
 
 #define LAST_MILE_SEARCH 0  // 0: binary search, 1: linear search
@@ -57,6 +88,12 @@ void PrintMacro() {
   std::cout << "---------PRINT MACRO-------------\n";
   std::cout << "Threads: " << GetConfiguredThreadCount()
             << " (override with env LID_THREADS)" << std::endl;
+  std::cout << "Lookup batch: " << GetConfiguredLookupBatch()
+            << " (override with env LID_LOOKUP_BATCH)" << std::endl;
+  std::cout << "Lookup chunk: " << GetConfiguredLookupChunk()
+            << " (override with env LID_LOOKUP_CHUNK)" << std::endl;
+  std::cout << "NUMA placement: " << GetConfiguredNumaMode()
+            << " (override with env LID_NUMA)" << std::endl;
 
 #ifdef DIRECT_IO
   std::cout << "Use [direct IO] to fetch pages on disk." << std::endl;
@@ -65,9 +102,13 @@ void PrintMacro() {
 #endif  // DIRECT_IO
 
 #if LAST_MILE_SEARCH == 0
-  std::cout << "Use [binary search] to perform last-mile search." << std::endl;
+  std::cout << "Use [binary search] to perform last-mile search (override "
+               "with --last-mile)."
+            << std::endl;
 #else
-  std::cout << "Use [linear search] to perform last-mile search." << std::endl;
+  std::cout << "Use [linear search] to perform last-mile search (override "
+               "with --last-mile)."
+            << std::endl;
 #endif  // LAST_MILE_SEARCH
 
 #ifdef TEST_SEARCH
@@ -0,0 +1,135 @@
+/**
+ * @file numa_placement.h
+ * @brief NUMA-aware placement of the lookup threads (LID_NUMA=1). The CPUs of
+ * each node are read from /sys/devices/system/node; the lookup threads are
+ * spread over the nodes round-robin and pinned to one CPU of their node each.
+ * DoLookups then copies the index once per node, from a thread pinned to that
+ * node so that the first touch places the replica in its memory, and the
+ * threads of the node share it.
+ */
+#ifndef EXPERIMENTS_NUMA_PLACEMENT_H_
+#define EXPERIMENTS_NUMA_PLACEMENT_H_
+
+#include <pthread.h>
+#include <sched.h>
+
+#include <fstream>
+#include <stdexcept>
+#include <string>
+#include <thread>
+#include <vector>
+
+class NumaTopology {
+ public:
+  /**
+   * @brief The online nodes that have CPUs the process may run on; a single
+   * node with all of them if sysfs has no node information.
+   */
+  static NumaTopology Detect() {
+    cpu_set_t allowed;
+    CPU_ZERO(&allowed);
+    sched_getaffinity(0, sizeof(allowed), &allowed);
+
+    NumaTopology topology;
+    const std::string kNodeDir = "/sys/devices/system/node/";
+    for (int node : ParseCpuList(ReadLine(kNodeDir + "online"))) {
+      std::vector<int> cpus;
+      for (int cpu : ParseCpuList(ReadLine(
+               kNodeDir + "node" + std::to_string(node) + "/cpulist"))) {
+        if (cpu < CPU_SETSIZE && CPU_ISSET(cpu, &allowed)) {
+          cpus.push_back(cpu);
+        }
+      }
+      if (!cpus.empty()) {
+        topology.node_ids_.push_back(node);
+        topology.cpus_.push_back(cpus);
+      }
+    }
+    if (topology.cpus_.empty()) {
+      std::vector<int> cpus;
+      for (int cpu = 0; cpu < CPU_SETSIZE; cpu++) {
+        if (CPU_ISSET(cpu, &allowed)) {
+          cpus.push_back(cpu);
+        }
+      }
+      topology.node_ids_.push_back(0);
+      topology.cpus_.push_back(cpus);
+    }
+    return topology;
+  }
+
+  inline size_t GetNodeNum() const { return cpus_.size(); }
+  inline int GetNodeId(size_t node) const { return node_ids_[node]; }
+  inline const std::vector<int>& GetCpus(size_t node) const {
+    return cpus_[node];
+  }
+
+  // The node (an index of the detected ones) and the CPU of lookup thread i.
+  inline size_t GetThreadNode(size_t i) const { return i % cpus_.size(); }
+  inline int GetThreadCpu(size_t i) const {
+    const std::vector<int>& cpus = cpus_[GetThreadNode(i)];
+    return cpus[(i / cpus_.size()) % cpus.size()];
+  }
+
+ private:
+  static std::string ReadLine(const std::string& filename) {
+    std::ifstream in(filename);
+    std::string line;
+    std::getline(in, line);
+    return line;
+  }
+
+  // A list such as "0-3,8-11,16".
+  static std::vector<int> ParseCpuList(const std::string& list) {
+    std::vector<int> res;
+    size_t start = 0;
+    while (start < list.size()) {
+      size_t end = list.find(',', start);
+      if (end == std::string::npos) {
+        end = list.size();
+      }
+      const std::string range = list.substr(start, end - start);
+      const size_t dash = range.find('-');
+      try {
+        const int first = std::stoi(range.substr(0, dash));
+        const int last =
+            dash == std::string::npos ? first : std::stoi(range.substr(dash + 1));
+        for (int i = first; i <= last; i++) {
+          res.push_back(i);
+        }
+      } catch (const std::exception&) {
+        return {};
+      }
+      start = end + 1;
+    }
+    return res;
+  }
+
+  std::vector<int> node_ids_;
+  std::vector<std::vector<int>> cpus_;
+};
+
+static inline cpu_set_t GetCpuSet(const std::vector<int>& cpus) {
+  cpu_set_t set;
+  CPU_ZERO(&set);
+  for (int cpu : cpus) {
+    CPU_SET(cpu, &set);
+  }
+  return set;
+}
+
+/**
+ * @brief Runs fn on a thread pinned to cpus and waits for it, so that the
+ * memory fn touches first is allocated on their node.
+ */
+template <typename F>
+static inline void RunOnCpus(const std::vector<int>& cpus, F fn) {
+  std::thread t([&] {
+    const cpu_set_t set = GetCpuSet(cpus);
+    pthread_setaffinity_np(pthread_self(), sizeof(set), &set);
+    fn();
+  });
+  t.join();
+}
+
+#endif  // EXPERIMENTS_NUMA_PLACEMENT_H_
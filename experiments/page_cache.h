@@ -0,0 +1,227 @@
+/**
+ * @file page_cache.h
+ * @brief A buffer pool of data pages shared by all the lookup threads. Pages
+ * are keyed by (file id, page id) and spread over independently locked
+ * shards, each of which evicts by CLOCK or by LRU within its own frames.
+ */
+#ifndef EXPERIMENTS_PAGE_CACHE_H_
+#define EXPERIMENTS_PAGE_CACHE_H_
+
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+#include <algorithm>
+#include <memory>
+#include <mutex>
+#include <stdexcept>
+#include <string>
+#include <unordered_map>
+#include <vector>
+
+enum PageCachePolicy { kClockCache, kLRUCache };
+
+static inline const char* PageCachePolicyName(PageCachePolicy policy) {
+  return policy == kLRUCache ? "lru" : "clock";
+}
+
+class PageCache {
+ public:
+  PageCache(size_t capacity_bytes, size_t page_bytes, PageCachePolicy policy,
+            size_t shard_num)
+      : page_bytes_(page_bytes), policy_(policy) {
+    capacity_ = capacity_bytes / page_bytes;
+    if (capacity_ < 1) {
+      throw std::runtime_error("The page cache is smaller than one page!");
+    }
+    // A power of two, and at least one frame per shard.
+    shard_num_ = 1;
+    while (shard_num_ * 2 <= shard_num && shard_num_ * 2 <= capacity_) {
+      shard_num_ *= 2;
+    }
+    frames_ = reinterpret_cast<char*>(
+        aligned_alloc(page_bytes_, capacity_ * page_bytes_));
+    if (frames_ == nullptr) {
+      throw std::runtime_error("frames_ memalign error in PageCache()");
+    }
+
+    shards_.reset(new Shard[shard_num_]);
+    size_t offset = 0;
+    for (size_t i = 0; i < shard_num_; i++) {
+      Shard& shard = shards_[i];
+      shard.capacity = capacity_ / shard_num_ + (i < capacity_ % shard_num_);
+      shard.frames = frames_ + offset * page_bytes_;
+      offset += shard.capacity;
+      shard.keys.resize(shard.capacity);
+      shard.referenced.resize(shard.capacity);
+      shard.prev.resize(shard.capacity);
+      shard.next.resize(shard.capacity);
+      shard.table.reserve(shard.capacity);
+    }
+  }
+
+  PageCache(const PageCache&) = delete;
+  PageCache& operator=(const PageCache&) = delete;
+
+  ~PageCache() { free(frames_); }
+
+  /**
+   * @brief Copies the cached pages among [pid, pid + page_num) of file fid
+   * into buf. [*read_first, *read_first + *read_num) (relative to pid) is the
+   * shortest run that covers the missing pages, *read_num is 0 if all of them
+   * are cached. Returns the number of missing pages.
+   */
+  size_t GetPages(uint64_t fid, uint64_t pid, size_t page_num, void* buf,
+                  size_t* read_first, size_t* read_num) {
+    char* dst = reinterpret_cast<char*>(buf);
+    size_t miss = 0, first = page_num, last = 0;
+    for (size_t i = 0; i < page_num; i++) {
+      if (!Get(fid, pid + i, dst + i * page_bytes_)) {
+        miss++;
+        first = std::min(first, i);
+        last = i;
+      }
+    }
+    *read_first = miss ? first : 0;
+    *read_num = miss ? last - first + 1 : 0;
+    return miss;
+  }
+
+  // Caches the pages [pid, pid + page_num) of file fid read into buf.
+  void PutPages(uint64_t fid, uint64_t pid, size_t page_num, const void* buf) {
+    const char* src = reinterpret_cast<const char*>(buf);
+    for (size_t i = 0; i < page_num; i++) {
+      Put(fid, pid + i, src + i * page_bytes_);
+    }
+  }
+
+  bool Get(uint64_t fid, uint64_t pid, void* dst) {
+    const uint64_t key = PageKey(fid, pid);
+    Shard& shard = shards_[ShardOf(key)];
+    std::lock_guard<std::mutex> lock(shard.mutex);
+    auto it = shard.table.find(key);
+    if (it == shard.table.end()) {
+      return false;
+    }
+    Touch(&shard, it->second);
+    memcpy(dst, shard.frames + it->second * page_bytes_, page_bytes_);
+    return true;
+  }
+
+  void Put(uint64_t fid, uint64_t pid, const void* src) {
+    const uint64_t key = PageKey(fid, pid);
+    Shard& shard = shards_[ShardOf(key)];
+    std::lock_guard<std::mutex> lock(shard.mutex);
+    auto it = shard.table.find(key);
+    if (it != shard.table.end()) {
+      Touch(&shard, it->second);
+      return;
+    }
+    const uint32_t frame = Evict(&shard);
+    shard.keys[frame] = key;
+    shard.table[key] = frame;
+    memcpy(shard.frames + frame * page_bytes_, src, page_bytes_);
+  }
+
+  // Drops all the pages, e.g., before evaluating the next index.
+  void Clear() {
+    for (size_t i = 0; i < shard_num_; i++) {
+      Shard& shard = shards_[i];
+      std::lock_guard<std::mutex> lock(shard.mutex);
+      shard.table.clear();
+      shard.used = 0;
+      shard.hand = 0;
+      shard.head = shard.tail = kNil;
+    }
+  }
+
+  size_t GetCapacityBytes() const { return capacity_ * page_bytes_; }
+  size_t GetPageBytes() const { return page_bytes_; }
+  size_t GetShardNum() const { return shard_num_; }
+  PageCachePolicy GetPolicy() const { return policy_; }
+
+ private:
+  static constexpr uint32_t kNil = UINT32_MAX;
+
+  // Padded so that the locks of neighbouring shards do not share a line.
+  struct alignas(64) Shard {
+    std::mutex mutex;
+    std::unordered_map<uint64_t, uint32_t> table;  // page key -> frame
+    std::vector<uint64_t> keys;                     // page key of each frame
+    std::vector<uint8_t> referenced;                // CLOCK reference bits
+    std::vector<uint32_t> prev, next;               // LRU list, head is MRU
+    uint32_t head = kNil, tail = kNil;
+    char* frames = nullptr;
+    size_t capacity = 0;
+    size_t used = 0;
+    size_t hand = 0;
+  };
+
+  static inline uint64_t PageKey(uint64_t fid, uint64_t pid) {
+    return (fid << 40) | pid;
+  }
+
+  inline size_t ShardOf(uint64_t key) const {
+    return ((key * 0x9E3779B97F4A7C15ull) >> 32) & (shard_num_ - 1);
+  }
+
+  void Unlink(Shard* shard, uint32_t frame) {
+    const uint32_t p = shard->prev[frame], n = shard->next[frame];
+    (p == kNil ? shard->head : shard->next[p]) = n;
+    (n == kNil ? shard->tail : shard->prev[n]) = p;
+  }
+
+  void PushFront(Shard* shard, uint32_t frame) {
+    shard->prev[frame] = kNil;
+    shard->next[frame] = shard->head;
+    (shard->head == kNil ? shard->tail : shard->prev[shard->head]) = frame;
+    shard->head = frame;
+  }
+
+  void Touch(Shard* shard, uint32_t frame) {
+    if (policy_ == kClockCache) {
+      shard->referenced[frame] = 1;
+    } else if (shard->head != frame) {
+      Unlink(shard, frame);
+      PushFront(shard, frame);
+    }
+  }
+
+  // Returns a free frame, evicting a page if the shard is full.
+  uint32_t Evict(Shard* shard) {
+    uint32_t frame;
+    if (shard->used < shard->capacity) {
+      frame = shard->used++;
+      if (policy_ == kClockCache) {
+        shard->referenced[frame] = 1;
+      } else {
+        PushFront(shard, frame);
+      }
+      return frame;
+    }
+    if (policy_ == kClockCache) {
+      while (shard->referenced[shard->hand]) {
+        shard->referenced[shard->hand] = 0;
+        shard->hand = (shard->hand + 1) % shard->capacity;
+      }
+      frame = shard->hand;
+      shard->referenced[frame] = 1;
+      shard->hand = (shard->hand + 1) % shard->capacity;
+    } else {
+      frame = shard->tail;
+      Unlink(shard, frame);
+      PushFront(shard, frame);
+    }
+    shard->table.erase(shard->keys[frame]);
+    return frame;
+  }
+
+  size_t page_bytes_;
+  size_t capacity_;  // #frames
+  size_t shard_num_;
+  PageCachePolicy policy_;
+  char* frames_;
+  std::unique_ptr<Shard[]> shards_;
+};
+
+#endif  // EXPERIMENTS_PAGE_CACHE_H_
@@ -0,0 +1,81 @@
+/**
+ * @file prefetch_hints.h
+ * @brief The direction in which the speculative fetch strategy reads ahead.
+ * The predicted pages are grouped into segments of kSegmentPages pages; for a
+ * sample of the keys, the page that holds each key is compared with the page
+ * of the middle of its predicted range, and a segment reads ahead towards the
+ * side its keys fall on at least kMinRatio of the time (the more frequent one
+ * if both do). Segments whose keys are mostly on the predicted page, or that
+ * have no sampled key, read only the predicted page.
+ */
+#ifndef EXPERIMENTS_PREFETCH_HINTS_H_
+#define EXPERIMENTS_PREFETCH_HINTS_H_
+
+#include <stdint.h>
+
+#include <vector>
+
+enum PrefetchDirection : uint8_t { kNoPrefetch, kPrefetchNext, kPrefetchPrev };
+
+class PrefetchHints {
+ public:
+  static constexpr uint64_t kSegmentPages = 16;
+  static constexpr double kMinRatio = 0.25;
+
+  explicit PrefetchHints(uint64_t page_num)
+      : counts_((page_num + kSegmentPages - 1) / kSegmentPages),
+        directions_(counts_.size(), kNoPrefetch) {}
+
+  // A sampled key on actual_page, whose predicted range centers on
+  // predicted_page.
+  inline void Record(uint64_t predicted_page, uint64_t actual_page) {
+    Counts& c = counts_[GetSegment(predicted_page)];
+    c.total++;
+    c.next += actual_page > predicted_page;
+    c.prev += actual_page < predicted_page;
+  }
+
+  // Fixes the direction of each segment once all the samples are recorded.
+  void Finish() {
+    for (size_t i = 0; i < counts_.size(); i++) {
+      const Counts& c = counts_[i];
+      const uint64_t side = c.next >= c.prev ? c.next : c.prev;
+      if (c.total == 0 || side < kMinRatio * c.total) {
+        directions_[i] = kNoPrefetch;
+      } else {
+        directions_[i] = c.next >= c.prev ? kPrefetchNext : kPrefetchPrev;
+      }
+    }
+    counts_.clear();
+    counts_.shrink_to_fit();
+  }
+
+  inline PrefetchDirection Get(uint64_t predicted_page) const {
+    return static_cast<PrefetchDirection>(
+        directions_[GetSegment(predicted_page)]);
+  }
+
+  // The share of the segments that read ahead.
+  double GetPrefetchRatio() const {
+    uint64_t cnt = 0;
+    for (uint8_t d : directions_) {
+      cnt += d != kNoPrefetch;
+    }
+    return directions_.empty() ? 0 : cnt * 1.0 / directions_.size();
+  }
+
+ private:
+  struct Counts {
+    uint64_t total = 0, next = 0, prev = 0;
+  };
+
+  inline size_t GetSegment(uint64_t page) const {
+    const size_t segment = page / kSegmentPages;
+    return segment < directions_.size() ? segment : directions_.size() - 1;
+  }
+
+  std::vector<Counts> counts_;       // only until Finish()
+  std::vector<uint8_t> directions_;  // a PrefetchDirection per segment
+};
+
+#endif  // EXPERIMENTS_PREFETCH_HINTS_H_
@@ -0,0 +1,114 @@
+/**
+ * @file stripe_layout.h
+ * @brief Striping of the on-disk data pages over several data directories
+ * (one per device). Page pid of data file fid belongs to one directory,
+ * chosen per stripe unit of stripe_pages_ pages round-robin or by a hash, and
+ * is stored in <dir><fid>.data of that directory at the same offset as in the
+ * unstriped layout, so each directory holds a sparse copy of every data file
+ * with only its own pages written. A lookup thread opens every (file,
+ * directory) pair and reads each run of pages from the device it is on.
+ */
+#ifndef EXPERIMENTS_STRIPE_LAYOUT_H_
+#define EXPERIMENTS_STRIPE_LAYOUT_H_
+
+#include <stdint.h>
+
+#include <algorithm>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+class StripeLayout {
+ public:
+  StripeLayout(const std::vector<std::string>& dirs, uint64_t stripe_pages,
+               bool hashed)
+      : dirs_(dirs), stripe_pages_(stripe_pages), hashed_(hashed) {
+    if (dirs_.empty() || stripe_pages_ < 1) {
+      throw std::runtime_error("The stripe layout is invalid!");
+    }
+  }
+
+  /**
+   * @brief Parses the colon-separated directories of LID_DATA_DIRS (a
+   * trailing '/' is added to those without one); an empty list stands for
+   * default_dir alone.
+   */
+  static std::vector<std::string> ParseDirs(const char* dirs,
+                                            const std::string& default_dir) {
+    std::vector<std::string> res;
+    std::string list = dirs != nullptr ? dirs : "";
+    size_t start = 0;
+    while (start <= list.size()) {
+      size_t end = list.find(':', start);
+      if (end == std::string::npos) {
+        end = list.size();
+      }
+      std::string dir = list.substr(start, end - start);
+      if (!dir.empty()) {
+        if (dir.back() != '/') {
+          dir += '/';
+        }
+        res.push_back(dir);
+      }
+      start = end + 1;
+    }
+    if (res.empty()) {
+      res.push_back(default_dir);
+    }
+    return res;
+  }
+
+  inline size_t GetDeviceNum() const { return dirs_.size(); }
+  inline uint64_t GetStripePages() const { return stripe_pages_; }
+  inline bool IsHashed() const { return hashed_; }
+  inline const std::string& GetDir(size_t dev) const { return dirs_[dev]; }
+
+  inline std::string GetFile(uint64_t fid, size_t dev) const {
+    return dirs_[dev] + std::to_string(fid) + ".data";
+  }
+
+  // The key of the fd of file fid on device dev among the open files; fid
+  // itself without striping.
+  inline int GetFileKey(uint64_t fid, size_t dev) const {
+    return static_cast<int>(fid * dirs_.size() + dev);
+  }
+
+  // The device of page pid of file fid.
+  inline size_t GetDevice(uint64_t fid, uint64_t pid) const {
+    if (dirs_.size() == 1) {
+      return 0;
+    }
+    const uint64_t unit = pid / stripe_pages_;
+    if (!hashed_) {
+      // each file starts on the next device, so that the first pages of all
+      // files are not on the same one
+      return (fid + unit) % dirs_.size();
+    }
+    // the finalizer of splitmix64
+    uint64_t x = (fid << 32) ^ unit;
+    x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9ULL;
+    x = (x ^ (x >> 27)) * 0x94d049bb133111ebULL;
+    return (x ^ (x >> 31)) % dirs_.size();
+  }
+
+  // The end (exclusive, at most end) of the pages from pid of file fid that
+  // are on the same device, i.e. can be fetched by one read.
+  inline uint64_t GetRunEnd(uint64_t fid, uint64_t pid, uint64_t end) const {
+    if (dirs_.size() == 1) {
+      return end;
+    }
+    const size_t dev = GetDevice(fid, pid);
+    uint64_t run_end = (pid / stripe_pages_ + 1) * stripe_pages_;
+    while (run_end < end && GetDevice(fid, run_end) == dev) {
+      run_end += stripe_pages_;
+    }
+    return std::min(run_end, end);
+  }
+
+ private:
+  std::vector<std::string> dirs_;
+  uint64_t stripe_pages_;
+  bool hashed_;
+};
+
+#endif  // EXPERIMENTS_STRIPE_LAYOUT_H_
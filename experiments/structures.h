@@ -16,9 +16,15 @@
 #include <fstream>
 #include <iostream>
 #include <map>
+#include <memory>
 #include <random>
 
+#include "lookup_dispatch.h"
+#include "lookup_stats.h"
 #include "macro.h"
+#include "page_cache.h"
+#include "prefetch_hints.h"
+#include "stripe_layout.h"
 
 struct SearchRange {
   uint64_t start;
@@ -57,6 +63,13 @@ struct ResultInfo {
   uint64_t index_predict_time;
   uint64_t cpu_time;
   uint64_t io_time;
+  uint64_t io_inflight_sum;  // #in-flight reads summed over all submissions
+  uint64_t cache_hits;       // #pages served by the page cache
+  uint64_t cache_misses;     // #pages that had to be read from disk
+  uint64_t coalesce_batches;      // #windows of coalesced lookups
+  uint64_t coalesce_pages_saved;  // #pages requested - #pages fetched
+  uint64_t prefetch_pages;   // #pages read ahead by kSpeculativeFetch
+  uint64_t prefetch_wasted;  // #pages read ahead but never searched
 
   ResultInfo() {
     res = 0;
@@ -69,6 +82,13 @@ struct ResultInfo {
     index_predict_time = 0;
     cpu_time = 0;
     io_time = 0;
+    io_inflight_sum = 0;
+    cache_hits = 0;
+    cache_misses = 0;
+    coalesce_batches = 0;
+    coalesce_pages_saved = 0;
+    prefetch_pages = 0;
+    prefetch_wasted = 0;
   }
 };
 
@@ -79,9 +99,27 @@ enum FetchStrategy {
   kStartOneByOne,
   kMiddleWorstCase,
   kMiddleOneByOne,
-  kLecoFetch
+  kLecoFetch,
+  // the predicted page, read together with its neighbour in the direction
+  // given by the PrefetchHints of the index, then one by one
+  kSpeculativeFetch
 };
 
+// How the pages of on-disk lookups are read: one blocking read at a time, or
+// io_depth_ outstanding reads per thread through libaio / io_uring.
+enum IOBackend { kSyncIO, kLibaio, kIoUring };
+
+static inline const char* IOBackendName(IOBackend backend) {
+  switch (backend) {
+    case kLibaio:
+      return "libaio";
+    case kIoUring:
+      return "io_uring";
+    default:
+      return "sync";
+  }
+}
+
 enum IndexName {
   kPGMIndex,
   kPGMIndexPage,
@@ -246,6 +284,8 @@ class CompressedBlockSize {
   int stddev_;
 };
 
+class LecoPageTable;
+
 template <typename Key>
 class Params {
  public:
@@ -254,6 +294,7 @@ class Params {
 
   std::string dataset_filename_;
   std::string data_dir_;  // useless in-memory mode
+  // The fds of the data files, keyed by stripe_->GetFileKey(fid, device)
   std::map<int, int> open_files;
   Key* read_buf_;
 
@@ -275,6 +316,44 @@ class Params {
   FetchStrategy fetch_strategy_;  // useless in compression and in-memory mode
   uint64_t pred_granularity_;     // useless in compression mode
 
+  // Set by the environment variables LID_IO_BACKEND (sync, libaio or io_uring)
+  // and LID_IO_DEPTH (#outstanding lookups per thread); useless in-memory.
+  IOBackend io_backend_ = kSyncIO;
+  size_t io_depth_ = 1;
+
+  // Shared by the copies of the parameters in all threads. Set by the
+  // environment variables LID_PAGE_CACHE_MB (0: no cache) and
+  // LID_PAGE_CACHE_POLICY (clock or lru); useless in-memory.
+  std::shared_ptr<PageCache> page_cache_;
+
+  // Set by the environment variable LID_COALESCE_WINDOW: the fetches of this
+  // many lookups are coalesced into shared reads (0: one fetch per lookup);
+  // only in normal mode with the sync backend.
+  size_t coalesce_window_ = 0;
+
+  // Set by the environment variables LID_DATA_DIRS (colon-separated data
+  // directories, data_dir_ if unset), LID_STRIPE (rr or hash) and
+  // LID_STRIPE_PAGES (#pages per stripe unit); shared by all threads and
+  // useless in-memory.
+  std::shared_ptr<const StripeLayout> stripe_;
+
+  // Set by --page-format leco: the first record of each LeCo-compressed data
+  // page (nullptr: raw pages of record_num_per_page_ records).
+  std::shared_ptr<const LecoPageTable> leco_pages_;
+
+  // Learned for each index evaluated with kSpeculativeFetch (nullptr: no
+  // read-ahead).
+  std::shared_ptr<const PrefetchHints> prefetch_hints_;
+
+  // Set by --index-cache <dir>: built indexes are saved to and loaded from
+  // snapshots in this directory (empty: always build).
+  std::string index_cache_dir_;
+
+  // Set by --build-threads <n> (0: the default chunking of the PGM builds)
+  // and --build-compare (also build sequentially for reference).
+  size_t build_threads_ = 0;
+  bool build_compare_ = false;
+
   CompressedBlockSize comp_block_bytes;  // only for compression mode
 
   Params() { payload_bytes_ = 0; }
@@ -292,6 +371,7 @@ class Params {
     page_bytes_ = 4 * 1024;
     if (is_on_disk_) {
       data_dir_ = argv[9];
+      SetIOBackend(std::getenv("LID_IO_BACKEND"), std::getenv("LID_IO_DEPTH"));
       is_compression_mode_ = strtoul(argv[11], &endptr, 10);
       read_buf_ = reinterpret_cast<Key*>(
           aligned_alloc(page_bytes_, page_bytes_ * ALLOCATED_BUF_SIZE));
@@ -302,7 +382,7 @@ class Params {
       const uint64_t kFileSize = strtoul(argv[10], &endptr, 10);
       const uint64_t kPageSize = strtoul(argv[12], &endptr, 10);
       int strategy = strtoul(argv[13], &endptr, 10);
-      if (strategy <= kLecoFetch) {
+      if (strategy <= kSpeculativeFetch) {
         fetch_strategy_ = FetchStrategy(strategy);
       } else {
         throw std::runtime_error(
@@ -324,6 +404,11 @@ class Params {
           file_bytes_ = comp_block_bytes.byte_offset_.back();
         }
       }
+      SetPageCache(std::getenv("LID_PAGE_CACHE_MB"),
+                   std::getenv("LID_PAGE_CACHE_POLICY"));
+      SetCoalesceWindow(std::getenv("LID_COALESCE_WINDOW"));
+      SetStripe(std::getenv("LID_DATA_DIRS"), std::getenv("LID_STRIPE"),
+                std::getenv("LID_STRIPE_PAGES"));
     }
     record_num_per_page_ = page_bytes_ / record_bytes_;
     record_num_per_file_ = file_bytes_ / record_bytes_;
@@ -347,6 +432,16 @@ class Params {
         page_num_per_file_(other.page_num_per_file_),
         fetch_strategy_(other.fetch_strategy_),
         pred_granularity_(other.pred_granularity_),
+        io_backend_(other.io_backend_),
+        io_depth_(other.io_depth_),
+        page_cache_(other.page_cache_),
+        coalesce_window_(other.coalesce_window_),
+        stripe_(other.stripe_),
+        leco_pages_(other.leco_pages_),
+        prefetch_hints_(other.prefetch_hints_),
+        index_cache_dir_(other.index_cache_dir_),
+        build_threads_(other.build_threads_),
+        build_compare_(other.build_compare_),
         comp_block_bytes(other.comp_block_bytes) {}
 
   Params& operator=(const Params<Key>& other) {
@@ -367,11 +462,122 @@ class Params {
       page_num_per_file_ = other.page_num_per_file_;
       fetch_strategy_ = other.fetch_strategy_;
       pred_granularity_ = other.pred_granularity_;
+      io_backend_ = other.io_backend_;
+      io_depth_ = other.io_depth_;
+      page_cache_ = other.page_cache_;
+      coalesce_window_ = other.coalesce_window_;
+      stripe_ = other.stripe_;
+      leco_pages_ = other.leco_pages_;
+      prefetch_hints_ = other.prefetch_hints_;
+      index_cache_dir_ = other.index_cache_dir_;
+      build_threads_ = other.build_threads_;
+      build_compare_ = other.build_compare_;
       comp_block_bytes = other.comp_block_bytes;
     }
     return *this;
   }
 
+  void SetIOBackend(const char* backend, const char* depth) {
+    if (backend != nullptr && *backend) {
+      std::string name(backend);
+      if (name == "sync") {
+        io_backend_ = kSyncIO;
+      } else if (name == "libaio") {
+        io_backend_ = kLibaio;
+      } else if (name == "io_uring") {
+        io_backend_ = kIoUring;
+      } else {
+        throw std::runtime_error("The I/O backend is invalid: " + name);
+      }
+    }
+    io_depth_ = io_backend_ == kSyncIO ? 1 : 32;
+    if (depth != nullptr && *depth) {
+      char* endptr;
+      io_depth_ = strtoul(depth, &endptr, 10);
+      if (endptr == depth || io_depth_ < 1) {
+        throw std::runtime_error("The I/O depth is invalid!");
+      }
+    }
+    if (io_backend_ == kSyncIO) {
+      io_depth_ = 1;
+    }
+  }
+
+  void SetPageCache(const char* megabytes, const char* policy) {
+    page_cache_.reset();
+    if (megabytes == nullptr || !*megabytes) {
+      return;
+    }
+    char* endptr;
+    const double mib = strtod(megabytes, &endptr);
+    if (endptr == megabytes || mib < 0) {
+      throw std::runtime_error("The size of the page cache is invalid!");
+    }
+    if (mib == 0) {
+      return;
+    }
+    PageCachePolicy cache_policy = kClockCache;
+    if (policy != nullptr && *policy) {
+      std::string name(policy);
+      if (name == "lru") {
+        cache_policy = kLRUCache;
+      } else if (name != "clock") {
+        throw std::runtime_error("The page cache policy is invalid: " + name);
+      }
+    }
+    // Pages are cached in the unit of the reads: the logical page in normal
+    // mode, the OS page in compression mode.
+    const size_t cache_page_bytes =
+        is_compression_mode_ ? getpagesize() : page_bytes_;
+    page_cache_ = std::make_shared<PageCache>(
+        static_cast<size_t>(mib * 1024 * 1024), cache_page_bytes, cache_policy,
+        4 * GetConfiguredThreadCount());
+  }
+
+  void SetCoalesceWindow(const char* window) {
+    coalesce_window_ = 0;
+    if (window == nullptr || !*window) {
+      return;
+    }
+    char* endptr;
+    coalesce_window_ = strtoul(window, &endptr, 10);
+    if (endptr == window) {
+      throw std::runtime_error("The coalescing window is invalid!");
+    }
+    if (coalesce_window_ > 0 &&
+        (is_compression_mode_ || io_backend_ != kSyncIO)) {
+      throw std::runtime_error(
+          "LID_COALESCE_WINDOW needs the normal mode and the sync I/O "
+          "backend!");
+    }
+  }
+
+  void SetStripe(const char* dirs, const char* stripe, const char* pages) {
+    bool hashed = false;
+    if (stripe != nullptr && *stripe) {
+      std::string name(stripe);
+      if (name == "hash") {
+        hashed = true;
+      } else if (name != "rr") {
+        throw std::runtime_error("The stripe placement is invalid: " + name);
+      }
+    }
+    uint64_t stripe_pages = 1;
+    if (pages != nullptr && *pages) {
+      char* endptr;
+      stripe_pages = strtoul(pages, &endptr, 10);
+      if (endptr == pages || stripe_pages < 1) {
+        throw std::runtime_error("The stripe unit is invalid!");
+      }
+    }
+    stripe_ = std::make_shared<StripeLayout>(
+        StripeLayout::ParseDirs(dirs, data_dir_), stripe_pages, hashed);
+    if (stripe_->GetDeviceNum() > 1 && is_compression_mode_) {
+      throw std::runtime_error(
+          "LID_DATA_DIRS with several directories needs the normal mode!");
+    }
+  }
+
   void alloc() {
     read_buf_ = reinterpret_cast<Key*>(
         aligned_alloc(page_bytes_, page_bytes_ * ALLOCATED_BUF_SIZE));
@@ -423,6 +629,27 @@ class Params {
                  "the given range: (a) mid, mid + 1, ... or (b) mid, mid - 1, "
                  "...\n";
           break;
+        case kLecoFetch:
+          std::cout << "fetch strategy:, fetch all pages of [start, mid), "
+                       "then of [mid, end)\n";
+          break;
+        case kSpeculativeFetch:
+          std::cout << "fetch strategy:, fetch the middle page together with "
+                       "its neighbour on the side the errors are skewed to, "
+                       "then one by one\n";
+          break;
+      }
+
+      std::cout << "I/O backend:, " << IOBackendName(io_backend_)
+                << ", queue depth per thread:, " << io_depth_ << std::endl;
+      if (page_cache_) {
+        std::cout << "page cache:, "
+                  << page_cache_->GetCapacityBytes() / 1024.0 / 1024.0
+                  << " MiB, policy:, "
+                  << PageCachePolicyName(page_cache_->GetPolicy())
+                  << ", #shards:, " << page_cache_->GetShardNum() << std::endl;
+      } else {
+        std::cout << "page cache:, none" << std::endl;
       }
 
       std::cout << "The maximum number of records per page is:, "
@@ -433,6 +660,12 @@ class Params {
     } else {
       std::cout << "memory hierarchy:, in memory" << std::endl;
     }
+    if (!index_cache_dir_.empty()) {
+      std::cout << "index cache:, " << index_cache_dir_ << std::endl;
+    }
+    std::cout << "build threads:, " << build_threads_
+              << ", compare with the sequential build:, " << build_compare_
+              << std::endl;
     std::cout << "---------PRINT PARAMETERS COMPLETED-------------\n";
   }
 };
@@ -440,16 +673,25 @@ class Params {
 template <typename IndexType>
 class ThreadParams {
  public:
+  typedef typename IndexType::DataVev_::value_type Record;
+
   Params<typename IndexType::K_> params;
   IndexType index = IndexType(typename IndexType::param_t());
-  typename IndexType::DataVev_ lookups;
+  // hands out the chunks of the shared lookup array, see lookup_dispatch.h
+  ChunkDispatcher<Record>* lookups = nullptr;
   typename IndexType::param_t diff;  // used for testing the disk
   typename IndexType::K_ read_buf_;
+  size_t lookup_batch = 1;  // #keys predicted per LookupBatch call
+  LookupStats* stats = nullptr;  // the thread's own profiling stats
+  // LID_NUMA: the index replica of the thread's node, used instead of index
+  IndexType* shared_index = nullptr;
+  // LID_NUMA: params.read_buf_ is allocated by the (pinned) thread itself
+  bool alloc_in_thread = false;
 
   ThreadParams() {}
 
   ThreadParams(const Params<typename IndexType::K_>& p, const IndexType& i,
-               const typename IndexType::DataVev_& l,
+               ChunkDispatcher<Record>* l,
                const typename IndexType::param_t& d = 0)
       : params(p), index(i), lookups(l), diff(d) {}
 
@@ -457,7 +699,11 @@ class ThreadParams {
       : params(other.params),
         index(other.index),
         lookups(other.lookups),
-        diff(other.diff) {}
+        diff(other.diff),
+        lookup_batch(other.lookup_batch),
+        stats(other.stats),
+        shared_index(other.shared_index),
+        alloc_in_thread(other.alloc_in_thread) {}
 };
 
 #endif
\ No newline at end of file
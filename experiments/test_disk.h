@@ -14,34 +14,36 @@ pthread_mutex_t mutex_task;
 template <typename IndexType>
 static void* TestDiskCore(void* thread_params) {
   typedef typename IndexType::K_ K;
-  ThreadParams<IndexType> tmp_params =
+  ThreadParams<IndexType>& tmp_params =
       *static_cast<ThreadParams<IndexType>*>(thread_params);
   uint64_t data_num =
       tmp_params.params.dataset_bytes_ / tmp_params.params.record_bytes_;
   const uint64_t kGapCnt = tmp_params.params.record_bytes_ / sizeof(K);
   ResultInfo<K>* res_info = new ResultInfo<K>();
-  auto size = tmp_params.lookups.size();
 
   res_info->latency_sum = GetNsTime([&] {
-    for (uint64_t i = 0; i < size; i++) {
-      SearchRange range = {tmp_params.lookups[i].second - tmp_params.diff,
-                           tmp_params.lookups[i].second + 1};
-      if (tmp_params.lookups[i].second < tmp_params.diff) {
-        range.start = 0;
+    for (auto lookups = tmp_params.lookups->Next(); !lookups.empty();
+         lookups = tmp_params.lookups->Next()) {
+      for (const auto& lookup : lookups) {
+        SearchRange range = {lookup.second - tmp_params.diff,
+                             lookup.second + 1};
+        if (lookup.second < tmp_params.diff) {
+          range.start = 0;
+        }
+        range.stop = std::min(range.stop, data_num);
+
+        ResultInfo<K> read_res = NormalCoreLookup(range, lookup.first,
+                                                  tmp_params.params, kGapCnt);
+
+        res_info->total_search_range += read_res.total_search_range;
+        if (read_res.total_search_range > res_info->max_search_range) {
+          res_info->max_search_range = read_res.total_search_range;
+        }
+        res_info->res += read_res.res;
+        res_info->fetch_page_num += read_res.fetch_page_num;
+        res_info->total_io += read_res.total_io;
+        res_info->ops++;
       }
-      range.stop = std::min(range.stop, data_num);
-
-      ResultInfo<K> read_res = NormalCoreLookup(
-          range, tmp_params.lookups[i].first, tmp_params.params, kGapCnt);
-
-      res_info->total_search_range += read_res.total_search_range;
-      if (read_res.total_search_range > res_info->max_search_range) {
-        res_info->max_search_range = read_res.total_search_range;
-      }
-      res_info->res += read_res.res;
-      res_info->fetch_page_num += read_res.fetch_page_num;
-      res_info->total_io += read_res.total_io;
-      res_info->ops++;
     }
   });
   return static_cast<void*>(res_info);
@@ -72,10 +74,13 @@ void TestDisk(const typename IndexType::DataVev_& data,
   mutex_task = PTHREAD_MUTEX_INITIALIZER;
   const size_t thread_num =
       params.is_on_disk_ ? GetConfiguredThreadCount() : 1;
+  ChunkDispatcher<typename ThreadParams<IndexType>::Record> dispatcher(
+      tmp_lookups.data(), lookup_num, GetConfiguredLookupChunk());
   uint64_t ns = GetNsTime([&] {
     const size_t tn = std::max<size_t>(1, thread_num);
     if (tn == 1 || lookup_num == 0) {
-      ThreadParams<IndexType> tmp_params(params, IndexType(), tmp_lookups, diff);
+      ThreadParams<IndexType> tmp_params(params, IndexType(), &dispatcher,
+                                         diff);
       auto* tmp =
           static_cast<ResultInfo<typename IndexType::K_>*>(TestDiskCore<IndexType>(
               static_cast<void*>(&tmp_params)));
@@ -88,13 +93,8 @@ void TestDisk(const typename IndexType::DataVev_& data,
     std::vector<pthread_t> thread_handles(tn);
     std::vector<ThreadParams<IndexType>> thread(tn);
 
-    const uint64_t seg = lookup_num / tn;
     for (size_t i = 0; i < tn; i++) {
-      const uint64_t begin = static_cast<uint64_t>(i) * seg;
-      const uint64_t end =
-          (i == tn - 1) ? lookup_num : static_cast<uint64_t>(i + 1) * seg;
-      thread[i].lookups = typename IndexType::DataVev_(
-          tmp_lookups.begin() + begin, tmp_lookups.begin() + end);
+      thread[i].lookups = &dispatcher;
       thread[i].params = params;
       thread[i].diff = diff;
       pthread_create(&thread_handles[i], nullptr, TestDiskCore<IndexType>,
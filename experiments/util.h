@@ -1,9 +1,15 @@
 #ifndef EXPERIMENTS_UTIL_H_
 #define EXPERIMENTS_UTIL_H_
 
+#include <string.h>
+
 #include <algorithm>
+#include <memory>
 #include <vector>
 
+#include "numa_placement.h"
+#include "util_async_io.h"
+#include "util_coalesce.h"
 #include "util_compression.h"
 #include "util_lid.h"
 #include "util_same_block_size.h"
@@ -22,66 +28,130 @@ inline void GetItemRange(SearchRange* range, uint64_t pred_gran,
 template <typename IndexType>
 static void* DoCoreLookups(void* thread_params) {
   typedef typename IndexType::K_ K;
-  ThreadParams<IndexType> tmp_params =
-      *static_cast<ThreadParams<IndexType>*>(thread_params);
+  auto* shared_params = static_cast<ThreadParams<IndexType>*>(thread_params);
+  if (shared_params->alloc_in_thread) {
+    // first touched on the node the thread is pinned to; freed by DoLookups
+    shared_params->params.alloc();
+    memset(shared_params->params.read_buf_, 0,
+           shared_params->params.page_bytes_ * ALLOCATED_BUF_SIZE);
+  }
+  ThreadParams<IndexType>& tmp_params = *shared_params;
+  IndexType& index = tmp_params.shared_index != nullptr
+                         ? *tmp_params.shared_index
+                         : tmp_params.index;
   uint64_t data_num =
       tmp_params.params.dataset_bytes_ / tmp_params.params.record_bytes_;
   const uint64_t kGapCnt = tmp_params.params.record_bytes_ / sizeof(K);
   ResultInfo<K>* res_info = new ResultInfo<K>;
-  auto size = tmp_params.lookups.size();
+
+  // The search ranges are predicted lookup_batch keys at a time, so the index
+  // can overlap the cache misses of different keys and the prediction timer
+  // is paid once per batch instead of once per key.
+  const size_t batch = std::max<size_t>(1, tmp_params.lookup_batch);
+  std::vector<K> batch_keys(batch);
+  std::vector<SearchRange> batch_ranges(batch);
+
+  // With an asynchronous I/O backend up to io_depth_ lookups are in flight;
+  // they are accumulated into res_info as they complete.
+  std::unique_ptr<AsyncLookupQueue<K>> async_queue;
+  if (tmp_params.params.io_backend_ != kSyncIO) {
+    async_queue.reset(new AsyncLookupQueue<K>(tmp_params.params, kGapCnt));
+  }
+  // With a coalescing window, the pages of that many lookups are fetched
+  // together once they are all predicted.
+  std::unique_ptr<CoalescedLookupQueue<K>> coalesced_queue;
+  if (tmp_params.params.coalesce_window_ > 0) {
+    coalesced_queue.reset(
+        new CoalescedLookupQueue<K>(tmp_params.params, kGapCnt));
+  }
+  // the IO and last-mile timers deeper down find the stats through this
+  lookup_stats = lookup_profiling ? tmp_params.stats : nullptr;
 
   res_info->latency_sum = GetNsTime([&] {
-    for (uint64_t i = 0; i < size; i++) {
-      SearchRange range;
-      res_info->index_predict_time += GetNsTime([&] {
-        range = tmp_params.index.Lookup(tmp_params.lookups[i].first);
-      });
+    for (auto lookups = tmp_params.lookups->Next(); !lookups.empty();
+         lookups = tmp_params.lookups->Next()) {
+      const uint64_t size = lookups.size();
+      for (uint64_t b = 0; b < size; b += batch) {
+        const size_t m = std::min<uint64_t>(batch, size - b);
+        for (size_t j = 0; j < m; j++) {
+          batch_keys[j] = lookups[b + j].first;
+        }
+        const uint64_t predict_ns = GetNsTime([&] {
+          index.LookupBatch(batch_keys.data(), m, batch_ranges.data());
+        });
+        res_info->index_predict_time += predict_ns;
+        if (lookup_stats != nullptr) {
+          lookup_stats->hist[kPredictStage].Record(predict_ns / m, m);
+        }
 
-      ResultInfo<K> read_res;
+        for (uint64_t i = b; i < b + m; i++) {
+          SearchRange range = batch_ranges[i - b];
+
+          ResultInfo<K> read_res;
 #ifdef PROF_CPU_IO
-      res_info->cpu_time += GetNsTime([&] {
+          res_info->cpu_time += GetNsTime([&] {
 #endif  // PROF_CPU_IO
-        GetItemRange(&range, tmp_params.params.pred_granularity_, data_num);
+            GetItemRange(&range, tmp_params.params.pred_granularity_, data_num);
 #ifdef PROF_CPU_IO
-      });
+          });
 #endif  // PROF_CPU_IO
-      if (!tmp_params.params.is_compression_mode_) {
-        if (tmp_params.params.pred_granularity_ > 1) {
-          range.stop--;
+          if (!tmp_params.params.is_compression_mode_ &&
+              tmp_params.params.pred_granularity_ > 1) {
+            range.stop--;
+          }
+          if (async_queue) {
+            async_queue->Push(range, lookups[i].first, res_info);
+            continue;
+          }
+          if (coalesced_queue) {
+            coalesced_queue->Push(range, lookups[i].first, res_info);
+            continue;
+          }
+          if (!tmp_params.params.is_compression_mode_) {
+            read_res = NormalCoreLookup(range, lookups[i].first,
+                                        tmp_params.params, kGapCnt);
+          } else {
+            read_res = CompressionCoreLookup(range, lookups[i].first,
+                                             tmp_params.params, kGapCnt);
+          }
+          read_res.io_inflight_sum = read_res.total_io;
+          AddLookupResult(res_info, read_res);
         }
-        read_res = NormalCoreLookup(range, tmp_params.lookups[i].first,
-                                    tmp_params.params, kGapCnt);
-      } else {
-        read_res = CompressionCoreLookup(range, tmp_params.lookups[i].first,
-                                         tmp_params.params, kGapCnt);
       }
-      res_info->total_search_range += read_res.total_search_range;
-      if (read_res.total_search_range > res_info->max_search_range) {
-        res_info->max_search_range = read_res.total_search_range;
-      }
-      res_info->res += read_res.res;
-      res_info->fetch_page_num += read_res.fetch_page_num;
-      res_info->total_io += read_res.total_io;
-      res_info->cpu_time += read_res.cpu_time;
-      res_info->io_time += read_res.io_time;
-      res_info->ops++;
+    }
+    if (async_queue) {
+      async_queue->Drain(res_info);
+    }
+    if (coalesced_queue) {
+      coalesced_queue->Drain(res_info);
     }
   });
+  lookup_stats = nullptr;
   return static_cast<void*>(res_info);
 }
 
 template <typename IndexType>
 static inline ResultInfo<typename IndexType::K_> DoLookups(
     const IndexType& index, const typename IndexType::DataVev_& lookups,
-    const Params<typename IndexType::K_>& params, size_t thread_num) {
+    const Params<typename IndexType::K_>& params, size_t thread_num,
+    size_t lookup_batch = 1, LookupStats* stats = nullptr) {
   typedef typename IndexType::K_ K;
   ResultInfo<K> res_info;
   uint64_t size = lookups.size();
 
+  // The threads claim whole batches of the shared array at a time.
+  const size_t batch = std::max<size_t>(1, lookup_batch);
+  const size_t chunk =
+      (GetConfiguredLookupChunk() + batch - 1) / batch * batch;
+  ChunkDispatcher<typename ThreadParams<IndexType>::Record> dispatcher(
+      lookups.data(), size, chunk);
+
   thread_num = std::max<size_t>(1, thread_num);
   if (thread_num == 1 || size == 0) {
-    ThreadParams<IndexType> tmp_params(params, index, lookups,
+    ThreadParams<IndexType> tmp_params(params, index, &dispatcher,
                                        typename IndexType::param_t());
+    tmp_params.lookup_batch = lookup_batch;
+    tmp_params.stats = stats;
     auto* tmp =
         static_cast<ResultInfo<K>*>(DoCoreLookups<IndexType>(&tmp_params));
     res_info = *tmp;
@@ -93,24 +163,51 @@ static inline ResultInfo<typename IndexType::K_> DoLookups(
 
   std::vector<pthread_t> thread_handles(thread_num);
   std::vector<ThreadParams<IndexType>> thread(thread_num);
+  // one per thread, each on its own cache lines, merged after the join
+  std::vector<LookupStats> thread_stats(stats != nullptr ? thread_num : 0);
 
-  const uint64_t seg = size / thread_num;
-  for (size_t i = 0; i < thread_num; i++) {
-    const uint64_t begin = static_cast<uint64_t>(i) * seg;
-    const uint64_t end =
-        (i == thread_num - 1) ? size : static_cast<uint64_t>(i + 1) * seg;
-    thread[i].lookups =
-        typename IndexType::DataVev_(lookups.begin() + begin, lookups.begin() + end);
+  // LID_NUMA: one index replica per node with lookup threads, copied by a
+  // thread pinned to the node so that it lives in the node's memory.
+  const bool numa = GetConfiguredNumaMode();
+  NumaTopology topology;
+  std::vector<std::unique_ptr<IndexType>> replicas;
+  if (numa) {
+    topology = NumaTopology::Detect();
+    replicas.resize(topology.GetNodeNum());
+    for (size_t node = 0; node < topology.GetNodeNum() && node < thread_num;
+         node++) {
+      RunOnCpus(topology.GetCpus(node),
+                [&] { replicas[node].reset(new IndexType(index)); });
+    }
   }
 
   for (size_t i = 0; i < thread_num; i++) {
-    thread[i].index = index;
+    if (numa) {
+      thread[i].shared_index = replicas[topology.GetThreadNode(i)].get();
+      thread[i].alloc_in_thread = true;
+    } else {
+      thread[i].index = index;
+    }
     thread[i].params = params;
-    thread[i].params.alloc();
+    thread[i].lookups = &dispatcher;
+    thread[i].lookup_batch = lookup_batch;
+    thread[i].stats = stats != nullptr ? &thread_stats[i] : nullptr;
+    if (!numa) {
+      thread[i].params.alloc();
+    }
     thread[i].params.open_files =
-        OpenFiles(params.data_dir_, static_cast<int>(params.open_files.size()));
-    pthread_create(&thread_handles[i], nullptr, DoCoreLookups<IndexType>,
+        OpenFiles(*params.stripe_,
+                  static_cast<int>(params.open_files.size() /
+                                   params.stripe_->GetDeviceNum()));
+    pthread_attr_t attr;
+    pthread_attr_init(&attr);
+    if (numa) {
+      const cpu_set_t cpus = GetCpuSet({topology.GetThreadCpu(i)});
+      pthread_attr_setaffinity_np(&attr, sizeof(cpus), &cpus);
+    }
+    pthread_create(&thread_handles[i], &attr, DoCoreLookups<IndexType>,
                    static_cast<void*>(&thread[i]));
+    pthread_attr_destroy(&attr);
   }
 
   for (size_t i = 0; i < thread_num; i++) {
@@ -124,9 +221,21 @@ static inline ResultInfo<typename IndexType::K_> DoLookups(
     res_info.total_io += tmp->total_io;
     res_info.ops += tmp->ops;
     res_info.index_predict_time += tmp->index_predict_time;
+    res_info.cpu_time += tmp->cpu_time;
+    res_info.io_time += tmp->io_time;
+    res_info.io_inflight_sum += tmp->io_inflight_sum;
+    res_info.cache_hits += tmp->cache_hits;
+    res_info.cache_misses += tmp->cache_misses;
+    res_info.prefetch_pages += tmp->prefetch_pages;
+    res_info.prefetch_wasted += tmp->prefetch_wasted;
+    res_info.coalesce_batches += tmp->coalesce_batches;
+    res_info.coalesce_pages_saved += tmp->coalesce_pages_saved;
     // latency_sum from each thread is thread-local wall time; not aggregated for reporting.
     delete tmp;
   }
+  for (const auto& t : thread_stats) {
+    stats->Merge(t);
+  }
 
   for (auto& t : thread) {
     CloseFiles(t.params.open_files);
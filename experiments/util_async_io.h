@@ -0,0 +1,561 @@
+/**
+ * @file util_async_io.h
+ * @brief Asynchronous page fetching for on-disk lookups: each thread keeps
+ * io_depth_ lookups in flight (predict, submit the page reads, reap the
+ * completions, then run the last-mile search) instead of blocking on one read
+ * at a time.
+ */
+#ifndef EXPERIMENTS_UTIL_ASYNC_IO_H_
+#define EXPERIMENTS_UTIL_ASYNC_IO_H_
+
+#include <errno.h>
+#include <stdlib.h>
+
+#include <memory>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+#ifdef LID_HAVE_LIBAIO
+#include <libaio.h>
+#endif  // LID_HAVE_LIBAIO
+#ifdef LID_HAVE_LIBURING
+#include <liburing.h>
+#endif  // LID_HAVE_LIBURING
+
+#include "util_compression.h"
+#include "util_lid.h"
+#include "util_same_block_size.h"
+
+template <typename K>
+static inline void AddLookupResult(ResultInfo<K>* total,
+                                   const ResultInfo<K>& one) {
+  total->total_search_range += one.total_search_range;
+  if (one.total_search_range > total->max_search_range) {
+    total->max_search_range = one.total_search_range;
+  }
+  total->res += one.res;
+  total->fetch_page_num += one.fetch_page_num;
+  total->total_io += one.total_io;
+  total->cpu_time += one.cpu_time;
+  total->io_time += one.io_time;
+  total->io_inflight_sum += one.io_inflight_sum;
+  total->cache_hits += one.cache_hits;
+  total->cache_misses += one.cache_misses;
+  total->prefetch_pages += one.prefetch_pages;
+  total->prefetch_wasted += one.prefetch_wasted;
+  total->ops++;
+}
+
+/**
+ * @brief Submit() only queues a read; Reap() hands the queued reads to the
+ * kernel and waits until at least min_nr reads have completed.
+ */
+class AsyncIOBackend {
+ public:
+  virtual ~AsyncIOBackend() {}
+
+  virtual void Submit(int fd, void* buf, size_t bytes, size_t offset,
+                      size_t tag) = 0;
+
+  // Returns the tags of the completed reads.
+  virtual void Reap(size_t min_nr, std::vector<size_t>* tags) = 0;
+};
+
+#ifdef LID_HAVE_LIBAIO
+class LibaioBackend : public AsyncIOBackend {
+ public:
+  explicit LibaioBackend(size_t depth) : iocbs_(depth), events_(depth) {
+    if (io_setup(depth, &ctx_) != 0) {
+      throw std::runtime_error("io_setup error in LibaioBackend");
+    }
+    pending_.reserve(depth);
+  }
+
+  ~LibaioBackend() { io_destroy(ctx_); }
+
+  void Submit(int fd, void* buf, size_t bytes, size_t offset,
+              size_t tag) override {
+    struct iocb* cb = &iocbs_[tag];
+    io_prep_pread(cb, fd, buf, bytes, offset);
+    cb->data = reinterpret_cast<void*>(tag);
+    pending_.push_back(cb);
+  }
+
+  void Reap(size_t min_nr, std::vector<size_t>* tags) override {
+    size_t submitted = 0;
+    while (submitted < pending_.size()) {
+      int ret = io_submit(ctx_, pending_.size() - submitted,
+                          pending_.data() + submitted);
+      if (ret < 0) {
+        throw std::runtime_error("io_submit error in LibaioBackend");
+      }
+      submitted += ret;
+    }
+    pending_.clear();
+
+    int n;
+    do {
+      n = io_getevents(ctx_, min_nr, events_.size(), events_.data(), nullptr);
+    } while (n == -EINTR);
+    if (n < 0) {
+      throw std::runtime_error("io_getevents error in LibaioBackend");
+    }
+    tags->clear();
+    for (int i = 0; i < n; i++) {
+      if (static_cast<long>(events_[i].res) < 0) {
+        throw std::runtime_error("read error in LibaioBackend");
+      }
+      tags->push_back(reinterpret_cast<size_t>(events_[i].data));
+    }
+  }
+
+ private:
+  io_context_t ctx_ = 0;
+  std::vector<struct iocb> iocbs_;
+  std::vector<struct iocb*> pending_;
+  std::vector<struct io_event> events_;
+};
+#endif  // LID_HAVE_LIBAIO
+
+#ifdef LID_HAVE_LIBURING
+class IoUringBackend : public AsyncIOBackend {
+ public:
+  explicit IoUringBackend(size_t depth) {
+    if (io_uring_queue_init(depth, &ring_, 0) < 0) {
+      throw std::runtime_error("io_uring_queue_init error in IoUringBackend");
+    }
+  }
+
+  ~IoUringBackend() { io_uring_queue_exit(&ring_); }
+
+  void Submit(int fd, void* buf, size_t bytes, size_t offset,
+              size_t tag) override {
+    struct io_uring_sqe* sqe = io_uring_get_sqe(&ring_);
+    if (sqe == nullptr) {
+      throw std::runtime_error("the submission queue is full in IoUringBackend");
+    }
+    io_uring_prep_read(sqe, fd, buf, bytes, offset);
+    io_uring_sqe_set_data(sqe, reinterpret_cast<void*>(tag));
+  }
+
+  void Reap(size_t min_nr, std::vector<size_t>* tags) override {
+    int ret;
+    do {
+      ret = io_uring_submit_and_wait(&ring_, min_nr);
+    } while (ret == -EINTR);
+    if (ret < 0) {
+      throw std::runtime_error("io_uring_submit_and_wait error in IoUringBackend");
+    }
+    tags->clear();
+    struct io_uring_cqe* cqe;
+    while (io_uring_peek_cqe(&ring_, &cqe) == 0) {
+      if (cqe->res < 0) {
+        throw std::runtime_error("read error in IoUringBackend");
+      }
+      tags->push_back(reinterpret_cast<size_t>(io_uring_cqe_get_data(cqe)));
+      io_uring_cqe_seen(&ring_, cqe);
+    }
+  }
+
+ private:
+  struct io_uring ring_;
+};
+#endif  // LID_HAVE_LIBURING
+
+static inline std::unique_ptr<AsyncIOBackend> MakeAsyncIOBackend(
+    IOBackend backend, size_t depth) {
+  (void)depth;  // unused when neither libaio nor liburing is available
+  switch (backend) {
+    case kLibaio:
+#ifdef LID_HAVE_LIBAIO
+      return std::unique_ptr<AsyncIOBackend>(new LibaioBackend(depth));
+#else
+      throw std::runtime_error(
+          "LID was built without libaio, install it and rebuild");
+#endif  // LID_HAVE_LIBAIO
+    case kIoUring:
+#ifdef LID_HAVE_LIBURING
+      return std::unique_ptr<AsyncIOBackend>(new IoUringBackend(depth));
+#else
+      throw std::runtime_error(
+          "LID was built without liburing, install it and rebuild");
+#endif  // LID_HAVE_LIBURING
+    default:
+      throw std::runtime_error("The I/O backend is not asynchronous!");
+  }
+}
+
+/**
+ * @brief Runs up to params.io_depth_ lookups at the same time. Each lookup
+ * owns one slot (a read buffer and the state of its fetch strategy) and has at
+ * most one read in flight; when the read completes, the last-mile search
+ * decides whether the lookup is done or which pages to read next, following
+ * the fetch strategies of NormalCoreLookup and CompressionCoreLookup. A read
+ * never exceeds the ALLOCATED_BUF_SIZE pages of its buffer nor the run of
+ * pages on one stripe device, and a range that spans several files is read up
+ * to its last page; the reads to all the devices share the queue of the
+ * thread. With a page cache, a read whose pages are all cached completes
+ * without going to the disk, otherwise only the run covering the missing pages
+ * is submitted.
+ */
+template <typename K>
+class AsyncLookupQueue {
+ public:
+  AsyncLookupQueue(const Params<K>& params, uint64_t gap_cnt)
+      : params_(params),
+        gap_cnt_(gap_cnt),
+        slots_(params.io_depth_),
+        backend_(MakeAsyncIOBackend(params.io_backend_, params.io_depth_)) {
+    for (size_t i = 0; i < slots_.size(); i++) {
+      slots_[i].buf = reinterpret_cast<K*>(aligned_alloc(
+          params_.page_bytes_, params_.page_bytes_ * ALLOCATED_BUF_SIZE));
+      if (slots_[i].buf == nullptr) {
+        throw std::runtime_error("read buffer memalign error in AsyncLookupQueue");
+      }
+      free_slots_.push_back(i);
+    }
+  }
+
+  AsyncLookupQueue(const AsyncLookupQueue&) = delete;
+  AsyncLookupQueue& operator=(const AsyncLookupQueue&) = delete;
+
+  ~AsyncLookupQueue() {
+    for (auto& slot : slots_) {
+      FreeAlignedBuf(slot.buf);
+    }
+  }
+
+  /**
+   * @brief Starts the lookup of key over the item-level range (already
+   * adjusted as for NormalCoreLookup/CompressionCoreLookup). Finished lookups
+   * are added to res_info; blocks while all slots are busy.
+   */
+  void Push(const SearchRange& range, const K& key, ResultInfo<K>* res_info) {
+    while (free_slots_.empty()) {
+      Poll(res_info);
+    }
+    const size_t tag = free_slots_.back();
+    free_slots_.pop_back();
+    Slot& slot = slots_[tag];
+    slot.key = key;
+    slot.res = ResultInfo<K>();
+    const bool has_read = params_.is_compression_mode_
+                              ? StartCompression(&slot, range)
+                              : StartNormal(&slot, range);
+    if (has_read) {
+      Issue(tag, res_info);
+    } else {
+      Finish(tag, res_info);
+    }
+  }
+
+  // Waits for all the lookups in flight.
+  void Drain(ResultInfo<K>* res_info) {
+    while (inflight_ > 0) {
+      Poll(res_info);
+    }
+  }
+
+ private:
+  struct Slot {
+    K key;
+    K* buf = nullptr;
+    ResultInfo<K> res;
+
+    // Normal mode, in global page ids (fid * page_num_per_file_ + pid).
+    uint64_t first_page, last_page, mid_page;  // the whole predicted range
+    bool probing;           // reading the first half / the middle page
+    uint64_t lo, hi;        // the pages of the current phase, inclusive
+    uint64_t cursor;        // the next page to read
+    bool one_by_one;        // one page per read instead of whole runs
+    bool reverse;           // one page per read, from hi down to lo
+    uint64_t read_page;     // the pages of the read in flight
+    uint64_t read_page_num;
+    size_t io_first, io_num;  // the pages of it that are read from the disk
+    uint64_t submit_ns;       // when it was submitted, if profiling
+
+    // Compression mode.
+    CompressedBlockRange block;
+    size_t end_bytes;
+  };
+
+  void SetPhase(Slot* slot, uint64_t lo, uint64_t hi, bool one_by_one,
+                bool reverse) {
+    slot->lo = lo;
+    slot->hi = hi;
+    slot->one_by_one = one_by_one;
+    slot->reverse = reverse;
+    slot->cursor = reverse ? hi : lo;
+  }
+
+  bool StartNormal(Slot* slot, const SearchRange& range) {
+    slot->first_page = GetGlobalPageID(params_, range.start);
+    slot->last_page = GetGlobalPageID(params_, range.stop - 1);
+    slot->mid_page = GetGlobalPageID(params_, (range.start + range.stop) >> 1);
+    slot->probing = true;
+    switch (params_.fetch_strategy_) {
+      case kStartWorstCase:
+        slot->probing = false;
+        SetPhase(slot, slot->first_page, slot->last_page, false, false);
+        break;
+      case kStartOneByOne:
+        slot->probing = false;
+        SetPhase(slot, slot->first_page, slot->last_page, true, false);
+        break;
+      case kMiddleWorstCase:
+      case kMiddleOneByOne:
+        SetPhase(slot, slot->mid_page, slot->mid_page, true, false);
+        break;
+      case kLecoFetch:
+        // [start, mid) first, then [mid, end)
+        if (slot->mid_page > slot->first_page) {
+          SetPhase(slot, slot->first_page, slot->mid_page - 1, false, false);
+        } else {
+          slot->probing = false;
+          SetPhase(slot, slot->mid_page, slot->last_page, false, false);
+        }
+        break;
+      case kSpeculativeFetch: {
+        // the middle page and the page ahead of it by one read, which cannot
+        // span two files or stripe devices, so the read-ahead is dropped then
+        uint64_t lo, hi;
+        GetSpeculativeWindow(params_, slot->first_page, slot->mid_page,
+                             slot->last_page, &lo, &hi);
+        const uint64_t fid = lo / params_.page_num_per_file_;
+        const uint64_t pid = lo % params_.page_num_per_file_;
+        if (hi / params_.page_num_per_file_ != fid ||
+            params_.stripe_->GetRunEnd(fid, pid, pid + 2) < pid + 2) {
+          lo = hi = slot->mid_page;
+        }
+        SetPhase(slot, lo, hi, false, false);
+        break;
+      }
+    }
+    return PrepareRead(slot);
+  }
+
+  bool PrepareRead(Slot* slot) {
+    if (slot->lo > slot->hi) {
+      return false;
+    }
+    slot->read_page = slot->cursor;
+    slot->read_page_num = 1;
+    if (!slot->one_by_one && !slot->reverse) {
+      // A read cannot cross a file, nor the pages of one stripe device, nor
+      // exceed the read buffer.
+      const uint64_t fid = slot->cursor / params_.page_num_per_file_;
+      const uint64_t pid = slot->cursor % params_.page_num_per_file_;
+      const uint64_t run_last =
+          slot->cursor - pid +
+          params_.stripe_->GetRunEnd(fid, pid, params_.page_num_per_file_) - 1;
+      const uint64_t last = std::min(slot->hi, run_last);
+      slot->read_page_num =
+          std::min<uint64_t>(last - slot->cursor + 1, ALLOCATED_BUF_SIZE);
+    }
+    return true;
+  }
+
+  // Moves to the next read of a normal-mode lookup after a miss.
+  bool NextNormalRead(Slot* slot, FindStatus status) {
+    if (slot->reverse) {
+      if (slot->cursor > slot->lo) {
+        slot->cursor--;
+        return PrepareRead(slot);
+      }
+    } else {
+      slot->cursor += slot->read_page_num;
+      if (slot->cursor <= slot->hi) {
+        return PrepareRead(slot);
+      }
+    }
+    if (!slot->probing) {
+      return false;
+    }
+
+    slot->probing = false;
+    const uint64_t mid = slot->mid_page;
+    switch (params_.fetch_strategy_) {
+      case kMiddleWorstCase:
+      case kMiddleOneByOne: {
+        const bool one_by_one = params_.fetch_strategy_ == kMiddleOneByOne;
+        if (status == kLessThanKey) {
+          // [mid + 1, end)
+          if (mid + 1 > slot->last_page) return false;
+          SetPhase(slot, mid + 1, slot->last_page, one_by_one, false);
+        } else {
+          // [start, mid), backwards from mid - 1 in the one-by-one case
+          if (mid == 0 || mid - 1 < slot->first_page) return false;
+          SetPhase(slot, slot->first_page, mid - 1, false, one_by_one);
+        }
+        break;
+      }
+      case kLecoFetch:
+        SetPhase(slot, mid, slot->last_page, false, false);
+        break;
+      default:
+        return false;
+    }
+    return PrepareRead(slot);
+  }
+
+  bool StartCompression(Slot* slot, const SearchRange& range) {
+    auto seek_table_res =
+        params_.comp_block_bytes.GetBlockRange(range.start, range.stop);
+    slot->block = seek_table_res.first;
+    slot->end_bytes = seek_table_res.second;
+    return slot->block.block_bytes + slot->block.offset <= slot->end_bytes;
+  }
+
+  // The pages [*pid, *pid + *page_num) of file *fid read next by the slot.
+  void GetReadPages(const Slot& slot, uint64_t* fid, uint64_t* pid,
+                    size_t* page_num, size_t* page_bytes) const {
+    if (params_.is_compression_mode_) {
+      *fid = 0;
+      *pid = slot.block.block_sid;
+      *page_num = slot.block.block_eid - slot.block.block_sid + 1;
+      *page_bytes = getpagesize();
+    } else {
+      *fid = slot.read_page / params_.page_num_per_file_;
+      *pid = slot.read_page % params_.page_num_per_file_;
+      *page_num = slot.read_page_num;
+      *page_bytes = params_.page_bytes_;
+    }
+  }
+
+  void Issue(size_t tag, ResultInfo<K>* res_info) {
+    Slot& slot = slots_[tag];
+    PageCache* cache = params_.page_cache_.get();
+    uint64_t fid, pid;
+    size_t page_num, page_bytes;
+    GetReadPages(slot, &fid, &pid, &page_num, &page_bytes);
+    slot.io_first = 0;
+    slot.io_num = page_num;
+    while (cache != nullptr) {
+      const size_t miss = cache->GetPages(fid, pid, page_num, slot.buf,
+                                          &slot.io_first, &slot.io_num);
+      slot.res.cache_hits += page_num - miss;
+      slot.res.cache_misses += miss;
+      if (slot.io_num > 0) {
+        break;
+      }
+      if (!Advance(&slot)) {
+        Finish(tag, res_info);
+        return;
+      }
+      GetReadPages(slot, &fid, &pid, &page_num, &page_bytes);
+    }
+    // the read is on one device, see PrepareRead
+    const StripeLayout& stripe = *params_.stripe_;
+    const int fd =
+        params_.open_files
+            .find(stripe.GetFileKey(fid, stripe.GetDevice(fid, pid)))
+            ->second;
+    backend_->Submit(fd,
+                     reinterpret_cast<char*>(slot.buf) +
+                         slot.io_first * page_bytes,
+                     slot.io_num * page_bytes,
+                     (pid + slot.io_first) * page_bytes, tag);
+    if (lookup_stats != nullptr) {
+      slot.submit_ns = GetProfNs();
+    }
+    inflight_++;
+    slot.res.io_inflight_sum += inflight_;
+  }
+
+  // Searches the pages read by the slot; returns whether it needs to read
+  // more pages.
+  bool Advance(Slot* slot) {
+    if (params_.is_compression_mode_) {
+      if (SearchCompressedBlock<K>(slot->block, slot->key, params_, gap_cnt_,
+                                   slot->buf, &slot->res)) {
+        return false;
+      }
+      slot->block =
+          params_.comp_block_bytes.GetNextBlockRange(slot->block.idx + 1);
+      return slot->block.block_bytes + slot->block.offset <= slot->end_bytes;
+    }
+    if (params_.fetch_strategy_ == kSpeculativeFetch && slot->probing) {
+      return AdvanceSpeculative(slot);
+    }
+    auto fetch_res = SearchFetchedPages<K>(
+        slot->key, params_.page_bytes_, slot->read_page_num,
+        params_.record_num_per_page_, gap_cnt_, slot->buf,
+        params_.leco_pages_.get());
+    slot->res.total_search_range += fetch_res.second.total_search_range;
+    slot->res.fetch_page_num += fetch_res.second.fetch_page_num;
+    slot->res.res = fetch_res.second.res;
+    return fetch_res.first != kEqualToKey &&
+           NextNormalRead(slot, fetch_res.first);
+  }
+
+  // The window of kSpeculativeFetch is read; searches it and moves one page at
+  // a time on the side of the key, as kMiddleOneByOne.
+  bool AdvanceSpeculative(Slot* slot) {
+    auto fetch_res = SearchSpeculativePages<K>(
+        slot->key, params_, gap_cnt_, slot->buf, slot->lo, slot->hi,
+        slot->mid_page);
+    slot->res.total_search_range += fetch_res.second.total_search_range;
+    slot->res.fetch_page_num += fetch_res.second.fetch_page_num;
+    slot->res.res = fetch_res.second.res;
+    slot->res.prefetch_pages += fetch_res.second.prefetch_pages;
+    slot->res.prefetch_wasted += fetch_res.second.prefetch_wasted;
+    slot->probing = false;
+    if (fetch_res.first == kLessThanKey) {
+      if (slot->hi >= slot->last_page) return false;
+      SetPhase(slot, slot->hi + 1, slot->last_page, true, false);
+    } else if (fetch_res.first == kGreaterThanKey) {
+      if (slot->lo <= slot->first_page) return false;
+      SetPhase(slot, slot->first_page, slot->lo - 1, false, true);
+    } else {
+      return false;
+    }
+    return PrepareRead(slot);
+  }
+
+  void Poll(ResultInfo<K>* res_info) {
+    backend_->Reap(1, &completed_);
+    PageCache* cache = params_.page_cache_.get();
+    LookupStats* stats = lookup_stats;
+    const uint64_t reap_ns = stats != nullptr ? GetProfNs() : 0;
+    for (size_t tag : completed_) {
+      inflight_--;
+      Slot& slot = slots_[tag];
+      slot.res.total_io++;
+      if (stats != nullptr) {
+        // the latency seen by the lookup, including the time the read was
+        // queued behind the others in flight
+        stats->io_time += reap_ns - slot.submit_ns;
+        stats->hist[kIOStage].Record(reap_ns - slot.submit_ns);
+      }
+      if (cache != nullptr) {
+        uint64_t fid, pid;
+        size_t page_num, page_bytes;
+        GetReadPages(slot, &fid, &pid, &page_num, &page_bytes);
+        cache->PutPages(fid, pid + slot.io_first, slot.io_num,
+                        reinterpret_cast<char*>(slot.buf) +
+                            slot.io_first * page_bytes);
+      }
+      if (Advance(&slot)) {
+        Issue(tag, res_info);
+      } else {
+        Finish(tag, res_info);
+      }
+    }
+  }
+
+  void Finish(size_t tag, ResultInfo<K>* res_info) {
+    AddLookupResult(res_info, slots_[tag].res);
+    free_slots_.push_back(tag);
+  }
+
+  const Params<K>& params_;
+  const uint64_t gap_cnt_;
+  std::vector<Slot> slots_;
+  std::vector<size_t> free_slots_;
+  std::vector<size_t> completed_;
+  size_t inflight_ = 0;
+  std::unique_ptr<AsyncIOBackend> backend_;
+};
+
+#endif  // EXPERIMENTS_UTIL_ASYNC_IO_H_
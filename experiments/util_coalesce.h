@@ -0,0 +1,175 @@
+#ifndef EXPERIMENTS_UTIL_COALESCE_H_
+#define EXPERIMENTS_UTIL_COALESCE_H_
+
+#include <stdlib.h>
+
+#include <algorithm>
+#include <stdexcept>
+#include <vector>
+
+#include "util_async_io.h"
+#include "util_same_block_size.h"
+
+/**
+ * @brief Coalesced page fetching over a window of lookups (normal mode with the
+ * sync backend). Push() only queues a lookup; once coalesce_window_ of them are
+ * queued, their predicted page ranges are split at file boundaries, sorted, and
+ * overlapping or adjacent ones of the same file merged into runs. Each run is
+ * read once (by one read per stripe device it spans) into a shared buffer
+ * (through the page cache, if any) and every lookup is resolved by searching
+ * its own pages there. The whole range of each lookup is fetched, as with
+ * kStartWorstCase.
+ */
+template <typename K>
+class CoalescedLookupQueue {
+ public:
+  CoalescedLookupQueue(const Params<K>& params, uint64_t gap_cnt)
+      : params_(params), gap_cnt_(gap_cnt) {
+    lookups_.reserve(params.coalesce_window_);
+  }
+
+  ~CoalescedLookupQueue() { free(buf_); }
+
+  CoalescedLookupQueue(const CoalescedLookupQueue&) = delete;
+  CoalescedLookupQueue& operator=(const CoalescedLookupQueue&) = delete;
+
+  void Push(const SearchRange& range, const K& key, ResultInfo<K>* res_info) {
+    lookups_.push_back({range, key});
+    if (lookups_.size() >= params_.coalesce_window_) {
+      Flush(res_info);
+    }
+  }
+
+  void Drain(ResultInfo<K>* res_info) {
+    if (!lookups_.empty()) {
+      Flush(res_info);
+    }
+  }
+
+ private:
+  struct Lookup {
+    SearchRange range;
+    K key;
+  };
+
+  // The pages [first, last] of one file wanted by one lookup, in global page
+  // ids (fid * page_num_per_file_ + pid).
+  struct Piece {
+    uint64_t first, last;
+    size_t lookup;
+    size_t buf_page;  // where its first page is in buf_
+  };
+
+  void Flush(ResultInfo<K>* res_info) {
+    const uint64_t page_num_per_file = params_.page_num_per_file_;
+    pieces_.clear();
+    for (size_t i = 0; i < lookups_.size(); i++) {
+      const FetchRange fr = GetFetchRange<K>(params_, lookups_[i].range);
+      for (uint64_t fid = fr.fid_start; fid <= fr.fid_end; fid++) {
+        const uint64_t pid_start = fid == fr.fid_start ? fr.pid_start : 0;
+        const uint64_t pid_end =
+            fid == fr.fid_end ? fr.pid_end : page_num_per_file - 1;
+        pieces_.push_back({fid * page_num_per_file + pid_start,
+                           fid * page_num_per_file + pid_end, i, 0});
+      }
+    }
+    order_.resize(pieces_.size());
+    for (size_t i = 0; i < order_.size(); i++) {
+      order_[i] = i;
+    }
+    std::sort(order_.begin(), order_.end(), [&](size_t a, size_t b) {
+      return pieces_[a].first < pieces_[b].first;
+    });
+
+    // Merge the sorted pieces into runs and place the runs one after another
+    // in buf_.
+    runs_.clear();
+    uint64_t requested = 0;
+    size_t total_pages = 0;
+    for (size_t idx : order_) {
+      Piece& piece = pieces_[idx];
+      requested += piece.last - piece.first + 1;
+      if (runs_.empty() || piece.first > runs_.back().last + 1 ||
+          piece.first / page_num_per_file !=
+              runs_.back().first / page_num_per_file) {
+        runs_.push_back({piece.first, piece.last, total_pages});
+      } else {
+        runs_.back().last = std::max(runs_.back().last, piece.last);
+      }
+      piece.buf_page =
+          runs_.back().buf_page + (piece.first - runs_.back().first);
+      total_pages = runs_.back().buf_page + runs_.back().last -
+                    runs_.back().first + 1;
+    }
+    Reserve(total_pages);
+
+    for (const auto& run : runs_) {
+      const uint64_t fid = run.first / page_num_per_file;
+      const size_t io_num = CachedIORead<K>(
+          params_.page_cache_.get(), params_.open_files, *params_.stripe_,
+          fid, params_.page_bytes_, run.last - run.first + 1,
+          run.first % page_num_per_file, PageAt(run.buf_page), res_info);
+      res_info->total_io += io_num;
+      res_info->io_inflight_sum += io_num;
+    }
+    res_info->fetch_page_num += total_pages;
+    res_info->coalesce_batches++;
+    res_info->coalesce_pages_saved += requested - total_pages;
+
+    // The pieces of one lookup are consecutive in pieces_, in page order.
+    size_t p = 0;
+    for (size_t i = 0; i < lookups_.size(); i++) {
+      ResultInfo<K> read_res;
+      bool found = false;
+      for (; p < pieces_.size() && pieces_[p].lookup == i; p++) {
+        if (found) {
+          continue;
+        }
+        const Piece& piece = pieces_[p];
+        auto fetch_res = SearchFetchedPages<K>(
+            lookups_[i].key, params_.page_bytes_, piece.last - piece.first + 1,
+            params_.record_num_per_page_, gap_cnt_, PageAt(piece.buf_page),
+            params_.leco_pages_.get());
+        read_res.total_search_range += fetch_res.second.total_search_range;
+        read_res.res = fetch_res.second.res;
+        found = fetch_res.first == kEqualToKey;
+      }
+      AddLookupResult(res_info, read_res);
+    }
+    lookups_.clear();
+  }
+
+  void Reserve(size_t page_num) {
+    if (page_num <= buf_pages_) {
+      return;
+    }
+    free(buf_);
+    buf_pages_ = std::max(page_num, 2 * buf_pages_);
+    buf_ = reinterpret_cast<K*>(
+        aligned_alloc(params_.page_bytes_, params_.page_bytes_ * buf_pages_));
+    if (buf_ == nullptr) {
+      throw std::runtime_error("aligned_alloc error in CoalescedLookupQueue");
+    }
+  }
+
+  K* PageAt(size_t page) {
+    return reinterpret_cast<K*>(reinterpret_cast<char*>(buf_) +
+                                page * params_.page_bytes_);
+  }
+
+  struct Run {
+    uint64_t first, last;  // global page ids, inclusive
+    size_t buf_page;
+  };
+
+  const Params<K>& params_;
+  const uint64_t gap_cnt_;
+  std::vector<Lookup> lookups_;
+  std::vector<Piece> pieces_;
+  std::vector<size_t> order_;
+  std::vector<Run> runs_;
+  K* buf_ = nullptr;
+  size_t buf_pages_ = 0;
+};
+
+#endif  // EXPERIMENTS_UTIL_COALESCE_H_
@@ -14,6 +14,39 @@
 
 #include "util_search.h"
 
+/**
+ * @brief Search one logical block whose pages [block_sid, block_eid] are
+ * already in pages_data. Returns true if lookupkey is found.
+ */
+template <typename K>
+inline bool SearchCompressedBlock(const CompressedBlockRange& block,
+                                  const K& lookupkey, const Params<K>& params,
+                                  uint64_t gap_cnt, const K* pages_data,
+                                  ResultInfo<K>* res_info) {
+  const auto kPageSize = getpagesize();
+  uint64_t fetch_page_num = block.block_eid - block.block_sid + 1;
+  auto new_gap_cnt = gap_cnt;
+#if ALIGNED_COMPRESSION == 0
+  auto io_offset = 0;
+  uint64_t idx = ProfLastMileSearch(pages_data + io_offset,
+                                block.block_bytes / params.record_bytes_,
+                                new_gap_cnt, lookupkey);
+  res_info->total_search_range +=
+      block.block_bytes / params.record_bytes_ * sizeof(K) * new_gap_cnt;
+#else
+  new_gap_cnt = block.block_bytes / params.record_num_per_page_ / sizeof(K);
+  auto io_offset = (block.offset - block.block_sid * kPageSize) / sizeof(K);
+  uint64_t idx = ProfLastMileSearch(pages_data + io_offset,
+                                params.record_num_per_page_, new_gap_cnt,
+                                lookupkey);
+  res_info->total_search_range +=
+      params.record_num_per_page_ * sizeof(K) * new_gap_cnt;
+#endif
+  res_info->fetch_page_num += fetch_page_num;
+  res_info->res = *(pages_data + io_offset + idx * new_gap_cnt);
+  return res_info->res == lookupkey;
+}
+
 template <typename K>
 inline ResultInfo<K> CompressionCoreLookup(const SearchRange& range,
                                            const K& lookupkey,
@@ -23,39 +56,18 @@ inline ResultInfo<K> CompressionCoreLookup(const SearchRange& range,
   auto seek_table_res =
       params.comp_block_bytes.GetBlockRange(range.start, range.stop);
   CompressedBlockRange start_range = seek_table_res.first;
-  auto new_gap_cnt = gap_cnt;
 
   // Fetch all the pages of this logical block
   const auto kPageSize = getpagesize();
   while (start_range.block_bytes + start_range.offset <=
          seek_table_res.second) {
     uint64_t fetch_page_num = start_range.block_eid - start_range.block_sid + 1;
-    auto fd = params.open_files.find(0)->second;
-    DirectIORead<K>(fd, kPageSize, fetch_page_num,
-                    start_range.block_sid * kPageSize, params.read_buf_);
-
-#if ALIGNED_COMPRESSION == 0
-    auto io_offset = 0;
-    uint64_t idx = LastMileSearch(
-        pages_data + io_offset, start_range.block_bytes / params.record_bytes_,
-        new_gap_cnt, lookupkey);
-    res_info.total_search_range += start_range.block_bytes /
-                                   params.record_bytes_ * sizeof(K) *
-                                   new_gap_cnt;
-#else
-    new_gap_cnt =
-        start_range.block_bytes / params.record_num_per_page_ / sizeof(K);
-    auto io_offset =
-        (start_range.offset - start_range.block_sid * kPageSize) / sizeof(K);
-    uint64_t idx =
-        LastMileSearch(params.read_buf_ + io_offset,
-                       params.record_num_per_page_, new_gap_cnt, lookupkey);
-    res_info.total_search_range +=
-        params.record_num_per_page_ * sizeof(K) * new_gap_cnt;
-#endif
-    res_info.fetch_page_num += fetch_page_num;
-    res_info.res = *(params.read_buf_ + io_offset + idx * new_gap_cnt);
-    if (res_info.res == lookupkey) {
+    res_info.total_io += CachedIORead<K>(
+        params.page_cache_.get(), params.open_files, *params.stripe_, 0,
+        kPageSize, fetch_page_num, start_range.block_sid, params.read_buf_,
+        &res_info);
+    if (SearchCompressedBlock<K>(start_range, lookupkey, params, gap_cnt,
+                                 params.read_buf_, &res_info)) {
       return res_info;
     }
     start_range =
@@ -64,4 +76,4 @@ inline ResultInfo<K> CompressionCoreLookup(const SearchRange& range,
 
   return res_info;
 }
-#endif  // EXPERIMENTS_UTIL_COMPRESSION_H_
\ No newline at end of file
+#endif  // EXPERIMENTS_UTIL_COMPRESSION_H_
@@ -140,48 +140,59 @@ static inline void FreeAlignedBuf(Key*& buf) {
   }
 }
 
-std::map<int, int> OpenFiles(const std::string& dir, int file_num) {
+// Opens the file_num data files in every directory of the stripe layout.
+std::map<int, int> OpenFiles(const StripeLayout& stripe, int file_num) {
   std::map<int, int> files;
   for (int idx = 0; idx < file_num; idx++) {
-    std::string file = dir + std::to_string(idx) + ".data";
-    int fd = DirectIOOpen(file);
-    files.insert({idx, fd});
+    for (size_t dev = 0; dev < stripe.GetDeviceNum(); dev++) {
+      int fd = DirectIOOpen(stripe.GetFile(idx, dev));
+      files.insert({stripe.GetFileKey(idx, dev), fd});
+    }
   }
   return files;
 }
 
 template <typename K>
 static void StoreData(std::vector<K> keys, Params<K>& params) {
+  const StripeLayout& stripe = *params.stripe_;
+  const size_t dev_num = stripe.GetDeviceNum();
   int file_num = std::ceil(keys.size() * 1.0 / params.record_num_per_file_);
   std::vector<char> payload(params.payload_bytes_, 'a');
   uint64_t s = 0, e = keys.size();
-  std::string file;
+  // each page goes to the copy of its file on its own device
+  std::vector<char*> data(dev_num);
+  auto store_record = [&](int fid, uint64_t i, const K& key) {
+    char* dst = data[stripe.GetDevice(fid, i / params.record_num_per_page_)] +
+                i * params.record_bytes_;
+    memcpy(dst, &key, sizeof(K));
+    memcpy(dst + sizeof(K), payload.data(), params.payload_bytes_);
+  };
   for (int idx = 0; idx < file_num; idx++) {
-    file = params.data_dir_ + std::to_string(idx) + ".data";
     s = idx * params.record_num_per_file_;
     e = std::min<size_t>((idx + 1) * params.record_num_per_file_, keys.size());
-    char* data = MapFile<char>(file, params.record_bytes_ * (e - s));
+    for (size_t dev = 0; dev < dev_num; dev++) {
+      data[dev] = MapFile<char>(stripe.GetFile(idx, dev),
+                                params.record_bytes_ * (e - s));
+    }
     for (uint64_t i = s; i < e; i++) {
-      memcpy(data, &keys[i], sizeof(K));
-      data += sizeof(K);
-      memcpy(data, &payload, params.payload_bytes_);
-      data += params.payload_bytes_;
+      store_record(idx, i - s, keys[i]);
     }
   }
   if (keys.size() / params.record_num_per_page_ != 0) {
     uint64_t num = params.record_num_per_page_ -
                    (keys.size() % params.record_num_per_page_);
-    char* data = MapFile<char>(file, (e + num) * params.record_bytes_);
-    data += params.record_bytes_ * (e - s);
-    K max_key = keys.back();
-    for (uint64_t i = 0; i < num; i++) {
-      memcpy(data, &max_key, sizeof(K));
-      data += sizeof(K);
-      memcpy(data, &payload, params.payload_bytes_);
-      data += params.payload_bytes_;
+    for (size_t dev = 0; dev < dev_num; dev++) {
+      data[dev] = MapFile<char>(stripe.GetFile(file_num - 1, dev),
+                                (e - s + num) * params.record_bytes_);
     }
+    for (uint64_t i = e - s; i < e - s + num; i++) {
+      store_record(file_num - 1, i, keys.back());
+    }
+  }
+  std::cout << "store " << keys.size() << " records into ";
+  for (size_t dev = 0; dev < dev_num; dev++) {
+    std::cout << (dev == 0 ? "" : ",") << stripe.GetDir(dev);
   }
-  std::cout << "store " << keys.size() << " records into " << params.data_dir_;
 }
 
 template <typename K, typename V>
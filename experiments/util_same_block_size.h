@@ -14,49 +14,60 @@ static inline uint64_t GetInFilePageID(uint64_t idx, uint64_t recordNumPerPage,
   return (idx / recordNumPerPage) % pageNumPerFile;
 }
 
+/**
+ * @brief The page of record idx, in global page ids (fid * page_num_per_file_ +
+ * pid).
+ */
+template <typename K>
+static inline uint64_t GetGlobalPageID(const Params<K>& params, uint64_t idx) {
+  if (params.leco_pages_) {
+    return params.leco_pages_->GetPage(idx);
+  }
+  return idx / params.record_num_per_page_;
+}
+
+template <typename K>
+static inline void GetRecordPage(const Params<K>& params, uint64_t idx,
+                                 uint64_t* fid, uint64_t* pid) {
+  const uint64_t page = GetGlobalPageID(params, idx);
+  *fid = page / params.page_num_per_file_;
+  *pid = page % params.page_num_per_file_;
+}
+
 template <typename K>
 static inline FetchRange GetFetchRange(const Params<K>& params,
                                        const SearchRange& range) {
   FetchRange fetch_range;
-  fetch_range.fid_start = GetFileID(range.start, params.record_num_per_file_);
-  fetch_range.pid_start = GetInFilePageID(
-      range.start, params.record_num_per_page_, params.page_num_per_file_);
-  fetch_range.fid_end = GetFileID(range.stop - 1, params.record_num_per_file_);
-  fetch_range.pid_end = GetInFilePageID(
-      range.stop - 1, params.record_num_per_page_, params.page_num_per_file_);
+  GetRecordPage(params, range.start, &fetch_range.fid_start,
+                &fetch_range.pid_start);
+  GetRecordPage(params, range.stop - 1, &fetch_range.fid_end,
+                &fetch_range.pid_end);
   return fetch_range;
 }
 
+/**
+ * @brief Last-mile search over page_num pages that are already in read_buf,
+ * LeCo-compressed ones if leco_pages is given. The reads are counted by the
+ * caller.
+ */
 template <typename K>
-static inline std::pair<FindStatus, ResultInfo<K>> FetchPages(
+static inline std::pair<FindStatus, ResultInfo<K>> SearchFetchedPages(
     const K& lookupkey, const size_t bytes_per_page, const size_t page_num,
-    const size_t record_per_page, const int fd, const size_t pid,
-    const uint64_t gap_cnt, K* read_buf) {
+    const size_t record_per_page, const uint64_t gap_cnt, const K* read_buf,
+    const LecoPageTable* leco_pages = nullptr) {
   ResultInfo<K> res_info;
   uint64_t fetch_bytes = bytes_per_page * page_num;
 
-#ifdef DIRECT_IO
-  DirectIORead<K>(fd, bytes_per_page, page_num, pid * bytes_per_page, read_buf);
-#else
-  K* file_data = MMapRead<K>(filename, fetch_bytes, pid * bytes_per_page);
-#endif
-
-#ifdef PROF_CPU_IO
-  auto prof_start = std::chrono::high_resolution_clock::now();
-#endif  // PROF_CPU_IO
-  uint64_t idx =
-      LastMileSearch(read_buf, record_per_page * page_num, gap_cnt, lookupkey);
-#ifdef PROF_CPU_IO
-  auto prof_end = std::chrono::high_resolution_clock::now();
-  uint64_t prof_ns = std::chrono::duration_cast<std::chrono::nanoseconds>(
-                         prof_end - prof_start)
-                         .count();
-  last_mile_search_time += prof_ns;
-#endif  // PROF_CPU_IO
+  if (leco_pages != nullptr) {
+    res_info.res = ProfLecoPagesSearch(read_buf, page_num, bytes_per_page,
+                                       lookupkey);
+  } else {
+    uint64_t idx = ProfLastMileSearch(read_buf, record_per_page * page_num,
+                                      gap_cnt, lookupkey);
+    res_info.res = *(read_buf + idx * gap_cnt);
+  }
   res_info.total_search_range += fetch_bytes;
   res_info.fetch_page_num += page_num;
-  res_info.res = *(read_buf + idx * gap_cnt);
-  res_info.total_io++;
 
   if (res_info.res == lookupkey) {
     return {kEqualToKey, res_info};
@@ -67,13 +78,38 @@ static inline std::pair<FindStatus, ResultInfo<K>> FetchPages(
 }
 
 template <typename K>
-static inline ResultInfo<K> WorstCaseFetch(const FetchRange range,
-                                           const K lookupkey,
-                                           const std::map<int, int>& open_files,
-                                           const size_t bytes_per_page,
-                                           const size_t record_per_page,
-                                           const size_t page_num_per_file,
-                                           uint64_t gap_cnt, K* read_buf) {
+static inline std::pair<FindStatus, ResultInfo<K>> FetchPages(
+    const K& lookupkey, const size_t bytes_per_page, const size_t page_num,
+    const size_t record_per_page, const uint64_t fid,
+    const std::map<int, int>& open_files, const StripeLayout& stripe,
+    const size_t pid, const uint64_t gap_cnt, K* read_buf,
+    PageCache* page_cache, const LecoPageTable* leco_pages) {
+  ResultInfo<K> cache_res;
+#ifdef DIRECT_IO
+  const size_t io_num =
+      CachedIORead<K>(page_cache, open_files, stripe, fid, bytes_per_page,
+                      page_num, pid, read_buf, &cache_res);
+#else
+  uint64_t fetch_bytes = bytes_per_page * page_num;
+  K* file_data = MMapRead<K>(filename, fetch_bytes, pid * bytes_per_page);
+  const size_t io_num = 1;
+#endif
+  auto fetch_res =
+      SearchFetchedPages<K>(lookupkey, bytes_per_page, page_num,
+                            record_per_page, gap_cnt, read_buf, leco_pages);
+  fetch_res.second.total_io = io_num;
+  fetch_res.second.cache_hits = cache_res.cache_hits;
+  fetch_res.second.cache_misses = cache_res.cache_misses;
+  return fetch_res;
+}
+
+template <typename K>
+static inline ResultInfo<K> WorstCaseFetch(
+    const FetchRange range, const K lookupkey,
+    const std::map<int, int>& open_files, const StripeLayout& stripe,
+    const size_t bytes_per_page, const size_t record_per_page,
+    const size_t page_num_per_file, uint64_t gap_cnt, K* read_buf,
+    PageCache* page_cache, const LecoPageTable* leco_pages) {
   bool read_page = true;
   ResultInfo<K> res_info;
   uint64_t fid = range.fid_start, pid = range.pid_start;
@@ -81,13 +117,16 @@ static inline ResultInfo<K> WorstCaseFetch(const FetchRange range,
     uint64_t tmp_pid_end =
         (fid == range.fid_end) ? range.pid_end : page_num_per_file - 1;
     uint64_t fetch_page_num = tmp_pid_end - pid + 1;
-    int fd = open_files.find(fid)->second;
-    auto fetch_res = FetchPages<K>(lookupkey, bytes_per_page, fetch_page_num,
-                                   record_per_page, fd, pid, gap_cnt, read_buf);
+    auto fetch_res =
+        FetchPages<K>(lookupkey, bytes_per_page, fetch_page_num,
+                      record_per_page, fid, open_files, stripe, pid, gap_cnt,
+                      read_buf, page_cache, leco_pages);
     res_info.total_search_range += fetch_res.second.total_search_range;
     res_info.fetch_page_num += fetch_res.second.fetch_page_num;
     res_info.res = fetch_res.second.res;
     res_info.total_io += fetch_res.second.total_io;
+    res_info.cache_hits += fetch_res.second.cache_hits;
+    res_info.cache_misses += fetch_res.second.cache_misses;
     res_info.cpu_time += fetch_res.second.cpu_time;
     res_info.io_time += fetch_res.second.io_time;
 
@@ -100,27 +139,29 @@ static inline ResultInfo<K> WorstCaseFetch(const FetchRange range,
 }
 
 template <typename K>
-static inline ResultInfo<K> OneByOneFetch(const FetchRange range,
-                                          const K lookupkey,
-                                          const std::map<int, int>& open_files,
-                                          const size_t bytes_per_page,
-                                          const size_t record_per_page,
-                                          const size_t page_num_per_file,
-                                          uint64_t gap_cnt, K* read_buf) {
+static inline ResultInfo<K> OneByOneFetch(
+    const FetchRange range, const K lookupkey,
+    const std::map<int, int>& open_files, const StripeLayout& stripe,
+    const size_t bytes_per_page, const size_t record_per_page,
+    const size_t page_num_per_file, uint64_t gap_cnt, K* read_buf,
+    PageCache* page_cache, const LecoPageTable* leco_pages) {
   bool read_page = true;
   ResultInfo<K> res_info;
   uint64_t fid = range.fid_start, pid = range.pid_start;
   while (read_page && fid <= range.fid_end) {
     uint64_t tmp_pid_end =
         (fid == range.fid_end) ? range.pid_end : page_num_per_file - 1;
-    int fd = open_files.find(fid)->second;
     while (pid <= tmp_pid_end) {
-      auto fetch_res = FetchPages(lookupkey, bytes_per_page, 1, record_per_page,
-                                  fd, pid, gap_cnt, read_buf);
+      auto fetch_res =
+          FetchPages(lookupkey, bytes_per_page, 1, record_per_page, fid,
+                     open_files, stripe, pid, gap_cnt, read_buf, page_cache,
+                     leco_pages);
       res_info.total_search_range += fetch_res.second.total_search_range;
       res_info.fetch_page_num += fetch_res.second.fetch_page_num;
       res_info.res = fetch_res.second.res;
       res_info.total_io += fetch_res.second.total_io;
+      res_info.cache_hits += fetch_res.second.cache_hits;
+      res_info.cache_misses += fetch_res.second.cache_misses;
       res_info.cpu_time += fetch_res.second.cpu_time;
       res_info.io_time += fetch_res.second.io_time;
 
@@ -139,22 +180,26 @@ static inline ResultInfo<K> OneByOneFetch(const FetchRange range,
 template <typename K>
 static inline ResultInfo<K> OneByOneReverseFetch(
     const FetchRange range, const K lookupkey,
-    const std::map<int, int>& open_files, const size_t bytes_per_page,
-    const size_t record_per_page, const size_t page_num_per_file,
-    uint64_t gap_cnt, K* read_buf) {
+    const std::map<int, int>& open_files, const StripeLayout& stripe,
+    const size_t bytes_per_page, const size_t record_per_page,
+    const size_t page_num_per_file, uint64_t gap_cnt, K* read_buf,
+    PageCache* page_cache, const LecoPageTable* leco_pages) {
   bool read_page = true;
   ResultInfo<K> res_info;
   uint64_t fid = range.fid_end, pid = range.pid_end;
   while (read_page && fid >= range.fid_start) {
     uint64_t tmp_pid_start = (fid == range.fid_start) ? range.pid_start : 0;
-    int fd = open_files.find(fid)->second;
     while (pid >= tmp_pid_start) {
-      auto fetch_res = FetchPages(lookupkey, bytes_per_page, 1, record_per_page,
-                                  fd, pid, gap_cnt, read_buf);
+      auto fetch_res =
+          FetchPages(lookupkey, bytes_per_page, 1, record_per_page, fid,
+                     open_files, stripe, pid, gap_cnt, read_buf, page_cache,
+                     leco_pages);
       res_info.total_search_range += fetch_res.second.total_search_range;
       res_info.fetch_page_num += fetch_res.second.fetch_page_num;
       res_info.res = fetch_res.second.res;
       res_info.total_io += fetch_res.second.total_io;
+      res_info.cache_hits += fetch_res.second.cache_hits;
+      res_info.cache_misses += fetch_res.second.cache_misses;
       res_info.cpu_time += fetch_res.second.cpu_time;
       res_info.io_time += fetch_res.second.io_time;
 
@@ -170,6 +215,148 @@ static inline ResultInfo<K> OneByOneReverseFetch(
   return res_info;
 }
 
+/**
+ * @brief Reads the pages [page, page + page_num) (global page ids) into
+ * read_buf, by one CachedIORead per file they are in. Returns the number of
+ * reads.
+ */
+template <typename K>
+static inline size_t ReadGlobalPages(const Params<K>& params, uint64_t page,
+                                     size_t page_num, K* read_buf,
+                                     ResultInfo<K>* res_info) {
+  char* buf = reinterpret_cast<char*>(read_buf);
+  size_t io_num = 0;
+  for (uint64_t p = page; p < page + page_num;) {
+    const uint64_t fid = p / params.page_num_per_file_;
+    const uint64_t pid = p % params.page_num_per_file_;
+    const size_t num = std::min<uint64_t>(page + page_num - p,
+                                          params.page_num_per_file_ - pid);
+    io_num += CachedIORead<K>(
+        params.page_cache_.get(), params.open_files, *params.stripe_, fid,
+        params.page_bytes_, num, pid,
+        reinterpret_cast<K*>(buf + (p - page) * params.page_bytes_), res_info);
+    p += num;
+  }
+  return io_num;
+}
+
+/**
+ * @brief The pages [*lo, *hi] read first by kSpeculativeFetch: the middle
+ * page of the range and, if the hints of its segment say so, its neighbour
+ * within the range.
+ */
+template <typename K>
+static inline void GetSpeculativeWindow(const Params<K>& params,
+                                        uint64_t first_page, uint64_t mid_page,
+                                        uint64_t last_page, uint64_t* lo,
+                                        uint64_t* hi) {
+  *lo = *hi = mid_page;
+  if (!params.prefetch_hints_) {
+    return;
+  }
+  switch (params.prefetch_hints_->Get(mid_page)) {
+    case kPrefetchNext:
+      *hi = std::min(mid_page + 1, last_page);
+      break;
+    case kPrefetchPrev:
+      *lo = mid_page > first_page ? mid_page - 1 : mid_page;
+      break;
+    default:
+      break;
+  }
+}
+
+/**
+ * @brief Searches the pages [lo, hi] of kSpeculativeFetch, which are in
+ * read_buf: the middle page first, and the page read ahead only if the key is
+ * on its side, otherwise it is counted as wasted. The status is that of the
+ * last page searched.
+ */
+template <typename K>
+static inline std::pair<FindStatus, ResultInfo<K>> SearchSpeculativePages(
+    const K& lookupkey, const Params<K>& params, uint64_t gap_cnt,
+    const K* read_buf, uint64_t lo, uint64_t hi, uint64_t mid_page) {
+  auto page_at = [&](uint64_t page) {
+    return reinterpret_cast<const K*>(reinterpret_cast<const char*>(read_buf) +
+                                      (page - lo) * params.page_bytes_);
+  };
+  auto fetch_res = SearchFetchedPages<K>(
+      lookupkey, params.page_bytes_, 1, params.record_num_per_page_, gap_cnt,
+      page_at(mid_page), params.leco_pages_.get());
+  if (lo == hi) {
+    return fetch_res;
+  }
+  const uint64_t ahead = lo == mid_page ? hi : lo;
+  fetch_res.second.prefetch_pages = 1;
+  fetch_res.second.fetch_page_num = 2;
+  const FindStatus towards = ahead > mid_page ? kLessThanKey : kGreaterThanKey;
+  if (fetch_res.first != towards) {
+    fetch_res.second.prefetch_wasted = 1;
+    return fetch_res;
+  }
+  auto ahead_res = SearchFetchedPages<K>(
+      lookupkey, params.page_bytes_, 1, params.record_num_per_page_, gap_cnt,
+      page_at(ahead), params.leco_pages_.get());
+  ahead_res.second.total_search_range += fetch_res.second.total_search_range;
+  ahead_res.second.fetch_page_num = 2;
+  ahead_res.second.prefetch_pages = 1;
+  return ahead_res;
+}
+
+/**
+ * @brief kSpeculativeFetch: one read of the middle page of the range and the
+ * page ahead of it (see GetSpeculativeWindow), then one page at a time on the
+ * side of the key, as kMiddleOneByOne.
+ */
+template <typename K>
+static inline ResultInfo<K> SpeculativeFetch(const SearchRange& range,
+                                             const K& lookupkey,
+                                             const Params<K>& params,
+                                             uint64_t gap_cnt) {
+  const uint64_t first_page = GetGlobalPageID(params, range.start);
+  const uint64_t last_page = GetGlobalPageID(params, range.stop - 1);
+  const uint64_t mid_page =
+      GetGlobalPageID(params, (range.start + range.stop) >> 1);
+  uint64_t lo, hi;
+  GetSpeculativeWindow(params, first_page, mid_page, last_page, &lo, &hi);
+
+  ResultInfo<K> res_info;
+  res_info.total_io +=
+      ReadGlobalPages<K>(params, lo, hi - lo + 1, params.read_buf_, &res_info);
+  auto fetch_res = SearchSpeculativePages<K>(lookupkey, params, gap_cnt,
+                                             params.read_buf_, lo, hi, mid_page);
+  res_info.total_search_range += fetch_res.second.total_search_range;
+  res_info.fetch_page_num += fetch_res.second.fetch_page_num;
+  res_info.res = fetch_res.second.res;
+  res_info.prefetch_pages += fetch_res.second.prefetch_pages;
+  res_info.prefetch_wasted += fetch_res.second.prefetch_wasted;
+
+  const FindStatus side = fetch_res.first;
+  while (fetch_res.first == side && side != kEqualToKey) {
+    uint64_t page;
+    if (side == kLessThanKey) {
+      if (hi >= last_page) {
+        break;
+      }
+      page = ++hi;
+    } else {
+      if (lo <= first_page) {
+        break;
+      }
+      page = --lo;
+    }
+    res_info.total_io +=
+        ReadGlobalPages<K>(params, page, 1, params.read_buf_, &res_info);
+    fetch_res = SearchFetchedPages<K>(
+        lookupkey, params.page_bytes_, 1, params.record_num_per_page_, gap_cnt,
+        params.read_buf_, params.leco_pages_.get());
+    res_info.total_search_range += fetch_res.second.total_search_range;
+    res_info.fetch_page_num += fetch_res.second.fetch_page_num;
+    res_info.res = fetch_res.second.res;
+  }
+  return res_info;
+}
+
 template <typename K>
 static inline ResultInfo<K> NormalCoreLookup(const SearchRange& range,
                                              const K& lookupkey,
@@ -182,27 +369,29 @@ static inline ResultInfo<K> NormalCoreLookup(const SearchRange& range,
   switch (params.fetch_strategy_) {
     case kStartWorstCase: {
       res_info = WorstCaseFetch<K>(
-          fetch_range, lookupkey, params.open_files, params.page_bytes_,
-          params.record_num_per_page_, params.page_num_per_file_, gap_cnt,
-          params.read_buf_);
+          fetch_range, lookupkey, params.open_files, *params.stripe_,
+          params.page_bytes_, params.record_num_per_page_,
+          params.page_num_per_file_, gap_cnt, params.read_buf_,
+          params.page_cache_.get(), params.leco_pages_.get());
       break;
     }
     case kStartOneByOne: {
       res_info = OneByOneFetch<K>(
-          fetch_range, lookupkey, params.open_files, params.page_bytes_,
-          params.record_num_per_page_, params.page_num_per_file_, gap_cnt,
-          params.read_buf_);
+          fetch_range, lookupkey, params.open_files, *params.stripe_,
+          params.page_bytes_, params.record_num_per_page_,
+          params.page_num_per_file_, gap_cnt, params.read_buf_,
+          params.page_cache_.get(), params.leco_pages_.get());
       break;
     }
     case kMiddleWorstCase: {
       uint64_t mid = (range.start + range.stop) >> 1;
-      uint64_t mid_fid = GetFileID(mid, params.record_num_per_file_);
-      uint64_t mid_pid = GetInFilePageID(mid, params.record_num_per_page_,
-                                         params.page_num_per_file_);
-      int fd = params.open_files.find(mid_fid)->second;
-      auto fetch_res = FetchPages(lookupkey, params.page_bytes_, 1,
-                                  params.record_num_per_page_, fd, mid_pid,
-                                  gap_cnt, params.read_buf_);
+      uint64_t mid_fid, mid_pid;
+      GetRecordPage(params, mid, &mid_fid, &mid_pid);
+      auto fetch_res = FetchPages(
+          lookupkey, params.page_bytes_, 1, params.record_num_per_page_,
+          mid_fid, params.open_files, *params.stripe_, mid_pid, gap_cnt,
+          params.read_buf_, params.page_cache_.get(),
+          params.leco_pages_.get());
       res_info = fetch_res.second;
 
 #ifdef PROF_CPU_IO
@@ -246,14 +435,17 @@ static inline ResultInfo<K> NormalCoreLookup(const SearchRange& range,
 #endif  // PROF_CPU_IO
 
       auto second_res = WorstCaseFetch<K>(
-          fetch_range, lookupkey, params.open_files, params.page_bytes_,
-          params.record_num_per_page_, params.page_num_per_file_, gap_cnt,
-          params.read_buf_);
+          fetch_range, lookupkey, params.open_files, *params.stripe_,
+          params.page_bytes_, params.record_num_per_page_,
+          params.page_num_per_file_, gap_cnt, params.read_buf_,
+          params.page_cache_.get(), params.leco_pages_.get());
 
       res_info.total_search_range += second_res.total_search_range;
       res_info.fetch_page_num += second_res.fetch_page_num;
       res_info.res = second_res.res;
       res_info.total_io += second_res.total_io;
+      res_info.cache_hits += second_res.cache_hits;
+      res_info.cache_misses += second_res.cache_misses;
       res_info.cpu_time += second_res.cpu_time;
       res_info.io_time += second_res.io_time;
 
@@ -261,13 +453,13 @@ static inline ResultInfo<K> NormalCoreLookup(const SearchRange& range,
     }
     case kMiddleOneByOne: {
       uint64_t mid = (range.start + range.stop) >> 1;
-      uint64_t mid_fid = GetFileID(mid, params.record_num_per_file_);
-      uint64_t mid_pid = GetInFilePageID(mid, params.record_num_per_page_,
-                                         params.page_num_per_file_);
-      int fd = params.open_files.find(mid_fid)->second;
-      auto fetch_res = FetchPages(lookupkey, params.page_bytes_, 1,
-                                  params.record_num_per_page_, fd, mid_pid,
-                                  gap_cnt, params.read_buf_);
+      uint64_t mid_fid, mid_pid;
+      GetRecordPage(params, mid, &mid_fid, &mid_pid);
+      auto fetch_res = FetchPages(
+          lookupkey, params.page_bytes_, 1, params.record_num_per_page_,
+          mid_fid, params.open_files, *params.stripe_, mid_pid, gap_cnt,
+          params.read_buf_, params.page_cache_.get(),
+          params.leco_pages_.get());
       res_info = fetch_res.second;
 
       if (fetch_res.first == kEqualToKey) {
@@ -298,14 +490,17 @@ static inline ResultInfo<K> NormalCoreLookup(const SearchRange& range,
 #endif  // PROF_CPU_IO
 
         auto second_res = OneByOneFetch<K>(
-            fetch_range, lookupkey, params.open_files, params.page_bytes_,
-            params.record_num_per_page_, params.page_num_per_file_, gap_cnt,
-            params.read_buf_);
+            fetch_range, lookupkey, params.open_files, *params.stripe_,
+            params.page_bytes_, params.record_num_per_page_,
+            params.page_num_per_file_, gap_cnt, params.read_buf_,
+            params.page_cache_.get(), params.leco_pages_.get());
 
         res_info.total_search_range += second_res.total_search_range;
         res_info.fetch_page_num += second_res.fetch_page_num;
         res_info.res = second_res.res;
         res_info.total_io += second_res.total_io;
+        res_info.cache_hits += second_res.cache_hits;
+        res_info.cache_misses += second_res.cache_misses;
         res_info.cpu_time += second_res.cpu_time;
         res_info.io_time += second_res.io_time;
 
@@ -334,14 +529,17 @@ static inline ResultInfo<K> NormalCoreLookup(const SearchRange& range,
 #endif  // PROF_CPU_IO
 
         auto second_res = OneByOneReverseFetch<K>(
-            fetch_range, lookupkey, params.open_files, params.page_bytes_,
-            params.record_num_per_page_, params.page_num_per_file_, gap_cnt,
-            params.read_buf_);
+            fetch_range, lookupkey, params.open_files, *params.stripe_,
+            params.page_bytes_, params.record_num_per_page_,
+            params.page_num_per_file_, gap_cnt, params.read_buf_,
+            params.page_cache_.get(), params.leco_pages_.get());
 
         res_info.total_search_range += second_res.total_search_range;
         res_info.fetch_page_num += second_res.fetch_page_num;
         res_info.res = second_res.res;
         res_info.total_io += second_res.total_io;
+        res_info.cache_hits += second_res.cache_hits;
+        res_info.cache_misses += second_res.cache_misses;
         res_info.cpu_time += second_res.cpu_time;
         res_info.io_time += second_res.io_time;
       }
@@ -351,16 +549,16 @@ static inline ResultInfo<K> NormalCoreLookup(const SearchRange& range,
     case kLecoFetch: {
       // [start, end / 2)
       uint64_t mid = (range.start + range.stop) >> 1;
-      uint64_t mid_fid = GetFileID(mid, params.record_num_per_file_);
-      uint64_t mid_pid = GetInFilePageID(mid, params.record_num_per_page_,
-                                         params.page_num_per_file_);
+      uint64_t mid_fid, mid_pid;
+      GetRecordPage(params, mid, &mid_fid, &mid_pid);
       auto half_range = fetch_range;
       half_range.pid_end = mid_pid - 1;
       half_range.fid_end = mid_fid;
       res_info = WorstCaseFetch<K>(
-          half_range, lookupkey, params.open_files, params.page_bytes_,
-          params.record_num_per_page_, params.page_num_per_file_, gap_cnt,
-          params.read_buf_);
+          half_range, lookupkey, params.open_files, *params.stripe_,
+          params.page_bytes_, params.record_num_per_page_,
+          params.page_num_per_file_, gap_cnt, params.read_buf_,
+          params.page_cache_.get(), params.leco_pages_.get());
 
       if (res_info.res != lookupkey) {
 #ifdef PROF_CPU_IO
@@ -389,19 +587,26 @@ static inline ResultInfo<K> NormalCoreLookup(const SearchRange& range,
 #endif  // PROF_CPU_IO
 
         auto second_res = WorstCaseFetch<K>(
-            half_range, lookupkey, params.open_files, params.page_bytes_,
-            params.record_num_per_page_, params.page_num_per_file_, gap_cnt,
-            params.read_buf_);
+            half_range, lookupkey, params.open_files, *params.stripe_,
+            params.page_bytes_, params.record_num_per_page_,
+            params.page_num_per_file_, gap_cnt, params.read_buf_,
+            params.page_cache_.get(), params.leco_pages_.get());
         res_info.total_search_range += second_res.total_search_range;
         res_info.fetch_page_num += second_res.fetch_page_num;
         res_info.res = second_res.res;
         res_info.total_io += second_res.total_io;
+        res_info.cache_hits += second_res.cache_hits;
+        res_info.cache_misses += second_res.cache_misses;
         res_info.cpu_time += second_res.cpu_time;
         res_info.io_time += second_res.io_time;
       }
 
       break;
     }
+    case kSpeculativeFetch: {
+      res_info = SpeculativeFetch<K>(range, lookupkey, params, gap_cnt);
+      break;
+    }
   }
 
   return res_info;
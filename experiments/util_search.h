@@ -11,6 +11,9 @@
 #include <chrono>
 #include <iostream>
 
+#include "last_mile_search.h"
+#include "leco_data_page.h"
+#include "lookup_stats.h"
 #include "structures.h"
 
 template <typename K>
@@ -36,72 +39,132 @@ static K* MMapRead(const std::string& filename, size_t page_bytes,
   return data;
 }
 
-uint64_t prof_io_time = 0;
-uint64_t last_mile_search_time = 0;
-uint64_t prof_file_cpu_time = 0;
-
+/**
+ * @brief Reads page_num pages at offset into read_buf. When the calling thread
+ * profiles (lookup_stats is set), the time in lseek() is added to its file CPU
+ * time and the time in read() to its IO time and IO latency histogram.
+ */
 template <typename K>
 static void DirectIORead(int fd, size_t page_bytes, size_t page_num,
                          size_t offset, K* read_buf) {
-#ifdef PROF_CPU_IO
-  auto prof_start = std::chrono::high_resolution_clock::now();
-#endif  // PROF_CPU_IO
+  LookupStats* stats = lookup_stats;
+  uint64_t prof_start = stats != nullptr ? GetProfNs() : 0;
   if (lseek(fd, offset, SEEK_SET) == -1) {
     throw std::runtime_error("lseek file error in DirectIORead");
   }
-#ifdef PROF_CPU_IO
-  auto prof_end = std::chrono::high_resolution_clock::now();
-  uint64_t prof_ns = std::chrono::duration_cast<std::chrono::nanoseconds>(
-                         prof_end - prof_start)
-                         .count();
-  prof_file_cpu_time += prof_ns;
-
-  prof_start = std::chrono::high_resolution_clock::now();
-#endif  // PROF_CPU_IO
+  if (stats != nullptr) {
+    const uint64_t prof_end = GetProfNs();
+    stats->file_cpu_time += prof_end - prof_start;
+    prof_start = prof_end;
+  }
 
   int ret = read(fd, read_buf, page_bytes * page_num);
   if (ret == -1) {
     throw std::runtime_error("read error in DirectIORead");
   }
 
-#ifdef PROF_CPU_IO
-  prof_end = std::chrono::high_resolution_clock::now();
-  prof_ns = std::chrono::duration_cast<std::chrono::nanoseconds>(prof_end -
-                                                                 prof_start)
-                .count();
-  prof_io_time += prof_ns;
-#endif  // PROF_CPU_IO
+  if (stats != nullptr) {
+    const uint64_t prof_ns = GetProfNs() - prof_start;
+    stats->io_time += prof_ns;
+    stats->hist[kIOStage].Record(prof_ns);
+  }
+}
+
+/**
+ * @brief Reads the pages [pid, pid + page_num) of file fid into read_buf, by
+ * one read per run of them on the same device of the stripe layout. Returns
+ * the number of reads.
+ */
+template <typename K>
+static size_t StripedIORead(const std::map<int, int>& open_files,
+                            const StripeLayout& stripe, uint64_t fid,
+                            size_t page_bytes, size_t page_num, size_t pid,
+                            K* read_buf) {
+  char* buf = reinterpret_cast<char*>(read_buf);
+  const size_t end = pid + page_num;
+  size_t io_num = 0;
+  for (size_t p = pid; p < end; io_num++) {
+    const size_t run_end = stripe.GetRunEnd(fid, p, end);
+    const int fd =
+        open_files.find(stripe.GetFileKey(fid, stripe.GetDevice(fid, p)))
+            ->second;
+    DirectIORead<K>(fd, page_bytes, run_end - p, p * page_bytes,
+                    reinterpret_cast<K*>(buf + (p - pid) * page_bytes));
+    p = run_end;
+  }
+  return io_num;
 }
 
+/**
+ * @brief Reads the pages [pid, pid + page_num) of file fid into read_buf.
+ * Cached pages are copied from page_cache (if any), the missing ones are
+ * fetched by the reads that cover all of them and then cached. Returns the
+ * number of reads issued to the disks.
+ */
 template <typename K>
-inline uint64_t LastMileSearch(const K* data, uint64_t record_num,
-                               uint64_t gap_cnt, K key) {
-  // Here assuming that each location has a meaningful value
-  uint64_t s = 0, e = record_num;
-  if (*(data + (e - 1) * gap_cnt) < key) {
-    return e - 1;
+static size_t CachedIORead(PageCache* page_cache,
+                           const std::map<int, int>& open_files,
+                           const StripeLayout& stripe, uint64_t fid,
+                           size_t page_bytes, size_t page_num, size_t pid,
+                           K* read_buf, ResultInfo<K>* res_info) {
+  if (page_cache == nullptr) {
+    return StripedIORead<K>(open_files, stripe, fid, page_bytes, page_num, pid,
+                            read_buf);
+  }
+  char* buf = reinterpret_cast<char*>(read_buf);
+  size_t read_first, read_num;
+  const size_t miss = page_cache->GetPages(fid, pid, page_num, buf,
+                                           &read_first, &read_num);
+  res_info->cache_hits += page_num - miss;
+  res_info->cache_misses += miss;
+  if (read_num == 0) {
+    return 0;
   }
+  char* dst = buf + read_first * page_bytes;
+  const size_t io_num =
+      StripedIORead<K>(open_files, stripe, fid, page_bytes, read_num,
+                       pid + read_first, reinterpret_cast<K*>(dst));
+  page_cache->PutPages(fid, pid + read_first, read_num, dst);
+  return io_num;
+}
 
-#if LAST_MILE_SEARCH == 0
-  // binary search
-  while (s < e) {
-    uint64_t mid = (s + e) >> 1;
-    if (*(data + mid * gap_cnt) < key)
-      s = mid + 1;
-    else
-      e = mid;
+/**
+ * @brief LastMileSearch, timed into the last-mile time and search latency
+ * histogram of the calling thread when it profiles.
+ */
+template <typename K>
+inline uint64_t ProfLastMileSearch(const K* data, uint64_t record_num,
+                                   uint64_t gap_cnt, K key) {
+  LookupStats* stats = lookup_stats;
+  if (stats == nullptr) {
+    return LastMileSearch(data, record_num, gap_cnt, key);
   }
-  return s;
-#else
-  // linear search
-  while (s < e) {
-    if (*(data + s * gap_cnt) == key)
-      return s;
-    else
-      s++;
+  const uint64_t prof_start = GetProfNs();
+  uint64_t idx = LastMileSearch(data, record_num, gap_cnt, key);
+  const uint64_t prof_ns = GetProfNs() - prof_start;
+  stats->last_mile_time += prof_ns;
+  stats->hist[kSearchStage].Record(prof_ns);
+  return idx;
+}
+
+/**
+ * @brief LecoPagesSearch over page_num LeCo-compressed pages, profiled as
+ * ProfLastMileSearch.
+ */
+template <typename K>
+inline K ProfLecoPagesSearch(const K* pages, size_t page_num,
+                             size_t page_bytes, K key) {
+  const char* buf = reinterpret_cast<const char*>(pages);
+  LookupStats* stats = lookup_stats;
+  if (stats == nullptr) {
+    return LecoPagesSearch(buf, page_num, page_bytes, key);
   }
-  return s;
-#endif
+  const uint64_t prof_start = GetProfNs();
+  const K res = LecoPagesSearch(buf, page_num, page_bytes, key);
+  const uint64_t prof_ns = GetProfNs() - prof_start;
+  stats->last_mile_time += prof_ns;
+  stats->hist[kSearchStage].Record(prof_ns);
+  return res;
 }
 
 #endif
\ No newline at end of file
@@ -0,0 +1,47 @@
+#include "key_type.h"
+#include "ycsb_utils/util_lid.h"
+#include "ycsb_utils/workload_generator.h"
+
+int main(int argc, char* argv[]) {
+  char* endptr;
+  if (argc != 7 && argc != 8) {
+    for (auto i = 0; i < argc; i++) {
+      std::cout << i << ": " << argv[i] << std::endl;
+    }
+    std::cout << " Usage: " << argv[0] << std::endl
+              << "  1. dataset_path" << std::endl
+              << "  2. store_path" << std::endl
+              << "  3. #init_key (M)" << std::endl
+              << "  4. #query (M)" << std::endl
+              << "  5. ops mix: a-f, or R:U:S:I:D in percent" << std::endl
+              << "  6. key distribution: uniform, zipfian, latest or hotspot"
+              << std::endl
+              << "  7. seed (optional)" << std::endl;
+    return -1;
+  }
+
+  const std::string kDataPath = argv[1];
+  const std::string kStorePath = argv[2];
+  const uint64_t kInitNum = strtod(argv[3], &endptr) * 1e6;
+  const uint64_t kOpsNum = strtod(argv[4], &endptr) * 1e6;
+  const OpsMix kMix = GetOpsMix(argv[5]);
+  const KeyDistribution kDist = GetKeyDistribution(argv[6]);
+  const uint64_t kSeed =
+      argc == 8 ? strtoul(argv[7], &endptr, 10)
+                : std::chrono::system_clock::now().time_since_epoch().count();
+  std::cout << "ops mix (read/update/scan/insert/delete): "
+            << kMix.ratio[READ] << "/" << kMix.ratio[UPDATE] << "/"
+            << kMix.ratio[SCAN] << "/" << kMix.ratio[INSERT] << "/"
+            << kMix.ratio[DELETE] << ", key distribution: " << argv[6]
+            << ", seed: " << kSeed << std::endl;
+
+  KeyVec keys = LoadKeys<Key>(kDataPath);
+  if (!is_sorted(keys.begin(), keys.end())) {
+    std::sort(keys.begin(), keys.end());
+  }
+
+  WorkloadGenerator generator(kMix, kDist, kSeed);
+  const uint64_t ns = GetNsTime(
+      [&] { generator.Generate(keys, kInitNum, kOpsNum, kStorePath); });
+  std::cout << "generated the workload in " << ns / 1e6 << " ms" << std::endl;
+}
@@ -55,6 +55,7 @@ int main(int argc, char* argv[]) {
   std::string read("READ");
   std::string update("UPDATE");
   std::string scan("SCAN");
+  std::string del("DELETE");
   std::string op;
   Key key;
   int range;
@@ -80,6 +81,9 @@ int main(int argc, char* argv[]) {
       ops.push_back(OpsType::SCAN);
       ranges.push_back(range);
 
+    } else if (op.compare(del) == 0) {
+      ops.push_back(OpsType::DELETE);
+
     } else {
       std::cout << "UNRECOGNIZED CMD!\n";
       break;
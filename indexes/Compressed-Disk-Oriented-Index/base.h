@@ -13,6 +13,7 @@
 #include "../../libraries/LeCo/headers/piecewise_fix_integer_template_float.h"
 #include "../PGM-index-disk/pgm_index_page.hpp"
 #include "../PGM-index/include/pgm/sdsl.hpp"
+#include "../snapshot.h"
 
 namespace compressed_disk_index {
 
@@ -113,6 +114,33 @@ class CompressedIntercepts {
            intercepts_map_.size() * (sizeof(size_t) + sizeof(INTERCEPT_TYPE));
   }
 
+  void Save(SnapshotWriter* out) const {
+    out->Put(intercept_offset_);
+    out->PutSerialized(compressed_intercepts_);
+    std::vector<size_t> map_keys;
+    std::vector<INTERCEPT_TYPE> map_values;
+    for (const auto& kv : intercepts_map_) {
+      map_keys.push_back(kv.first);
+      map_values.push_back(kv.second);
+    }
+    out->PutArray(map_keys);
+    out->PutArray(map_values);
+  }
+
+  void Load(SnapshotReader* in) {
+    intercept_offset_ = in->Get<INTERCEPT_TYPE>();
+    in->GetSerialized(&compressed_intercepts_);
+    sdsl::util::init_support(sel1_, &compressed_intercepts_);
+    size_t n;
+    const size_t* map_keys = in->GetArray<size_t>(&n);
+    const INTERCEPT_TYPE* map_values = in->GetArray<INTERCEPT_TYPE>(&n);
+    intercepts_map_.clear();
+    for (size_t i = 0; i < n; i++) {
+      intercepts_map_.insert(intercepts_map_.end(),
+                             {map_keys[i], map_values[i]});
+    }
+  }
+
  private:
   INTERCEPT_TYPE intercept_offset_;  ///< An offset to make the intercepts start
                                      ///< from 0 in the bitvector.
@@ -200,6 +228,18 @@ class CompressedSlopes {
     return slopes_map_.bit_size() / 8 + slopes_table_.size() * sizeof(float);
   }
 
+  void Save(SnapshotWriter* out) const {
+    out->PutArray(slopes_table_);
+    out->PutSerialized(slopes_map_);
+  }
+
+  void Load(SnapshotReader* in) {
+    size_t n;
+    const float* slopes = in->GetArray<float>(&n);
+    slopes_table_.assign(slopes, slopes + n);
+    in->GetSerialized(&slopes_map_);
+  }
+
  private:
   std::vector<float> slopes_table_;
   sdsl::int_vector<> slopes_map_;
@@ -285,17 +325,49 @@ class LecoCompression {
         block_length = point_num_ - (block_num_ - 1) * block_width_;
       }
 
-      uint8_t* descriptor = (uint8_t*)malloc(block_length * sizeof(K) * 4);
+      // the bit width and the two doubles of the model precede the deltas
+      uint8_t* descriptor = (uint8_t*)malloc(
+          block_length * sizeof(K) * 4 + sizeof(uint8_t) + sizeof(double) * 2);
       uint8_t* res = descriptor;
       res = codec_.encodeArray8_int(keys.data() + (i * block_width_),
                                     block_length, descriptor, i);
       uint32_t segment_size = res - descriptor;
       descriptor = (uint8_t*)realloc(descriptor, segment_size);
       block_start_vec_.push_back(descriptor);
+      block_bytes_.push_back(segment_size);
       memory_size_ += segment_size;
     }
   }
 
+  void Save(SnapshotWriter* out) const {
+    out->Put<uint64_t>(point_num_);
+    out->PutArray(points_);
+    if (point_num_ <= 100) {
+      return;
+    }
+    out->Put<uint64_t>(block_num_);
+    out->Put<uint64_t>(block_width_);
+    out->Put<uint64_t>(memory_size_);
+    out->PutBlocks(block_start_vec_, block_bytes_);
+  }
+
+  // The blocks are self-contained, so they are decoded in the mapping.
+  void Load(SnapshotReader* in) {
+    point_num_ = in->Get<uint64_t>();
+    size_t n;
+    const K* points = in->GetArray<K>(&n);
+    points_.assign(points, points + n);
+    if (point_num_ <= 100) {
+      return;
+    }
+    block_num_ = in->Get<uint64_t>();
+    block_width_ = in->Get<uint64_t>();
+    memory_size_ = in->Get<uint64_t>();
+    in->GetBlocks(&block_start_vec_, &block_bytes_);
+    snapshot_ = in->GetMapping();
+    codec_.init(block_num_, block_width_);
+  }
+
   inline K decompress(size_t i) {
     if (point_num_ <= 100) {
       return points_[i];
@@ -327,6 +399,46 @@ class LecoCompression {
     return {s, last_data};
   }
 
+  // LecoUpperBound of n keys. The searches of a group of keys run in lockstep
+  // over [0, point_num_), and the blocks probed by the next step of all of them
+  // are prefetched before any is decoded.
+  inline void LecoUpperBoundBatch(const K* keys, size_t n,
+                                  std::pair<size_t, K>* out) {
+    if (point_num_ <= 100) {
+      for (size_t i = 0; i < n; i++) {
+        auto it = std::upper_bound(points_.begin(), points_.end(), keys[i]);
+        out[i] = {it - points_.begin(),
+                  it == points_.begin() ? *it : *std::prev(it)};
+      }
+      return;
+    }
+    constexpr size_t kGroup = 16;
+    uint64_t base[kGroup];
+    for (size_t b = 0; b < n; b += kGroup) {
+      const size_t m = std::min(kGroup, n - b);
+      std::fill(base, base + m, 0);
+      for (uint64_t len = point_num_; len > 1; len -= len / 2) {
+        const uint64_t half = len / 2;
+        for (size_t j = 0; j < m; j++) {
+          __builtin_prefetch(block_start_vec_[(base[j] + half) / block_width_]);
+        }
+        for (size_t j = 0; j < m; j++) {
+          if (decompress(base[j] + half) <= keys[b + j]) {
+            base[j] += half;
+          }
+        }
+      }
+      for (size_t j = 0; j < m; j++) {
+        const K data = decompress(base[j]);
+        if (data <= keys[b + j]) {
+          out[b + j] = {base[j] + 1, data};
+        } else {
+          out[b + j] = {0, data};
+        }
+      }
+    }
+  }
+
   inline size_t size() const { return memory_size_ + sizeof(size_t) * 4; }
 
   inline size_t keys_num() const { return point_num_; }
@@ -334,13 +446,15 @@ class LecoCompression {
  private:
   Codecset::Leco_int<K> codec_;
   std::vector<uint8_t*> block_start_vec_;
+  std::vector<uint32_t> block_bytes_;
+  std::shared_ptr<const char> snapshot_;  // holds the loaded blocks
 
   std::vector<K> points_;
 
-  size_t point_num_;
-  size_t block_num_;
+  size_t point_num_ = 0;
+  size_t block_num_ = 0;
   size_t memory_size_ = 0;
-  size_t block_width_;
+  size_t block_width_ = 0;
 };
 
 template <class K>
@@ -173,6 +173,34 @@ class DiskOrientedIndexV4 {
     return SearchBound{begin, end + 1};
   }
 
+  // GetSearchBound of n keys, passed to emit(i, bound): the segment searches
+  // of a group of keys are done first, in lockstep, then the models are
+  // evaluated.
+  template <typename Emit>
+  void GetSearchBoundBatch(const K* keys, size_t n, Emit emit) {
+    constexpr size_t kGroup = 16;  // as in LecoUpperBoundBatch
+    std::pair<size_t, K> segs[kGroup];
+    for (size_t b = 0; b < n; b += kGroup) {
+      const size_t m = std::min(kGroup, n - b);
+      compressed_keys.LecoUpperBoundBatch(keys + b, m, segs);
+      for (size_t j = 0; j < m; j++) {
+        const K key = keys[b + j];
+        if (key <= min_key_) {
+          emit(b + j, SearchBound{0, 1});
+          continue;
+        } else if (key >= max_key_) {
+          emit(b + j, SearchBound{max_y_, max_y_ + 1});
+          continue;
+        }
+        assert(segs[j].first >= 1);
+        const size_t pred = Predict(key - segs[j].second, segs[j].first - 1);
+        const size_t begin = (pred < error_) ? 0 : (pred - error_);
+        const size_t end = (pred + error_ > max_y_) ? max_y_ : (pred + error_);
+        emit(b + j, SearchBound{begin, end + 1});
+      }
+    }
+  }
+
   size_t GetModelNum() const { return compressed_keys.keys_num(); }
 
   size_t GetSize() const {
@@ -184,6 +212,30 @@ class DiskOrientedIndexV4 {
            sizeof(uint16_t) + compressed_keys.size();
 #endif
   }
+  void Save(SnapshotWriter* out) const {
+    out->Put(min_key_);
+    out->Put(max_key_);
+    out->Put<uint64_t>(max_y_);
+    out->Put<uint64_t>(record_per_page_);
+    out->Put(error_);
+    compressed_slopes.Save(out);
+    leco_intercepts_.Save(out);
+    pgm_intercepts_.Save(out);
+    compressed_keys.Save(out);
+  }
+
+  void Load(SnapshotReader* in) {
+    min_key_ = in->Get<K>();
+    max_key_ = in->Get<K>();
+    max_y_ = in->Get<uint64_t>();
+    record_per_page_ = in->Get<uint64_t>();
+    error_ = in->Get<uint16_t>();
+    compressed_slopes.Load(in);
+    leco_intercepts_.Load(in);
+    pgm_intercepts_.Load(in);
+    compressed_keys.Load(in);
+  }
+
 #ifdef BREAKDOWN
   void PrintBreakdown() {
     std::cout << "di v4: ," << init_data_size << ",\t" << seg_size << ",\t"
@@ -34,6 +34,14 @@ class DI_V1 : public BaseIndex<K, V> {
     return {range.begin, range.end};
   }
 
+  // Lookup is non-const here, so the default LookupBatch (which calls the
+  // const one) cannot be used.
+  void LookupBatch(const K* lookup_keys, size_t n, SearchRange* out) override {
+    for (size_t i = 0; i < n; i++) {
+      out[i] = Lookup(lookup_keys[i]);
+    }
+  }
+
   size_t GetIndexParams() const override { return lambda_; }
 
   std::string GetIndexName() const override {
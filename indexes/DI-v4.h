@@ -35,6 +35,14 @@ class DI_V4 : public BaseIndex<K, V> {
     return {range.begin, range.end};
   }
 
+  void LookupBatch(const K* lookup_keys, size_t n, SearchRange* out) override {
+    di_.GetSearchBoundBatch(
+        lookup_keys, n,
+        [out](size_t i, const compressed_disk_index::SearchBound& range) {
+          out[i] = {range.begin, range.end};
+        });
+  }
+
   size_t GetIndexParams() const override { return lambda_; }
 
   std::string GetIndexName() const override {
@@ -50,6 +58,23 @@ class DI_V4 : public BaseIndex<K, V> {
     return GetInMemorySize() + disk_size_;
   }
 
+  std::string GetSnapshotName() const override {
+    return "DI-V4_" + std::to_string(lambda_) + "_" +
+           std::to_string(record_per_page_);
+  }
+
+  bool Save(SnapshotWriter* out) const override {
+    out->Put<uint64_t>(disk_size_);
+    di_.Save(out);
+    return true;
+  }
+
+  bool Load(SnapshotReader* in) override {
+    disk_size_ = in->Get<uint64_t>();
+    di_.Load(in);
+    return true;
+  }
+
  private:
   compressed_disk_index::DiskOrientedIndexV4<K, V> di_;
 
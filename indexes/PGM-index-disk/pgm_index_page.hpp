@@ -27,6 +27,7 @@
 #include <utility>
 #include <vector>
 
+#include "../snapshot.h"
 #include "./piecewise_linear_model.hpp"
 
 namespace pgm_page {
@@ -304,9 +305,10 @@ class PGMIndexPage {
   size_t n;        ///< The number of elements this index was built on.
   uint64_t max_y;  ///< The max value.
   K first_key;     ///< The smallest element.
-  std::vector<Segment> segments;       ///< The segments composing the index.
-  std::vector<size_t> levels_offsets;  ///< The starting position of each level
-                                       ///< in segments[], in reverse order.
+  SnapshotArray<Segment> segments;  ///< The segments composing the index.
+  SnapshotArray<size_t> levels_offsets;  ///< The starting position of each
+                                         ///< level in segments[], in reverse
+                                         ///< order.
 
   template <typename RandomIt>
   static void build(RandomIt first, RandomIt last, size_t epsilon,
@@ -422,13 +424,41 @@ class PGMIndexPage {
    */
   template <typename RandomIt>
   PGMIndexPage(RandomIt first, RandomIt last, size_t eps = 64)
-      : n(std::distance(first, last)),
-        first_key(n ? first->first : K(0)),
-        segments(),
-        levels_offsets() {
+      : n(std::distance(first, last)), first_key(n ? first->first : K(0)) {
     epsilon_value = eps;
     max_y = (last - 1)->second;
-    build(first, last, eps, max_y, EpsilonRecursive, segments, levels_offsets);
+    std::vector<Segment> built_segments;
+    std::vector<size_t> built_levels_offsets;
+    build(first, last, eps, max_y, EpsilonRecursive, built_segments,
+          built_levels_offsets);
+    segments = std::move(built_segments);
+    levels_offsets = std::move(built_levels_offsets);
+  }
+
+  /**
+   * Writes the index to a snapshot.
+   * @param out the snapshot being written
+   */
+  void save(SnapshotWriter *out) const {
+    out->Put<uint64_t>(n);
+    out->Put<uint64_t>(max_y);
+    out->Put<K>(first_key);
+    out->Put<uint64_t>(epsilon_value);
+    segments.Save(out);
+    levels_offsets.Save(out);
+  }
+
+  /**
+   * Restores the index from a snapshot, the segments are used in place.
+   * @param in the snapshot being read
+   */
+  void load(SnapshotReader *in) {
+    n = in->Get<uint64_t>();
+    max_y = in->Get<uint64_t>();
+    first_key = in->Get<K>();
+    epsilon_value = in->Get<uint64_t>();
+    segments.Load(in);
+    levels_offsets.Load(in);
   }
 
   /**
@@ -445,6 +475,67 @@ class PGMIndexPage {
     return {pos, lo, hi};
   }
 
+  /**
+   * Batched search(): the keys of a group walk the levels in lockstep, and the
+   * segments each key scans at the next level are prefetched before any of them
+   * is touched, so the cache misses of different keys overlap.
+   * @param keys the keys to search for
+   * @param n the number of keys
+   * @param emit called as emit(i, search(keys[i])) for each key, so that the
+   * caller stores the positions in its own format without a temporary array
+   */
+  template <typename Emit>
+  void search_batch(const K *keys, size_t n, Emit emit) const {
+    if constexpr (EpsilonRecursive == 0) {
+      for (size_t i = 0; i < n; ++i) emit(i, search(keys[i]));
+      return;
+    }
+
+    static constexpr size_t kGroup = 16;
+    static constexpr size_t linear_search_threshold = 8 * 64 / sizeof(Segment);
+    const Segment *root = segments.data() + *(levels_offsets.end() - 2);
+    K ks[kGroup];
+    const Segment *its[kGroup];
+    size_t pos[kGroup];
+
+    for (size_t b = 0; b < n; b += kGroup) {
+      const size_t m = std::min(kGroup, n - b);
+      for (size_t j = 0; j < m; ++j) {
+        ks[j] = std::max(first_key, keys[b + j]);
+        its[j] = root;
+      }
+      for (auto l = int(height()) - 2; l >= 0; --l) {
+        const Segment *level_begin = segments.data() + levels_offsets[l];
+        for (size_t j = 0; j < m; ++j) {
+          pos[j] = std::min<size_t>((*its[j])(ks[j]),
+                                    std::next(its[j])->intercept);
+          const Segment *lo =
+              level_begin + PGM_SUB_EPS(pos[j], EpsilonRecursive + 1);
+          __builtin_prefetch(lo);
+          __builtin_prefetch(lo + 2 * (EpsilonRecursive + 1));
+        }
+        for (size_t j = 0; j < m; ++j) {
+          const Segment *lo =
+              level_begin + PGM_SUB_EPS(pos[j], EpsilonRecursive + 1);
+          if constexpr (EpsilonRecursive <= linear_search_threshold) {
+            for (; std::next(lo)->key <= ks[j]; ++lo) continue;
+            its[j] = lo;
+          } else {
+            auto level_size = levels_offsets[l + 1] - levels_offsets[l] - 1;
+            const Segment *hi =
+                level_begin + PGM_ADD_EPS(pos[j], EpsilonRecursive, level_size);
+            its[j] = std::prev(std::upper_bound(lo, hi, ks[j]));
+          }
+        }
+      }
+      for (size_t j = 0; j < m; ++j) {
+        auto p = std::min<size_t>((*its[j])(ks[j]), std::next(its[j])->intercept);
+        emit(b + j, ApproxPos{p, PGM_SUB_EPS(p, epsilon_value),
+                              PGM_ADD_EPS(p, epsilon_value, (max_y + 1))});
+      }
+    }
+  }
+
   /**
    * Returns the number of segments in the last level of the index.
    * @return the number of segments
@@ -317,6 +317,123 @@ struct Y_Range {
   size_t y_high_;
 };
 
+//==============================================================
+//  STITCHED PARALLEL SEGMENTATION
+//==============================================================
+/**
+ * The number of chunks (and OpenMP threads) of make_segmentation_par and
+ * make_segmentation_range_par. 0: one chunk per OpenMP thread, each segmented
+ * on its own, so a few extra segments appear at the chunk boundaries. 1:
+ * sequential. k > 1: k chunks stitched by make_segmentation_stitched, which
+ * gives the same segments as the sequential build.
+ */
+inline size_t build_threads = 0;
+
+/**
+ * Greedily segments the points [from, to), starting a segment at from. Calls
+ * emit(start, cs) for each segment cs, where start is the index of its first
+ * point; the segmentation stops when emit returns false.
+ */
+template <typename Y, typename Fin, typename Fadd, typename Femit>
+void make_segmentation_from(size_t from, size_t to, size_t epsilon, Fin in,
+                            Fadd add, Femit emit) {
+  using X = typename std::invoke_result_t<Fin, size_t>::first_type;
+  OptimalPiecewiseLinearModel<X, Y> opt(epsilon);
+  auto p = in(from);
+  size_t start = from;
+  add(opt, p);
+
+  for (size_t i = from + 1; i < to; ++i) {
+    auto next_p = in(i);
+    if (next_p.first == p.first) continue;
+    p = next_p;
+    if (!add(opt, p)) {
+      if (!emit(start, opt.get_segment())) return;
+      start = i;
+      add(opt, p);
+    }
+  }
+
+  emit(start, opt.get_segment());
+}
+
+/**
+ * Segments the chunks of the points in parallel, then stitches them in order.
+ * The greedy segmentation only depends on where a segment starts, so the
+ * segments of a chunk are the sequential ones from the first start point the
+ * two have in common. At each boundary, the last segment of the chunk (which
+ * may be cut by the chunk end) is segmented again sequentially, until a
+ * segment starts at the same point as one of a later chunk; the rest of that
+ * chunk is then taken as is. Usually this takes a few segments per boundary.
+ */
+template <typename Y, typename Fin, typename Fadd, typename Fout>
+size_t make_segmentation_stitched(size_t n, size_t epsilon, size_t parallelism,
+                                  Fin in, Fadd add, Fout out) {
+  using X = typename std::invoke_result_t<Fin, size_t>::first_type;
+  using canonical_segment =
+      typename OptimalPiecewiseLinearModel<X, Y>::CanonicalSegment;
+  using start_segment = std::pair<size_t, canonical_segment>;
+  if (n == 0) return 0;
+
+  const size_t chunk_size = n / parallelism;
+  std::vector<size_t> chunk_first(parallelism);
+  std::vector<std::vector<start_segment>> results(parallelism);
+
+#pragma omp parallel for num_threads(parallelism)
+  for (size_t i = 0; i < parallelism; ++i) {
+    auto first = i * chunk_size;
+    auto last = i == parallelism - 1 ? n : first + chunk_size;
+    if (first > 0) {
+      for (; first < last; ++first)
+        if (in(first).first != in(first - 1).first) break;
+    }
+    chunk_first[i] = first;
+    if (first == last) continue;
+
+    results[i].reserve(chunk_size / (epsilon > 0 ? epsilon * epsilon : 16));
+    make_segmentation_from<Y>(first, last, epsilon, in, add,
+                              [&results, i](size_t start, const auto &cs) {
+                                results[i].emplace_back(start, cs);
+                                return true;
+                              });
+  }
+
+  size_t c = 0, j = 0, k = 0;
+  while (true) {
+    const auto &segs = results[j];
+    for (; k + 1 < segs.size(); ++k, ++c) out(segs[k].second);
+    if (j + 1 == parallelism) {
+      out(segs[k].second);
+      return ++c;
+    }
+
+    size_t next = j + 1;
+    bool synced = false;
+    make_segmentation_from<Y>(
+        segs[k].first, n, epsilon, in, add,
+        [&](size_t start, const auto &cs) {
+          while (next + 1 < parallelism && start >= chunk_first[next + 1])
+            ++next;
+          if (start >= chunk_first[next]) {
+            const auto &later = results[next];
+            auto it = std::lower_bound(
+                later.begin(), later.end(), start,
+                [](const start_segment &s, size_t v) { return s.first < v; });
+            if (it != later.end() && it->first == start) {
+              synced = true;
+              j = next;
+              k = it - later.begin();
+              return false;
+            }
+          }
+          out(cs);
+          ++c;
+          return true;
+        });
+    if (!synced) return c;
+  }
+}
+
 template <typename Fin, typename Fout>
 size_t make_segmentation_disk(size_t n, size_t epsilon, Fin in, Fout out) {
   if (n == 0) return 0;
@@ -379,7 +496,10 @@ size_t make_segmentation_range(size_t n, size_t epsilon, Fin in, Fout out) {
 template <typename Fin, typename Fout>
 size_t make_segmentation_range_par(size_t n, size_t epsilon, Fin in, Fout out) {
   auto parallelism =
-      std::min(std::min(omp_get_num_procs(), omp_get_max_threads()), 128);
+      build_threads ? build_threads
+                    : std::min(std::min(omp_get_num_procs(),
+                                        omp_get_max_threads()),
+                               128);
   auto chunk_size = n / parallelism;
   auto c = 0ull;
 
@@ -389,12 +509,20 @@ size_t make_segmentation_range_par(size_t n, size_t epsilon, Fin in, Fout out) {
   using X = typename std::invoke_result_t<Fin, size_t>::first_type;
   // using Y = typename std::invoke_result_t<Fin, size_t>::second_type;
   using Y = size_t;
+  if (build_threads) {
+    auto add = [](auto &opt, const auto &p) {
+      return opt.add_point(p.first, p.second.y_low_, p.second.y_high_,
+                           p.second.y_);
+    };
+    return make_segmentation_stitched<Y>(n, epsilon, parallelism, in, add,
+                                         out);
+  }
   using canonical_segment =
       typename OptimalPiecewiseLinearModel<X, Y>::CanonicalSegment;
   std::vector<std::vector<canonical_segment>> results(parallelism);
 
 #pragma omp parallel for reduction(+ : c) num_threads(parallelism)
-  for (auto i = 0; i < parallelism; ++i) {
+  for (size_t i = 0; i < parallelism; ++i) {
     auto first = i * chunk_size;
     auto last = i == parallelism - 1 ? n : first + chunk_size;
     if (first > 0) {
@@ -528,7 +656,10 @@ size_t make_segmentation(size_t n, size_t epsilon, Fin in, Fout out) {
 template <typename Fin, typename Fout>
 size_t make_segmentation_par(size_t n, size_t epsilon, Fin in, Fout out) {
   auto parallelism =
-      std::min(std::min(omp_get_num_procs(), omp_get_max_threads()), 20);
+      build_threads ? build_threads
+                    : std::min(std::min(omp_get_num_procs(),
+                                        omp_get_max_threads()),
+                               20);
   auto chunk_size = n / parallelism;
   auto c = 0ull;
 
@@ -537,12 +668,19 @@ size_t make_segmentation_par(size_t n, size_t epsilon, Fin in, Fout out) {
 
   using X = typename std::invoke_result_t<Fin, size_t>::first_type;
   using Y = typename std::invoke_result_t<Fin, size_t>::second_type;
+  if (build_threads) {
+    auto add = [](auto &opt, const auto &p) {
+      return opt.add_point(p.first, p.second);
+    };
+    return make_segmentation_stitched<Y>(n, epsilon, parallelism, in, add,
+                                         out);
+  }
   using canonical_segment =
       typename OptimalPiecewiseLinearModel<X, Y>::CanonicalSegment;
   std::vector<std::vector<canonical_segment>> results(parallelism);
 
 #pragma omp parallel for reduction(+ : c) num_threads(parallelism)
-  for (auto i = 0; i < parallelism; ++i) {
+  for (size_t i = 0; i < parallelism; ++i) {
     auto first = i * chunk_size;
     auto last = i == parallelism - 1 ? n : first + chunk_size;
     if (first > 0) {
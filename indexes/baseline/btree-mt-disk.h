@@ -29,9 +29,14 @@ class BaselineBTreeMTDisk : public MultiThreadedBaseIndex<K, V> {
 
   V Find(const K key, int thread_id) {
     V res = btree_.lookup(key);
+    if (res == kTombstone<V>) {
+      return std::numeric_limits<V>::max();
+    }
     return res;
   }
 
+  // The disk B+-tree has no range scan; run_multi_threaded_ycsb rejects
+  // workloads with SCAN ops for this index.
   V Scan(const K key, const int range, int thread_id) {
     V sum = 0;
     return sum;
@@ -42,12 +47,23 @@ class BaselineBTreeMTDisk : public MultiThreadedBaseIndex<K, V> {
     return true;
   }
 
-  bool Update(const K key, const V value, int thread_id) { return true; }
+  // In place: reads the leaf block and writes it back.
+  bool Update(const K key, const V value, int thread_id) {
+    btree_.insert(key, value);
+    return true;
+  }
 
-  bool Delete(const K key, int thread_id) { return true; }
+  // The disk B+-tree cannot remove keys, so a delete rewrites the value to a
+  // tombstone in place, as the hybrid index does out of place.
+  bool Delete(const K key, int thread_id) {
+    btree_.insert(key, kTombstone<V>);
+    return true;
+  }
 
   void FreeBuffer(){};
 
+  ScanStats GetScanStats() const { return ScanStats(); }
+
 #ifdef BREAKDOWN
   void PrintBreakdown(){};
 #endif
@@ -3,9 +3,22 @@
 
 #include <assert.h>
 
+#include <atomic>
+#include <exception>
+#include <memory>
+#include <thread>
+
 #include "../base_index.h"
 
 #define INIT_SIZE 100
+#define MIN_PARTITION_SIZE 65536  // #records
+
+// The static part is split by key into partitions, each a StaticType with its
+// own data file. A merge freezes the records of the dynamic index and a
+// background thread rewrites (and retrains) only the partitions they fall
+// into, into new files; until it is over, lookups go to the frozen records
+// and the old partitions, and the new partitions are installed by the next
+// operation. Partitions that grow to twice their initial size are split.
 
 template <typename K, typename V, typename DynamicType, typename StaticType>
 class HybridIndex : public BaseIndex<K, V> {
@@ -18,7 +31,13 @@ class HybridIndex : public BaseIndex<K, V> {
 
   HybridIndex(param_t params)
       : dynamic_index_(params.d_params_),
-        static_index_(params.s_params_),
+        s_params_(params.s_params_),
+        partition_num_(GetHybridMergePartitions()),
+        background_merge_(GetHybridBackgroundMerge()),
+        partition_size_(0),
+        next_file_id_(0),
+        merging_(false),
+        merge_done_(false),
         merge_cnt_(0),
         mem_find_cnt_(0),
         disk_find_cnt_(0),
@@ -30,7 +49,24 @@ class HybridIndex : public BaseIndex<K, V> {
         max_memory_usage_(0),
         max_buffer_size_(0),
         memory_budget_(params.memory_budget_),
-        dynamic_budget_(0) {}
+        dynamic_budget_(0),
+        rewritten_cnt_(0) {
+    // GetAllData and DirectIOWrite move at most 500000 pages at a time
+    size_t page_bytes = s_params_.disk_params.page_bytes;
+    merge_buf_ = reinterpret_cast<K*>(aligned_alloc(
+        page_bytes, page_bytes * std::min(ALLOCATED_BUF_SIZE, 500000)));
+    if (merge_buf_ == nullptr) {
+      throw std::runtime_error("allocate the merge buffer error");
+    }
+    partitions_.push_back(NewPartition(std::numeric_limits<K>::min()));
+  }
+
+  ~HybridIndex() {
+    if (merge_thread_.joinable()) {
+      merge_thread_.join();
+    }
+    free(merge_buf_);
+  }
 
   typedef typename BaseIndex<K, V>::DataVec_ BaseVec;
   void Build(BaseVec& data) {
@@ -62,10 +98,26 @@ class HybridIndex : public BaseIndex<K, V> {
 #endif
 
     dynamic_index_.Build(dynamic_data);
-    static_index_.Build(static_data);
+    size_t num = std::max<size_t>(
+        1, std::min(partition_num_, static_data.size() / MIN_PARTITION_SIZE));
+    partition_size_ = (static_data.size() + num - 1) / num;
+    for (size_t i = 0; i < num; i++) {
+      auto first = static_data.begin() + i * partition_size_;
+      auto last = static_data.begin() +
+                  std::min((i + 1) * partition_size_, static_data.size());
+      BaseVec part(first, last);
+      if (i > 0) {
+        partitions_.push_back(NewPartition(part.front().first));
+      }
+      partitions_[i].index->Build(part);
+    }
+#ifdef PRINT_PROCESSING_INFO
+    std::cout << "#partitions of static_index_:" << partitions_.size()
+              << ",	background merge:" << background_merge_ << std::endl;
+#endif
 
     // get the remaining memory budget for the dynamic index
-    size_t static_memory = static_index_.GetNodeSize();
+    size_t static_memory = GetStaticNodeSize();
     std::cout << "memory_budget:" << PRINT_MIB(memory_budget_)
               << " MiB,\tstatic_memory:" << PRINT_MIB(static_memory) << " MiB"
               << std::endl;
@@ -93,42 +145,71 @@ class HybridIndex : public BaseIndex<K, V> {
   }
 
   V Find(const K key) {
+    PollMerge();
     // lookup in the dynamic index
     V res = dynamic_index_.Find(key);
     mem_find_cnt_++;
+    if (res == std::numeric_limits<V>::max() && merging_) {
+      // lookup in the records being merged
+      res = FindFrozen(key);
+    }
     if (res == std::numeric_limits<V>::max()) {
       // lookup in the static index
-      res = static_index_.Find(key);
+      res = GetPartition(key).Find(key);
       disk_find_cnt_++;
     }
     return res;
   }
 
+  // The static part of a scan starts in the partition of the key and goes on
+  // in the next partitions until it has taken range records.
   V Scan(const K key, const int range) {
+    PollMerge();
     V res = dynamic_index_.Scan(key, range);
     mem_find_cnt_++;
     disk_find_cnt_++;
+    if (merging_) {
+      V frozen = ScanFrozen(key, range);
+      if (res == std::numeric_limits<V>::max()) {
+        res = frozen;
+      } else if (frozen != std::numeric_limits<V>::max()) {
+        res += frozen;
+      }
+    }
     if (res == std::numeric_limits<V>::max()) {
-      res = static_index_.Scan(key, range);
+      res = ScanPartitions(key, range);
     } else {
-      res += static_index_.Scan(key, range);
+      res += ScanPartitions(key, range);
     }
     return res;
   }
 
   bool Insert(const K key, const V value) {
+    PollMerge();
     mem_insert_cnt_++;
     if (dynamic_index_.GetTotalSize() > dynamic_budget_) {
 #ifdef PRINT_PROCESSING_INFO
-      auto static_size = static_index_.size();
+      auto static_size = GetStaticSize();
       std::cout << "need to merge! dynamic_size:"
                 << dynamic_index_.GetTotalSize()
                 << ",\tstatic_size:" << static_size
                 << ",\tmax_buffer_size_:" << max_buffer_size_ << std::endl;
 #endif
+      if (merging_) {
+        // the previous merge is not over yet
+#ifdef BREAKDOWN
+        auto start = std::chrono::high_resolution_clock::now();
+#endif
+        FinishMerge();
+#ifdef BREAKDOWN
+        auto end = std::chrono::high_resolution_clock::now();
+        merge_stall_lat +=
+            std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
+                .count();
+#endif
+      }
       merge_cnt_++;
       Merge();
-      dynamic_budget_ = memory_budget_ - static_index_.GetNodeSize();
     }
 #ifdef BREAKDOWN
     auto start = std::chrono::high_resolution_clock::now();
@@ -152,6 +233,7 @@ class HybridIndex : public BaseIndex<K, V> {
   }
 
   bool Update(const K key, const V value) {
+    PollMerge();
     // update in the dynamic index
     bool success = dynamic_index_.Update(key, value);
     if (success) {
@@ -164,16 +246,25 @@ class HybridIndex : public BaseIndex<K, V> {
         dynamic_index_.Find(key);
       }
 #endif
+    } else if (merging_) {
+      // the frozen records and the partitions are being read by the merge,
+      // so the new value goes to the dynamic index, which is looked up first
+      disk_update_cnt_++;
+      success = FindFrozen(key) != std::numeric_limits<V>::max() ||
+                GetPartition(key).Find(key) != std::numeric_limits<V>::max();
+      if (success) {
+        dynamic_index_.Insert(key, value);
+      }
     } else {
       // update in the static index
-      success = static_index_.Update(key, value);
+      success = GetPartition(key).Update(key, value);
       disk_update_cnt_++;
 #ifdef CHECK_CORRECTION
-      V new_val = static_index_.Find(key);
+      V new_val = GetPartition(key).Find(key);
       if (new_val != value) {
         std::cout << "static update wrong! key:" << key << ",\tval:" << value
                   << ",\tnew_val:" << new_val << std::endl;
-        static_index_.Find(key);
+        GetPartition(key).Find(key);
       }
 #endif
     }
@@ -181,20 +272,27 @@ class HybridIndex : public BaseIndex<K, V> {
   }
 
   bool Delete(const K key) {
+    PollMerge();
     dynamic_index_.Delete(key);
     // static_index_.Delete(key);
     return true;
   }
 
   size_t GetCurrMemoryUsage() const {
-    return dynamic_index_.GetTotalSize() + static_index_.GetNodeSize();
+    return dynamic_index_.GetTotalSize() + GetStaticNodeSize() +
+           frozen_.size() * sizeof(std::pair<K, V>);
   }
   size_t GetNodeSize() const {
     // return dynamic_index_.GetTotalSize() + static_index_.GetNodeSize();
     return max_memory_usage_;
   }
   size_t GetTotalSize() const {
-    return dynamic_index_.GetTotalSize() + static_index_.GetTotalSize();
+    size_t static_size = 0;
+    for (auto& p : partitions_) {
+      static_size += p.index->GetTotalSize();
+    }
+    return dynamic_index_.GetTotalSize() + static_size +
+           frozen_.size() * sizeof(std::pair<K, V>);
   }
   void PrintEachPartSize() {
     max_memory_usage_ = std::max(max_memory_usage_, GetCurrMemoryUsage());
@@ -206,12 +304,17 @@ class HybridIndex : public BaseIndex<K, V> {
     std::cout << "-------------dynamic info-------------" << std::endl;
     dynamic_index_.PrintEachPartSize();
     std::cout << "-------------static info---------------" << std::endl;
-    static_index_.PrintEachPartSize();
+    std::cout << "\t\tpartitions:" << partitions_.size()
+              << ",\tmodel MiB:" << PRINT_MIB(GetStaticNodeSize())
+              << ",\ton-disk data num:" << GetStaticSize() << ",\ton-disk MiB:"
+              << PRINT_MIB(sizeof(std::pair<K, V>) * GetStaticSize())
+              << std::endl;
     std::cout << "-------------processing info-------------" << std::endl;
     std::cout << "\t\tmerge cnt:" << merge_cnt_
               << ",\tin-memory find cnt:" << mem_find_cnt_
               << ",\ton-disk find cnt:" << disk_find_cnt_
-              << ",\tin-memory insert:" << mem_insert_cnt_ << std::endl;
+              << ",\tin-memory insert:" << mem_insert_cnt_
+              << ",\trewritten partitions:" << rewritten_cnt_ << std::endl;
     std::cout << "-------------memory usage---------------" << std::endl;
     std::cout << "\tmemory_budget:" << PRINT_MIB(memory_budget_)
               << " MiB,\tdynamic_budget:" << PRINT_MIB(dynamic_budget_)
@@ -225,7 +328,7 @@ class HybridIndex : public BaseIndex<K, V> {
               << " MiB,\tmax_dynamic_data_node_usage:"
               << PRINT_MIB(max_dynamic_usage_ - max_dynamic_index_usage_)
               << " MiB,\tmax_static_usage_:"
-              << PRINT_MIB(static_index_.GetNodeSize())
+              << PRINT_MIB(GetStaticNodeSize())
               << " MiB,\tmax_memory_usage_:" << PRINT_MIB(max_memory_usage_)
               << " MiB" << std::endl;
     std::cout << "-------------print over---------------" << std::endl;
@@ -238,6 +341,12 @@ class HybridIndex : public BaseIndex<K, V> {
                 << dynamic_merge_lat / merge_cnt_ / 1e6 << " ms" << std::endl;
       std::cout << "static merge avg latency:"
                 << static_merge_lat / merge_cnt_ / 1e6 << " ms" << std::endl;
+      std::cout << "merge stall avg latency:"
+                << merge_stall_lat / merge_cnt_ / 1e6 << " ms" << std::endl;
+      std::cout << "merge install avg latency:"
+                << install_lat / merge_cnt_ / 1e6 << " ms" << std::endl;
+      std::cout << "rewritten partitions per merge:"
+                << rewritten_cnt_ * 1.0 / merge_cnt_ << std::endl;
       std::cout << "-------------print over---------------" << std::endl;
     }
 #endif
@@ -249,10 +358,91 @@ class HybridIndex : public BaseIndex<K, V> {
     return dynamic_index_.GetIndexParams();
   }
   typename StaticType::param_t GetStaticParams() const {
-    return static_index_.GetIndexParams();
+    return partitions_[0].index->GetIndexParams();
   }
 
  private:
+  struct Partition {
+    K lower;  // the first partition also takes the keys below
+    std::string filename;
+    std::unique_ptr<StaticType> index;
+  };
+
+  Partition NewPartition(K lower) {
+    typename StaticType::param_t params = s_params_;
+    params.disk_params.filename =
+        s_params_.disk_params.filename + "_p" + std::to_string(next_file_id_++);
+    Partition p{lower, params.disk_params.filename,
+                std::make_unique<StaticType>(params)};
+    p.index->SetMergeBuffer(merge_buf_);
+    return p;
+  }
+
+  size_t GetPartitionId(const K key) const {
+    auto it = std::upper_bound(
+        partitions_.begin() + 1, partitions_.end(), key,
+        [](const K& key, const Partition& p) { return key < p.lower; });
+    return it - partitions_.begin() - 1;
+  }
+
+  StaticType& GetPartition(const K key) {
+    return *partitions_[GetPartitionId(key)].index;
+  }
+
+  V ScanPartitions(const K key, const int range) {
+    size_t id = GetPartitionId(key);
+    StaticType& first = *partitions_[id].index;
+    V res = first.Scan(key, range);
+    // nothing follows a key that is not in the static part
+    uint64_t left =
+        first.GetScannedNum() > 0 ? range - first.GetScannedNum() : 0;
+    while (left > 0 && ++id < partitions_.size()) {
+      res += partitions_[id].index->ScanFirst(left);
+      left -= std::min<uint64_t>(left, partitions_[id].index->size());
+    }
+    return res;
+  }
+
+  size_t GetStaticNodeSize() const {
+    size_t size = 0;
+    for (auto& p : partitions_) {
+      size += p.index->GetNodeSize();
+    }
+    return size;
+  }
+
+  size_t GetStaticSize() const {
+    size_t size = 0;
+    for (auto& p : partitions_) {
+      size += p.index->size();
+    }
+    return size;
+  }
+
+  V FindFrozen(const K key) const {
+    auto it = std::lower_bound(
+        frozen_.begin(), frozen_.end(), key,
+        [](const std::pair<K, V>& r, const K& key) { return r.first < key; });
+    if (it == frozen_.end() || it->first != key) {
+      return std::numeric_limits<V>::max();
+    }
+    return it->second;
+  }
+
+  V ScanFrozen(const K key, const int range) const {
+    auto it = std::lower_bound(
+        frozen_.begin(), frozen_.end(), key,
+        [](const std::pair<K, V>& r, const K& key) { return r.first < key; });
+    if (it == frozen_.end() || it->first != key) {
+      return std::numeric_limits<V>::max();
+    }
+    V sum = it->second;
+    for (int i = 0; i < range && ++it != frozen_.end(); i++) {
+      sum += it->second;
+    }
+    return sum;
+  }
+
   void Merge() {
     max_memory_usage_ = std::max(max_memory_usage_, GetCurrMemoryUsage());
     max_dynamic_usage_ =
@@ -260,37 +450,177 @@ class HybridIndex : public BaseIndex<K, V> {
     max_dynamic_index_usage_ =
         std::max(max_dynamic_index_usage_, dynamic_index_.GetNodeSize());
     max_buffer_size_ = std::max(max_buffer_size_, dynamic_index_.size());
-    BaseVec dynamic_data;
 
 #ifdef BREAKDOWN
     auto start = std::chrono::high_resolution_clock::now();
 #endif
-    dynamic_index_.Merge(dynamic_data, INIT_SIZE);
+    dynamic_index_.Merge(frozen_, INIT_SIZE);
 #ifdef BREAKDOWN
     auto end = std::chrono::high_resolution_clock::now();
     dynamic_merge_lat +=
         std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
             .count();
-    start = std::chrono::high_resolution_clock::now();
 #endif
+    max_memory_usage_ = std::max(max_memory_usage_, GetCurrMemoryUsage());
+
+    merging_ = true;
+    if (background_merge_) {
+      merge_thread_ = std::thread([this] { MergePartitions(); });
+    } else {
+      MergePartitions();
+      FinishMerge();
+    }
+  }
 
-    static_index_.Build(dynamic_data);
+  // Runs on the merge thread: only reads frozen_ and partitions_, and
+  // leaves the new partitions in rebuilt_.
+  void MergePartitions() {
+#ifdef BREAKDOWN
+    auto start = std::chrono::high_resolution_clock::now();
+#endif
+    try {
+      auto it = frozen_.begin();
+      while (it != frozen_.end()) {
+        size_t id = GetPartitionId(it->first);
+        auto last = frozen_.end();
+        if (id + 1 < partitions_.size()) {
+          last = std::lower_bound(
+              it, frozen_.end(), partitions_[id + 1].lower,
+              [](const std::pair<K, V>& r, const K& key) {
+                return r.first < key;
+              });
+        }
+        BaseVec old_data, merged_data;
+        partitions_[id].index->GetAllRecords(old_data);
+        MergeRecords(old_data, it, last, merged_data);
+        BaseVec().swap(old_data);
+        rebuilt_.emplace_back(id, Rebuild(merged_data, partitions_[id].lower));
+        it = last;
+      }
+    } catch (...) {
+      merge_error_ = std::current_exception();
+    }
 #ifdef BREAKDOWN
-    end = std::chrono::high_resolution_clock::now();
+    auto end = std::chrono::high_resolution_clock::now();
     static_merge_lat +=
         std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
             .count();
+#endif
+    merge_done_.store(true, std::memory_order_release);
+  }
+
+  // old_data with the records in [first, last), which win on equal keys
+  static void MergeRecords(const BaseVec& old_data,
+                           typename BaseVec::const_iterator first,
+                           typename BaseVec::const_iterator last,
+                           BaseVec& merged_data) {
+    merged_data.resize(old_data.size() + (last - first));
+    size_t i = 0, cnt = 0;
+    while (i < old_data.size() && first != last) {
+      if (old_data[i].first < first->first) {
+        merged_data[cnt++] = old_data[i++];
+      } else {
+        if (old_data[i].first == first->first) {
+          i++;
+        }
+        merged_data[cnt++] = *first++;
+      }
+    }
+    while (i < old_data.size()) {
+      merged_data[cnt++] = old_data[i++];
+    }
+    while (first != last) {
+      merged_data[cnt++] = *first++;
+    }
+    merged_data.resize(cnt);
+  }
+
+  std::vector<Partition> Rebuild(BaseVec& data, K lower) {
+    size_t num = 1;
+    if (data.size() > 2 * partition_size_) {
+      num = (data.size() + partition_size_ - 1) / partition_size_;
+    }
+    std::vector<Partition> res;
+    size_t size = (data.size() + num - 1) / num;
+    for (size_t i = 0; i < num; i++) {
+      auto first = data.begin() + i * size;
+      auto last = data.begin() + std::min((i + 1) * size, data.size());
+      BaseVec part(first, last);
+      res.push_back(NewPartition(i == 0 ? lower : part.front().first));
+      res.back().index->Build(part);
+    }
+    return res;
+  }
+
+  void PollMerge() {
+    if (merging_ && merge_done_.load(std::memory_order_acquire)) {
+      FinishMerge();
+    }
+  }
+
+  // waits for the merge thread and swaps in the new partitions
+  void FinishMerge() {
+    if (merge_thread_.joinable()) {
+      merge_thread_.join();
+    }
+    if (merge_error_) {
+      std::rethrow_exception(merge_error_);
+    }
+#ifdef BREAKDOWN
+    auto start = std::chrono::high_resolution_clock::now();
+#endif
+    max_memory_usage_ = std::max(max_memory_usage_, GetCurrMemoryUsage());
+    // from the back, so that the ids of the earlier partitions stay valid
+    for (auto it = rebuilt_.rbegin(); it != rebuilt_.rend(); it++) {
+      auto pos = partitions_.begin() + it->first;
+      std::string old_file = pos->filename;
+      pos = partitions_.erase(pos);
+      partitions_.insert(pos, std::make_move_iterator(it->second.begin()),
+                         std::make_move_iterator(it->second.end()));
+      unlink(old_file.c_str());
+    }
+    rewritten_cnt_ += rebuilt_.size();
+    rebuilt_.clear();
+    BaseVec().swap(frozen_);
+    merging_ = false;
+    merge_done_.store(false, std::memory_order_relaxed);
+    dynamic_budget_ = memory_budget_ - GetStaticNodeSize();
+#ifdef BREAKDOWN
+    auto end = std::chrono::high_resolution_clock::now();
+    install_lat +=
+        std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
+            .count();
 #endif
   }
 
   std::string GetDynamicName() const { return dynamic_index_.GetIndexName(); }
-  std::string GetStaticName() const { return static_index_.GetIndexName(); }
+  std::string GetStaticName() const {
+    return partitions_[0].index->GetIndexName();
+  }
 
   DynamicType dynamic_index_;
-  StaticType static_index_;
+  typename StaticType::param_t s_params_;
+  std::vector<Partition> partitions_;
+  size_t partition_num_;
+  bool background_merge_;
+  size_t partition_size_;  // #records per partition after Build
+  size_t next_file_id_;
+  K* merge_buf_;
+
+  // the records of the dynamic index being merged, sorted
+  BaseVec frozen_;
+  std::thread merge_thread_;
+  bool merging_;
+  std::atomic<bool> merge_done_;
+  std::exception_ptr merge_error_;
+  // (partition id, its new partitions) of the running merge
+  std::vector<std::pair<size_t, std::vector<Partition>>> rebuilt_;
+
 #ifdef BREAKDOWN
   double dynamic_merge_lat = 0.0;
-  double static_merge_lat = 0.0;
+  double static_merge_lat = 0.0;  // on the merge thread
+  double merge_stall_lat = 0.0;
+  double install_lat = 0.0;
   double dynamic_insert_lat = 0.0;
 #endif
 
@@ -308,6 +638,7 @@ class HybridIndex : public BaseIndex<K, V> {
 
   size_t memory_budget_;
   size_t dynamic_budget_;
+  size_t rewritten_cnt_;
 };
 
 #endif  // !INDEXES_HYBRID_INDEX_H_
\ No newline at end of file
@@ -120,7 +120,7 @@ class StaticIndex {
     start = std::chrono::high_resolution_clock::now();
 #endif
     DirectIOWrite(fd, merged_data, record_per_page_ * sizeof(Record_),
-                  page_number_, read_buf_);
+                  page_number_, MergeBuffer());
 #ifdef BREAKDOWN
     end = std::chrono::high_resolution_clock::now();
     if (merge_cnt >= 0) {
@@ -162,6 +162,28 @@ class StaticIndex {
 
   inline V ScanData(const SearchRange& range, const K key, const int length) {
     ResultInfo<K, V> res = LowerBound(range, key, length);
+    scanned_num_ = 0;
+    if (res.fd == fd) {
+      // the key is found at record res.pid * record_per_page_ + res.idx
+      scanned_num_ = std::min<uint64_t>(
+          length, data_number_ - res.pid * record_per_page_ - res.idx);
+    }
+    return res.val;
+  }
+
+  // The number of records the last scan took (0 if its key is not found), so
+  // that a scan that reaches the last record can go on in the next index.
+  inline uint64_t GetScannedNum() const { return scanned_num_; }
+
+  // Scans the first length records, as a scan that started before them would.
+  inline V ScanFirst(uint64_t length) {
+    length = std::min(length, data_number_);
+    if (length == 0) {
+      return 0;
+    }
+    ResultInfo<K, V> res =
+        RangeScan<K, V>(fd, 0, (length - 1) / record_per_page_ + 1,
+                        record_per_page_, length, read_buf_);
     return res.val;
   }
 
@@ -182,6 +204,20 @@ class StaticIndex {
 
   inline size_t size() const { return data_number_; }
 
+  // The bulk reads/writes of MergeData and GetAllRecords go through read_buf_
+  // unless another buffer of the same size is given, e.g. when a merge runs
+  // on a background thread while lookups keep using read_buf_.
+  inline void SetMergeBuffer(K* buf) { merge_buf_ = buf; }
+
+  // all the records on disk, in key order
+  inline void GetAllRecords(DataVec_& data) const {
+    data.resize(size());
+    if (size() > 0) {
+      GetAllData<K, V>(fd, 0, page_number_, record_per_page_, data_number_,
+                       MergeBuffer(), data);
+    }
+  }
+
   virtual size_t GetStaticInitSize(DataVec_& data) const = 0;
 
   virtual size_t GetNodeSize() const = 0;
@@ -193,14 +229,19 @@ class StaticIndex {
   inline void GetDataVector(DataVec_& data) const {
     if (size() > 0) {
       GetAllData<K, V>(fd, 0, page_number_, record_per_page_, data_number_,
-                       read_buf_, data);
+                       MergeBuffer(), data);
     } else {
       std::cout << "GetDataVector: no data" << std::endl;
     }
   }
 
+  inline K* MergeBuffer() const {
+    return merge_buf_ != nullptr ? merge_buf_ : read_buf_;
+  }
+
  private:
   std::string name_ = "DISK_STATIC_BASE";
+  K* merge_buf_ = nullptr;
 #ifdef CHECK_CORRECTION
   DataVec_ data_;
 #endif
@@ -219,6 +260,7 @@ class StaticIndex {
 #endif
 
   uint64_t data_number_;
+  uint64_t scanned_num_ = 0;
   int page_number_;
   int last_page_id_;
 };
@@ -6,6 +6,7 @@
 #include <vector>
 
 #include "../experiments/util.h"
+#include "./snapshot.h"
 
 template <typename K, typename V>
 class BaseIndex {
@@ -24,6 +25,15 @@ class BaseIndex {
 
   virtual SearchRange Lookup(const K lookup_key) const = 0;
 
+  // Predict the search ranges of n keys at once: out[i] is the range of
+  // lookup_keys[i]. Indexes override it to overlap the cache misses of
+  // different keys; the default one simply calls Lookup for each key.
+  virtual void LookupBatch(const K* lookup_keys, size_t n, SearchRange* out) {
+    for (size_t i = 0; i < n; i++) {
+      out[i] = Lookup(lookup_keys[i]);
+    }
+  }
+
   virtual size_t GetIndexParams() const { return 0; }
 
   virtual std::string GetIndexName() const { return name_; }
@@ -34,6 +44,17 @@ class BaseIndex {
 
   virtual size_t GetModelNum() const = 0;
 
+  // Identifies a built index in the --index-cache directory, so it must tell
+  // apart all the parameters the built index depends on. It is called before
+  // Build.
+  virtual std::string GetSnapshotName() const { return GetIndexName(); }
+
+  // Write the built index to / restore it from a snapshot (see snapshot.h).
+  // Indexes without snapshots return false, and are always built.
+  virtual bool Save(SnapshotWriter*) const { return false; }
+
+  virtual bool Load(SnapshotReader*) { return false; }
+
  private:
   std::string name_ = "Basic Index";
   size_t disk_size_ = 0;
@@ -1,6 +1,7 @@
 #ifndef INDEXES_LECO_PAGE_H_
 #define INDEXES_LECO_PAGE_H_
 
+#include <memory>
 #include <string>
 #include <utility>
 #include <vector>
@@ -77,7 +78,11 @@ class LecoPage : public BaseIndex<K, V> {
         block_length = point_num_ - (block_num_ - 1) * block_width_;
       }
 
-      uint8_t* descriptor = (uint8_t*)malloc(block_length * sizeof(K) * 4);
+      // the bit width, the gap and the two doubles of the model precede the
+      // deltas
+      uint8_t* descriptor = (uint8_t*)malloc(block_length * sizeof(K) * 4 +
+                                             sizeof(uint8_t) + sizeof(K) +
+                                             sizeof(double) * 2);
       uint8_t* res = descriptor;
       res = codec_.encodeArray8_int(lower_bounds.data() + (i * block_width_),
                                     upper_bounds.data() + (i * block_width_),
@@ -86,6 +91,7 @@ class LecoPage : public BaseIndex<K, V> {
       uint32_t segment_size = res - descriptor;
       descriptor = (uint8_t*)realloc(descriptor, segment_size);
       block_start_vec_.push_back(descriptor);
+      block_bytes_.push_back(segment_size);
       memory_size_ += segment_size;
     }
 
@@ -135,14 +141,35 @@ class LecoPage : public BaseIndex<K, V> {
   SearchRange Lookup(const K lookup_key) const {};
 
   SearchRange Lookup(const K lookup_key) {
-    size_t pos = LecoBinarySearch(lookup_key);
-    size_t start = pos * (fixed_pages_ + slide_pages_);
-    if (pos >= slide_pages_) {
-      start -= slide_pages_;
+    return PosToRange(LecoBinarySearch(lookup_key));
+  }
+
+  // The binary searches of a group of keys run in lockstep (every search over
+  // [0, point_num_) takes the same number of steps), so the descriptors probed
+  // by the next step of all of them can be prefetched together.
+  void LookupBatch(const K* lookup_keys, size_t n, SearchRange* out) override {
+    constexpr size_t kGroup = 16;
+    uint64_t base[kGroup];
+    for (size_t b = 0; b < n; b += kGroup) {
+      const size_t m = std::min(kGroup, n - b);
+      std::fill(base, base + m, 0);
+      for (uint64_t len = point_num_; len > 1; len -= len / 2) {
+        const uint64_t half = len / 2;
+        for (size_t j = 0; j < m; j++) {
+          __builtin_prefetch(block_start_vec_[(base[j] + half) / block_width_]);
+        }
+        for (size_t j = 0; j < m; j++) {
+          if (GetLowerBound(base[j] + half) < lookup_keys[b + j]) {
+            base[j] += half;
+          }
+        }
+      }
+      for (size_t j = 0; j < m; j++) {
+        const uint64_t pos =
+            base[j] + (GetLowerBound(base[j]) < lookup_keys[b + j]);
+        out[b + j] = PosToRange(pos);
+      }
     }
-    size_t end = start + fixed_pages_ + 2 * slide_pages_;
-    return {start * record_per_page_,
-            std::min(max_y_ + 1, end * record_per_page_)};
   }
 
   size_t GetIndexParams() const override {
@@ -162,14 +189,59 @@ class LecoPage : public BaseIndex<K, V> {
     return GetInMemorySize() + disk_size_;
   }
 
+  // block_num_ is still the requested one before Build.
+  std::string GetSnapshotName() const override {
+    return "LecoPage_" + std::to_string(record_per_page_) + "_" +
+           std::to_string(fixed_pages_) + "_" + std::to_string(slide_pages_) +
+           "_" + std::to_string(block_num_);
+  }
+
+  bool Save(SnapshotWriter* out) const override {
+    out->Put<uint64_t>(max_y_);
+    out->Put<uint64_t>(point_num_);
+    out->Put<uint64_t>(block_num_);
+    out->Put<int64_t>(block_width_);
+    out->Put<uint64_t>(memory_size_);
+    out->Put<uint64_t>(disk_size_);
+    out->PutBlocks(block_start_vec_, block_bytes_);
+    return true;
+  }
+
+  // The blocks are self-contained, so they are decoded in the mapping.
+  bool Load(SnapshotReader* in) override {
+    max_y_ = in->Get<uint64_t>();
+    point_num_ = in->Get<uint64_t>();
+    block_num_ = in->Get<uint64_t>();
+    block_width_ = in->Get<int64_t>();
+    memory_size_ = in->Get<uint64_t>();
+    disk_size_ = in->Get<uint64_t>();
+    in->GetBlocks(&block_start_vec_, &block_bytes_);
+    snapshot_ = in->GetMapping();
+    codec_.init(block_num_, block_width_);
+    return true;
+  }
+
  private:
+  inline SearchRange PosToRange(size_t pos) const {
+    size_t start = pos * (fixed_pages_ + slide_pages_);
+    if (pos >= slide_pages_) {
+      start -= slide_pages_;
+    }
+    size_t end = start + fixed_pages_ + 2 * slide_pages_;
+    return {start * record_per_page_,
+            std::min(max_y_ + 1, end * record_per_page_)};
+  }
+
+  inline K GetLowerBound(uint64_t i) {
+    return codec_.randomdecodeArray8Page(block_start_vec_[i / block_width_],
+                                         i % block_width_, NULL, point_num_);
+  }
+
   size_t LecoBinarySearch(K key) {
     uint64_t s = 0, e = point_num_;
     while (s < e) {
       uint64_t mid = (s + e) >> 1;
-      K data_mid =
-          codec_.randomdecodeArray8Page(block_start_vec_[mid / block_width_],
-                                        mid % block_width_, NULL, point_num_);
+      K data_mid = GetLowerBound(mid);
       if (data_mid < key)
         s = mid + 1;
       else
@@ -181,6 +253,8 @@ class LecoPage : public BaseIndex<K, V> {
  private:
   Leco_int<K> codec_;
   std::vector<uint8_t*> block_start_vec_;
+  std::vector<uint32_t> block_bytes_;
+  std::shared_ptr<const char> snapshot_;  // holds the loaded blocks
 
   int block_width_;
   size_t point_num_;
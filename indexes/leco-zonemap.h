@@ -78,6 +78,14 @@ class LecoZonemap : public BaseIndex<K, V> {
             (pos + 1) * record_per_page_ * tolerance_};
   }
 
+  // Lookup is non-const here, so the default LookupBatch (which calls the
+  // const one) cannot be used.
+  void LookupBatch(const K* lookup_keys, size_t n, SearchRange* out) override {
+    for (size_t i = 0; i < n; i++) {
+      out[i] = Lookup(lookup_keys[i]);
+    }
+  }
+
   size_t GetIndexParams() const override {
     return record_per_page_ * tolerance_;
   }
@@ -9,6 +9,7 @@
 #include <utility>
 #include <vector>
 
+#include "../../../ycsb_utils/structures.h"
 #include "./btree/BTreeOLC.h"
 #include "./dynamic_base.h"
 
@@ -49,8 +50,19 @@ class MultiThreadedBTreeIndex : public DynamicIndex<K, V> {
   }
 
   V Scan(const K key, const int range) {
-    // TODO: scan
-    return 0;
+    DataVev_ records(range);
+    const size_t cnt = ScanRecords(key, range, records.data());
+    V res = 0;
+    for (size_t i = 0; i < cnt; i++) {
+      res += records[i].second;
+    }
+    return res;
+  }
+
+  // Copies up to range records from the lower bound of key on, tombstones
+  // included; returns how many there were.
+  size_t ScanRecords(const K key, const int range, Record_* records) {
+    return btree_.scanRecords(key, range, records);
   }
 
   bool Insert(const K key, const V value) {
@@ -58,15 +70,13 @@ class MultiThreadedBTreeIndex : public DynamicIndex<K, V> {
     return true;
   }
 
+  // Upserts value; returns whether key was already in the tree.
   bool Update(const K key, const V value) {
-    // TODO: update
-    return false;
+    return !btree_.insert(key, value);
   }
 
-  bool Delete(const K key) {
-    // TODO: delete
-    return false;
-  }
+  // Leaves a tombstone for key, which a merge drops along with the record.
+  bool Delete(const K key) { return !btree_.insert(key, kTombstone<V>); }
 
   void Merge(DataVev_& merged_data) {
     merged_data.resize(btree_.size());
@@ -6,6 +6,7 @@
 #include <atomic>
 #include <cassert>
 #include <cstring>
+#include <utility>
 
 namespace btreeolc {
 
@@ -120,14 +121,15 @@ struct BTreeLeaf : public BTreeLeafBase {
     return (*base < k) + base - keys;
   }
 
-  void insert(Key k, Payload p) {
+  // Returns false if k was already there and only its payload is replaced.
+  bool insert(Key k, Payload p) {
     assert(count < maxEntries);
     if (count) {
       unsigned pos = lowerBound(k);
       if ((pos < count) && (keys[pos] == k)) {
         // Upsert
         payloads[pos] = p;
-        return;
+        return false;
       }
       memmove(keys + pos + 1, keys + pos, sizeof(Key) * (count - pos));
       memmove(payloads + pos + 1, payloads + pos,
@@ -139,6 +141,7 @@ struct BTreeLeaf : public BTreeLeafBase {
       payloads[0] = p;
     }
     count++;
+    return true;
   }
 
   BTreeLeaf* split(Key& sep) {
@@ -295,7 +298,8 @@ struct BTree {
       _mm_pause();
   }
 
-  void insert(Key k, Value v) {
+  // Returns false if k was already in the tree and only its value is replaced.
+  bool insert(Key k, Value v) {
     int restartCount = 0;
   restart:
     if (restartCount++) yield(restartCount);
@@ -406,10 +410,12 @@ struct BTree {
           goto restart;
         }
       }
-      leaf->insert(k, v);
-      item_count.fetch_add(1, std::memory_order_relaxed);
+      const bool inserted = leaf->insert(k, v);
+      if (inserted) {
+        item_count.fetch_add(1, std::memory_order_relaxed);
+      }
       node->writeUnlock();
-      return;  // success
+      return inserted;  // success
     }
   }
 
@@ -523,6 +529,67 @@ struct BTree {
 
     return count;
   }
+
+  // Like scan(), but copies the keys too and follows the leaf chain until
+  // range records are found; each leaf is validated before moving on.
+  uint64_t scanRecords(Key k, int range, std::pair<Key, Value>* output) {
+    int restartCount = 0;
+  restart:
+    if (restartCount++) yield(restartCount);
+    bool needRestart = false;
+
+    NodeBase* node = root;
+    uint64_t versionNode = node->readLockOrRestart(needRestart);
+    if (needRestart || (node != root)) goto restart;
+
+    // Parent of current node
+    BTreeInner<Key>* parent = nullptr;
+    uint64_t versionParent;
+
+    while (node->type == PageType::BTreeInner) {
+      auto inner = static_cast<BTreeInner<Key>*>(node);
+
+      if (parent) {
+        parent->readUnlockOrRestart(versionParent, needRestart);
+        if (needRestart) goto restart;
+      }
+
+      parent = inner;
+      versionParent = versionNode;
+
+      node = inner->children[inner->lowerBound(k)];
+      inner->checkOrRestart(versionNode, needRestart);
+      if (needRestart) goto restart;
+      versionNode = node->readLockOrRestart(needRestart);
+      if (needRestart) goto restart;
+    }
+    if (parent) {
+      parent->readUnlockOrRestart(versionParent, needRestart);
+      if (needRestart) goto restart;
+    }
+
+    BTreeLeaf<Key, Value>* leaf = static_cast<BTreeLeaf<Key, Value>*>(node);
+    unsigned pos = leaf->lowerBound(k);
+    int count = 0;
+    while (true) {
+      for (unsigned i = pos; i < leaf->count && count < range; i++) {
+        output[count++] = {leaf->keys[i], leaf->payloads[i]};
+      }
+      BTreeLeaf<Key, Value>* next = leaf->next_leaf;
+      node->readUnlockOrRestart(versionNode, needRestart);
+      if (needRestart) goto restart;
+      if (count == range || next == nullptr) {
+        break;
+      }
+      leaf = next;
+      node = next;
+      versionNode = node->readLockOrRestart(needRestart);
+      if (needRestart) goto restart;
+      pos = 0;
+    }
+
+    return count;
+  }
 };
 
 }  // namespace btreeolc
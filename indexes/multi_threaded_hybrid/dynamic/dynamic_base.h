@@ -10,6 +10,7 @@ template <typename K, typename V>
 class DynamicIndex {
  public:
   DynamicIndex() {}
+  virtual ~DynamicIndex() {}
 
   typedef K K_;
   typedef V V_;
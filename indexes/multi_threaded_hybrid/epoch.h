@@ -0,0 +1,79 @@
+#ifndef INDEXES_MULTI_THREADED_HYBRID_EPOCH_H_
+#define INDEXES_MULTI_THREADED_HYBRID_EPOCH_H_
+
+#include <stdint.h>
+
+#include <atomic>
+#include <chrono>
+#include <limits>
+#include <thread>
+#include <vector>
+
+/**
+ * @brief Epoch-based reclamation for the versions of MultiThreadedHybridIndex.
+ * Every operation of a worker thread runs between Enter() and Exit(), which
+ * announce the global epoch it started in. A writer that has unlinked an
+ * object (by publishing a new version) calls Synchronize(): it advances the
+ * epoch and waits until no thread is still in an earlier one, after which no
+ * thread can hold the old object. Only the writer waits; the workers never do.
+ */
+class EpochManager {
+ public:
+  explicit EpochManager(size_t thread_num) : slots_(thread_num) {}
+
+  EpochManager(const EpochManager&) = delete;
+  EpochManager& operator=(const EpochManager&) = delete;
+
+  inline void Enter(int thread_id) {
+    slots_[thread_id].epoch.store(global_epoch_.load());
+  }
+
+  inline void Exit(int thread_id) {
+    slots_[thread_id].epoch.store(kIdle, std::memory_order_release);
+  }
+
+  // Waits for the operations that may still see what was unlinked before.
+  void Synchronize() {
+    const uint64_t epoch = global_epoch_.fetch_add(1) + 1;
+    for (const Slot& slot : slots_) {
+      int cnt = 0;
+      while (slot.epoch.load() < epoch) {
+        if (cnt++ < 64) {
+          std::this_thread::yield();
+        } else {
+          std::this_thread::sleep_for(std::chrono::microseconds(1));
+        }
+      }
+    }
+  }
+
+ private:
+  static constexpr uint64_t kIdle = std::numeric_limits<uint64_t>::max();
+
+  // one per worker thread, each on its own cache line
+  struct alignas(64) Slot {
+    std::atomic<uint64_t> epoch{kIdle};
+  };
+
+  std::vector<Slot> slots_;
+  std::atomic<uint64_t> global_epoch_{0};
+};
+
+// Enter() and Exit() of one operation.
+class EpochGuard {
+ public:
+  EpochGuard(EpochManager* epochs, int thread_id)
+      : epochs_(epochs), thread_id_(thread_id) {
+    epochs_->Enter(thread_id_);
+  }
+  ~EpochGuard() { epochs_->Exit(thread_id_); }
+
+  EpochGuard(const EpochGuard&) = delete;
+  EpochGuard& operator=(const EpochGuard&) = delete;
+
+ private:
+  EpochManager* epochs_;
+  int thread_id_;
+};
+
+#endif  // INDEXES_MULTI_THREADED_HYBRID_EPOCH_H_
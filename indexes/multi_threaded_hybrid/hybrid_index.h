@@ -4,13 +4,24 @@
 #include <assert.h>
 
 #include <atomic>
+#include <exception>
 #include <thread>
 
 #include "../base_index.h"
+#include "./epoch.h"
 
 #define INIT_SIZE 100
-enum ModeType { NormalMode, PrepareToMerge, MergingMode, MergedMode };
 
+/**
+ * @brief The dynamic index takes the inserts; once its memory reaches the
+ * merge ratio, a background merge thread freezes it behind a new, empty one,
+ * merges its records into a new static index built off to the side (its own
+ * data file version, read and written with a file slot of its own), and
+ * publishes it with one pointer swap. Every operation works on the Version it
+ * loads at its start, protected by an epoch (see epoch.h), so the workers
+ * never wait for a merge: only the merge thread waits for the operations that
+ * may still use what it replaced before freeing it.
+ */
 template <typename K, typename V, typename DynamicType, typename StaticType>
 class MultiThreadedHybridIndex : public MultiThreadedBaseIndex<K, V> {
  public:
@@ -22,40 +33,29 @@ class MultiThreadedHybridIndex : public MultiThreadedBaseIndex<K, V> {
 
   MultiThreadedHybridIndex(param_t params)
       : index_params_(params),
+        epochs_(params.s_params_.disk_params.thread_numbers),
+        merge_thread_id_(params.s_params_.disk_params.thread_numbers),
         merge_cnt_(0),
-        mem_find_cnt_(0),
-        disk_find_cnt_(0),
-        mem_update_cnt_(0),
-        disk_update_cnt_(0),
-        mem_insert_cnt_(0),
         max_dynamic_usage_(0),
         max_dynamic_index_usage_(0),
         max_memory_usage_(0),
         max_buffer_size_(0),
-        merge_ratio_(params.merge_ratio_) {
-    merging_dynamic_index_ = NULL;
-    dynamic_index_ = new DynamicType(params.d_params_);
-    static_index_ = new StaticType(params.s_params_);
-    backup_static_index_ = NULL;
-    mode_.store(NormalMode);
-    threads_free_status_ = std::vector<std::atomic<int>>(
-        params.s_params_.disk_params.thread_numbers);
-    for (size_t i = 0; i < threads_free_status_.size(); i++) {
-      threads_free_status_[i].store(0);
-    }
-#ifdef BREAKDOWN
-    assign_to_merge_lat = std::vector<double>(threads_free_status_.size(), 0);
-    update_version_lat = std::vector<double>(threads_free_status_.size(), 0);
-    wait_to_normal_lat = std::vector<double>(threads_free_status_.size(), 0);
-    update_all_version_lat =
-        std::vector<double>(threads_free_status_.size(), 0);
-    merge_lat = std::vector<double>(threads_free_status_.size(), 0);
-    merge_cnt = std::vector<double>(threads_free_status_.size(), 0);
-    merged_wait_lat = std::vector<double>(threads_free_status_.size(), 0);
-    merging_wait_lat = std::vector<double>(threads_free_status_.size(), 0);
-    prepare_wait_lat = std::vector<double>(threads_free_status_.size(), 0);
-    normal_wait_lat = std::vector<double>(threads_free_status_.size(), 0);
-#endif
+        merge_ratio_(params.merge_ratio_),
+        op_stats_(params.s_params_.disk_params.thread_numbers),
+        scan_stats_(params.s_params_.disk_params.thread_numbers) {
+    // one more file slot in the static indexes, for the merge thread
+    index_params_.s_params_.disk_params.thread_numbers++;
+    version_.store(new Version{new DynamicType(params.d_params_), nullptr,
+                               new StaticType(index_params_.s_params_)});
+  }
+
+  ~MultiThreadedHybridIndex() {
+    JoinMergeThread();
+    Version* v = version_.load();
+    delete v->dynamic;
+    delete v->frozen;
+    delete v->sta;
+    delete v;
   }
 
   typedef typename MultiThreadedBaseIndex<K, V>::DataVec_ BaseVec;
@@ -88,10 +88,11 @@ class MultiThreadedHybridIndex : public MultiThreadedBaseIndex<K, V> {
               << std::endl;
 #endif
 
-    DynamicType* dy = dynamic_index_.load();
+    const Version* v = version_.load();
+    DynamicType* dy = v->dynamic;
     dy->Build(dynamic_data);
 
-    StaticType* sta = static_index_.load();
+    StaticType* sta = v->sta;
     sta->Build(static_data, 0);
 
     // get the remaining memory budget for the dynamic index
@@ -105,9 +106,10 @@ class MultiThreadedHybridIndex : public MultiThreadedBaseIndex<K, V> {
       throw std::runtime_error("Need smaller merge ratio!");
     }
 
-    max_memory_usage_ = GetCurrMemoryUsage();
-    max_dynamic_usage_ = dy->GetTotalSize();
-    max_dynamic_index_usage_ = dy->GetNodeSize();
+    max_memory_usage_.store(GetCurrMemoryUsage(), std::memory_order_relaxed);
+    max_dynamic_usage_.store(dy->GetTotalSize(), std::memory_order_relaxed);
+    max_dynamic_index_usage_.store(dy->GetNodeSize(),
+                                   std::memory_order_relaxed);
 #ifdef CHECK_CORRECTION
     for (size_t i = 0; i < dynamic_cnt; i++) {
       auto res = dy->Find(dynamic_data[i].first);
@@ -122,342 +124,184 @@ class MultiThreadedHybridIndex : public MultiThreadedBaseIndex<K, V> {
   }
 
   V Find(const K key, int thread_id) {
-    threads_free_status_[thread_id].fetch_add(1);
-    V res = std::numeric_limits<V>::max();
-    switch (mode_.load()) {
-      case NormalMode:
-        break;
-      case PrepareToMerge:
-        break;
-      case MergingMode:
-        AssignedToMerge(thread_id);
-        break;
-      case MergedMode:
-        UpdateVersion(thread_id);
-        break;
-      default:
-        break;
-    }
-
-    // lookup in the dynamic index
-    DynamicType* dy = dynamic_index_.load();
-    res = dy->Find(key);
-    mem_find_cnt_++;
-
-    // lookup in the merging index when the mode is merging/merged mode
-    if (res == std::numeric_limits<V>::max()) {
-      switch (mode_.load()) {
-        case NormalMode:
-          break;
-        case PrepareToMerge:
-          break;
-        case MergingMode: {
-          DynamicType* merge_dy = merging_dynamic_index_.load();
-          if (merge_dy != NULL) {
-            ready_to_normal_.store(false);
-            ops_on_merge_dynamic_.fetch_add(1);
-            res = merge_dy->Find(key);
-            UpdateReadyNormalStatus();
-          }
-          break;
-        }
-        case MergedMode: {
-          if (ready_to_normal_.load()) {
-            break;
-          }
-          ready_to_normal_.store(false);
-          ops_on_merge_dynamic_.fetch_add(1);
-          DynamicType* merge_dy = merging_dynamic_index_.load();
-          res = merge_dy->Find(key);
-          UpdateReadyNormalStatus();
-          break;
-        }
-        default:
-          break;
-      }
+    EpochGuard guard(&epochs_, thread_id);
+    const Version* v = version_.load();
+
+    // lookup in the dynamic index, then in the one being merged, if any
+    V res = v->dynamic->Find(key);
+    OpStats& stats = op_stats_[thread_id];
+    stats.mem_find_cnt++;
+    if (res == std::numeric_limits<V>::max() && v->frozen != nullptr) {
+      res = v->frozen->Find(key);
     }
 
     // lookup on static index (on disk)
     if (res == std::numeric_limits<V>::max()) {
-      switch (mode_.load()) {
-          // normal and merging modes lookup in the static index
-        case NormalMode:
-        case PrepareToMerge:
-        case MergingMode: {
-          StaticType* sta = static_index_.load();
-          res = sta->Find(key, thread_id);
-          break;
-        }
-          // merged mode lookup in the backup static index
-        case MergedMode: {
-          auto backup_static = backup_static_index_.load();
-          bool find_in_static = true;
-          if (backup_static && backup_static->GetUpdatedStatus()) {
-            UpdateVersion(thread_id);
-            find_in_static = false;
-          }
-          backup_static = backup_static_index_.load();
-          if (backup_static == NULL || find_in_static) {
-            StaticType* sta = static_index_.load();
-            res = sta->Find(key, thread_id);
-          } else {
-            res = backup_static->Find(key, thread_id);
-          }
-          break;
-        }
-        default:
-          break;
-      }
-      disk_find_cnt_++;
+      res = v->sta->Find(key, thread_id);
+      stats.disk_find_cnt++;
     }
-    threads_free_status_[thread_id].fetch_sub(1);
-    return res;
-  }
-
-  V Scan(const K key, const int range, int thread_id) {
-    // TODO: update the content
-    DynamicType* dy = dynamic_index_.load();
-    V res = dy->Scan(key, range);
-    mem_find_cnt_++;
-    disk_find_cnt_++;
-    UpdateVersion(thread_id);
-    StaticType* sta = static_index_.load();
-    if (res == std::numeric_limits<V>::max()) {
-      res = sta->Scan(key, range, thread_id);
-    } else {
-      res += sta->Scan(key, range, thread_id);
+    if (res == kTombstone<V>) {
+      return std::numeric_limits<V>::max();
     }
     return res;
   }
 
-  bool Insert(const K key, const V value, int thread_id) {
-    threads_free_status_[thread_id].fetch_add(1);
-    bool res = false;
-    DynamicType* dy = dynamic_index_.load();
-    switch (mode_.load()) {
-      case NormalMode: {
-        size_t curr_disk = GetTotalSize();
-        size_t curr_memory = GetCurrMemoryUsage();
-        if ((curr_disk - curr_memory) * 1.0 / curr_memory <= merge_ratio_) {
-          ModeType mode = NormalMode;
-          if (!mode_.compare_exchange_strong(mode, PrepareToMerge)) {
-            break;
-          }
-
-#ifdef PRINT_MULTI_THREAD_INFO
-          std::cout << "insert key " << key << " wait for merge!" << std::endl;
-#endif
-#ifdef BREAKDOWN
-          auto start = std::chrono::high_resolution_clock::now();
-#endif
-          int cnt = 0;
-          while (ready_to_merge_.load() == false) {
-            auto timeout = yield(cnt++);
-            if (timeout) {
-              break;
-            }
-          }
-#ifdef BREAKDOWN
-          auto end = std::chrono::high_resolution_clock::now();
-          normal_wait_lat[thread_id] +=
-              std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
-                  .count();
-#endif
-
-#ifdef PRINT_MULTI_THREAD_INFO
-          StaticType* sta = static_index_.load();
-          auto static_size = sta->size();
-          std::cout << "insert key " << key
-                    << " need to merge! dynamic_size:" << dy->size()
-                    << ",\tstatic_size:" << static_size
-                    << ",\tmax_buffer_size_:" << max_buffer_size_
-                    << ",\ttotal size:" << PRINT_MIB(curr_disk)
-                    << ",\tmemory usage:" << PRINT_MIB(curr_memory)
-                    << std::endl;
-#endif
-          mode = PrepareToMerge;
-
-          if (mode_.compare_exchange_strong(mode, MergingMode)) {
-            dy = dynamic_index_.load();
-            max_memory_usage_ = std::max(max_memory_usage_, curr_memory);
-            max_dynamic_usage_ =
-                std::max(max_dynamic_usage_, dy->GetTotalSize());
-            max_dynamic_index_usage_ =
-                std::max(max_dynamic_index_usage_, dy->GetNodeSize());
-            max_buffer_size_ = std::max(max_buffer_size_, dy->size());
-            DynamicType* dynamic_null = NULL;
-            merging_dynamic_index_.compare_exchange_strong(
-                dynamic_null, dynamic_index_.load());
-            dy = new DynamicType(index_params_.d_params_);
-            dynamic_index_.store(dy);
-#ifdef PRINT_MULTI_THREAD_INFO
-            std::cout << "thread " << thread_id << ",\t call merge!"
-                      << std::endl;
-#endif
-            merge_cnt_++;
-            Merge(thread_id);
-          }
-#ifdef PRINT_MULTI_THREAD_INFO
-          else {
-            std::cout << "the dynamic index is under merging " << std::endl;
-          }
-#endif
-        }
+  // Merges the records from key on of the dynamic, frozen and static indexes
+  // as three ordered streams: for a key in several, the newest wins, and the
+  // tombstones are skipped. Returns the sum of the values of the first range
+  // records.
+  V Scan(const K key, const int range, int thread_id) {
+    EpochGuard guard(&epochs_, thread_id);
+    const Version* v = version_.load();
+    DynamicCursor dy(v->dynamic, key, range);
+    DynamicCursor frozen(v->frozen, key, range);
+    auto sta = v->sta->GetScanIterator(key, range, thread_id);
+
+    V res = 0;
+    int cnt = 0;
+    while (cnt < range) {
+      const bool dy_valid = dy.Valid(), frozen_valid = frozen.Valid();
+      const bool sta_valid = sta.Valid();
+      if (!dy_valid && !frozen_valid && !sta_valid) {
         break;
       }
-      case PrepareToMerge: {
-#ifdef BREAKDOWN
-        auto start = std::chrono::high_resolution_clock::now();
-#endif
-        int cnt = 0;
-        while (mode_.load() == PrepareToMerge) {
-          auto timeout = yield(cnt++);
-          if (timeout) {
-            break;
-          }
-        }
-#ifdef BREAKDOWN
-        auto end = std::chrono::high_resolution_clock::now();
-        prepare_wait_lat[thread_id] +=
-            std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
-                .count();
-#endif
-        break;
+      K min_key = std::numeric_limits<K>::max();
+      if (dy_valid) {
+        min_key = std::min(min_key, dy.Get().first);
       }
-      case MergingMode: {
-        AssignedToMerge(thread_id);
-        size_t curr_disk = GetTotalSize();
-        size_t curr_memory = GetCurrMemoryUsage();
-#ifdef BREAKDOWN
-        auto start = std::chrono::high_resolution_clock::now();
-#endif
-        int cnt = 0;
-        while (mode_.load() == MergingMode &&
-               (curr_disk - curr_memory) * 1.0 / curr_memory <= merge_ratio_) {
-          auto timeout = yield(cnt++);
-          if (timeout) {
-            break;
-          }
-          curr_disk = GetTotalSize();
-          curr_memory = GetCurrMemoryUsage();
-          AssignedToMerge(thread_id);
-        }
-#ifdef BREAKDOWN
-        auto end = std::chrono::high_resolution_clock::now();
-        merging_wait_lat[thread_id] +=
-            std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
-                .count();
-#endif
-        break;
+      if (frozen_valid) {
+        min_key = std::min(min_key, frozen.Get().first);
       }
-      case MergedMode: {
-        UpdateVersion(thread_id);
-        size_t curr_disk = GetTotalSize();
-        size_t curr_memory = GetCurrMemoryUsage();
-#ifdef BREAKDOWN
-        auto start = std::chrono::high_resolution_clock::now();
-#endif
-        int cnt = 0;
-        while (mode_.load() == MergedMode &&
-               (curr_disk - curr_memory) * 1.0 / curr_memory <= merge_ratio_) {
-          auto timeout = yield(cnt++);
-          if (timeout) {
-            UpdateAllVersion();
-            break;
-          }
-          curr_disk = GetTotalSize();
-          curr_memory = GetCurrMemoryUsage();
-          UpdateVersion(thread_id);
-        }
-#ifdef BREAKDOWN
-        auto end = std::chrono::high_resolution_clock::now();
-        merged_wait_lat[thread_id] +=
-            std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
-                .count();
-#endif
-        break;
+      if (sta_valid) {
+        min_key = std::min(min_key, sta.Get().first);
       }
-      default: {
-        break;
+      // the newest record of min_key, in this order
+      const std::pair<K, V>* record = nullptr;
+      if (dy_valid && dy.Get().first == min_key) {
+        record = &dy.Get();
+      } else if (frozen_valid && frozen.Get().first == min_key) {
+        record = &frozen.Get();
+      } else {
+        record = &sta.Get();
+      }
+      if (record->second != kTombstone<V>) {
+        res += record->second;
+        cnt++;
+      }
+      if (dy_valid && dy.Get().first == min_key) {
+        dy.Next();
+      }
+      if (frozen_valid && frozen.Get().first == min_key) {
+        frozen.Next();
+      }
+      if (sta_valid && sta.Get().first == min_key) {
+        sta.Next();
       }
     }
-    mem_insert_cnt_++;
-
-    // insert into dynamic index
-    ready_to_merge_.store(false);
-    ops_on_dynamic_.fetch_add(1);
-    dy = dynamic_index_.load();
-    if (mode_.load() == PrepareToMerge) {
-      UpdateReadyMergeStatus();
-      threads_free_status_[thread_id].fetch_sub(1);
-      return Insert(key, value, thread_id);
-    }
-    res = dy->Insert(key, value);
-    UpdateReadyMergeStatus();
+
+    ScanStats& stats = scan_stats_[thread_id];
+    stats.scan_cnt++;
+    stats.key_cnt += cnt;
+    stats.page_cnt += sta.GetPageNum();
+    stats.io_cnt += sta.GetIONum();
+    return res;
+  }
+
+  bool Insert(const K key, const V value, int thread_id) {
+    EpochGuard guard(&epochs_, thread_id);
+    const Version* v = version_.load();
+    op_stats_[thread_id].mem_insert_cnt++;
+    bool res = v->dynamic->Insert(key, value);
 
 #ifdef CHECK_CORRECTION
-    if (ops_on_dynamic_ < 0) {
-      std::cout << "tid:" << thread_id << ",\tops on dy:" << ops_on_dynamic_
-                << std::endl;
-    }
-    V new_val = dy->Find(key);
+    V new_val = v->dynamic->Find(key);
     if (new_val != value) {
       std::cout << "insert wrong! key:" << key << ",\tval:" << value
                 << ",\tnew_val:" << new_val << std::endl;
-      dy->Find(key);
     }
 #endif
 
-    threads_free_status_[thread_id].fetch_sub(1);
+    CheckMerge(v);
     return res;
   }
 
+  // Updates out of place: the new value goes into the dynamic index and
+  // shadows the one in the frozen or static index until a merge folds it in,
+  // so no page is read or rewritten.
   bool Update(const K key, const V value, int thread_id) {
-    // TODO: update the code
+    EpochGuard guard(&epochs_, thread_id);
+    const Version* v = version_.load();
+    if (v->dynamic->Update(key, value)) {
+      op_stats_[thread_id].mem_update_cnt++;
+    } else {
+      op_stats_[thread_id].disk_update_cnt++;
+    }
+    CheckMerge(v);
     return true;
   }
 
+  // Leaves a tombstone in the dynamic index; the merge drops the key.
   bool Delete(const K key, int thread_id) {
-    // TODO: update the code
+    EpochGuard guard(&epochs_, thread_id);
+    const Version* v = version_.load();
+    v->dynamic->Delete(key);
+    op_stats_[thread_id].delete_cnt++;
+    CheckMerge(v);
     return true;
   }
 
   inline size_t GetCurrMemoryUsage() const {
-    DynamicType* dy = dynamic_index_.load();
-    StaticType* sta = static_index_.load();
-    return dy->GetTotalSize() + sta->GetNodeSize();
+    return GetCurrMemoryUsage(version_.load());
   }
-  inline size_t GetNodeSize() const { return max_memory_usage_; }
-  inline size_t GetTotalSize() const {
-    DynamicType* dy = dynamic_index_.load();
-    StaticType* sta = static_index_.load();
-    return dy->GetTotalSize() + sta->GetTotalSize();
+  ScanStats GetScanStats() const {
+    ScanStats res;
+    for (const ScanStats& stats : scan_stats_) {
+      res.Add(stats);
+    }
+    return res;
   }
+  inline size_t GetNodeSize() const {
+    return max_memory_usage_.load(std::memory_order_relaxed);
+  }
+  inline size_t GetTotalSize() const { return GetTotalSize(version_.load()); }
   void PrintEachPartSize() {
-    DynamicType* dy = dynamic_index_.load();
-    StaticType* sta = static_index_.load();
+    const Version* v = version_.load();
     std::cout << "-------------dynamic info-------------" << std::endl;
-    dy->PrintEachPartSize();
+    v->dynamic->PrintEachPartSize();
     std::cout << "-------------static info---------------" << std::endl;
-    sta->PrintEachPartSize();
+    v->sta->PrintEachPartSize();
+    OpStats ops;
+    for (const OpStats& stats : op_stats_) {
+      ops.Add(stats);
+    }
     std::cout << "-------------processing info-------------" << std::endl;
-    std::cout << "\t\tmerge cnt:" << merge_cnt_
-              << ",\tin-memory find cnt:" << mem_find_cnt_
-              << ",\ton-disk find cnt:" << disk_find_cnt_
-              << ",\tin-memory insert:" << mem_insert_cnt_ << std::endl;
+    std::cout << "\t\tmerge cnt:" << merge_cnt_.load(std::memory_order_relaxed)
+              << ",\tin-memory find cnt:" << ops.mem_find_cnt
+              << ",\ton-disk find cnt:" << ops.disk_find_cnt
+              << ",\tin-memory insert:" << ops.mem_insert_cnt
+              << ",\tin-memory update:" << ops.mem_update_cnt
+              << ",\tdelta update:" << ops.disk_update_cnt
+              << ",\tdelete:" << ops.delete_cnt
+              << ",\tscan cnt:" << GetScanStats().scan_cnt << std::endl;
+    const size_t max_buffer_size =
+        max_buffer_size_.load(std::memory_order_relaxed);
+    const size_t max_dynamic_usage =
+        max_dynamic_usage_.load(std::memory_order_relaxed);
+    const size_t max_dynamic_index_usage =
+        max_dynamic_index_usage_.load(std::memory_order_relaxed);
     std::cout << "-------------memory usage---------------" << std::endl;
     std::cout << "\tmerge_ratio:" << merge_ratio_
-              << ",\tmax_buffer_size:" << max_buffer_size_
+              << ",\tmax_buffer_size:" << max_buffer_size
               << ",\tmax_buffer_usage_:"
-              << PRINT_MIB(max_buffer_size_ * sizeof(std::pair<K, V>)) << " MiB"
+              << PRINT_MIB(max_buffer_size * sizeof(std::pair<K, V>)) << " MiB"
               << std::endl;
-    std::cout << "\tmax_dynamic_usage_:" << PRINT_MIB(max_dynamic_usage_)
+    std::cout << "\tmax_dynamic_usage_:" << PRINT_MIB(max_dynamic_usage)
               << " MiB,\tmax_dynamic_index_usage_:"
-              << PRINT_MIB(max_dynamic_index_usage_)
+              << PRINT_MIB(max_dynamic_index_usage)
               << " MiB,\tmax_dynamic_data_node_usage:"
-              << PRINT_MIB(max_dynamic_usage_ - max_dynamic_index_usage_)
-              << " MiB,\tmax_static_usage_:" << PRINT_MIB(sta->GetNodeSize())
-              << " MiB,\tmax_memory_usage_:" << PRINT_MIB(max_memory_usage_)
+              << PRINT_MIB(max_dynamic_usage - max_dynamic_index_usage)
+              << " MiB,\tmax_static_usage_:" << PRINT_MIB(v->sta->GetNodeSize())
+              << " MiB,\tmax_memory_usage_:" << PRINT_MIB(GetNodeSize())
               << " MiB" << std::endl;
     std::cout << "-------------print over---------------" << std::endl;
   }
@@ -465,302 +309,270 @@ class MultiThreadedHybridIndex : public MultiThreadedBaseIndex<K, V> {
     return GetDynamicName() + "_" + GetStaticName();
   }
   typename DynamicType::param_t GetDynamicParams() const {
-    DynamicType* dy = dynamic_index_.load();
-    return dy->GetIndexParams();
+    return version_.load()->dynamic->GetIndexParams();
   }
   typename StaticType::param_t GetStaticParams() const {
-    StaticType* sta = static_index_.load();
-    return sta->GetIndexParams();
+    return version_.load()->sta->GetIndexParams();
   }
   size_t size() const {
-    DynamicType* dy = dynamic_index_.load();
-    size_t cnt = dy->size();
-    DynamicType* merging_dy = merging_dynamic_index_.load();
-    if (merging_dy != NULL) {
-      cnt += merging_dy->size();
+    const Version* v = version_.load();
+    size_t cnt = v->dynamic->size();
+    if (v->frozen != nullptr) {
+      cnt += v->frozen->size();
     }
-    StaticType* sta = static_index_.load();
-    cnt += sta->size();
+    cnt += v->sta->size();
     return cnt;
   }
+  // Waits for a running merge, which reads and writes with the buffers.
   void FreeBuffer() {
-    auto sta = static_index_.load();
-    sta->FreeBuffer();
+    WaitForMerge();
+    version_.load()->sta->FreeBuffer();
   }
 #ifdef BREAKDOWN
   void PrintBreakdown() {
+    WaitForMerge();
     std::cout << "***********HYBRID BREAKDOWN***************" << std::endl;
-    std::cout << "thread id"
-              << ",\tassign_to_merge_lat/ms"
-              << ",\tupdate_version_lat/ms"
-              << ",\twait_to_normal_lat/ms"
-              << ",\tupdate_all_version_lat/ms"
+    std::cout << "merge_cnt_"
+              << ",\tfreeze_wait_lat/ms"
               << ",\tmerge_lat/ms"
-              << ",\tmerge_cnt_"
-              << ",\tmerged_wait_lat/ms"
-              << ",\tmerging_wait_lat/ms"
-              << ",\tprepare_wait_lat/ms"
-              << ",\tnormal_wait_lat/ms" << std::endl;
-    for (int i = 0; i < assign_to_merge_lat.size(); i++) {
-      std::cout << i << ",\t" << assign_to_merge_lat[i] / merge_cnt_ / 1e6
-                << ",\t" << update_version_lat[i] / merge_cnt_ / 1e6 << ",\t"
-                << wait_to_normal_lat[i] / merge_cnt_ / 1e6 << ",\t"
-                << update_all_version_lat[i] / merge_cnt_ / 1e6 << ",\t"
-                << merge_lat[i] / merge_cnt_ / 1e6 << ",\t" << merge_cnt[i]
-                << ",\t" << merged_wait_lat[i] / merge_cnt_ / 1e6 << ",\t"
-                << merging_wait_lat[i] / merge_cnt_ / 1e6 << ",\t"
-                << prepare_wait_lat[i] / merge_cnt_ / 1e6 << ",\t"
-                << normal_wait_lat[i] / merge_cnt_ / 1e6 << std::endl;
-    }
-    auto sta = static_index_.load();
-    sta->PrintBreakdown();
+              << ",\tpublish_wait_lat/ms" << std::endl;
+    const size_t merge_cnt = merge_cnt_.load(std::memory_order_relaxed);
+    std::cout << merge_cnt << ",\t" << freeze_wait_lat / merge_cnt / 1e6
+              << ",\t" << merge_lat / merge_cnt / 1e6 << ",\t"
+              << publish_wait_lat / merge_cnt / 1e6 << std::endl;
+    version_.load()->sta->PrintBreakdown();
   }
 #endif
 
  private:
-  void Merge(int thread_id) {
-#ifdef BREAKDOWN
-    auto start = std::chrono::high_resolution_clock::now();
-#endif
-    auto merging_dy = merging_dynamic_index_.load();
-
-    // collect the data points in dynamic stage
-    tmp_dynamic_data_ = BaseVec();
-    merging_dy = merging_dynamic_index_.load();
-    merging_dy->Merge(tmp_dynamic_data_);
-    StaticType* backup_sta = new StaticType(index_params_.s_params_);
-    // copy the current info into the backup static index
-    *backup_sta = *(static_index_.load());
-    backup_static_index_.store(backup_sta);
-    backup_sta->Merge(tmp_dynamic_data_, thread_id);
-#ifdef BREAKDOWN
-    auto end = std::chrono::high_resolution_clock::now();
-    merge_lat[thread_id] +=
-        std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
-            .count();
-    merge_cnt[thread_id]++;
-#endif
-  }
+  // What one operation works on; replaced as a whole, never modified.
+  struct Version {
+    DynamicType* dynamic;  // takes the inserts
+    DynamicType* frozen;   // being merged into the static index, or nullptr
+    StaticType* sta;
+  };
 
-  inline void AssignedToMerge(int thread_id) {
-    StaticType* backup_sta = backup_static_index_.load();
-    if (backup_sta == NULL) {
-      return;
+  // Reads a dynamic index (none if nullptr) from a key on, in batches of the
+  // scan length, each starting right after the last key of the previous one.
+  class DynamicCursor {
+   public:
+    DynamicCursor(DynamicType* index, const K key, int range)
+        : index_(index), records_(std::max(range, 1)) {
+      if (index_ != nullptr) {
+        Load(key);
+      }
     }
-#ifdef BREAKDOWN
-    auto start = std::chrono::high_resolution_clock::now();
-#endif
 
-    auto partition_id = backup_sta->ObtainMergeTask(thread_id);
-    if (partition_id >= 0) {
-#ifdef PRINT_MULTI_THREAD_INFO
-      DynamicType* dy = dynamic_index_.load();
-      std::cout << "thread" << thread_id << ",\tobtain partition "
-                << partition_id
-                << " AssignedToMerge.1 tmp_dynamic_data_.size():"
-                << tmp_dynamic_data_.size() << ",\tdynamic size:" << dy->size()
-                << std::endl;
-#endif
-      backup_sta->MergeSubData(tmp_dynamic_data_, thread_id, partition_id);
-#ifdef PRINT_MULTI_THREAD_INFO
-      std::cout << "thread" << thread_id
-                << " AssignedToMerge.2 tmp_dynamic_data_.size():"
-                << tmp_dynamic_data_.size() << ",\tdynamic size:" << dy->size()
-                << std::endl;
-#endif
-    }
-    if (mode_.load() == MergingMode && backup_sta->AllSubMergeFinished()) {
-      ModeType now_mode = MergingMode;
-      bool change_mode = mode_.compare_exchange_strong(now_mode, MergedMode);
-      if (change_mode) {
-        backup_sta->UpdateLatestVersion(thread_id);
-#ifdef PRINT_MULTI_THREAD_INFO
-        std::cout << "thread " << thread_id
-                  << " AssignedToMerge.3 tmp_dynamic_data_.size():"
-                  << tmp_dynamic_data_.size()
-                  << ",\tdynamic size:" << dy->size() << std::endl;
-        std::cout << "tid:" << thread_id << ",\tchange mode to:" << mode_.load()
-                  << " success!" << std::endl;
-#endif
-      }
-#ifdef PRINT_MULTI_THREAD_INFO
-      else {
-        std::cout << "tid:" << thread_id << ",\tchange mode to:" << mode_.load()
-                  << " failed!" << std::endl;
+    inline bool Valid() const { return pos_ < cnt_; }
+    inline const std::pair<K, V>& Get() const { return records_[pos_]; }
+    inline void Next() {
+      if (++pos_ == cnt_ && cnt_ == records_.size() &&
+          records_[cnt_ - 1].first < std::numeric_limits<K>::max()) {
+        Load(records_[cnt_ - 1].first + 1);
       }
-#endif
     }
-#ifdef BREAKDOWN
-    auto end = std::chrono::high_resolution_clock::now();
-    assign_to_merge_lat[thread_id] +=
-        std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
-            .count();
-#endif
+
+   private:
+    inline void Load(const K key) {
+      cnt_ = index_->ScanRecords(key, records_.size(), records_.data());
+      pos_ = 0;
+    }
+
+    DynamicType* index_;
+    BaseVec records_;
+    size_t pos_ = 0;
+    size_t cnt_ = 0;
+  };
+
+  inline size_t GetCurrMemoryUsage(const Version* v) const {
+    return v->dynamic->GetTotalSize() + v->sta->GetNodeSize();
+  }
+  inline size_t GetTotalSize(const Version* v) const {
+    return v->dynamic->GetTotalSize() + v->sta->GetTotalSize();
   }
 
-  inline void UpdateVersion(int thread_id) {
-#ifdef BREAKDOWN
-    auto start = std::chrono::high_resolution_clock::now();
-#endif
-    auto backup_static = backup_static_index_.load();
-    if (backup_static && mode_.load() == MergedMode &&
-        backup_static->GetUpdatedStatus() &&
-        backup_static->CheckLatestVersion(thread_id)) {
-      // Compare And Swap
+  // While a merge runs, the writes go on into the new dynamic index even past
+  // the merge ratio; the next merge starts once it is published.
+  inline void CheckMerge(const Version* v) {
+    if (v->frozen == nullptr && !merging_.load()) {
+      size_t curr_disk = GetTotalSize(v);
+      size_t curr_memory = GetCurrMemoryUsage(v);
+      if ((curr_disk - curr_memory) * 1.0 / curr_memory <= merge_ratio_ &&
+          StartMerge(curr_memory)) {
 #ifdef PRINT_MULTI_THREAD_INFO
-      std::cout << "thread " << thread_id
-                << " try to update backup_static_index_!" << std::endl;
+        std::cout << "call merge! total size:" << PRINT_MIB(curr_disk)
+                  << ",\tmemory usage:" << PRINT_MIB(curr_memory) << std::endl;
 #endif
-      auto now_static = static_index_.load();
-      auto success = false;
-      if (now_static != backup_static) {
-        success =
-            static_index_.compare_exchange_strong(now_static, backup_static);
       }
-      auto succ2 =
-          backup_static_index_.compare_exchange_strong(backup_static, NULL);
-      if (!success) {
-#ifdef PRINT_MULTI_THREAD_INFO
-        std::cout << "thread " << thread_id
-                  << " try to update backup_static_index_ failed" << std::endl;
-#endif
+    }
+  }
+
+  // Returns false if another thread has just started the merge.
+  bool StartMerge(size_t curr_memory) {
+    bool merging = false;
+    if (!merging_.compare_exchange_strong(merging, true)) {
+      return false;
+    }
+    // the previous merge thread has published its version by now; an error
+    // of it is left to the next WaitForMerge
+    JoinMergeThread();
+    const Version* v = version_.load();
+    UpdateMax(&max_memory_usage_, curr_memory);
+    UpdateMax(&max_dynamic_usage_, v->dynamic->GetTotalSize());
+    UpdateMax(&max_dynamic_index_usage_, v->dynamic->GetNodeSize());
+    UpdateMax(&max_buffer_size_, v->dynamic->size());
+    merge_thread_ = std::thread([this] { Merge(); });
+    return true;
+  }
+
+  // Runs on the merge thread, the only one that replaces the version.
+  void Merge() {
+    try {
+      // 1. freeze the dynamic index behind a new one
 #ifdef BREAKDOWN
-        auto end = std::chrono::high_resolution_clock::now();
-        update_version_lat[thread_id] +=
-            std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
-                .count();
-#endif
-        return;
-      }
-#ifdef PRINT_MULTI_THREAD_INFO
-      std::cout << "thread " << thread_id
-                << " try to delete file:" << std::endl;
-      std::cout << "res 1:" << success << ",\tres2:" << succ2 << std::endl;
-      std::cout << "static_index_:" << static_index_
-                << ",\tnow_static:" << now_static
-                << ",\tbackup_static:" << backup_static
-                << ",\tbackup_static_index_:" << backup_static_index_
-                << std::endl;
-#endif
+      auto start = std::chrono::high_resolution_clock::now();
+#endif
+      Version* old_version = version_.load();
+      Version* frozen_version =
+          new Version{new DynamicType(index_params_.d_params_),
+                      old_version->dynamic, old_version->sta};
+      version_.store(frozen_version);
+      // no insert into the frozen index is still running after this
+      epochs_.Synchronize();
+      delete old_version;
 #ifdef BREAKDOWN
-      auto start0 = std::chrono::high_resolution_clock::now();
-#endif
-      now_static->DeleteFile();
-
-      int spin_cnt = 0;
-      while (ready_to_normal_.load() == false) {
-        auto timeout = yield(spin_cnt++);
-        if (timeout) {
-          break;
+      auto end = std::chrono::high_resolution_clock::now();
+      freeze_wait_lat +=
+          std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
+              .count();
+      start = end;
+#endif
+
+      // 2. merge its records into a copy of the static index, partition by
+      // partition, into the next version of the data file
+      BaseVec dynamic_data;
+      frozen_version->frozen->Merge(dynamic_data);
+      StaticType* merged = new StaticType(index_params_.s_params_);
+      *merged = *frozen_version->sta;
+      merged->ReopenLatestVersion(merge_thread_id_);
+      merged->Merge(dynamic_data, merge_thread_id_);
+      while (!merged->AllSubMergeFinished()) {
+        merged->ReopenLatestVersion(merge_thread_id_);
+        auto partition_id = merged->ObtainMergeTask(merge_thread_id_);
+        if (partition_id < 0) {
+          throw std::runtime_error("no merge task is left in Merge()");
         }
+        merged->MergeSubData(dynamic_data, merge_thread_id_, partition_id);
       }
-      merging_dynamic_index_.store(NULL);
-#ifdef PRINT_MULTI_THREAD_INFO
-      std::cout << "thread " << thread_id
-                << " try to update backup_static_index_ successed" << std::endl;
-#endif
-      ModeType now_mode = MergedMode;
-      mode_.compare_exchange_strong(now_mode, NormalMode);
+      merged->UpdateLatestVersion(merge_thread_id_);
+      merged->ReopenAllLatestVersion();
 #ifdef BREAKDOWN
-      auto end0 = std::chrono::high_resolution_clock::now();
-      wait_to_normal_lat[thread_id] +=
-          std::chrono::duration_cast<std::chrono::nanoseconds>(end0 - start0)
+      end = std::chrono::high_resolution_clock::now();
+      merge_lat +=
+          std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
               .count();
-#endif
-    }
+      start = end;
+#endif
+
+      // 3. publish it and free the frozen index and the old static index
+      // once no operation can use them
+      version_.store(
+          new Version{frozen_version->dynamic, nullptr, merged});
+      epochs_.Synchronize();
+      frozen_version->sta->DeleteFile();
+      delete frozen_version->frozen;
+      delete frozen_version->sta;
+      delete frozen_version;
 #ifdef BREAKDOWN
-    auto end = std::chrono::high_resolution_clock::now();
-    update_version_lat[thread_id] +=
-        std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
-            .count();
+      end = std::chrono::high_resolution_clock::now();
+      publish_wait_lat +=
+          std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
+              .count();
 #endif
-  }
-  inline void UpdateReadyNormalStatus() {
-    auto prev = ops_on_merge_dynamic_.fetch_sub(1);
-    if (prev == 1) {
-      ready_to_normal_.store(true);
+      merge_cnt_.fetch_add(1, std::memory_order_relaxed);
+    } catch (...) {
+      merge_error_ = std::current_exception();
     }
+    merging_.store(false);
   }
 
-  inline void UpdateReadyMergeStatus() {
-    auto prev = ops_on_dynamic_.fetch_sub(1);
-    if (prev == 1) {
-      ready_to_merge_.store(true);
+  // The max_* stats are read by other threads while a merge starts.
+  static void UpdateMax(std::atomic<size_t>* max, size_t value) {
+    size_t curr = max->load(std::memory_order_relaxed);
+    while (curr < value && !max->compare_exchange_weak(
+                               curr, value, std::memory_order_relaxed)) {
     }
   }
 
-  inline void UpdateAllVersion() {
-    for (size_t i = 0; i < threads_free_status_.size(); i++) {
-      if (threads_free_status_[i].load() == 0 && mode_.load() == MergedMode) {
-        std::cout << "update all:" << i << std::endl;
-        UpdateVersion(i);
-      }
+  inline void JoinMergeThread() {
+    if (merge_thread_.joinable()) {
+      merge_thread_.join();
     }
   }
 
-  bool yield(int count) {
-    if (count > 100000000) {
-      return true;
-    } else if (count > 10) {
-      std::this_thread::sleep_for(std::chrono::microseconds(1));
-    } else if (count > 3) {
-      sched_yield();
-    } else {
-      _mm_pause();
+  // Joins the merge thread and rethrows the error of a failed merge, once.
+  void WaitForMerge() {
+    JoinMergeThread();
+    std::exception_ptr error = nullptr;
+    std::swap(error, merge_error_);
+    if (error) {
+      std::rethrow_exception(error);
     }
-    return false;
   }
 
   std::string GetDynamicName() const {
-    DynamicType* dy = dynamic_index_.load();
-    return dy->GetIndexName();
+    return version_.load()->dynamic->GetIndexName();
   }
 
   std::string GetStaticName() const {
-    StaticType* sta = static_index_.load();
-    return sta->GetIndexName();
+    return version_.load()->sta->GetIndexName();
   }
 
 #ifdef BREAKDOWN
-  std::vector<double> assign_to_merge_lat;
-  std::vector<double> update_version_lat;
-  std::vector<double> wait_to_normal_lat;
-  std::vector<double> update_all_version_lat;
-  std::vector<double> merge_lat;
-  std::vector<double> merge_cnt;
-  std::vector<double> merged_wait_lat;
-  std::vector<double> merging_wait_lat;
-  std::vector<double> prepare_wait_lat;
-  std::vector<double> normal_wait_lat;
+  // on the merge thread
+  double freeze_wait_lat = 0.0;
+  double merge_lat = 0.0;
+  double publish_wait_lat = 0.0;
 #endif
-  std::atomic<DynamicType*> dynamic_index_;
-  std::atomic<DynamicType*> merging_dynamic_index_;
-  std::atomic<StaticType*> static_index_;
-  std::atomic<StaticType*> backup_static_index_;
-  std::atomic<ModeType> mode_;
-
-  std::atomic<int> ops_on_dynamic_{0};
-  std::atomic<int> ops_on_merge_dynamic_{0};
-  std::atomic<bool> ready_to_merge_{true};
-  std::atomic<bool> ready_to_normal_{true};
-  std::vector<std::atomic<int>> threads_free_status_;
-
-  BaseVec tmp_dynamic_data_;
+  std::atomic<Version*> version_;
   param_t index_params_;
+  EpochManager epochs_;
+  const int merge_thread_id_;  // the file slot of the merge thread
+
+  std::thread merge_thread_;
+  std::atomic<bool> merging_{false};
+  std::exception_ptr merge_error_;
+
+  // Operation counters of one worker thread, summed when printed.
+  struct alignas(64) OpStats {
+    size_t mem_find_cnt = 0;
+    size_t disk_find_cnt = 0;
+    size_t mem_update_cnt = 0;
+    size_t disk_update_cnt = 0;
+    size_t mem_insert_cnt = 0;
+    size_t delete_cnt = 0;
+
+    inline void Add(const OpStats& other) {
+      mem_find_cnt += other.mem_find_cnt;
+      disk_find_cnt += other.disk_find_cnt;
+      mem_update_cnt += other.mem_update_cnt;
+      disk_update_cnt += other.disk_update_cnt;
+      mem_insert_cnt += other.mem_insert_cnt;
+      delete_cnt += other.delete_cnt;
+    }
+  };
 
-  size_t merge_cnt_;
-  size_t mem_find_cnt_;
-  size_t disk_find_cnt_;
-  size_t mem_update_cnt_;
-  size_t disk_update_cnt_;
-  size_t mem_insert_cnt_;
+  std::atomic<size_t> merge_cnt_;
 
-  size_t max_dynamic_usage_;
-  size_t max_dynamic_index_usage_;
-  size_t max_memory_usage_;
-  size_t max_buffer_size_;
+  std::atomic<size_t> max_dynamic_usage_;
+  std::atomic<size_t> max_dynamic_index_usage_;
+  std::atomic<size_t> max_memory_usage_;
+  std::atomic<size_t> max_buffer_size_;
 
   size_t merge_ratio_;
+
+  std::vector<OpStats> op_stats_;      // one per worker thread
+  std::vector<ScanStats> scan_stats_;  // one per worker thread
 };
 
-#endif  // !INDEXES_MULTI_THREADED_HYBRID_INDEX_H_
\ No newline at end of file
+#endif  // !INDEXES_MULTI_THREADED_HYBRID_INDEX_H_
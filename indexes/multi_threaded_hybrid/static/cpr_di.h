@@ -119,10 +119,20 @@ class MultiThreadedStaticCprDI : public MultiThreadedStaticIndex<K, V> {
   }
 
   V Scan(const K key, const int length, int thread_id) {
+    auto it = GetScanIterator(key, length, thread_id);
+    return Base::ScanData(it, length);
+  }
+
+  typename Base::ScanIterator GetScanIterator(const K key, const int length,
+                                              int thread_id) {
     auto pid = Base::GetPartitionID(key);
-    auto range = di_[pid].GetSearchBound(key);
-    SearchRange static_range = {range.begin, range.end};
-    return Base::ScanData(static_range, key, length, thread_id, pid);
+    SearchRange static_range = {0, 0};
+    if (pid < static_cast<int>(di_.size())) {
+      auto range = di_[pid].GetSearchBound(key);
+      static_range = {range.begin, range.end};
+    }
+    return typename Base::ScanIterator(this, static_range, key, length,
+                                       thread_id, pid);
   }
 
   bool Update(const K key, const V value, int thread_id) {
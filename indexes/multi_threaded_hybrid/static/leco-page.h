@@ -266,9 +266,19 @@ class MultiThreadedStaticLecoPage : public MultiThreadedStaticIndex<K, V> {
   }
 
   V Scan(const K key, const int length, int thread_id) {
+    auto it = GetScanIterator(key, length, thread_id);
+    return Base::ScanData(it, length);
+  }
+
+  typename Base::ScanIterator GetScanIterator(const K key, const int length,
+                                              int thread_id) {
     auto pid = Base::GetPartitionID(key);
-    auto range = leco_[pid].FindRange(key);
-    return Base::ScanData(range, key, length, thread_id, pid);
+    SearchRange range = {0, 0};
+    if (pid < static_cast<int>(leco_.size())) {
+      range = leco_[pid].FindRange(key);
+    }
+    return typename Base::ScanIterator(this, range, key, length, thread_id,
+                                       pid);
   }
 
   inline size_t size() const { return Base::size(); }
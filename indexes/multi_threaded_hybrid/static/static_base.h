@@ -12,6 +12,7 @@ template <typename K, typename V>
 class MultiThreadedStaticIndex {
  public:
   MultiThreadedStaticIndex() {}
+  virtual ~MultiThreadedStaticIndex() {}
 
   typedef K K_;
   typedef V V_;
@@ -99,6 +100,108 @@ class MultiThreadedStaticIndex {
     uint64_t version_;  // file version
   };
 
+  /**
+   * @brief Streams the records from the lower bound of a key on, through the
+   * partitions that follow. The first read covers the range predicted for the
+   * key and the pages the scan wants after it, so a short scan costs one I/O;
+   * later reads fetch an extent sized to the records still wanted (at least a
+   * page) into the buffer of the thread.
+   */
+  class ScanIterator {
+   public:
+    ScanIterator(MultiThreadedStaticIndex* index, const SearchRange& range,
+                 const K_ key, size_t length, int thread_id, int partition_id)
+        : index_(index),
+          thread_id_(thread_id),
+          partition_id_(partition_id),
+          want_(length) {
+      if (partition_id_ >= static_cast<int>(index_->merge_thread_num_)) {
+        return;  // all the keys are smaller
+      }
+      const uint64_t data_num = index_->data_numbers_[partition_id_];
+      if (data_num == 0) {
+        return;  // Valid() moves on to the next partition
+      }
+      const uint64_t start = std::min<uint64_t>(range.start, data_num - 1);
+      Read(start, std::max<uint64_t>(range.stop, start + length));
+      const Record_* it = std::lower_bound(
+          records_ + pos_, records_ + end_, key,
+          [](const Record_& lhs, const K_& k) { return lhs.first < k; });
+      pos_ = it - records_;
+    }
+
+    // Reads the next extent once the current one is used up, so that nothing
+    // is read after the last record the scan takes.
+    inline bool Valid() {
+      if (pos_ == end_) {
+        Fill();
+      }
+      return pos_ < end_;
+    }
+    inline const Record_& Get() const { return records_[pos_]; }
+    inline void Next() {
+      want_ -= want_ > 0;
+      pos_++;
+    }
+
+    inline uint64_t GetPageNum() const { return page_cnt_; }
+    inline uint64_t GetIONum() const { return io_cnt_; }
+
+   private:
+    // Reads the pages of the partition holding its records [first, stop).
+    void Read(uint64_t first, uint64_t stop) {
+      const uint64_t record_per_page = index_->record_per_page_;
+      const uint64_t data_num = index_->data_numbers_[partition_id_];
+      const uint64_t first_page = first / record_per_page;
+      uint64_t last_page = (std::min(stop, data_num) - 1) / record_per_page;
+      last_page = std::min<uint64_t>(last_page,
+                                     first_page + ALLOCATED_BUF_SIZE - 1);
+      const uint64_t page_num = last_page - first_page + 1;
+      const uint64_t page_bytes = record_per_page * sizeof(Record_);
+      K_* buf = index_->threads_[thread_id_].buf_;
+      DirectIORead<K_>(
+          index_->threads_[thread_id_].GetFD(), page_bytes, page_num,
+          (index_->page_start_ids_[partition_id_] + first_page) * page_bytes,
+          buf);
+      page_cnt_ += page_num;
+      io_cnt_++;
+
+      records_ = reinterpret_cast<const Record_*>(buf);
+      begin_ = first_page * record_per_page;
+      pos_ = first - begin_;
+      end_ = std::min((last_page + 1) * record_per_page, data_num) - begin_;
+    }
+
+    // The next extent, in this partition or in the next non-empty one.
+    void Fill() {
+      if (partition_id_ >= static_cast<int>(index_->merge_thread_num_)) {
+        return;
+      }
+      uint64_t next = begin_ + end_;
+      pos_ = end_ = 0;
+      while (next >= index_->data_numbers_[partition_id_]) {
+        if (++partition_id_ >= static_cast<int>(index_->merge_thread_num_)) {
+          return;
+        }
+        next = 0;
+      }
+      Read(next, next + std::max<uint64_t>(want_, 1));
+    }
+
+    MultiThreadedStaticIndex* index_;
+    int thread_id_;
+    int partition_id_;
+    uint64_t want_;  // the records the scan still expects
+
+    const Record_* records_ = nullptr;  // the extent in the buffer
+    uint64_t begin_ = 0;  // the index of records_[0] in the partition
+    uint64_t pos_ = 0;
+    uint64_t end_ = 0;
+
+    uint64_t page_cnt_ = 0;
+    uint64_t io_cnt_ = 0;
+  };
+
   MultiThreadedStaticIndex(param_t p)
       : data_file_(p.filename),
         record_per_page_(p.page_bytes / sizeof(Record_)),
@@ -208,7 +311,8 @@ class MultiThreadedStaticIndex {
 #endif
   }
 
-  // only copy the current data info
+  // Only copies the current data info. The read/write buffers are shared with
+  // other, and no file is open until ReopenLatestVersion.
   MultiThreadedStaticIndex& operator=(const MultiThreadedStaticIndex& other) {
     name_ = other.name_;
     data_file_ = other.data_file_;
@@ -219,12 +323,11 @@ class MultiThreadedStaticIndex {
     latest_version_.store(ver);
     consistent_version_cnt_.store(thread_numbers_);
     for (uint64_t i = 0; i < thread_numbers_; i++) {
-      std::string filename =
-          data_file_ + std::to_string(latest_version_.load());
-      int fd = DirectIOOpen(filename);
-      threads_[i].SetFD(fd);
-      threads_[i].SetVersion(other.threads_[i].GetVersion());
-      threads_[i].buf_ = other.threads_[i].buf_;
+      threads_[i].UpdateFile(-1, other.threads_[i].GetVersion());
+      if (threads_[i].buf_ != other.threads_[i].buf_) {
+        threads_[i].FreeBuffer();
+        threads_[i].buf_ = other.threads_[i].buf_;
+      }
     }
     old_version_ = other.old_version_;
     merge_thread_num_ = other.merge_thread_num_;
@@ -542,6 +645,24 @@ class MultiThreadedStaticIndex {
     return consistent_version_cnt_.load() == thread_numbers_;
   }
 
+  // Points the file of thread_id at the latest version again. A merge done by
+  // one thread alone calls it before each partition, since MergeSubData moves
+  // the file of the thread to the version being written.
+  inline void ReopenLatestVersion(int thread_id) {
+    uint64_t ver = latest_version_.load();
+    auto fd = DirectIOOpen(data_file_ + std::to_string(ver));
+    threads_[thread_id].UpdateFile(fd, ver);
+  }
+
+  // Points the files of all the threads at the latest version, once a merge
+  // done off to the side has moved to it and before the index is published.
+  inline void ReopenAllLatestVersion() {
+    for (uint64_t i = 0; i < thread_numbers_; i++) {
+      ReopenLatestVersion(i);
+    }
+    consistent_version_cnt_.store(thread_numbers_);
+  }
+
   inline int ObtainMergeTask(int thread_id) {
 #ifdef BREAKDOWN
     auto start = std::chrono::high_resolution_clock::now();
@@ -644,6 +765,9 @@ class MultiThreadedStaticIndex {
   inline V FindData(const SearchRange& range, const K_ key, int thread_id,
                     int partition_id) {
     ResultInfo<K_, V_> res = LowerBound(range, key, 1, thread_id, partition_id);
+    if (res.res != key) {
+      return std::numeric_limits<V>::max();  // e.g., dropped by a delete
+    }
     return res.val;
   }
 
@@ -655,11 +779,13 @@ class MultiThreadedStaticIndex {
                        threads_[thread_id].buf_);
   }
 
-  inline V ScanData(const SearchRange& range, const K key, const int length,
-                    int thread_id, int partition_id) {
-    ResultInfo<K, V> res =
-        LowerBound(range, key, length, thread_id, partition_id);
-    return res.val;
+  // The sum of the values of the first length records of the iterator.
+  inline V ScanData(ScanIterator& it, const int length) {
+    V res = 0;
+    for (int i = 0; i < length && it.Valid(); i++, it.Next()) {
+      res += it.Get().second;
+    }
+    return res;
   }
 
   inline size_t GetDiskBytes() const { return sizeof(Record_) * size(); }
@@ -759,23 +885,49 @@ class MultiThreadedStaticIndex {
 #endif
   }
 
+  // Merges from the back, in place. A dynamic record replaces the static one
+  // with the same key and a tombstone drops both, which leaves a gap at the
+  // front to erase; a partition left empty keeps one tombstone instead.
   inline void MergeTwoSortedArray(DataVec_& dy_data, int first_dy_idx,
                                   int end_dy_idx, DataVec_& merged_data,
                                   int static_size) {
     int cnt = end_dy_idx - first_dy_idx + static_size - 1, i = end_dy_idx - 1,
         j = static_size - 1;
-    int tmp = 0;
+    int dropped = 0;
+    Record_ last_tombstone;
     while (i >= first_dy_idx && j >= 0) {
-      if (dy_data[i].first > merged_data[j].first) {
-        merged_data[cnt--] = dy_data[i--];
-      } else {
+      if (dy_data[i].first < merged_data[j].first) {
         merged_data[cnt--] = merged_data[j--];
+        continue;
+      }
+      if (dy_data[i].first == merged_data[j].first) {
+        j--;
+        dropped++;
+      }
+      if (dy_data[i].second == kTombstone<V_>) {
+        last_tombstone = dy_data[i--];
+        dropped++;
+      } else {
+        merged_data[cnt--] = dy_data[i--];
       }
-      tmp++;
     }
 
     while (i >= first_dy_idx) {
-      merged_data[cnt--] = dy_data[i--];
+      if (dy_data[i].second == kTombstone<V_>) {
+        last_tombstone = dy_data[i--];
+        dropped++;
+      } else {
+        merged_data[cnt--] = dy_data[i--];
+      }
+    }
+    while (j >= 0 && cnt > j) {
+      merged_data[cnt--] = merged_data[j--];
+    }
+    if (dropped > 0) {
+      merged_data.erase(merged_data.begin(), merged_data.begin() + dropped);
+      if (merged_data.empty()) {
+        merged_data.push_back(last_tombstone);
+      }
     }
 
 #ifdef CHECK_CORRECTION
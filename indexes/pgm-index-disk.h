@@ -34,6 +34,13 @@ class PGMIndexPage : public BaseIndex<K, V> {
     return {range.lo, range.hi};
   }
 
+  void LookupBatch(const K* lookup_keys, size_t n, SearchRange* out) override {
+    pgm_page_.search_batch(
+        lookup_keys, n, [out](size_t i, const pgm_page::ApproxPos& range) {
+          out[i] = {range.lo, range.hi};
+        });
+  }
+
   std::string GetIndexName() const override {
     return "PGM Index Page_" + std::to_string(epsilon_);
   }
@@ -48,6 +55,18 @@ class PGMIndexPage : public BaseIndex<K, V> {
     return GetInMemorySize() + disk_size_;
   }
 
+  bool Save(SnapshotWriter* out) const override {
+    out->Put<uint64_t>(disk_size_);
+    pgm_page_.save(out);
+    return true;
+  }
+
+  bool Load(SnapshotReader* in) override {
+    disk_size_ = in->Get<uint64_t>();
+    pgm_page_.load(in);
+    return true;
+  }
+
  private:
   pgm_page::PGMIndexPage<K> pgm_page_;
   size_t disk_size_ = 0;
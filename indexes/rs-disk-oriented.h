@@ -48,6 +48,13 @@ class RSDiskIndex : public BaseIndex<K, V> {
     return {range.begin, range.end};
   }
 
+  void LookupBatch(const K* lookup_keys, size_t n, SearchRange* out) override {
+    rs_.GetSearchBoundBatch(
+        lookup_keys, n, [out](size_t i, const rs::SearchBound& range) {
+          out[i] = {range.begin, range.end};
+        });
+  }
+
   size_t GetIndexParams() const override { return max_error_; }
 
   std::string GetIndexName() const override {
@@ -63,6 +70,22 @@ class RSDiskIndex : public BaseIndex<K, V> {
     return GetInMemorySize() + disk_size_;
   }
 
+  std::string GetSnapshotName() const override {
+    return GetIndexName() + "_" + std::to_string(record_per_page_);
+  }
+
+  bool Save(SnapshotWriter* out) const override {
+    out->Put<uint64_t>(disk_size_);
+    rs_.Save(out);
+    return true;
+  }
+
+  bool Load(SnapshotReader* in) override {
+    disk_size_ = in->Get<uint64_t>();
+    rs_.Load(in);
+    return true;
+  }
+
  private:
   rs::RadixSpline<K> rs_;
 
@@ -5,6 +5,7 @@
 #include <cmath>
 #include <vector>
 
+#include "../snapshot.h"
 #include "common.h"
 
 namespace rs {
@@ -39,33 +40,50 @@ class RadixSpline {
     // if (key >= max_key_) return num_keys_ - 1;
 
     // Find spline segment with `key` ∈ (spline[index - 1], spline[index]].
-    const size_t index = GetSplineSegment(key);
-    const Coord<KeyType> down = spline_points_[index - 1];
-    const Coord<KeyType> up = spline_points_[index];
-
-    // Compute slope.
-    const double x_diff = up.x - down.x;
-    const double y_diff = up.y - down.y;
-    const double slope = y_diff / x_diff;
-
-    // Interpolate.
-    const double key_diff = key - down.x;
-    // Fix the precision problem
-    const size_t res = key_diff * slope;
-    return res + down.y;
-    // return std::fma(key_diff, slope, down.y);
+    return Interpolate(key, GetSplineSegment(key));
   }
 
   // Returns a search bound [begin, end) around the estimated position.
   SearchBound GetSearchBound(const KeyType key) const {
-    const size_t estimate = GetEstimatedPosition(key);
-    const size_t begin =
-        (estimate < max_error_ - 1) ? 0 : (estimate - max_error_ + 1);
-    // `end` is exclusive. Modified for on-disk mode
-    const size_t end = (estimate + max_error_ + 1 > max_y_ + 1)
-                           ? max_y_ + 1
-                           : (estimate + max_error_ + 1);
-    return SearchBound{begin, end};
+    return BoundAround(GetEstimatedPosition(key));
+  }
+
+  // Same as calling GetSearchBound for each of the `n` keys, but the radix
+  // table and spline lookups of a group of keys are issued in separate passes
+  // with prefetching, so their cache misses overlap. The bound of keys[i] is
+  // passed to emit(i, bound), which stores it where the caller wants it.
+  template <typename Emit>
+  void GetSearchBoundBatch(const KeyType* keys, size_t n, Emit emit) const {
+    constexpr size_t kGroup = 16;
+    size_t prefix[kGroup];
+    uint32_t begin[kGroup];
+    for (size_t b = 0; b < n; b += kGroup) {
+      const size_t m = std::min(kGroup, n - b);
+      for (size_t j = 0; j < m; ++j) {
+        const KeyType key = keys[b + j];
+        prefix[j] = (key <= min_key_ || key >= max_key_)
+                        ? 0
+                        : (key - min_key_) >> num_shift_bits_;
+        __builtin_prefetch(&radix_table_[prefix[j]]);
+      }
+      for (size_t j = 0; j < m; ++j) {
+        begin[j] = radix_table_[prefix[j]];
+        __builtin_prefetch(&spline_points_[begin[j]]);
+      }
+      for (size_t j = 0; j < m; ++j) {
+        const KeyType key = keys[b + j];
+        size_t estimate;
+        if (key <= min_key_) {
+          estimate = 0;
+        } else if (key >= max_key_) {
+          estimate = max_y_;
+        } else {
+          const uint32_t end = radix_table_[prefix[j] + 1];
+          estimate = Interpolate(key, GetSplineSegment(key, begin[j], end));
+        }
+        emit(b + j, BoundAround(estimate));
+      }
+    }
   }
 
   // Returns the size in bytes.
@@ -76,6 +94,33 @@ class RadixSpline {
 
   size_t GetSplineNum() const { return spline_points_.size(); }
 
+  // Writes the model to a snapshot.
+  void Save(SnapshotWriter* out) const {
+    out->Put(min_key_);
+    out->Put(max_key_);
+    out->Put<uint64_t>(max_y_);
+    out->Put<uint64_t>(num_keys_);
+    out->Put<uint64_t>(num_radix_bits_);
+    out->Put<uint64_t>(num_shift_bits_);
+    out->Put<uint64_t>(max_error_);
+    radix_table_.Save(out);
+    spline_points_.Save(out);
+  }
+
+  // Restores the model from a snapshot, the radix table and the spline points
+  // are used in place.
+  void Load(SnapshotReader* in) {
+    min_key_ = in->Get<KeyType>();
+    max_key_ = in->Get<KeyType>();
+    max_y_ = in->Get<uint64_t>();
+    num_keys_ = in->Get<uint64_t>();
+    num_radix_bits_ = in->Get<uint64_t>();
+    num_shift_bits_ = in->Get<uint64_t>();
+    max_error_ = in->Get<uint64_t>();
+    radix_table_.Load(in);
+    spline_points_.Load(in);
+  }
+
  private:
   // Returns the index of the spline point that marks the end of the spline
   // segment that contains the `key`: `key` ∈ (spline[index - 1], spline[index]]
@@ -83,9 +128,13 @@ class RadixSpline {
     // Narrow search range using radix table.
     const KeyType prefix = (key - min_key_) >> num_shift_bits_;
     assert(prefix + 1 < radix_table_.size());
-    const uint32_t begin = radix_table_[prefix];
-    const uint32_t end = radix_table_[prefix + 1];
+    return GetSplineSegment(key, radix_table_[prefix],
+                            radix_table_[prefix + 1]);
+  }
 
+  // Same as above, with the radix table range [begin, end) already known.
+  size_t GetSplineSegment(const KeyType key, const uint32_t begin,
+                          const uint32_t end) const {
     if (end - begin < 32) {
       // Do linear search over narrowed range.
       uint32_t current = begin;
@@ -102,6 +151,36 @@ class RadixSpline {
     return std::distance(spline_points_.begin(), lb);
   }
 
+  // Interpolates the position of `key` on the spline segment
+  // (spline[index - 1], spline[index]].
+  double Interpolate(const KeyType key, const size_t index) const {
+    const Coord<KeyType> down = spline_points_[index - 1];
+    const Coord<KeyType> up = spline_points_[index];
+
+    // Compute slope.
+    const double x_diff = up.x - down.x;
+    const double y_diff = up.y - down.y;
+    const double slope = y_diff / x_diff;
+
+    // Interpolate.
+    const double key_diff = key - down.x;
+    // Fix the precision problem
+    const size_t res = key_diff * slope;
+    return res + down.y;
+    // return std::fma(key_diff, slope, down.y);
+  }
+
+  // Returns the search bound [begin, end) around `estimate`.
+  SearchBound BoundAround(const size_t estimate) const {
+    const size_t begin =
+        (estimate < max_error_ - 1) ? 0 : (estimate - max_error_ + 1);
+    // `end` is exclusive. Modified for on-disk mode
+    const size_t end = (estimate + max_error_ + 1 > max_y_ + 1)
+                           ? max_y_ + 1
+                           : (estimate + max_error_ + 1);
+    return SearchBound{begin, end};
+  }
+
   KeyType min_key_;
   KeyType max_key_;
   size_t max_y_;
@@ -110,8 +189,8 @@ class RadixSpline {
   size_t num_shift_bits_;
   size_t max_error_;
 
-  std::vector<uint32_t> radix_table_;
-  std::vector<rs::Coord<KeyType>> spline_points_;
+  SnapshotArray<uint32_t> radix_table_;
+  SnapshotArray<rs::Coord<KeyType>> spline_points_;
 
   template <typename>
   friend class Serializer;
@@ -16,6 +16,7 @@ class Serializer {
     // Scalar members.
     buffer.write(reinterpret_cast<const char*>(&rs.min_key_), sizeof(KeyType));
     buffer.write(reinterpret_cast<const char*>(&rs.max_key_), sizeof(KeyType));
+    buffer.write(reinterpret_cast<const char*>(&rs.max_y_), sizeof(size_t));
     buffer.write(reinterpret_cast<const char*>(&rs.num_keys_), sizeof(size_t));
     buffer.write(reinterpret_cast<const char*>(&rs.num_radix_bits_),
                  sizeof(size_t));
@@ -54,6 +55,7 @@ class Serializer {
     // Scalar members.
     in.read(reinterpret_cast<char*>(&rs.min_key_), sizeof(KeyType));
     in.read(reinterpret_cast<char*>(&rs.max_key_), sizeof(KeyType));
+    in.read(reinterpret_cast<char*>(&rs.max_y_), sizeof(size_t));
     in.read(reinterpret_cast<char*>(&rs.num_keys_), sizeof(size_t));
     in.read(reinterpret_cast<char*>(&rs.num_radix_bits_), sizeof(size_t));
     in.read(reinterpret_cast<char*>(&rs.num_shift_bits_), sizeof(size_t));
@@ -62,20 +64,21 @@ class Serializer {
     // Radix table.
     size_t radix_table_size;
     in.read(reinterpret_cast<char*>(&radix_table_size), sizeof(size_t));
-    rs.radix_table_.resize(radix_table_size);
-    for (int i = 0; i < rs.radix_table_.size(); ++i) {
-      in.read(reinterpret_cast<char*>(&rs.radix_table_[i]), sizeof(uint32_t));
+    std::vector<uint32_t> radix_table(radix_table_size);
+    for (int i = 0; i < radix_table.size(); ++i) {
+      in.read(reinterpret_cast<char*>(&radix_table[i]), sizeof(uint32_t));
     }
+    rs.radix_table_ = std::move(radix_table);
 
     // Spline points.
     size_t spline_points_size;
     in.read(reinterpret_cast<char*>(&spline_points_size), sizeof(size_t));
-    rs.spline_points_.resize(spline_points_size);
-    for (int i = 0; i < rs.spline_points_.size(); ++i) {
-      in.read(reinterpret_cast<char*>(&rs.spline_points_[i].x),
-              sizeof(KeyType));
-      in.read(reinterpret_cast<char*>(&rs.spline_points_[i].y), sizeof(double));
+    std::vector<rs::Coord<KeyType>> spline_points(spline_points_size);
+    for (int i = 0; i < spline_points.size(); ++i) {
+      in.read(reinterpret_cast<char*>(&spline_points[i].x), sizeof(KeyType));
+      in.read(reinterpret_cast<char*>(&spline_points[i].y), sizeof(double));
     }
+    rs.spline_points_ = std::move(spline_points);
 
     return rs;
   }
@@ -0,0 +1,315 @@
+/**
+ * @file snapshot.h
+ * @brief Versioned binary snapshots of built indexes. A snapshot starts with a
+ * magic number and the format version, followed by the sections written by the
+ * index in order. Every array starts at a 64-byte aligned offset of the file,
+ * so that a loaded index can use the arrays in the mmap-ed file in place
+ * instead of copying them out.
+ */
+#ifndef INDEXES_SNAPSHOT_H_
+#define INDEXES_SNAPSHOT_H_
+
+#include <fcntl.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+#include <fstream>
+#include <istream>
+#include <memory>
+#include <sstream>
+#include <stdexcept>
+#include <string>
+#include <type_traits>
+#include <utility>
+#include <vector>
+
+static const uint64_t kSnapshotMagic = 0x3150414e5344494cULL;  // "LIDSNAP1"
+// Bump it whenever the layout of any index in a snapshot changes.
+static const uint32_t kSnapshotVersion = 1;
+static const size_t kSnapshotAlign = 64;
+
+class SnapshotWriter {
+ public:
+  // The snapshot is written to filename.tmp and renamed to filename by
+  // Commit(), so that a reader never sees a partial snapshot.
+  explicit SnapshotWriter(const std::string& filename)
+      : filename_(filename),
+        out_(filename + ".tmp", std::ios::binary | std::ios::trunc) {
+    if (!out_) {
+      throw std::runtime_error("Failed to create the snapshot " + filename);
+    }
+    Put(kSnapshotMagic);
+    Put(kSnapshotVersion);
+  }
+
+  // An uncommitted snapshot is dropped.
+  ~SnapshotWriter() {
+    if (!committed_) {
+      out_.close();
+      unlink((filename_ + ".tmp").c_str());
+    }
+  }
+
+  template <typename T>
+  void Put(const T& value) {
+    static_assert(std::is_trivially_copyable<T>::value,
+                  "Only trivially copyable values can be put in a snapshot");
+    Write(&value, sizeof(T));
+  }
+
+  template <typename T>
+  void PutArray(const T* data, size_t n) {
+    static_assert(std::is_trivially_copyable<T>::value,
+                  "Only trivially copyable values can be put in a snapshot");
+    Put<uint64_t>(n);
+    Align();
+    Write(data, n * sizeof(T));
+  }
+
+  template <typename T>
+  void PutArray(const std::vector<T>& values) {
+    PutArray(values.data(), values.size());
+  }
+
+  void PutString(const std::string& str) { PutArray(str.data(), str.size()); }
+
+  // Structures with their own serialize(std::ostream&), e.g., the sdsl ones.
+  template <typename S>
+  void PutSerialized(const S& s) {
+    std::ostringstream buf;
+    s.serialize(buf);
+    PutString(buf.str());
+  }
+
+  // Variable-sized blocks (e.g., the LeCo ones) are stored back to back.
+  void PutBlocks(const std::vector<uint8_t*>& blocks,
+                 const std::vector<uint32_t>& block_bytes) {
+    std::vector<uint64_t> offsets(1, 0);
+    for (size_t i = 0; i < blocks.size(); i++) {
+      offsets.push_back(offsets.back() + block_bytes[i]);
+    }
+    PutArray(offsets);
+    Put<uint64_t>(offsets.back());
+    Align();
+    for (size_t i = 0; i < blocks.size(); i++) {
+      Write(blocks[i], block_bytes[i]);
+    }
+  }
+
+  void Commit() {
+    // The bit readers of LeCo may load a word past the end of the last block.
+    Align();
+    const char zeros[kSnapshotAlign] = {0};
+    Write(zeros, kSnapshotAlign);
+    out_.close();
+    if (!out_ ||
+        rename((filename_ + ".tmp").c_str(), filename_.c_str()) != 0) {
+      throw std::runtime_error("Failed to write the snapshot " + filename_);
+    }
+    committed_ = true;
+  }
+
+ private:
+  void Write(const void* data, size_t bytes) {
+    out_.write(reinterpret_cast<const char*>(data), bytes);
+    offset_ += bytes;
+  }
+
+  void Align() {
+    const char zeros[kSnapshotAlign] = {0};
+    Write(zeros, (kSnapshotAlign - offset_ % kSnapshotAlign) % kSnapshotAlign);
+  }
+
+  std::string filename_;
+  std::ofstream out_;
+  size_t offset_ = 0;
+  bool committed_ = false;
+};
+
+class SnapshotReader {
+ public:
+  explicit SnapshotReader(const std::string& filename) {
+    int fd = open(filename.c_str(), O_RDONLY);
+    if (fd < 0) {
+      throw std::runtime_error("Failed to open the snapshot " + filename);
+    }
+    struct stat st;
+    void* addr = MAP_FAILED;
+    if (fstat(fd, &st) == 0 && st.st_size > 0) {
+      size_ = st.st_size;
+      addr = mmap(nullptr, size_, PROT_READ, MAP_PRIVATE, fd, 0);
+    }
+    close(fd);
+    if (addr == MAP_FAILED) {
+      throw std::runtime_error("Failed to mmap the snapshot " + filename);
+    }
+    const size_t size = size_;
+    mapping_ = std::shared_ptr<const char>(
+        reinterpret_cast<const char*>(addr),
+        [size](const char* p) { munmap(const_cast<char*>(p), size); });
+    if (Get<uint64_t>() != kSnapshotMagic ||
+        Get<uint32_t>() != kSnapshotVersion) {
+      throw std::runtime_error("Unknown snapshot format: " + filename);
+    }
+  }
+
+  template <typename T>
+  T Get() {
+    T value;
+    memcpy(&value, Take(sizeof(T)), sizeof(T));
+    return value;
+  }
+
+  // Returns a pointer into the mapping, valid as long as GetMapping() is held.
+  template <typename T>
+  const T* GetArray(size_t* n) {
+    *n = Get<uint64_t>();
+    offset_ = (offset_ + kSnapshotAlign - 1) / kSnapshotAlign * kSnapshotAlign;
+    if (*n > size_ / sizeof(T)) {
+      throw std::runtime_error("The snapshot is truncated!");
+    }
+    return reinterpret_cast<const T*>(Take(*n * sizeof(T)));
+  }
+
+  std::string GetString() {
+    size_t n;
+    const char* str = GetArray<char>(&n);
+    return std::string(str, n);
+  }
+
+  // The blocks point into the mapping and must not be written or freed.
+  void GetBlocks(std::vector<uint8_t*>* blocks,
+                 std::vector<uint32_t>* block_bytes) {
+    size_t n, total;
+    const uint64_t* offsets = GetArray<uint64_t>(&n);
+    const uint8_t* bytes = GetArray<uint8_t>(&total);
+    if (n == 0 || offsets[n - 1] != total) {
+      throw std::runtime_error("The snapshot is corrupted!");
+    }
+    blocks->clear();
+    block_bytes->clear();
+    for (size_t i = 0; i + 1 < n; i++) {
+      blocks->push_back(const_cast<uint8_t*>(bytes + offsets[i]));
+      block_bytes->push_back(offsets[i + 1] - offsets[i]);
+    }
+  }
+
+  template <typename S>
+  void GetSerialized(S* s) {
+    size_t n;
+    const char* bytes = GetArray<char>(&n);
+    MemoryBuf buf(bytes, n);
+    std::istream in(&buf);
+    s->load(in);
+  }
+
+  const std::shared_ptr<const char>& GetMapping() const { return mapping_; }
+
+ private:
+  struct MemoryBuf : std::streambuf {
+    MemoryBuf(const char* data, size_t n) {
+      char* p = const_cast<char*>(data);
+      setg(p, p, p + n);
+    }
+  };
+
+  const char* Take(size_t bytes) {
+    if (offset_ > size_ || bytes > size_ - offset_) {
+      throw std::runtime_error("The snapshot is truncated!");
+    }
+    const char* p = mapping_.get() + offset_;
+    offset_ += bytes;
+    return p;
+  }
+
+  std::shared_ptr<const char> mapping_;
+  size_t size_ = 0;
+  size_t offset_ = 0;
+};
+
+/**
+ * @brief A read-only array that either owns its elements (built index) or
+ * views an array in a snapshot mapping (loaded index). Copies of a view share
+ * the mapping, which is unmapped with the last of them.
+ */
+template <typename T>
+class SnapshotArray {
+ public:
+  SnapshotArray() = default;
+
+  SnapshotArray(std::vector<T>&& values) : owned_(std::move(values)) {
+    Reset();
+  }
+
+  SnapshotArray(const SnapshotArray& other) { *this = other; }
+
+  SnapshotArray(SnapshotArray&& other) noexcept { *this = std::move(other); }
+
+  SnapshotArray& operator=(const SnapshotArray& other) {
+    if (this != &other) {
+      owned_ = other.owned_;
+      mapping_ = other.mapping_;
+      if (mapping_) {
+        data_ = other.data_;
+        size_ = other.size_;
+      } else {
+        Reset();
+      }
+    }
+    return *this;
+  }
+
+  // Moving a vector keeps its buffer, so data_ stays valid.
+  SnapshotArray& operator=(SnapshotArray&& other) noexcept {
+    if (this != &other) {
+      owned_ = std::move(other.owned_);
+      mapping_ = std::move(other.mapping_);
+      data_ = other.data_;
+      size_ = other.size_;
+      other.data_ = nullptr;
+      other.size_ = 0;
+    }
+    return *this;
+  }
+
+  SnapshotArray& operator=(std::vector<T>&& values) {
+    owned_ = std::move(values);
+    mapping_.reset();
+    Reset();
+    return *this;
+  }
+
+  void Save(SnapshotWriter* out) const { out->PutArray(data_, size_); }
+
+  void Load(SnapshotReader* in) {
+    size_t n;
+    data_ = in->template GetArray<T>(&n);
+    size_ = n;
+    mapping_ = in->GetMapping();
+    owned_ = std::vector<T>();
+  }
+
+  const T* data() const { return data_; }
+  const T* begin() const { return data_; }
+  const T* end() const { return data_ + size_; }
+  size_t size() const { return size_; }
+  bool empty() const { return size_ == 0; }
+  const T& operator[](size_t i) const { return data_[i]; }
+
+ private:
+  void Reset() {
+    data_ = owned_.data();
+    size_ = owned_.size();
+  }
+
+  std::vector<T> owned_;
+  std::shared_ptr<const char> mapping_;
+  const T* data_ = nullptr;
+  size_t size_ = 0;
+};
+
+#endif  // INDEXES_SNAPSHOT_H_
@@ -2,25 +2,42 @@ import numpy as np
 import struct
 from scipy.stats import norm, lognorm
 import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../scripts'))
+from sosd import write_sosd
+
+# Keys are written as the one-key-per-line text files the LeCo C++ experiments
+# read. Pass --sosd to also write them in the SOSD binary format (uint64 size
+# header + keys), which leco_lp.py and the LID tools read through
+# scripts/sosd.py. Each output is skipped only if that file already exists.
+WRITE_SOSD = "--sosd" in sys.argv
+
+
+def save_keys(path, make_keys):
+    outputs = [path + ".txt"] + ([path] if WRITE_SOSD else [])
+    if all(os.path.exists(out) for out in outputs):
+        return
+    print("32 bit...")
+    keys = make_keys()
+    if not os.path.exists(path + ".txt"):
+        np.savetxt(path + ".txt", keys, fmt='%d')
+    if WRITE_SOSD and not os.path.exists(path):
+        write_sosd(path, keys)
+
 
 # any arbitrary seed value will do, but this one is clearly the best.
 np.random.seed(seed=42) 
 
 NUM_KEYS = 200000000
 
-print("Generating linear data...")
-if not os.path.exists("../integer_data/linear_200M_uint32.txt"):
-    print("32 bit...")
+def linear_keys():
     keys = np.linspace(0, 1, NUM_KEYS + 2)[1:-1]
     keys = (keys - np.min(keys)) / (np.max(keys) - np.min(keys))
     keys *= 2**32 - 1
-    keys = keys.astype(np.uint32)
-    np.savetxt("../integer_data/linear_200M_uint32.txt", keys,fmt='%d')
+    return keys.astype(np.uint32)
 
 
-print("Generating normal data...")
-if not os.path.exists("../integer_data/normal_200M_uint32.txt"):
-    print("32 bit...")
+def normal_keys():
     keys = np.linspace(0, 1, NUM_KEYS + 2)[1:-1]
 
     # for some reason, the PPF function seems to use quadratic memory
@@ -31,8 +48,15 @@ if not os.path.exists("../integer_data/normal_200M_uint32.txt"):
 
     keys = (keys - np.min(keys)) / (np.max(keys) - np.min(keys))
     keys *= 2**32 - 1
-    keys = keys.astype(np.uint32)
-    np.savetxt("../integer_data/normal_200M_uint32.txt", keys,fmt='%d')
+    return keys.astype(np.uint32)
+
+
+print("Generating linear data...")
+save_keys("../integer_data/linear_200M_uint32", linear_keys)
+
+
+print("Generating normal data...")
+save_keys("../integer_data/normal_200M_uint32", normal_keys)
 
 
 # print("Generating log normal data...")
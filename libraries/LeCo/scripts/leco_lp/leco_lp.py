@@ -4,19 +4,20 @@ import pandas as pd
 import numpy as np
 # np.set_printoptions(suppress=True)
 import math
-from scipy.optimize import linprog
 import warnings
 warnings.filterwarnings('ignore')
 import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../../scripts'))
+from sosd import load_keys
+from lp_engine import fit_blocks, total_bytes as lp_total_bytes
 
 
 
 def calculate_lp(filename, blocks):
-    data = []
-    with open('../integer_data/'+filename,'r') as ff:
-        for lines in ff:
-            if len(lines) > 1:
-                data.append(int(lines[:-1]))
+    # SOSD binary files are memory-mapped; legacy *.txt files are still accepted
+    data = load_keys('../integer_data/'+filename)
+    # the legacy text datasets hold 32-bit keys, though they load as uint64
+    key_bytes = 4 if filename.endswith('.txt') else data.dtype.itemsize
     
     N = len(data)
 
@@ -25,41 +26,13 @@ def calculate_lp(filename, blocks):
     if blocks * block_size < N:
         blocks += 1
     print(blocks)
-    total_bytes = 0
-    for i in range(blocks):
-        start_ind = block_size*i
-        end_ind = min(block_size*(i+1),N)
-        block_length = end_ind - start_ind 
-        para = []
-        b = []
-
-        c = [0,0,1]
-        for j in range(start_ind,end_ind):
-            para.append([j-start_ind,1,-1])
-            para.append([start_ind-j,-1,-1])
-            b.append(data[j])
-            b.append(-data[j])
-        a_bound = (None, None)
-        b_bound = (None, None)
-        f_bound = (0, None)
-        # print(len(c),len(para),len(b))
-        res = linprog(c, A_ub=para, b_ub=b, options={'maxiter': 40},bounds=[a_bound, b_bound,f_bound])
-        print('{:.5f} {:.5f}'.format(res.x[1],res.x[0]))
-        # theta0=res.x[1]
-        # theta1=res.x[0]
-        # maxerror = 0
-        # for j in range(start_ind,end_ind):
-        #     tmp = data[j]-(theta0+theta1*j)
-        #     if tmp > maxerror:
-        #         maxerror = tmp
-        # print('maxerror {}'.format(maxerror))
-        # if i % 10 == 0:
-        #     print(i)
-        if res.x[-1] >= 0.1:
-            res.x[-1] = math.ceil(res.x[-1])
-            total_bytes+= math.ceil((math.log2(res.x[-1]+1)+1)*block_length /8)
+    # exact minimax fit per block (convex hulls), spread over a process pool
+    starts = np.arange(blocks, dtype=np.int64) * block_size
+    fits = fit_blocks(data, starts)
+    print('\n'.join('{:.5f} {:.5f}'.format(theta0, theta1) for theta0, theta1, _ in fits.tolist()))
+    total_bytes = lp_total_bytes(fits, starts, N)
     print('*'*20)
-    print((total_bytes+blocks*9)/(N*4))
+    print((total_bytes+blocks*9)/(N*key_bytes))
     return total_bytes+blocks*9
             
 
@@ -72,6 +45,10 @@ blocks = {
     "movieid.txt":100000,
     "books_200M_uint32.txt":1000000, 
     "fb_part.txt":37227,
+    "books_200M_uint64":1000000,
+    "fb_200M_uint64":1000000,
+    "wiki_ts_200M_uint64":1000000,
+    "osm_cellids_200M_uint64":1000000,
 }
 
 
@@ -79,5 +56,7 @@ blocks = {
 # for name in datasets:
 #     wf.write(name+'\n')
 #     wf.write(str(calculate_lp(name,blocks[name]))+'\n')
-name = sys.argv[1]
-calculate_lp(name,blocks[name])
\ No newline at end of file
+if __name__ == '__main__':
+    name = sys.argv[1]
+    block_num = int(sys.argv[2]) if len(sys.argv) > 2 else blocks[name]
+    calculate_lp(name,block_num)
\ No newline at end of file
@@ -0,0 +1,171 @@
+"""
+Exact per-block minimax (Chebyshev) linear fits for the LeCo LP cost estimate.
+
+For a block y[0..n) the LP solved by `calculate_lp` is
+
+    min f  s.t.  |y[j] - (theta0 + theta1 * j)| <= f
+
+i.e. the thinnest vertical strip that contains all points (j, y[j]). Like
+`OptimalPiecewiseLinearModel` in indexes/PGM-index-disk/piecewise_linear_model.hpp
+the answer only depends on the upper and lower convex hulls of the points: for a
+slope s the strip width is max(y - s*x) over the upper hull minus min(y - s*x)
+over the lower hull, a convex function of s whose minimum is attained at the
+slope of one of the hull edges. Points are sorted by x, so the hulls are built
+with a monotone chain in O(n); most non-hull points are first peeled off with a
+few vectorized passes so the Python loop only sees hull candidates.
+"""
+from __future__ import annotations
+
+import math
+import mmap
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+PEEL_PASSES = 8
+BLOCKS_PER_TASK = 256
+
+
+def _cross(x: np.ndarray, y: np.ndarray, o: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return (x[a] - x[o]) * (y[b] - y[o]) - (y[a] - y[o]) * (x[b] - x[o])
+
+
+def _hull(x: np.ndarray, y: np.ndarray, upper: bool) -> np.ndarray:
+    idx = np.arange(x.shape[0])
+    # A point that does not turn the right way w.r.t. its two neighbours lies
+    # under (over) their chord and can never be an upper (lower) hull vertex,
+    # so all of them can be dropped at once.
+    for _ in range(PEEL_PASSES):
+        if idx.shape[0] < 3:
+            return idx
+        c = _cross(x, y, idx[:-2], idx[1:-1], idx[2:])
+        keep = c < 0 if upper else c > 0
+        if keep.all():
+            return idx
+        mask = np.ones(idx.shape[0], dtype=bool)
+        mask[1:-1] = keep
+        idx = idx[mask]
+
+    hull: list[int] = []
+    xs, ys = x[idx].tolist(), y[idx].tolist()
+    hx: list[float] = []
+    hy: list[float] = []
+    for i, px, py in zip(idx.tolist(), xs, ys):
+        while len(hull) >= 2:
+            c = (hx[-1] - hx[-2]) * (py - hy[-2]) - (hy[-1] - hy[-2]) * (px - hx[-2])
+            if (c >= 0) if upper else (c <= 0):
+                hull.pop()
+                hx.pop()
+                hy.pop()
+            else:
+                break
+        hull.append(i)
+        hx.append(px)
+        hy.append(py)
+    return np.asarray(hull, dtype=np.int64)
+
+
+def chebyshev_fit(y: np.ndarray) -> tuple[float, float, float]:
+    """
+    Minimax line through (j, y[j]), j = 0..n-1. Returns (theta0, theta1, max_error),
+    the same quantities as res.x[1], res.x[0], res.x[2] of the linprog formulation.
+    """
+    n = y.shape[0]
+    if n == 0:
+        return 0.0, 0.0, 0.0
+    base = float(y[0])
+    if n == 1:
+        return base, 0.0, 0.0
+    # Work on offsets from the first key: keeps the magnitudes small in float64.
+    yy = y.astype(np.float64) - base
+    x = np.arange(n, dtype=np.float64)
+
+    up = _hull(x, yy, upper=True)
+    lo = _hull(x, yy, upper=False)
+    ux, uy = x[up], yy[up]
+    lx, ly = x[lo], yy[lo]
+
+    slopes = np.concatenate((np.diff(uy) / np.diff(ux), np.diff(ly) / np.diff(lx)))
+    slopes = np.unique(slopes)
+
+    def width(s: float) -> tuple[float, float, float]:
+        hi = float(np.max(uy - s * ux))
+        low = float(np.min(ly - s * lx))
+        return hi - low, hi, low
+
+    # width(s) is convex in s: binary search for the first slope where it stops
+    # decreasing.
+    a, b = 0, slopes.shape[0] - 1
+    while a < b:
+        m = (a + b) >> 1
+        if width(slopes[m])[0] <= width(slopes[m + 1])[0]:
+            b = m
+        else:
+            a = m + 1
+    s = float(slopes[a])
+    w, hi, low = width(s)
+    return base + (hi + low) / 2, s, w / 2
+
+
+def block_bytes(max_error: float, block_length: int) -> int:
+    """Residual bytes of one block, as accumulated by the original linprog loop."""
+    if max_error < 0.1:
+        return 0
+    f = math.ceil(max_error)
+    return math.ceil((math.log2(f + 1) + 1) * block_length / 8)
+
+
+_data: np.ndarray | None = None
+
+
+def _init_worker(source) -> None:
+    global _data
+    if isinstance(source, tuple):
+        filename, offset, dtype, shape = source
+        _data = np.memmap(filename, dtype=dtype, mode="r", offset=offset, shape=shape)
+    else:
+        _data = source
+
+
+def _fit_blocks(bounds: list[tuple[int, int]]) -> np.ndarray:
+    out = np.empty((len(bounds), 3), dtype=np.float64)
+    for k, (s, e) in enumerate(bounds):
+        out[k] = chebyshev_fit(_data[s:e])
+    return out
+
+
+def fit_blocks(
+    data: np.ndarray, starts: np.ndarray, stop: int | None = None, processes: int | None = None
+) -> np.ndarray:
+    """
+    Fit every block [starts[i], starts[i+1]); the last one ends at `stop`
+    (default: len(data)). Returns an (#blocks, 3) array of (theta0, theta1, max_error).
+    """
+    n = data.shape[0] if stop is None else min(stop, data.shape[0])
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.append(starts[1:], n)
+    bounds = list(zip(starts.tolist(), np.minimum(ends, n).tolist()))
+    tasks = [bounds[i : i + BLOCKS_PER_TASK] for i in range(0, len(bounds), BLOCKS_PER_TASK)]
+
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(tasks) == 1:
+        _init_worker(data)
+        parts = [_fit_blocks(t) for t in tasks]
+    else:
+        # Memory-mapped inputs are re-opened in the workers instead of pickled.
+        if isinstance(data, np.memmap) and isinstance(data.base, mmap.mmap):
+            source = (data.filename, data.offset, data.dtype, data.shape)
+        else:
+            source = data
+        with Pool(processes=processes, initializer=_init_worker, initargs=(source,)) as pool:
+            parts = pool.map(_fit_blocks, tasks)
+    if not parts:
+        return np.empty((0, 3), dtype=np.float64)
+    return np.concatenate(parts)
+
+
+def total_bytes(fits: np.ndarray, starts: np.ndarray, n: int) -> int:
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.append(starts[1:], n) - starts
+    return sum(block_bytes(err, int(length)) for err, length in zip(fits[:, 2].tolist(), lengths.tolist()))
@@ -4,19 +4,21 @@ import pandas as pd
 import numpy as np
 np.set_printoptions(suppress=True)
 import math
-from scipy.optimize import linprog
 import warnings
 warnings.filterwarnings('ignore')
 import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../../scripts'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../leco_lp'))
+from sosd import load_keys
+from lp_engine import fit_blocks, total_bytes as lp_total_bytes
 
 
 
 def calculate_lp(filename,dataset_name, blocks):
-    data = []
-    with open('../integer_data/'+filename,'r') as ff:
-        for lines in ff:
-            if len(lines) > 1:
-                data.append(int(lines[:-1]))
+    # SOSD binary files are memory-mapped; legacy *.txt files are still accepted
+    data = load_keys('../integer_data/'+filename)
+    # the legacy text datasets hold 32-bit keys, though they load as uint64
+    key_bytes = 4 if filename.endswith('.txt') else data.dtype.itemsize
     
     N = len(data)
 
@@ -26,30 +28,16 @@ def calculate_lp(filename,dataset_name, blocks):
             if len(lines) > 1:
                 block_start_idx.append(int(lines[:-1]))
 
-    total_bytes = 0
-    for i in range(len(block_start_idx)-1):
-        start_ind = block_start_idx[i]
-        end_ind = min(block_start_idx[i+1],N)
-        block_length = end_ind - start_ind
-        para = []
-        b = []
-        c = [0,0,1]
-        # print(start_ind,end_ind)
-        for j in range(start_ind,end_ind):
-            para.append([j-start_ind,1,-1])
-            para.append([start_ind-j,-1,-1])
-            b.append(data[j])
-            b.append(-data[j])
-        a_bound = (None, None)
-        b_bound = (None, None)
-        f_bound = (0, None)
-        res = linprog(c, A_ub=para, b_ub=b, options={'maxiter': 40},bounds=[a_bound, b_bound,f_bound])
-        print('{} {} {} {} {}'.format(i, start_ind, end_ind, res.x[1],res.x[0]))
-        if res.x[-1] >= 0.1:
-            res.x[-1] = math.ceil(res.x[-1])
-            total_bytes+= math.ceil((math.log2(res.x[-1]+1)+1)*block_length /8)
+    # exact minimax fit per segment (convex hulls), spread over a process pool
+    starts = np.asarray(block_start_idx[:-1], dtype=np.int64)
+    ends = np.minimum(np.asarray(block_start_idx[1:], dtype=np.int64), N)
+    stop = int(ends[-1]) if len(ends) else 0
+    fits = fit_blocks(data, starts, stop)
+    for i, (theta0, theta1, _) in enumerate(fits.tolist()):
+        print('{} {} {} {} {}'.format(i, starts[i], ends[i], theta0, theta1))
+    total_bytes = lp_total_bytes(fits, starts, stop)
     print('*'*20)
-    print((total_bytes+blocks*9)/(N*4))
+    print((total_bytes+blocks*9)/(N*key_bytes))
     return total_bytes+blocks*9
             
 
@@ -67,6 +55,7 @@ blocks = {
 # for name in datasets:
 #     wf.write(name+'\n')
 #     wf.write(str(calculate_lp(name,blocks[name]))+'\n')
-name = sys.argv[1]
-dataset = sys.argv[2]
-calculate_lp(name,dataset, blocks[name])
\ No newline at end of file
+if __name__ == '__main__':
+    name = sys.argv[1]
+    dataset = sys.argv[2]
+    calculate_lp(name,dataset, blocks[name])
\ No newline at end of file
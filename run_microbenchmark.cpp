@@ -2,7 +2,9 @@
 #include <iostream>
 #include <map>
 #include <sstream>
+#include <set>
 
+#include "experiments/auto_tuner.h"
 #include "experiments/benchmark.h"
 #include "indexes/DI-v1.h"
 #include "indexes/DI-v3.h"
@@ -18,8 +20,46 @@
 #include "indexes/rs-disk-pg.h"
 #include "indexes/rs-disk.h"
 
+// Removes the flag "name <value>", "name=<value>" or, without value, "name"
+// from anywhere in the arguments. Returns whether it is given.
+static bool TakeFlag(int* argc, char* argv[], const std::string& name,
+                     std::string* value = nullptr) {
+  bool found = false;
+  for (int i = 1; i < *argc;) {
+    const std::string arg = argv[i];
+    int flag_argc = 0;
+    if (arg == name && (value == nullptr || i + 1 < *argc)) {
+      if (value != nullptr) {
+        *value = argv[i + 1];
+      }
+      flag_argc = value == nullptr ? 1 : 2;
+    } else if (value != nullptr && arg.rfind(name + "=", 0) == 0) {
+      *value = arg.substr(name.size() + 1);
+      flag_argc = 1;
+    } else {
+      i++;
+      continue;
+    }
+    found = true;
+    for (int j = i; j + flag_argc <= *argc; j++) {
+      argv[j] = argv[j + flag_argc];
+    }
+    *argc -= flag_argc;
+  }
+  return found;
+}
+
 int main(int argc, char* argv[]) {
   char* endptr;
+  std::string index_cache_dir, build_threads, last_mile, page_format,
+      auto_tune;
+  TakeFlag(&argc, argv, "--index-cache", &index_cache_dir);
+  TakeFlag(&argc, argv, "--last-mile", &last_mile);
+  TakeFlag(&argc, argv, "--page-format", &page_format);
+  TakeFlag(&argc, argv, "--build-threads", &build_threads);
+  TakeFlag(&argc, argv, "--auto-tune", &auto_tune);
+  const bool build_compare = TakeFlag(&argc, argv, "--build-compare");
+  const bool profile = TakeFlag(&argc, argv, "--profile");
   if ((argc != 9 && argc != 14 && argc != 15) ||
       strtoul(argv[1], &endptr, 10) > 1) {
     for (auto i = 0; i < argc; i++) {
@@ -47,11 +87,41 @@ int main(int argc, char* argv[]) {
            "worst case from the middle position, (a) mid, [mid+1, end), or (b) "
            "mid, [start, mid), \n\t3: one by one from the middle "
            "position, (a) "
-           "mid, mid+1, ... or (b) mid, mid-1, ...)>"
+           "mid, mid+1, ... or (b) mid, mid-1, ..., \n\t4: [start, mid), "
+           "then [mid, end), \n\t5: mid with the page read ahead towards the "
+           "learned error skew, then one by one as 3)>"
         << std::endl;
     std::cout << "\tExample: ./build/LID 1 ./datasets/dataset 0 1 1000 "
                  "PGM-Index 64 1 ./datasets/data/ 1024 0 4 1 1"
               << std::endl;
+    std::cout << "(c) Add --index-cache <dir> to save the built indexes to "
+                 "<dir> and load them in later runs over the same data "
+                 "(PGM-Index-Page, RS-DISK-ORIENTED, DI-V4 and LecoPage)."
+              << std::endl;
+    std::cout << "(d) Add --build-threads <n> to segment the keys of "
+                 "PGM-Index-Page and the DI indexes in n stitched chunks "
+                 "(1: sequential), and --build-compare to also build them "
+                 "sequentially and report the speedup and the model delta."
+              << std::endl;
+    std::cout << "(e) Add --last-mile <binary|linear|branchless|avx2|avx512|"
+                 "simd> to choose the last-mile search over the fetched pages "
+                 "(simd: the widest one the CPU supports); add --profile "
+                 "as well to time it."
+              << std::endl;
+    std::cout << "(f) Add --profile to time the lookup stages on disk per "
+                 "thread and report the p50/p95/p99/p99.9 latencies of the "
+                 "prediction, the reads and the last-mile search."
+              << std::endl;
+    std::cout << "(g) Add --page-format leco to store the records on disk in "
+                 "LeCo-compressed pages (a linear model and bit-packed "
+                 "residuals per page) instead of raw ones (normal mode only)."
+              << std::endl;
+    std::cout << "(h) Add --auto-tune <mem=<MiB>|rp=<pages>> to pick the "
+                 "parameter of PGM-Index-Page, RS-DISK-ORIENTED, DI-V4 and "
+                 "LecoPage from partial builds on sampled windows (the least "
+                 "memory within rp pages per lookup, or the fewest pages "
+                 "within mem MiB) instead of <index_params> (normal mode only)."
+              << std::endl;
     return -1;
   }
   std::cout << "------------------------START LID-----------------------\n";
@@ -65,6 +135,7 @@ int main(int argc, char* argv[]) {
   const std::string kIndexName = argv[6];
   uint64_t kIndexParams = strtoul(argv[7], &endptr, 10);
   const bool KFirstRun = strtoul(argv[8], &endptr, 10);
+  const bool kAutoTune = !auto_tune.empty();
 
   std::vector<Key> keys = LoadKeys<Key>(argv[2]);
   if (!is_sorted(keys.begin(), keys.end())) {
@@ -72,6 +143,43 @@ int main(int argc, char* argv[]) {
   }
 
   Params<Key> params(argv, keys.size());
+  TuneTarget tune_target;
+  if (kAutoTune) {
+    tune_target = ParseTuneTarget(auto_tune);
+    const std::set<std::string> kTunable = {"PGM-Index-Page",
+                                            "RS-DISK-ORIENTED", "DI-V4",
+                                            "LecoPage"};
+    if (!kTunable.count(kIndexName)) {
+      throw std::runtime_error("--auto-tune only supports PGM-Index-Page, "
+                               "RS-DISK-ORIENTED, DI-V4 and LecoPage, got " +
+                               kIndexName);
+    }
+    if (params.is_compression_mode_) {
+      throw std::runtime_error("--auto-tune needs the normal mode!");
+    }
+  }
+  if (!index_cache_dir.empty()) {
+    if (mkdir(index_cache_dir.c_str(), 0755) != 0 && errno != EEXIST) {
+      throw std::runtime_error("Failed to create the index cache " +
+                               index_cache_dir);
+    }
+    params.index_cache_dir_ = index_cache_dir;
+  }
+  if (!build_threads.empty()) {
+    params.build_threads_ = strtoul(build_threads.c_str(), &endptr, 10);
+    if (*endptr != '\0' || params.build_threads_ < 1) {
+      throw std::runtime_error("The number of build threads is invalid!");
+    }
+  }
+  params.build_compare_ = build_compare;
+  if (!last_mile.empty()) {
+    last_mile_mode = ParseLastMileMode(last_mile);
+  }
+  if (profile) {
+    lookup_profiling = true;
+  }
+  std::cout << "Last-mile search:, " << LastMileModeName(last_mile_mode)
+            << std::endl;
   // params.PrintParams();
   PrintCurrentTime();
   std::cout << "# of lookup keys:, " << kLookupNum << std::endl;
@@ -96,11 +204,33 @@ int main(int argc, char* argv[]) {
     }
   }
 
-  if (params.is_on_disk_ && !params.is_compression_mode_ && KFirstRun) {
+  const bool leco_pages = page_format == "leco";
+  if (!page_format.empty() && page_format != "raw" && !leco_pages) {
+    throw std::runtime_error("Unknown page format: " + page_format);
+  }
+  if (leco_pages && (!params.is_on_disk_ || params.is_compression_mode_)) {
+    throw std::runtime_error(
+        "The leco page format needs the normal mode on disk!");
+  }
+  if (leco_pages) {
+    params.leco_pages_ =
+        KFirstRun ? LecoPageTable::Store(keys, params.data_dir_,
+                                         *params.stripe_, params.page_bytes_,
+                                         params.payload_bytes_,
+                                         params.page_num_per_file_)
+                  : LecoPageTable::Load(params.data_dir_, params.page_bytes_,
+                                        params.payload_bytes_, keys.size());
+  } else if (params.is_on_disk_ && !params.is_compression_mode_ && KFirstRun) {
     StoreData<Key>(keys, params);
+    LecoPageTable::Remove(params.data_dir_);
   }
   int file_num = std::ceil(keys.size() * 1.0 / params.record_num_per_file_);
-  params.open_files = OpenFiles(params.data_dir_, file_num);
+  if (params.leco_pages_) {
+    file_num = params.leco_pages_->GetFileNum(params.page_num_per_file_);
+  }
+  if (params.is_on_disk_) {
+    params.open_files = OpenFiles(*params.stripe_, file_num);
+  }
   std::cout << "\nopen " << params.open_files.size() << " files" << std::endl;
 
   const uint64_t lookup_num =
@@ -154,6 +284,10 @@ int main(int argc, char* argv[]) {
       break;
     }
     case kPGMIndexPage:
+      if (kAutoTune) {
+        kIndexParams =
+            AutoTuner<Key, Value>(data, params).TunePGMIndexPage(tune_target);
+      }
       Evaluate<PGMIndexPage<Key, Value>>(data, lookups, lookup_info, params,
                                          kIndexParams);
       break;
@@ -172,6 +306,10 @@ int main(int argc, char* argv[]) {
           {12, kIndexParams, params.pred_granularity_});
       break;
     case kRS_DISK:
+      if (kAutoTune) {
+        kIndexParams =
+            AutoTuner<Key, Value>(data, params).TuneRSDisk(tune_target);
+      }
       Evaluate<RSDiskIndex<Key, Value>>(
           data, lookups, lookup_info, params,
           {12, kIndexParams, params.record_num_per_page_});
@@ -198,7 +336,9 @@ int main(int argc, char* argv[]) {
       break;
     }
     case kDIV4: {
-      float lambda = strtof(argv[7], &endptr);
+      float lambda =
+          kAutoTune ? AutoTuner<Key, Value>(data, params).TuneDIV4(tune_target)
+                    : strtof(argv[7], &endptr);
       Evaluate<DI_V4<Key, Value>>(data, lookups, lookup_info, params,
                                   {lambda, params.record_num_per_page_});
       break;
@@ -239,46 +379,22 @@ int main(int argc, char* argv[]) {
     }
     case KLecoPage: {
       int total_pages = kIndexParams / params.record_num_per_page_;
-      if (argc == 15) {
-        std::string dataname = argv[14];
-        auto p = GetLecoPageParams<LecoPage<Key, Value>>(
-            total_pages, params.record_num_per_page_, dataname);
-        if (p.block_num_ == 0) {
-          std::vector<size_t> fix_list;
-          for (int i = 0; i <= total_pages; i++) {
-            fix_list.push_back(i);
-          }
-          std::vector<size_t> slide_list;
-          for (int i = 0; i <= total_pages / 2; i++) {
-            slide_list.push_back(i);
-          }
-          size_t min_size = UINT64_MAX;
-          size_t min_fix, min_slide;
-
-          for (auto s : slide_list) {
-            for (auto f : fix_list) {
-              if (f + s * 2 == total_pages) {
-                std::cout << "\n\nnow test leco-page on: #slide_pages:" << s
-                          << ",\t#fixed_pages:" << f << ",\tblock_num:" << 1000
-                          << std::endl;
-                auto res = Evaluate<LecoPage<Key, Value>>(
-                    data, lookups, lookup_info, params,
-                    {params.record_num_per_page_, f, s, 1000});
-                if (res < min_size) {
-                  min_size = res;
-                  min_fix = f;
-                  min_slide = s;
-                }
-              }
-            }
-          }
+      if (kAutoTune || argc == 15) {
+        typename LecoPage<Key, Value>::param_t p;
+        if (kAutoTune) {
+          p = AutoTuner<Key, Value>(data, params).TuneLecoPage(tune_target);
         } else {
-          std::cout << "\n\nnow test leco-page on: #slide_pages:"
-                    << p.slide_page_ << ",\t#fixed_pages:" << p.fix_page_
-                    << ",\tblock_num:" << p.block_num_ << std::endl;
-          Evaluate<LecoPage<Key, Value>>(data, lookups, lookup_info, params, p);
+          std::string dataname = argv[14];
+          p = GetLecoPageParams<LecoPage<Key, Value>>(
+              total_pages, params.record_num_per_page_, dataname);
+          if (p.block_num_ == 0) {
+            p = AutoTuner<Key, Value>(data, params).TuneLecoPage(total_pages);
+          }
         }
-
+        std::cout << "\n\nnow test leco-page on: #slide_pages:"
+                  << p.slide_page_ << ",\t#fixed_pages:" << p.fix_page_
+                  << ",\tblock_num:" << p.block_num_ << std::endl;
+        Evaluate<LecoPage<Key, Value>>(data, lookups, lookup_info, params, p);
       } else {
         std::vector<size_t> fix_list;
         for (int i = 0; i <= total_pages; i++) {
@@ -0,0 +1,172 @@
+"""
+Parallel generator of the synthetic datasets, written in the SOSD binary format.
+
+Datasets are named as in the experiment scripts:
+
+  syn_hard_g{G}_l{L} / syn_g{G}_l{L}   GRE hardness datasets (GRE_datasets/synthetic.sh):
+                                       G * 1e4 global segments (epsilon 512) and
+                                       L * 1e6 local segments (epsilon 8)
+  syn_curve_{E}g{G}_l{L}               the same with global epsilon E (scripts/compression.sh)
+  linear_{N}M_uint32|uint64            min-max scaled uniform grid  (LeCo gen_norm.py)
+  normal_{N}M_uint32|uint64            min-max scaled normal quantiles (LeCo gen_norm.py)
+  poisson_timestamps_EVENT_{E}_SENSOR_{S}_...
+                                       sensor timestamps (LeCo poisson_randomdie.py)
+
+Each dataset is cut into chunks that are generated independently by a process
+pool and streamed to the file in order, so memory stays at a few chunks per
+worker whatever the dataset size. Chunks get their own child of the seed, so
+the output only depends on the seed and the chunk size.
+"""
+from __future__ import annotations
+
+import os
+import re
+import sys
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sosd import SOSDWriter  # noqa: E402
+
+from .distributions import GridSpec, PoissonSpec, generate_grid, generate_poisson, plan_grid, plan_poisson  # noqa: E402
+from .hardness import HardSpec, generate_chunk, plan_chunks  # noqa: E402
+
+DEFAULT_NUM = 200000000
+DEFAULT_CHUNK_KEYS = 1 << 20
+LOCAL_EPSILON = 8
+GLOBAL_EPSILON = 512
+
+PRESETS = {
+    # GRE_datasets/synthetic.sh, the hard datasets of Fig.9
+    "fig9": [f"syn_hard_g{g}_l{l}" for l in (1, 2, 4) for g in (10, 12)],
+    # scripts/compression.sh, datasets with varying difficulty
+    "curve": [
+        f"syn_curve_512g{g}_l{l}"
+        for g, l in ((1, 6), (2, 6), (3, 6), (4, 6), (5, 6), (6, 6), (8, 6), (10, 6),
+                     (12, 6), (13, 6), (15, 6), (17, 7), (19, 1))
+    ],
+    # libraries/LeCo/scripts
+    "leco": [
+        "linear_200M_uint32",
+        "normal_200M_uint32",
+        "poisson_timestamps_EVENT_50000_SENSOR_2000_randomdie_OUTER_1000s_INNER_2ms_100M_uint64",
+    ],
+}
+
+_HARD = re.compile(r"syn_(?:hard_)?g(\d+)_l(\d+)")
+_CURVE = re.compile(r"syn_curve_(\d+)g(\d+)_l(\d+)")
+_GRID = re.compile(r"(linear|normal)_(\d+)M_(uint32|uint64)")
+_POISSON = re.compile(r"poisson_timestamps_EVENT_(\d+)_SENSOR_(\d+)_.*")
+
+
+def parse_dataset(name: str, num: int = DEFAULT_NUM) -> HardSpec | GridSpec | PoissonSpec:
+    """The generator parameters of a dataset name; `num` sizes the hardness ones."""
+    if m := _HARD.fullmatch(name):
+        g, l = int(m.group(1)), int(m.group(2))
+        return HardSpec(num, LOCAL_EPSILON, GLOBAL_EPSILON, l * 1000000, g * 10000)
+    if m := _CURVE.fullmatch(name):
+        e, g, l = int(m.group(1)), int(m.group(2)), int(m.group(3))
+        return HardSpec(num, LOCAL_EPSILON, e, l * 1000000, g * 10000)
+    if m := _GRID.fullmatch(name):
+        return GridSpec(int(m.group(2)) * 1000000, m.group(3), m.group(1) == "normal")
+    if m := _POISSON.fullmatch(name):
+        return PoissonSpec(int(m.group(1)), int(m.group(2)))
+    raise ValueError(f"Unknown synthetic dataset: {name}")
+
+
+def _hard_task(args: tuple[HardSpec, int, int, np.random.SeedSequence]) -> tuple[np.ndarray, int]:
+    return generate_chunk(*args)
+
+
+def _grid_task(args: tuple[GridSpec, int, int]) -> tuple[np.ndarray, int]:
+    return generate_grid(*args), 0
+
+
+def _poisson_task(args: tuple[PoissonSpec, np.ndarray, np.ndarray, np.random.SeedSequence]) -> tuple[np.ndarray, int]:
+    return generate_poisson(*args), 0
+
+
+def _ordered_map(pool: Pool | None, fn: Callable, tasks: Iterable, window: int) -> Iterator:
+    """Like pool.imap, but with at most `window` chunks in flight or waiting to be written."""
+    if pool is None:
+        yield from map(fn, tasks)
+        return
+    it = iter(tasks)
+    pending = deque(pool.apply_async(fn, (t,)) for t in islice(it, window))
+    while pending:
+        result = pending.popleft().get()
+        for t in islice(it, 1):
+            pending.append(pool.apply_async(fn, (t,)))
+        yield result
+
+
+def _tasks(spec: HardSpec | GridSpec | PoissonSpec, chunk_keys: int, seed: int) -> tuple[Callable, list]:
+    root = np.random.SeedSequence(seed)
+    if isinstance(spec, HardSpec):
+        spec.validate()
+        chunks = plan_chunks(spec, chunk_keys)
+        seeds = root.spawn(len(chunks))
+        return _hard_task, [(spec, f, l, s) for (f, l), s in zip(chunks, seeds)]
+    if isinstance(spec, GridSpec):
+        return _grid_task, [(spec, s, e) for s, e in plan_grid(spec, chunk_keys)]
+    plan_seed, chunk_seed = root.spawn(2)
+    chunks = plan_poisson(spec, chunk_keys, plan_seed)
+    seeds = chunk_seed.spawn(len(chunks))
+    return _poisson_task, [(spec, o, c, s) for (o, c), s in zip(chunks, seeds)]
+
+
+def generate(
+    name: str,
+    path: str | Path,
+    num: int = DEFAULT_NUM,
+    procs: int | None = None,
+    chunk_keys: int = DEFAULT_CHUNK_KEYS,
+    seed: int = 42,
+    pool: Pool | None = None,
+) -> int:
+    """
+    Generate the dataset `name` into `path` and return #keys. The file is
+    written as path.tmp and renamed once complete. Raises if the keys come out
+    unsorted.
+    """
+    spec = parse_dataset(name, num)
+    dtype = spec.dtype if isinstance(spec, GridSpec) else "uint64"
+    fn, tasks = _tasks(spec, chunk_keys, seed)
+    procs = procs or os.cpu_count() or 1
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+
+    own_pool = pool is None and procs > 1
+    if own_pool:
+        pool = Pool(procs)
+    try:
+        with SOSDWriter(tmp, dtype) as out:
+            offset, last = 0, None
+            for keys, exit_key in _ordered_map(pool, fn, tasks, 2 * procs):
+                if offset:
+                    keys += np.uint64(offset)
+                if keys.size:
+                    if (last is not None and keys[0] < last) or np.any(keys[1:] < keys[:-1]):
+                        raise RuntimeError(f"{name}: generated keys are not sorted")
+                    last = keys[-1]
+                out.write(keys)
+                offset += exit_key
+            count = out.count
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    finally:
+        if own_pool:
+            pool.close()
+            pool.join()
+    tmp.rename(path)
+    return count
+
+
+__all__ = ["PRESETS", "generate", "parse_dataset", "HardSpec", "GridSpec", "PoissonSpec"]
+
@@ -0,0 +1,75 @@
+"""
+Chunked versions of the LeCo synthetic datasets (libraries/LeCo/scripts).
+
+- linear / normal (gen_norm.py): the quantiles of a uniform grid over (0, 1),
+  min-max scaled to the key type. Both ends of the scaling are known up front,
+  so any range of ranks can be generated on its own.
+- poisson (poisson_randomdie.py): `events` outer timestamps with Poisson gaps
+  of `outer_gap`; at each of them a random number of the `sensors` report, with
+  Poisson gaps of `inner_gap` between them. The outer timestamps and the sensor
+  counts are drawn by the planner, the inner gaps by the chunks.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+# Largest float64 that converts to the key type without overflowing.
+_MAX_FLOAT = {4: float(2**32 - 1), 8: float(2**64 - 2048)}
+
+
+@dataclass(frozen=True)
+class GridSpec:
+    num: int
+    dtype: str
+    normal: bool  # normal quantiles, otherwise linear
+
+    def _quantiles(self, ranks: np.ndarray) -> np.ndarray:
+        p = (ranks + 1) / (self.num + 1)
+        if not self.normal:
+            return p
+        # Imported lazily, only the normal family needs scipy.
+        from scipy.special import ndtri
+
+        return ndtri(p)
+
+
+def plan_grid(spec: GridSpec, chunk_keys: int) -> list[tuple[int, int]]:
+    return [(s, min(s + chunk_keys, spec.num)) for s in range(0, spec.num, chunk_keys)]
+
+
+def generate_grid(spec: GridSpec, start: int, stop: int) -> np.ndarray:
+    lo, hi = spec._quantiles(np.array([0, spec.num - 1], dtype=np.float64))
+    q = spec._quantiles(np.arange(start, stop, dtype=np.float64))
+    scale = _MAX_FLOAT[np.dtype(spec.dtype).itemsize]
+    return np.minimum((q - lo) / (hi - lo) * scale, scale).astype(spec.dtype)
+
+
+@dataclass(frozen=True)
+class PoissonSpec:
+    events: int
+    sensors: int
+    random_die: int = 500
+    outer_gap: int = 1000000000000
+    inner_gap: int = 2000000
+
+
+def plan_poisson(spec: PoissonSpec, chunk_keys: int, seed: np.random.SeedSequence) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Chunks of whole events: (outer timestamps, #reporting sensors)."""
+    rng = np.random.default_rng(seed)
+    outer = np.cumsum(rng.poisson(spec.outer_gap, spec.events))
+    counts = spec.sensors - rng.integers(0, spec.random_die + 1, size=spec.events)
+    step = max(1, chunk_keys // max(1, spec.sensors))
+    return [(outer[e : e + step], counts[e : e + step]) for e in range(0, spec.events, step)]
+
+
+def generate_poisson(spec: PoissonSpec, outer: np.ndarray, counts: np.ndarray, seed: np.random.SeedSequence) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    total = int(counts.sum())
+    starts = np.cumsum(counts) - counts
+    gaps = rng.poisson(spec.inner_gap, total).astype(np.uint64)
+    # The first key of an event is its outer timestamp.
+    gaps[starts] = 0
+    ts = np.cumsum(gaps)
+    return ts - np.repeat(ts[starts], counts) + np.repeat(outer.astype(np.uint64), counts)
@@ -0,0 +1,223 @@
+"""
+Vectorized port of the piecewise-linear hardness generator in GRE_datasets/generator.cpp.
+
+The keys of a `syn_hard_g*_l*` dataset are laid out as `gv` global segments,
+each of them fitting one line within `ge`, and split into local segments that
+fit a steeper line within `le`. Like `ConstraintGenerator`:
+
+- a global segment starts just outside the ge-envelope of the previous one and
+  draws a slope dy/dx with dy in [1, 10] and dx in [101, 102];
+- a local segment starts just outside the le-envelope of the previous local
+  line (but inside the global one), and its slope is picked so that the keys of
+  the whole segment still fit in both envelopes;
+- every other key is drawn uniformly from the intersection of the two envelopes
+  at its rank.
+
+The C++ loop draws every key after the previous one. Here only the O(1) chain of
+segment lines is walked in Python; the keys of a global segment are then drawn
+at once from per-key envelopes, and `max(x, last_x + 1)` becomes a running
+maximum. Global segments are generated in their own frame (origin at key 0), so
+chunks of whole global segments are independent: the driver only shifts each
+chunk by the exit key of the previous one.
+"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+# A local line steeper than this leaves too few keys between its envelope
+# bounds, see ConstraintGenerator::generate_local_slope.
+MAX_LOCAL_SLOPE = 0.2
+
+
+@dataclass(frozen=True)
+class HardSpec:
+    num: int
+    le: int
+    ge: int
+    lv: int  # #local segments
+    gv: int  # #global segments
+
+    def validate(self) -> None:
+        if self.le > self.ge or self.lv < self.gv:
+            raise ValueError(
+                "Wrong setting for the parameters: requires local epsilon <= global epsilon "
+                f"and local value >= global value (le={self.le} ge={self.ge} lv={self.lv} gv={self.gv})"
+            )
+        if self.gv < 1:
+            raise ValueError(f"needs at least one global segment (gv={self.gv})")
+        # Every local segment needs two keys to draw a line through, also in the
+        # global segment that gets the most local segments and the fewest keys.
+        min_num = 2 * -(-self.lv // self.gv) * self.gv
+        if self.num < min_num:
+            raise ValueError(
+                f"{self.num} keys are too few for {self.gv} global and {self.lv} local segments "
+                f"(needs at least {min_num})"
+            )
+
+    def global_sizes(self, first: int, last: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        #keys and #local segments of the global segments [first, last). Both are
+        spread evenly; generator.cpp puts the remainders in the last global
+        segment, which e.g. leaves it 80016 local segments for g12_l2.
+        """
+        g = np.arange(first, last + 1, dtype=np.int64)
+        keys = np.diff(g * self.num // self.gv)
+        local = np.diff(g * self.lv // self.gv)
+        return keys, local
+
+def plan_chunks(spec: HardSpec, chunk_keys: int) -> list[tuple[int, int]]:
+    """Group whole global segments into chunks of about `chunk_keys` keys."""
+    per_global = max(1, spec.num // spec.gv)
+    step = max(1, chunk_keys // per_global)
+    return [(g, min(g + step, spec.gv)) for g in range(0, spec.gv, step)]
+
+
+def _local_slope(gi: float, gs: float, ox: int, oy: int, target: int, le: int, ge: int, u: float) -> float:
+    """
+    The local line through the origin (ox, oy) and (x, target), see
+    ConstraintGenerator::generate_local_slope; its two tuning loops are solved
+    in closed form since both conditions are monotone in x.
+    """
+    min_x = max(math.ceil((target - ge - gi) / gs), ox + 1)
+    max_x = math.floor((target + ge - gi) / gs)
+    mid_x = math.floor((target - gi) / gs)
+    if mid_x <= min_x:
+        mid_x = max_x
+    dy = target - oy
+    # The envelope of the local line at target + 1 must end at least two keys
+    # before the global one, so that the next local segment can start between.
+    next_max_global = math.trunc((target + 1 + ge - gi) / gs)
+    # x - ox < (next_max_global - 1 - ox) * dy / (dy + 1 + le), in integers so
+    # that an exact quotient is not rounded up.
+    cap_x = ox - (-(next_max_global - 1 - ox) * dy // (dy + 1 + le)) - 1
+    # When the previous local envelope ends right before the global line, x is
+    # drawn from a few keys left of mid_x and the slope comes out steep; draw
+    # again up to the global envelope then.
+    for upper in dict.fromkeys((mid_x, max_x)):
+        x = min_x + math.trunc((upper - min_x - 1) * u)
+        if x < upper - 1:
+            x = max(x, min(upper - 1, math.ceil(ox + dy / MAX_LOCAL_SLOPE)))
+        x = max(min_x, min(x, cap_x))
+        if x <= ox:
+            continue
+        slope = dy / (x - ox)
+        next_max_local = math.trunc(ox + (dy + 1 + le) / slope)
+        if slope < 1 and next_max_local < next_max_global - 1:
+            return slope
+    raise RuntimeError(f"cannot select an uncovered local slope at rank {target}")
+
+
+def _fits(x: np.ndarray, y: np.ndarray, key: int, rank: int, eps: int) -> bool:
+    """
+    Whether a line through (key, rank + eps) keeps all the points (x, y) within
+    eps. For a point right of and below the segment this is what
+    OptimalPiecewiseLinearModel::add_point decides.
+    """
+    d = key - x
+    return bool(np.max((rank - y) / d) <= np.min((rank + 2 * eps - y) / d))
+
+
+def _global_segment(
+    n_g: int, m_g: int, gs: float, le: int, ge: int, u_slope: list[float], u_outside: list[float], rng: np.random.Generator
+) -> tuple[np.ndarray, int]:
+    """
+    Keys of one global segment whose first key is 0 at rank 0, and the key at
+    which the next global segment starts.
+    """
+    gi = 0.0
+    base, extra = divmod(n_g, m_g)
+    # Per local segment: first rank, origin key and local line
+    # (rank = intercept + slope * key).
+    seg_rank = np.empty(m_g, dtype=np.int64)
+    seg_ox = np.empty(m_g, dtype=np.int64)
+    seg_li = np.empty(m_g)
+    seg_ls = np.empty(m_g)
+    ox, oy = 0, 0
+    for j in range(m_g):
+        n_l = base + (extra if j == m_g - 1 else 0)
+        target = oy + n_l - 1
+        ls = _local_slope(gi, gs, ox, oy, target, le, ge, u_slope[j])
+        li = oy - ox * ls
+        seg_rank[j], seg_ox[j], seg_li[j], seg_ls[j] = oy, ox, li, ls
+        if j == m_g - 1:
+            break
+        # The last key drawn in this segment is at most last_x.
+        last_x = min(math.floor((target + ge - gi) / gs), math.floor((target + le - li) / ls))
+        # ConstraintGenerator::generate_outside_local
+        rank = target + 1
+        restrict = rank + (base + (extra if j + 1 == m_g - 1 else 0)) - 1
+        next_max_global = math.trunc((rank + ge - gi) / gs)
+        restrict_global = math.trunc((restrict - gi) / gs)
+        next_max_global = min(next_max_global, restrict_global - (restrict - rank) * 2)
+        next_max_local = math.trunc((rank + le - li) / ls)
+        if next_max_global < next_max_local:
+            ox = last_x + 1
+        else:
+            ox = next_max_local + 1 + math.trunc((next_max_global - next_max_local) * u_outside[j])
+            ox = max(min(ox, next_max_global), last_x + 1)
+        oy = rank
+
+    # Draw the other keys from the envelopes at their rank.
+    lens = np.diff(np.append(seg_rank, n_g))
+    sid = np.repeat(np.arange(m_g), lens)
+    r = np.arange(n_g, dtype=np.float64)
+    li, ls = seg_li[sid], seg_ls[sid]
+    lo = np.maximum(np.ceil((r - ge - gi) / gs), np.ceil((r - le - li) / ls))
+    hi = np.minimum(np.floor((r + ge - gi) / gs), np.floor((r + le - li) / ls))
+    keys = (lo + np.trunc((hi - lo) * (rng.integers(0, 1001, size=n_g) / 1000.0))).astype(np.int64)
+    keys[seg_rank] = seg_ox
+    # max(x, last_x + 1) of every key at once.
+    idx = np.arange(n_g, dtype=np.int64)
+    keys = np.maximum.accumulate(keys - idx) + idx
+
+    # ConstraintGenerator::generate_outside_global, then move the key right
+    # until no line can take it in the segment, found by doubling + bisection.
+    # A segment of at most 2 * ge + 1 ranks fits a flat line whatever the key.
+    x = keys.astype(np.float64)
+    lo_key = max(math.trunc((n_g + ge - gi) / gs) + 1, int(keys[-1]) + 1)
+    if n_g <= 2 * ge + 1 or not _fits(x, r, lo_key, n_g, ge):
+        return keys, lo_key
+    step = 1
+    while _fits(x, r, lo_key + step, n_g, ge):
+        lo_key += step
+        step *= 2
+    hi_key = lo_key + step
+    while hi_key - lo_key > 1:
+        mid = (lo_key + hi_key) // 2
+        if _fits(x, r, mid, n_g, ge):
+            lo_key = mid
+        else:
+            hi_key = mid
+    return keys, hi_key
+
+
+def generate_chunk(spec: HardSpec, first: int, last: int, seed: np.random.SeedSequence) -> tuple[np.ndarray, int]:
+    """
+    Keys of the global segments [first, last), starting at key 0, and the key
+    at which the next global segment starts (relative to the same origin).
+    """
+    rng = np.random.default_rng(seed)
+    g_keys, g_local = spec.global_sizes(first, last)
+    n_local = int(g_local.sum())
+    # Draws of the segment chain: global dy, dx; slope and outside-local picks.
+    g_dy = rng.integers(1, 11, size=last - first).tolist()
+    g_dx = rng.integers(101, 103, size=last - first).tolist()
+    u_slope = (rng.integers(0, 1001, size=n_local) / 1000.0).tolist()
+    u_outside = (rng.integers(0, 1001, size=n_local) / 1000.0).tolist()
+
+    out = np.empty(int(g_keys.sum()), dtype=np.uint64)
+    pos, s, offset = 0, 0, 0
+    for g in range(last - first):
+        n_g, m_g = int(g_keys[g]), int(g_local[g])
+        keys, exit_key = _global_segment(
+            n_g, m_g, g_dy[g] / g_dx[g], spec.le, spec.ge, u_slope[s : s + m_g], u_outside[s : s + m_g], rng
+        )
+        out[pos : pos + n_g] = keys
+        out[pos : pos + n_g] += np.uint64(offset)
+        pos += n_g
+        s += m_g
+        offset += exit_key
+    return out, offset
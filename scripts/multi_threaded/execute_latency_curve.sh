@@ -0,0 +1,59 @@
+printf "Execute open-loop multi-threaded ycsb benchmark (throughput vs. latency)\n"
+# workload setup
+dataset=(fb_200M_uint64)
+workloads=(cc aa c)
+patterns=("/uniform_150")
+page_bytes=4096
+useless=1
+range=0
+# output date
+date=${3}_latency_curve
+thread_num=$4
+merge_t_num=$5
+# constant or poisson; rates in K ops/s (comma-separated), swept if unset
+export YCSB_ARRIVAL=${6:-poisson}
+export YCSB_RATES=$7
+
+merge_ratio=178
+di_param=2
+leco_param=5
+
+index_path="$1/indexes/"
+for pattern in ${patterns[*]}
+do
+    for wl in ${workloads[*]}
+    do
+        for data in ${dataset[*]}
+        do
+            printf "Testing ${data} using workload $wl...\n"
+            mkdir -p $2/results$pattern/
+            workload_dir="$1$pattern/$data/$wl"
+            resfile="$2/results$pattern/${date}_${data}_${wl}.csv"
+            curvefile="$2/results$pattern/${date}_${data}_${wl}_curve.csv"
+
+            rm -rf $index_path
+            mkdir $index_path
+            index="HYBRID_BTREE_DI"
+            indexfile="${index_path}${index}_${data}_${wl}.idx"
+            echo "     index: $index, resfile: $resfile"
+            ./build/MULTI-HYBRID-LID $workload_dir $range $index $useless $di_param $indexfile $page_bytes $thread_num $merge_ratio $merge_t_num >> $resfile
+
+            rm -rf $index_path
+            mkdir $index_path
+            index="HYBRID_BTREE_LECO"
+            indexfile="${index_path}${index}_${data}_${wl}.idx"
+            echo "     index: $index, resfile: $resfile"
+            ./build/MULTI-HYBRID-LID $workload_dir $range $index $useless $leco_param $indexfile $page_bytes $thread_num $merge_ratio $merge_t_num >> $resfile
+
+            rm -rf $index_path
+            mkdir $index_path
+            index="BTREE"
+            indexfile="${index_path}${index}_${data}_${wl}_${thread_num}.idx"
+            echo "     index: $index, resfile: $resfile"
+            ./build/MULTI-HYBRID-LID $workload_dir $range $index 64 64 $indexfile $page_bytes $thread_num >> $resfile
+
+            grep "^open-loop" $resfile > $curvefile
+            printf "The test is done, and the curves are written to $curvefile\n"
+        done
+    done
+done
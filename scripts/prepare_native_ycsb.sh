@@ -0,0 +1,30 @@
+printf "Prepare workloads without YCSB\n"
+init=$2 # in million
+ops=$3 # in million
+seed=${5:-42}
+
+suffix="hybrid"
+dataset=(fb_200M_uint64 books_200M_uint64 osm_cellids_200M_uint64)
+workloads=(a b c d e f)
+distributions=(uniform zipfian)
+
+for data in ${dataset[*]}
+do
+    for wl in ${workloads[*]}
+    do
+        for dist in ${distributions[*]}
+        do
+            pattern="${dist}_${init}"
+            if [ ! -f "$1$data" ];then
+                echo "$data not exits"
+            else
+                mkdir -p $1$suffix/$pattern/$data/
+                mkdir -p $4/prepare/
+                save="$1$suffix/${pattern}/${data}/$wl"
+                printf "\nprepare $data dataset for workload $wl, #ops is $ops M, #init is $init M, save wordloads on $save, pattern: $pattern\n"
+                resfilename="$4/prepare/native_I${init}M_OPS${ops}M.csv"
+                ./build/prepare_native_ycsb $1$data $save $init $ops $wl $dist $seed >> $resfilename
+            fi
+        done
+    done
+done
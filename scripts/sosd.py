@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Zero-copy access to SOSD-style binary datasets (`datasets/*_200M_uint64`).
+
+File layout (same as `LoadKeys` in experiments/util_lid.h):
+  uint64_t size
+  size x key (uint64 or uint32, little endian)
+
+`SOSDDataset.keys` is an `np.memmap` over the key array, so opening a 200M-key
+file costs a stat() and an mmap(); pages are faulted in only when touched.
+"""
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
+
+HEADER_BYTES = 8
+
+
+def dtype_from_name(path: str | Path) -> np.dtype:
+    name = Path(path).name
+    if "uint32" in name:
+        return np.dtype("<u4")
+    return np.dtype("<u8")
+
+
+class SOSDDataset:
+    def __init__(self, path: str | Path, dtype: np.dtype | str | None = None):
+        self.path = Path(path)
+        self.dtype = np.dtype(dtype) if dtype is not None else dtype_from_name(self.path)
+
+        file_bytes = self.path.stat().st_size
+        if file_bytes < HEADER_BYTES:
+            raise ValueError(f"{self.path}: too small for a SOSD header ({file_bytes} bytes)")
+        size = int(np.fromfile(self.path, dtype="<u8", count=1)[0])
+        expected = HEADER_BYTES + size * self.dtype.itemsize
+        if file_bytes < expected:
+            raise ValueError(
+                f"{self.path}: header says {size} keys ({expected} bytes) but file has {file_bytes} bytes"
+            )
+
+        if size == 0:
+            self.keys = np.empty(0, dtype=self.dtype)
+        else:
+            self.keys = np.memmap(self.path, dtype=self.dtype, mode="r", offset=HEADER_BYTES, shape=(size,))
+
+    def __len__(self) -> int:
+        return self.keys.shape[0]
+
+    def __getitem__(self, idx):
+        return self.keys[idx]
+
+    def iter_chunks(self, chunk_keys: int = 1 << 24, start: int = 0, stop: int | None = None) -> Iterator[np.ndarray]:
+        """Yield consecutive views (no copies) of at most `chunk_keys` keys."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for s in range(start, stop, chunk_keys):
+            yield self.keys[s : min(s + chunk_keys, stop)]
+
+    def sample(self, n: int, seed: int | None = None, replace: bool = False, sort: bool = True) -> np.ndarray:
+        """Return `n` keys drawn uniformly by position; only the sampled keys are copied."""
+        rng = np.random.default_rng(seed)
+        if not replace:
+            n = min(n, len(self))
+        idx = rng.choice(len(self), size=n, replace=replace)
+        # Sorted positions turn the gather into a forward scan over the mapping.
+        idx.sort()
+        out = self.keys[idx]
+        if not sort:
+            rng.shuffle(out)
+        return np.asarray(out)
+
+    def slice_range(self, lo: int | None = None, hi: int | None = None) -> np.ndarray:
+        """View of the keys in [lo, hi); assumes the file is sorted, as SOSD files are."""
+        s = 0 if lo is None else int(np.searchsorted(self.keys, self.dtype.type(lo), side="left"))
+        e = len(self) if hi is None else int(np.searchsorted(self.keys, self.dtype.type(hi), side="left"))
+        return self.keys[s:max(s, e)]
+
+    def is_sorted(self, chunk_keys: int = 1 << 24) -> bool:
+        prev = None
+        for chunk in self.iter_chunks(chunk_keys):
+            if chunk.size == 0:
+                continue
+            if prev is not None and chunk[0] < prev:
+                return False
+            if np.any(chunk[1:] < chunk[:-1]):
+                return False
+            prev = chunk[-1]
+        return True
+
+
+def open_sosd(path: str | Path, dtype: np.dtype | str | None = None) -> SOSDDataset:
+    return SOSDDataset(path, dtype)
+
+
+class SOSDWriter:
+    """
+    Streaming writer: keys are appended chunk by chunk and the `size` header is
+    patched on close, so arbitrarily large datasets are written with bounded RAM.
+    """
+
+    def __init__(self, path: str | Path, dtype: np.dtype | str | None = None):
+        self.path = Path(path)
+        self.dtype = np.dtype(dtype) if dtype is not None else dtype_from_name(self.path)
+        self.count = 0
+        self._f = self.path.open("wb")
+        self._f.write(np.zeros(1, dtype="<u8").tobytes())
+
+    def write(self, keys: np.ndarray) -> None:
+        keys = np.ascontiguousarray(keys, dtype=self.dtype)
+        keys.tofile(self._f)
+        self.count += keys.shape[0]
+
+    def close(self) -> None:
+        if self._f.closed:
+            return
+        self._f.seek(0)
+        self._f.write(np.array([self.count], dtype="<u8").tobytes())
+        self._f.close()
+
+    def __enter__(self) -> SOSDWriter:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def write_sosd(path: str | Path, keys: np.ndarray | Iterable[np.ndarray], dtype: np.dtype | str | None = None) -> int:
+    """Write one array, or an iterable of chunks, as a SOSD file; returns #keys."""
+    with SOSDWriter(path, dtype) as w:
+        if isinstance(keys, np.ndarray):
+            w.write(keys)
+        else:
+            for chunk in keys:
+                w.write(chunk)
+        return w.count
+
+
+def load_keys(path: str | Path, dtype: np.dtype | str | None = None) -> np.ndarray:
+    """
+    Keys of either a SOSD binary file (memory-mapped) or a legacy one-key-per-line
+    text file (`*.txt`, e.g. LeCo's ../integer_data).
+    """
+    path = Path(path)
+    if path.suffix == ".txt":
+        return np.loadtxt(path, dtype=np.dtype(dtype) if dtype is not None else np.uint64, ndmin=1)
+    return open_sosd(path, dtype).keys
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Inspect a SOSD binary dataset without loading it.")
+    ap.add_argument("dataset", type=Path, help="e.g. datasets/books_200M_uint64")
+    ap.add_argument("--dtype", default=None, help="Key type (default: from the file name, uint64 otherwise).")
+    ap.add_argument("--head", type=int, default=5, help="Print the first N keys.")
+    ap.add_argument("--check-sorted", action="store_true", help="Scan the file in chunks and verify ordering.")
+    args = ap.parse_args()
+
+    ds = open_sosd(args.dataset, args.dtype)
+    print(f"{ds.path}: {len(ds)} keys, dtype={ds.dtype}")
+    if len(ds):
+        print(f"min={ds.keys[0]} max={ds.keys[-1]} head={ds.keys[: args.head].tolist()}")
+    if args.check_sorted:
+        print(f"sorted={ds.is_sorted()}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
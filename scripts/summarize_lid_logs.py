@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import glob
+import hashlib
+import json
+import math
+import os
+from dataclasses import dataclass
+from multiprocessing import Pool
+from pathlib import Path
+
+# Line prefixes emitted by ./build/LID (experiments/benchmark.h).
+GET_MODEL_PREFIX = b"GetModelNum of,"
+EVAL_PREFIXES: dict[bytes, str] = {
+    b"Evaluate index on disk:,": "disk",
+    b"Evaluate index in memory:,": "memory",
+}
+
+# Log key -> column name. Keys that are not listed here are still kept, under a
+# sanitized version of the log key, so new fields in `Evaluate` show up without
+# touching this script.
+EVAL_SCHEMA: dict[str, str] = {
+    "build_time": "build_time_ms",
+    "avg_time": "avg_time_ns",
+    "in-memory_size": "in_memory_mib",
+    "#ops": "ops",
+    "avg_page": "avg_page",
+    "avg_range": "avg_range",
+    "max_range": "max_range",
+    "pred_gran": "pred_gran",
+    "fetch_strategy_": "fetch_strategy",
+    "res": "res",
+    "actual res": "actual_res",
+    "avg_len": "avg_len",
+    "max_len": "max_len",
+    "#threads": "threads",
+    "throughput": "throughput_ops",
+    "avg_io": "avg_io",
+    "total IO": "total_io",
+    "IOPS": "iops",
+    "Bandwidth": "bandwidth_gbs",
+    "latency": "latency_ns",
+    "predict time": "predict_time_ns",
+    "directIO file cpu time": "file_cpu_time_ns",
+    "last-mile search cpu time": "last_mile_search_time_ns",
+    "cpu total time": "cpu_total_time_ns",
+    "io time": "io_time_ns",
+}
+GET_MODEL_SCHEMA: dict[str, str] = {
+    "pred_gran": "model_pred_gran",
+    "#training data": "training_data",
+    "build_time/ms": "model_build_time_ms",
+    "#model": "models",
+    "space/MiB": "space_mib",
+}
+STRING_COLUMNS = ("log", "dataset", "medium", "index", "status")
+
+CACHE_VERSION = 2
+
+
+@dataclass(frozen=True)
+class LogFile:
+    path: Path
+    mtime_ns: int
+    size: int
+
+
+def dataset_from_path(path: Path) -> str:
+    s = path.name
+    # e.g., res_1219_paper_syn_g10_l1_8B_fetch0_syn_g10_l1.csv -> syn_g10_l1
+    if "_fetch" in s:
+        tail = s.split("_fetch", 1)[1]
+        if "_" in tail:
+            return tail.split("_", 1)[1].removesuffix(".csv")
+    return s.removeprefix("res_").removesuffix(".csv")
+
+
+def _column(key: str, schema: dict[str, str]) -> str:
+    col = schema.get(key)
+    if col is not None:
+        return col
+    return "".join(c if c.isalnum() else "_" for c in key.lstrip("#")).strip("_").lower()
+
+
+def _to_float(tok: str) -> float | None:
+    try:
+        return float(tok)
+    except ValueError:
+        return None
+
+
+def parse_fields(tokens: list[str], schema: dict[str, str]) -> tuple[dict[str, float | str], str]:
+    """
+    Walk the comma-separated tokens after the index name. A token ending with
+    ':' (or a bare '#xxx' counter) is a key and the next token is its value,
+    kept as a string if it is not a number (e.g. 'last_mile:,linear');
+    unit tokens such as 'ms'/'ns' and the empty padding columns are skipped.
+    """
+    fields: dict[str, float | str] = {}
+    status = ""
+    i, n = 0, len(tokens)
+    while i < n:
+        tok = tokens[i].strip()
+        i += 1
+        if not tok:
+            continue
+        if tok.startswith("FIND "):
+            # "FIND SUCCESS" or "FIND WRONG res:" followed by the wrong sum.
+            if tok.startswith("FIND SUCCESS"):
+                status = "FIND SUCCESS"
+                continue
+            status = "FIND WRONG"
+            tok = tok.removeprefix("FIND WRONG").strip()
+            if not tok:
+                continue
+        if tok.endswith(":"):
+            key = tok[:-1]
+        elif tok.startswith("#"):
+            key = tok
+        else:
+            continue
+        if i < n:
+            val = tokens[i].strip()
+            if not val or val.endswith(":"):
+                continue
+            v = _to_float(val)
+            fields[_column(key, schema)] = val if v is None else v
+            i += 1
+    return fields, status
+
+
+def parse_log(path: Path) -> list[dict]:
+    """
+    Single pass over one LID log. Each `Evaluate index ...` line becomes one
+    row, joined with the latest `GetModelNum of` line of the same index.
+    """
+    dataset = dataset_from_path(path)
+    last_get: dict[str, dict[str, float | str]] = {}
+    rows: list[dict] = []
+    with path.open("rb") as f:
+        for raw in f:
+            if raw.startswith(GET_MODEL_PREFIX):
+                tokens = raw[len(GET_MODEL_PREFIX) :].decode(errors="ignore").split(",")
+                fields, _ = parse_fields(tokens[1:], GET_MODEL_SCHEMA)
+                last_get[tokens[0].strip()] = fields
+                continue
+            if not raw.startswith(b"Evaluate index"):
+                continue
+            for prefix, medium in EVAL_PREFIXES.items():
+                if raw.startswith(prefix):
+                    break
+            else:
+                continue
+            tokens = raw[len(prefix) :].decode(errors="ignore").split(",")
+            name = tokens[0].strip()
+            fields, status = parse_fields(tokens[1:], EVAL_SCHEMA)
+            row: dict = {
+                "log": str(path),
+                "dataset": dataset,
+                "medium": medium,
+                "index": name,
+                "status": status,
+            }
+            row.update(last_get.get(name, {}))
+            row.update(fields)
+            rows.append(row)
+    return rows
+
+
+def _cache_file(cache_dir: Path, log: LogFile) -> Path:
+    digest = hashlib.sha1(str(log.path.resolve()).encode()).hexdigest()
+    return cache_dir / f"{digest}.json"
+
+
+def _load_cached(cache_dir: Path, log: LogFile) -> list[dict] | None:
+    p = _cache_file(cache_dir, log)
+    try:
+        with p.open("r") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (
+        entry.get("version") != CACHE_VERSION
+        or entry.get("mtime_ns") != log.mtime_ns
+        or entry.get("size") != log.size
+    ):
+        return None
+    return entry["rows"]
+
+
+def _parse_and_cache(job: tuple[LogFile, Path | None]) -> list[dict]:
+    log, cache_dir = job
+    rows = parse_log(log.path)
+    if cache_dir is not None:
+        p = _cache_file(cache_dir, log)
+        tmp = p.with_suffix(f".{os.getpid()}.tmp")
+        with tmp.open("w") as f:
+            json.dump(
+                {"version": CACHE_VERSION, "mtime_ns": log.mtime_ns, "size": log.size, "rows": rows},
+                f,
+            )
+        os.replace(tmp, p)
+    return rows
+
+
+def summarize(
+    files: list[Path], cache_dir: Path | None = None, jobs: int | None = None
+) -> tuple[list[dict], int]:
+    """Return (rows, #parsed files); files whose mtime/size match the cache are not re-parsed."""
+    if cache_dir is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+    per_file: dict[Path, list[dict]] = {}
+    stale: list[LogFile] = []
+    for path in files:
+        st = path.stat()
+        log = LogFile(path=path, mtime_ns=st.st_mtime_ns, size=st.st_size)
+        cached = _load_cached(cache_dir, log) if cache_dir is not None else None
+        if cached is None:
+            stale.append(log)
+        else:
+            per_file[path] = cached
+
+    work = [(log, cache_dir) for log in stale]
+    if len(work) > 1 and jobs != 1:
+        # Largest logs first so one big file does not become the straggler.
+        work.sort(key=lambda w: w[0].size, reverse=True)
+        with Pool(processes=jobs) as pool:
+            for (log, _), rows in zip(work, pool.imap(_parse_and_cache, work)):
+                per_file[log.path] = rows
+    else:
+        for w in work:
+            per_file[w[0].path] = _parse_and_cache(w)
+
+    rows = [r for path in files for r in per_file[path]]
+    return rows, len(stale)
+
+
+def _is_string_column(values: list) -> bool:
+    return any(isinstance(v, str) for v in values)
+
+
+def to_columns(rows: list[dict]) -> dict[str, list]:
+    """
+    One list per column. A field with a non-numeric value in any row becomes a
+    string column ('' where missing, numbers kept as their text); the others
+    are float columns with NaN where missing.
+    """
+    names: list[str] = list(STRING_COLUMNS)
+    seen = set(names)
+    for r in rows:
+        for k in r:
+            if k not in seen:
+                seen.add(k)
+                names.append(k)
+    cols: dict[str, list] = {}
+    for k in names:
+        values = [r.get(k) for r in rows]
+        if k in STRING_COLUMNS or _is_string_column(values):
+            cols[k] = ["" if v is None else v if isinstance(v, str) else f"{v:g}" for v in values]
+        else:
+            cols[k] = [math.nan if v is None else v for v in values]
+    return cols
+
+
+def write_table(cols: dict[str, list], out: Path) -> None:
+    out.parent.mkdir(parents=True, exist_ok=True)
+    if out.suffix == ".parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Writing .parquet requires pyarrow; use a .npz output instead.")
+        pq.write_table(pa.table(cols), out)
+        return
+
+    import numpy as np
+
+    arrays = {
+        k: (np.asarray(v, dtype=str) if _is_string_column(v) else np.asarray(v, dtype=np.float64))
+        for k, v in cols.items()
+    }
+    np.savez(out, **arrays)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(
+        description="Summarize every `Evaluate index ...` line of ./build/LID logs into one columnar table."
+    )
+    ap.add_argument(
+        "--glob",
+        action="append",
+        help="Glob pattern(s) for result logs (default: results/{diskOriented,compression}/res_*.csv).",
+    )
+    ap.add_argument(
+        "--out",
+        default="results/lid_summary.npz",
+        help="Output table, .npz (NumPy) or .parquet (needs pyarrow).",
+    )
+    ap.add_argument(
+        "--cache",
+        default="results/.lid_summary_cache",
+        help="Directory of per-log parse caches keyed by mtime/size; '' disables caching.",
+    )
+    ap.add_argument("--jobs", type=int, default=None, help="Parser processes (default: #CPUs).")
+    args = ap.parse_args()
+
+    patterns = args.glob or [
+        "results/diskOriented/res_*.csv",
+        "results/compression/res_*.csv",
+    ]
+    files = sorted({Path(p) for pat in patterns for p in glob.glob(pat)})
+    if not files:
+        raise SystemExit(f"No files matched: {patterns}")
+
+    cache_dir = Path(args.cache) if args.cache else None
+    rows, parsed = summarize(files, cache_dir=cache_dir, jobs=args.jobs)
+    out = Path(args.out)
+    write_table(to_columns(rows), out)
+
+    print(f"Parsed {parsed}/{len(files)} logs ({len(files) - parsed} cached), {len(rows)} rows -> {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
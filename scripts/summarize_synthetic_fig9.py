@@ -4,10 +4,11 @@ from __future__ import annotations
 import argparse
 import csv
 import glob
-import re
 from dataclasses import dataclass
 from pathlib import Path
 
+from summarize_lid_logs import dataset_from_path, parse_log
+
 
 @dataclass(frozen=True)
 class MetricRow:
@@ -20,52 +21,23 @@ class MetricRow:
     ratio_to_pgm: float | None
 
 
-GET_MODEL_RE = re.compile(
-    r"^GetModelNum of,\s*(?P<name>[^,]+),.*?#model:,(?P<models>\d+),\s*space/MiB:,(?P<mib>[0-9.]+)"
-)
-EVAL_RE = re.compile(
-    r"^Evaluate index on disk:,\s*(?P<name>[^,]+),.*?avg_page:,(?P<avg_page>[0-9.]+).*?(?P<status>FIND SUCCESS|FIND WRONG)"
-)
-
-
-def dataset_from_path(path: Path) -> str:
-    s = path.name
-    # e.g., res_1219_paper_syn_g10_l1_8B_fetch0_syn_g10_l1.csv -> syn_g10_l1
-    if "_fetch0_" in s:
-        return s.split("_fetch0_", 1)[1].removesuffix(".csv")
-    return s.removeprefix("res_").removesuffix(".csv")
-
-
 def parse_file(path: Path) -> dict[str, list[dict]]:
     """
     Returns a dict index_name -> list of observations:
       {models, space_mib, avg_page, status}
     """
-    last_get: dict[str, tuple[int, float]] = {}
     obs: dict[str, list[dict]] = {}
-    with path.open("r", errors="ignore") as f:
-        for line in f:
-            line = line.strip()
-            m = GET_MODEL_RE.match(line)
-            if m:
-                name = m.group("name")
-                last_get[name] = (int(m.group("models")), float(m.group("mib")))
-                continue
-
-            m = EVAL_RE.match(line)
-            if not m:
-                continue
-
-            name = m.group("name")
-            if name not in last_get:
-                continue
-
-            models, mib = last_get[name]
-            avg_page = float(m.group("avg_page"))
-            status = m.group("status")
-            obs.setdefault(name, []).append(
-                {"models": models, "space_mib": mib, "avg_page": avg_page, "status": status}
-            )
+    for row in parse_log(path):
+        if row["medium"] != "disk" or "models" not in row or "avg_page" not in row:
+            continue
+        obs.setdefault(row["index"], []).append(
+            {
+                "models": int(row["models"]),
+                "space_mib": row["space_mib"],
+                "avg_page": row["avg_page"],
+                "status": row["status"],
+            }
+        )
     return obs
 
 
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Parallel, resumable runner for the ./build/LID and ./build/HYBRID-LID sweeps.
+
+Expands the same grids as the bash scripts (`disk_oriented.sh`, `compression.sh`,
+`PG_Space.sh`, `execute_hybrid.sh`, `execute_baseline.sh`; the same env knobs
+DATASETS, PAYLOAD_BYTES, TOTAL_RANGE_LIST, BS_RANGE_LIST, LAMBDA_LIST,
+LOOKUP_COUNT, DATE_TAG) into jobs and runs them as a DAG:
+
+- jobs that read data files on disk hold their device exclusively, so disk
+  throughput is measured one job at a time per device, as in the bash loops;
+- in-memory jobs run concurrently, as long as the threads of the running jobs
+  fit in the CPU budget (--cpus);
+- the first job of a (dataset, payload) group runs with first=1 and writes the
+  data layout and the lookup keys the other jobs of the group read, so they
+  depend on it; groups sharing a layout directory run one after another.
+
+The stdout of each job goes to its own file under <results>/.sweep/<sweep>_<date>/,
+and the journal there records finished jobs and the layout last written to
+each directory. A rerun skips finished jobs and only prepares a layout again
+when another one was written since (or a preparation was interrupted). The
+CSVs of the bash scripts are rebuilt from the per-job outputs in grid order
+after every job, so summarize_lid_logs.py reads them as before.
+
+Usage:
+  python3 scripts/sweep.py compression ./datasets/ ./results 10000000
+  DATASETS="books_200M_uint64" python3 scripts/sweep.py disk_oriented ./datasets/ ./results 10000000 --cpus 16
+  python3 scripts/sweep.py hybrid /path/to/workloads ./results 0926 --dry-run
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+FILE_BYTES = 4096  # file size in MB of the data layout, `fs` in the scripts
+PAGE_KB = 4  # `ps` in the scripts
+FILES_SUFFIX = "_files"
+SOSD_DATASETS = ["fb_200M_uint64", "books_200M_uint64", "wiki_ts_200M_uint64", "osm_cellids_200M_uint64"]
+HYBRID_DATASETS = ["fb_200M_uint64", "books_200M_uint64", "osm_cellids_200M_uint64"]
+
+
+@dataclass
+class Job:
+    key: str  # stable name of the job in the journal
+    argv: list[str]
+    result: Path  # the CSV the bash script appends the output to
+    device: int | None  # st_dev held exclusively while running, None: in-memory
+    threads: int
+    # What first=1 prepares: (directory, version). The jobs of a group read it.
+    layout: tuple[str, str] | None = None
+    first_pos: int | None = None  # index of the first_run argument in argv
+    deps: set[str] = field(default_factory=set)  # must succeed first
+    after: set[str] = field(default_factory=set)  # must finish first
+
+
+def env_list(name: str, default: list[str]) -> list[str]:
+    value = os.environ.get(name, "")
+    return value.split() if value.strip() else default
+
+
+def device_of(path: str | Path) -> int:
+    """st_dev of the nearest existing ancestor of path."""
+    p = Path(path).resolve()
+    while not p.exists():
+        p = p.parent
+    return p.stat().st_dev
+
+
+def job_threads(args: argparse.Namespace, on_disk: bool) -> int:
+    """LID_THREADS as LID reads it (experiments/macro.h), charged to the CPU budget."""
+    value = os.environ.get("LID_THREADS", "")
+    if value.isdigit() and int(value) > 0:
+        return min(int(value), args.cpus)
+    return args.cpus if on_disk else 1
+
+
+def existing_datasets(data_dir: str, names: list[str]) -> list[str]:
+    found = []
+    for data in names:
+        if not Path(f"{data_dir}{data}").is_file():
+            print(f"{data} not exits", file=sys.stderr)
+        else:
+            found.append(data)
+    return found
+
+
+def lid_disk_grid(
+    args: argparse.Namespace, subdir: str, date: str, runs: Callable[[str], list[tuple[str, str, list[str]]]]
+) -> list[Job]:
+    """
+    The common shape of disk_oriented.sh and compression.sh: for every payload
+    and dataset, `runs(data)` lists (index, param, extra args) in script order.
+    """
+    jobs: list[Job] = []
+    for nbytes in env_list("PAYLOAD_BYTES", ["8"]):
+        for data in existing_datasets(args.data_dir, args.datasets):
+            datasrc = f"{args.data_dir}{data}"
+            storesrc = f"{args.data_dir}{data}{FILES_SUFFIX}/{FILE_BYTES}/{PAGE_KB}/"
+            fg = "0"
+            result = Path(args.results) / subdir / f"res_{date}_{nbytes}B_fetch{fg}_{data}.csv"
+            for index, param, extra in runs(data):
+                argv = [args.lid, "1", datasrc, nbytes, "1", str(args.lookups), index, param, "0",
+                        storesrc, str(FILE_BYTES), "0", str(PAGE_KB), fg] + extra
+                jobs.append(Job(
+                    key=f"{data}/{nbytes}B/fetch{fg}/{index}/{param}",
+                    argv=argv, result=result, device=device_of(storesrc),
+                    threads=job_threads(args, True), layout=(storesrc, nbytes), first_pos=8,
+                ))
+    return jobs
+
+
+def disk_oriented(args: argparse.Namespace) -> list[Job]:
+    total_range = env_list("TOTAL_RANGE_LIST", ["4", "128", "256", "512", "768", "1024"])
+    lambdas = env_list("LAMBDA_LIST", ["1.016", "1.5", "2", "3", "4", "5"])
+
+    def runs(data: str) -> list[tuple[str, str, list[str]]]:
+        out = [("DI-V1", lb, []) for lb in lambdas]
+        for r in total_range:
+            para = int(r) // 2
+            out += [("RadixSpline", str(para), []), ("RS-DISK-ORIENTED", str(para), []),
+                    ("PGM-Index-Page", str(para - 1), [])]
+        return out
+
+    return lid_disk_grid(args, "diskOriented", args.date, runs)
+
+
+def compression(args: argparse.Namespace) -> list[Job]:
+    total_range = env_list("TOTAL_RANGE_LIST", ["16", "256", "512", "768", "1024"])
+    bs_range = env_list("BS_RANGE_LIST", ["256", "512", "768", "1024", "1280"])
+    lambdas = env_list("LAMBDA_LIST", ["1.05", "2", "3", "4", "5"])
+
+    def runs(data: str) -> list[tuple[str, str, list[str]]]:
+        out = [(index, lb, []) for lb in lambdas for index in ("DI-V1", "DI-V3", "DI-V4")]
+        for bs in bs_range:
+            out += [("BinarySearch", bs, []), ("LecoZonemap", bs, [data]), ("LecoPage", bs, [data])]
+        for r in total_range:
+            pgm = str(int(r) // 2 - 1)
+            out += [("PGM-Index-Page", pgm, []), ("CompressedPGM", pgm, [])]
+        return out
+
+    return lid_disk_grid(args, "compression", args.date, runs)
+
+
+def pg_space(args: argparse.Namespace) -> list[Job]:
+    """PG_Space.sh: in-memory model sizes; first=1 only writes the lookup keys."""
+    total_range = env_list("TOTAL_RANGE_LIST", ["128", "256", "512", "1024"])
+    pred_gran = env_list("PRED_GRAN_LIST", ["1", "16", "32", "64", "128", "256"])
+    jobs: list[Job] = []
+    for nbytes in env_list("PAYLOAD_BYTES", ["8"]):
+        for data in existing_datasets(args.data_dir, args.datasets):
+            datasrc = f"{args.data_dir}{data}"
+            result = Path(args.results) / "predictionGran" / f"res_{args.date}_SameItem_{data}.csv"
+            for r in total_range:
+                for pg in pred_gran:
+                    para = int(r) // 2 // int(pg)
+                    runs = []
+                    if para > 0:
+                        runs += [("RadixSpline", str(para)), ("RS-PG", str(para))]
+                    if para > 1:
+                        runs += [("PGM-Index-Page", str(para - 1)), ("PGM-PG", str(para - 1))]
+                    for index, param in runs:
+                        jobs.append(Job(
+                            key=f"{data}/{nbytes}B/pg{pg}/{index}/{param}",
+                            argv=[args.lid, "0", datasrc, nbytes, pg, str(args.lookups), index, param, "0"],
+                            result=result, device=None, threads=job_threads(args, False),
+                            layout=(datasrc, nbytes), first_pos=8,
+                        ))
+    return jobs
+
+
+def read_bash_arrays(path: Path) -> dict[str, list[str]]:
+    """`name=(a b c)` lines of scripts/params_*; later lines win, as in bash."""
+    arrays: dict[str, list[str]] = {}
+    for line in path.read_text().splitlines():
+        m = re.match(r"\s*(\w+)=\(([^)]*)\)", line)
+        if m:
+            arrays[m.group(1)] = m.group(2).split()
+    return arrays
+
+
+def hybrid_job(args: argparse.Namespace, key: str, argv: list[str], result: Path) -> Job:
+    return Job(key=key, argv=[args.hybrid_lid] + argv, result=result,
+               device=device_of(args.data_dir), threads=1)
+
+
+def hybrid(args: argparse.Namespace) -> list[Job]:
+    """execute_hybrid.sh; the workload root is the first argument and the date the third."""
+    budget_a, budget_b = "10265559", "8598323"
+    index_path = f"{args.data_dir}/indexes/"
+    groups = [("di", ["HYBRID_BTREE_DI"]), ("leco", ["HYBRID_BTREE_LECO"]),
+              ("static_li", env_list("HYBRID_BASELINE", []))]
+    jobs: list[Job] = []
+    for pattern in ["/uniform_150"]:
+        for wl in ["c", "cc", "aa"]:
+            params = read_bash_arrays(Path(__file__).parent / f"params_{wl}")
+            for data in args.datasets:
+                workload_dir = f"{args.data_dir}{pattern}/{data}/{wl}"
+                result = Path(args.results) / f"results{pattern}" / f"{args.date}_{data}_{wl}.csv"
+                for group, indexes in groups:
+                    for index in indexes:
+                        budget = budget_b if index.startswith("HYBRID_ALEX") else budget_a
+                        indexfile = f"{index_path}{index}_{data}_{wl}.idx"
+                        for p in params.get(group, []):
+                            p = str(int(p) // 2) if group == "static_li" else p
+                            argv = [workload_dir, "0", index, "1", p, indexfile, "4096", budget]
+                            jobs.append(hybrid_job(args, f"{pattern}/{data}/{wl}/{index}/{p}", argv, result))
+    return jobs
+
+
+def baseline(args: argparse.Namespace) -> list[Job]:
+    """execute_baseline.sh; the workload root is the first argument and the date the third."""
+    budget = "10265559"
+    index_path = f"{args.data_dir}/indexes/"
+    jobs: list[Job] = []
+    for pattern in ["/uniform_150"]:
+        for data in args.datasets:
+            for wl in ["cc", "aa", "c"]:
+                workload_dir = f"{args.data_dir}{pattern}/{data}/{wl}"
+                result = Path(args.results) / f"results{pattern}" / f"{args.date}_{data}_{wl}_baseline.csv"
+                runs = [("FILM", "5120", "0.5", f"FILM_{data}_{wl}_.idx")]
+                runs += [("BTREE", bt, "64", f"BTREE_{data}_{wl}_{bt}.idx") for bt in ("2", "1", "0")]
+                runs += [("PGM_ORIGIN", p, "64", f"PGM_ORIGIN_{data}_{wl}_{p}.idx")
+                         for p in ("16", "256", "512", "768", "1024")]
+                for index, p1, p2, idx in runs:
+                    argv = [workload_dir, "0", index, p1, p2, index_path + idx, "4096", budget]
+                    jobs.append(hybrid_job(args, f"{pattern}/{data}/{wl}/{index}/{p1}", argv, result))
+    return jobs
+
+
+# name -> (grid, default datasets, default date tag; None: the third argument)
+SWEEPS: dict[str, tuple[Callable[[argparse.Namespace], list[Job]], list[str], str | None]] = {
+    "disk_oriented": (disk_oriented, SOSD_DATASETS, "0929_reduced_models"),
+    "compression": (compression, SOSD_DATASETS, "0926_reduce_memory"),
+    "pg_space": (pg_space, ["books_200M_uint64", "osm_cellids_200M_uint64"], "0901"),
+    "hybrid": (hybrid, HYBRID_DATASETS, None),
+    "baseline": (baseline, HYBRID_DATASETS, None),
+}
+
+
+class Journal:
+    """Append-only JSON lines; the last record of a job / layout wins."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.done: set[str] = set()
+        self.layouts: dict[str, str | None] = {}
+        if path.exists():
+            for line in path.read_text().splitlines():
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line of a killed run
+                if rec.get("event") == "done":
+                    self.done.add(rec["job"])
+                elif rec.get("event") == "failed":
+                    self.done.discard(rec["job"])
+                elif rec.get("event") == "layout":
+                    self.layouts[rec["dir"]] = rec["version"]
+        self._f = path.open("a")
+
+    def append(self, **rec) -> None:
+        rec["time"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        self._f.write(json.dumps(rec) + "\n")
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def set_layout(self, directory: str, version: str | None) -> None:
+        self.layouts[directory] = version
+        self.append(event="layout", dir=directory, version=version)
+
+
+def part_path(state_dir: Path, job: Job) -> Path:
+    return state_dir / "parts" / (re.sub(r"[^A-Za-z0-9_.-]+", "_", job.key.strip("/")) + ".out")
+
+
+def plan(jobs: list[Job], journal: Journal, state_dir: Path) -> list[Job]:
+    """
+    The pending jobs, with first=1 on the one that prepares the layout of its
+    group and the dependencies on it. Groups on the same directory are chained
+    in grid order, since each of them overwrites the layout of the previous one.
+    """
+    pending = [j for j in jobs if not (j.key in journal.done and part_path(state_dir, j).exists())]
+    groups: dict[tuple[str, str], list[Job]] = {}
+    for job in pending:
+        if job.layout is not None:
+            groups.setdefault(job.layout, []).append(job)
+    current = dict(journal.layouts)
+    previous: dict[str, list[Job]] = {}
+    for (directory, version), members in groups.items():
+        barrier = {j.key for j in previous.get(directory, [])}
+        if current.get(directory) != version:
+            prep = members[0]
+            prep.argv[prep.first_pos] = "1"
+            prep.after |= barrier
+            for job in members[1:]:
+                job.deps.add(prep.key)
+            current[directory] = version
+        else:
+            for job in members:
+                job.after |= barrier
+        previous[directory] = members
+    return pending
+
+
+def assemble(result: Path, jobs: list[Job], done: set[str], state_dir: Path) -> None:
+    """Rewrite the CSV from the outputs of its finished jobs, in grid order."""
+    result.parent.mkdir(parents=True, exist_ok=True)
+    tmp = result.with_name(result.name + ".tmp")
+    with tmp.open("wb") as out:
+        for job in jobs:
+            if job.result == result and job.key in done:
+                part = part_path(state_dir, job)
+                if part.exists():
+                    out.write(part.read_bytes())
+    tmp.replace(result)
+
+
+def run(jobs: list[Job], pending: list[Job], journal: Journal, state_dir: Path, cpus: int, poll: float) -> int:
+    (state_dir / "parts").mkdir(parents=True, exist_ok=True)
+    waiting = {j.key: j for j in pending}
+    running: dict[str, tuple[Job, subprocess.Popen, float]] = {}
+    failed: set[str] = set()
+    busy_devices: set[int] = set()
+    used_cpus = 0
+    finished = 0
+
+    while waiting or running:
+        # Start every ready job that fits, in grid order.
+        for key in list(waiting):
+            job = waiting[key]
+            if job.deps & failed:
+                print(f"[skip] {key}: a job it depends on failed", flush=True)
+                failed.add(key)
+                del waiting[key]
+                continue
+            if (job.deps | job.after) & (set(waiting) | set(running)):
+                continue
+            if job.device is not None and job.device in busy_devices:
+                continue
+            if used_cpus + job.threads > cpus and running:
+                continue
+            env = dict(os.environ, LID_THREADS=str(job.threads))
+            tmp = part_path(state_dir, job).with_suffix(".tmp")
+            with tmp.open("wb") as out:
+                proc = subprocess.Popen(job.argv, stdout=out, env=env)
+            if job.layout is not None and job.argv[job.first_pos] == "1":
+                # A preparation killed half-way leaves no usable layout.
+                journal.set_layout(job.layout[0], None)
+            running[key] = (job, proc, time.time())
+            del waiting[key]
+            used_cpus += job.threads
+            if job.device is not None:
+                busy_devices.add(job.device)
+
+        time.sleep(poll)
+        for key in list(running):
+            job, proc, start = running[key]
+            rc = proc.poll()
+            if rc is None:
+                continue
+            del running[key]
+            used_cpus -= job.threads
+            busy_devices.discard(job.device)
+            finished += 1
+            seconds = time.time() - start
+            tmp = part_path(state_dir, job).with_suffix(".tmp")
+            if rc == 0:
+                tmp.replace(part_path(state_dir, job))
+                if job.layout is not None and job.argv[job.first_pos] == "1":
+                    journal.set_layout(*job.layout)
+                journal.append(event="done", job=key, seconds=round(seconds, 3))
+                journal.done.add(key)
+                assemble(job.result, jobs, journal.done, state_dir)
+                status = "done"
+            else:
+                journal.append(event="failed", job=key, rc=rc, seconds=round(seconds, 3))
+                failed.add(key)
+                status = f"FAILED rc={rc}, output kept in {tmp}"
+            print(f"[{finished}/{len(pending)}] {key} {status} ({seconds:.1f}s)", flush=True)
+    return 1 if failed else 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Run an experiment sweep as a parallel, resumable job DAG.")
+    ap.add_argument("sweep", choices=sorted(SWEEPS))
+    ap.add_argument("data_dir", help="$1 of the bash script: dataset (or workload) prefix, e.g. ./datasets/")
+    ap.add_argument("results", help="$2 of the bash script: result directory")
+    ap.add_argument("lookups", help="$3 of the bash script: #lookups (the date tag for hybrid/baseline)")
+    ap.add_argument("--cpus", type=int, default=os.cpu_count() or 1,
+                    help="CPU budget shared by the running jobs (default: all cores).")
+    ap.add_argument("--lid", default="./build/LID")
+    ap.add_argument("--hybrid-lid", default="./build/HYBRID-LID")
+    ap.add_argument("--dry-run", action="store_true", help="Print the pending jobs and their dependencies.")
+    ap.add_argument("--poll", type=float, default=0.2, help="Seconds between checks of the running jobs.")
+    args = ap.parse_args()
+
+    build, default_datasets, default_date = SWEEPS[args.sweep]
+    args.datasets = env_list("DATASETS", default_datasets)
+    if default_date is None:
+        args.date = args.lookups
+    else:
+        args.date = os.environ.get("DATE_TAG") or default_date
+        args.lookups = os.environ.get("LOOKUP_COUNT") or args.lookups
+    jobs = build(args)
+    if not jobs:
+        print("nothing to run", file=sys.stderr)
+        return 0
+
+    state_dir = Path(args.results) / ".sweep" / f"{args.sweep}_{args.date}"
+    state_dir.mkdir(parents=True, exist_ok=True)
+    journal = Journal(state_dir / "journal.jsonl")
+    pending = plan(jobs, journal, state_dir)
+    print(f"{args.sweep}: {len(jobs)} jobs, {len(jobs) - len(pending)} already done, state in {state_dir}")
+
+    if args.dry_run:
+        for job in pending:
+            deps = f"  after {', '.join(sorted(job.deps | job.after))}" if job.deps or job.after else ""
+            where = "memory" if job.device is None else f"dev {job.device}"
+            print(f"{job.key} [{where}, {job.threads} threads]{deps}\n    {shlex.join(job.argv)} >> {job.result}")
+        return 0
+    for d in (Path(j.argv[9]) for j in pending if j.device is not None and j.first_pos is not None):
+        d.mkdir(parents=True, exist_ok=True)
+    if default_date is None:
+        Path(f"{args.data_dir}/indexes/").mkdir(parents=True, exist_ok=True)
+    return run(jobs, pending, journal, state_dir, args.cpus, args.poll)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -9,6 +9,12 @@ inline void RunYCSBBenchmark(DataVec& init_data, std::vector<int>& ops,
                              typename IndexType::param_t index_params) {
   std::cout << "\n\n--------------- TESTING YCSB BENCHMARK ----------------"
             << std::endl;
+  // Only the multi-threaded indexes implement Delete; the single-threaded
+  // ones would silently skip the deletes and report a wrong throughput.
+  if (std::find(ops.begin(), ops.end(), DELETE) != ops.end()) {
+    throw std::invalid_argument(
+        "DELETE ops are only supported by the multi-threaded benchmark");
+  }
   IndexType index(index_params);
 
   const uint64_t build_time = GetNsTime([&] { index.Build(init_data); }) / 1e6;
@@ -22,6 +28,8 @@ inline void RunYCSBBenchmark(DataVec& init_data, std::vector<int>& ops,
   index.PrintEachPartSize();
   Value res = 0;
   auto ops_size = ops.size();
+  // _RANGE_LEN holds one length per scan, in the order of the scans
+  uint64_t scan_id = 0;
   uint64_t ns = GetNsTime([&] {
     for (uint64_t i = 0; i < ops_size; i++) {
       switch (ops[i]) {
@@ -64,7 +72,7 @@ inline void RunYCSBBenchmark(DataVec& init_data, std::vector<int>& ops,
           break;
         }
         case SCAN: {
-          res += index.Scan(ops_key[i], len[i]);
+          res += index.Scan(ops_key[i], len[scan_id++]);
           break;
         }
         case INSERT: {
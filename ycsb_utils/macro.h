@@ -13,6 +13,30 @@
 // #define BREAKDOWN
 #define HYBRID_MODE 1  // for baseline, inner nodes are stored in main memory
 
+#include <cstdlib>
 #include <iostream>
 
+// Number of key-range partitions of the static part of HybridIndex; a merge
+// only rewrites the partitions its buffered records fall into. One partition
+// (the default) keeps the static part a single index and data file, so every
+// merge retrains and rewrites all of it. Partitioning is opt-in because each
+// partition is a separate model and file, which changes the model memory and
+// the disk layout that the static-index results are compared on.
+inline size_t GetHybridMergePartitions() {
+  const char* env = std::getenv("HYBRID_MERGE_PARTITIONS");
+  if (env && *env) {
+    char* end = nullptr;
+    auto v = std::strtoul(env, &end, 10);
+    if (end != env && v > 0) return static_cast<size_t>(v);
+  }
+  return 1;
+}
+
+// Whether HybridIndex merges on a background thread (default) or stops the
+// caller until the merge is over (HYBRID_BACKGROUND_MERGE=0).
+inline bool GetHybridBackgroundMerge() {
+  const char* env = std::getenv("HYBRID_BACKGROUND_MERGE");
+  return !(env && *env && std::strtoul(env, nullptr, 10) == 0);
+}
+
 #endif  // MACRO_H
\ No newline at end of file
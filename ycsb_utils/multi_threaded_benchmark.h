@@ -4,6 +4,7 @@
 #include <chrono>
 
 #include "../indexes/multi_threaded_hybrid/hybrid_index.h"
+#include "open_loop.h"
 #include "omp.h"
 
 template <typename IndexType>
@@ -32,103 +33,135 @@ inline void RunMultiYCSBBenchmark(DataVec& init_data, std::vector<int>& ops,
   std::vector<int> insert_cnt(thread_num, 0);
   uint64_t latency_ns = 1;
   Value final_res = 0;
+  // _RANGE_LEN holds one length per scan, in the order of the scans
+  std::vector<int> scan_len(ops_size, 0);
+  for (uint64_t i = 0, j = 0; i < ops_size && j < len.size(); i++) {
+    if (ops[i] == SCAN) {
+      scan_len[i] = len[j++];
+    }
+  }
+  const OpenLoopParams open_loop = GetOpenLoopParams();
   auto start = std::chrono::high_resolution_clock::now();
 
-#pragma omp parallel num_threads(thread_num)
-  {
-    auto thread_id = omp_get_thread_num();
-#pragma omp barrier
-#pragma omp master
-    start = std::chrono::high_resolution_clock::now();
-
-// running benchmark
-#pragma omp for schedule(dynamic, 100)
-    for (uint64_t i = 0; i < ops_size; i++) {
-      switch (ops[i]) {
-        case READ: {
-          res[thread_id] += index.Find(ops_key[i], thread_id);
+  auto run_op = [&](uint64_t i, int thread_id) {
+    switch (ops[i]) {
+      case READ: {
+        res[thread_id] += index.Find(ops_key[i], thread_id);
 #ifdef CHECK_CORRECTION
-          auto it = std::lower_bound(
-              init_data.begin(), init_data.end(), ops_key[i],
-              [](const auto& lhs, const Key& key) { return lhs.first < key; });
-          auto tmp = index.Find(ops_key[i], thread_id);
-          if (it->second != tmp || (it == init_data.end() && tmp != 0)) {
-            std::cout << "tid:" << thread_id << " lookup wrong! i:" << i
-                      << ",\tkey:" << ops_key[i] << std::endl;
-            std::cout << "it:" << it->second << std::endl;
-            std::cout << "it.idx:" << it - init_data.begin() << std::endl;
-            std::cout << "tmp:" << tmp << std::endl << std::endl;
-            index.Find(ops_key[i], thread_id);
-          }
-#endif
-          break;
+        auto it = std::lower_bound(
+            init_data.begin(), init_data.end(), ops_key[i],
+            [](const auto& lhs, const Key& key) { return lhs.first < key; });
+        auto tmp = index.Find(ops_key[i], thread_id);
+        if (it->second != tmp || (it == init_data.end() && tmp != 0)) {
+          std::cout << "tid:" << thread_id << " lookup wrong! i:" << i
+                    << ",\tkey:" << ops_key[i] << std::endl;
+          std::cout << "it:" << it->second << std::endl;
+          std::cout << "it.idx:" << it - init_data.begin() << std::endl;
+          std::cout << "tmp:" << tmp << std::endl << std::endl;
+          index.Find(ops_key[i], thread_id);
         }
-        case UPDATE: {
-          res[thread_id] +=
-              index.Update(ops_key[i], Value(thread_id), thread_id);
-#ifdef CHECK_CORRECTION
-          auto it = std::lower_bound(
-              init_data.begin(), init_data.end(), ops_key[i],
-              [](const auto& lhs, const Key& key) { return lhs.first < key; });
-          auto old_val = init_data[it - init_data.begin()].second;
-          init_data[it - init_data.begin()].second = 0;
-          auto tmp = index.Find(ops_key[i], thread_id);
-          if (thread_id != tmp) {
-            std::cout << "tid:" << thread_id << "Update wrong! i:" << i
-                      << ",\tkey:" << ops_key[i] << std::endl;
-            std::cout << "val:" << 0 << ",\told val:" << old_val << std::endl;
-            std::cout << "tmp:" << tmp << ",\tit_idx:" << it - init_data.begin()
-                      << std::endl;
-            index.Find(ops_key[i], thread_id);
-          }
 #endif
-          break;
-        }
-        case SCAN: {
-          res[thread_id] += index.Scan(ops_key[i], len[i], thread_id);
-          break;
+        break;
+      }
+      case UPDATE: {
+        res[thread_id] +=
+            index.Update(ops_key[i], Value(thread_id), thread_id);
+#ifdef CHECK_CORRECTION
+        auto it = std::lower_bound(
+            init_data.begin(), init_data.end(), ops_key[i],
+            [](const auto& lhs, const Key& key) { return lhs.first < key; });
+        auto old_val = init_data[it - init_data.begin()].second;
+        init_data[it - init_data.begin()].second = 0;
+        auto tmp = index.Find(ops_key[i], thread_id);
+        if (thread_id != tmp) {
+          std::cout << "tid:" << thread_id << "Update wrong! i:" << i
+                    << ",\tkey:" << ops_key[i] << std::endl;
+          std::cout << "val:" << 0 << ",\told val:" << old_val << std::endl;
+          std::cout << "tmp:" << tmp << ",\tit_idx:" << it - init_data.begin()
+                    << std::endl;
+          index.Find(ops_key[i], thread_id);
         }
-        case INSERT: {
-          insert_cnt[thread_id]++;
-          res[thread_id] +=
-              index.Insert(ops_key[i], Value(thread_id), thread_id);
+#endif
+        break;
+      }
+      case SCAN: {
+        res[thread_id] += index.Scan(ops_key[i], scan_len[i], thread_id);
+        break;
+      }
+      case INSERT: {
+        insert_cnt[thread_id]++;
+        res[thread_id] +=
+            index.Insert(ops_key[i], Value(thread_id), thread_id);
 #ifdef CHECK_CORRECTION
-          // size_t now_size = init_data.size();
-          // for (int i = 0; i < thread_num; i++) {
-          //   now_size += insert_cnt[i];
-          // }
-          // if (index.size() != now_size) {
-          //   std::cout << "after insert " << i << ",\tkey:" << ops_key[i]
-          //             << "some inserts are wrong!" << std::endl;
-          //   index.size();
-          // }
-          auto tmp = index.Find(ops_key[i], thread_id);
-          if (thread_id != tmp) {
-            std::cout << "tid:" << thread_id << "Insert wrong! i:" << i
-                      << ",\tkey:" << ops_key[i] << std::endl;
-            std::cout << "val:" << thread_id << std::endl;
-            std::cout << "tmp:" << tmp << std::endl;
-            index.Find(ops_key[i], thread_id);
-          }
+        // size_t now_size = init_data.size();
+        // for (int i = 0; i < thread_num; i++) {
+        //   now_size += insert_cnt[i];
+        // }
+        // if (index.size() != now_size) {
+        //   std::cout << "after insert " << i << ",\tkey:" << ops_key[i]
+        //             << "some inserts are wrong!" << std::endl;
+        //   index.size();
+        // }
+        auto tmp = index.Find(ops_key[i], thread_id);
+        if (thread_id != tmp) {
+          std::cout << "tid:" << thread_id << "Insert wrong! i:" << i
+                    << ",\tkey:" << ops_key[i] << std::endl;
+          std::cout << "val:" << thread_id << std::endl;
+          std::cout << "tmp:" << tmp << std::endl;
+          index.Find(ops_key[i], thread_id);
+        }
 #endif
-          break;
+        break;
+      }
+      case DELETE: {
+        res[thread_id] += index.Delete(ops_key[i], thread_id);
+#ifdef CHECK_CORRECTION
+        auto tmp = index.Find(ops_key[i], thread_id);
+        if (tmp != std::numeric_limits<Value>::max()) {
+          std::cout << "tid:" << thread_id << "Delete wrong! i:" << i
+                    << ",\tkey:" << ops_key[i] << std::endl;
+          std::cout << "tmp:" << tmp << std::endl;
         }
-        default:
-          break;
+#endif
+        break;
       }
-    }  // omp for loop
+      default:
+        break;
+    }
+  };
 
-#pragma omp master
+  if (open_loop.arrival != kClosedLoop) {
+    latency_ns = OpenLoopDriver(open_loop, thread_num, index.GetIndexName())
+                     .Run(run_op, ops_size);
+    for (int i = 0; i < thread_num; i++) {
+      final_res += res[i];
+    }
+  } else {
+#pragma omp parallel num_threads(thread_num)
     {
-      const auto end = std::chrono::high_resolution_clock::now();
-      latency_ns =
-          std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
-              .count();
-      for (int i = 0; i < thread_num; i++) {
-        final_res += res[i];
+      auto thread_id = omp_get_thread_num();
+#pragma omp barrier
+#pragma omp master
+      start = std::chrono::high_resolution_clock::now();
+
+// running benchmark
+#pragma omp for schedule(dynamic, 100)
+      for (uint64_t i = 0; i < ops_size; i++) {
+        run_op(i, thread_id);
+      }  // omp for loop
+
+#pragma omp master
+      {
+        const auto end = std::chrono::high_resolution_clock::now();
+        latency_ns =
+            std::chrono::duration_cast<std::chrono::nanoseconds>(end - start)
+                .count();
+        for (int i = 0; i < thread_num; i++) {
+          final_res += res[i];
+        }
       }
-    }
-  }  // all thread join here
+    }  // all thread join here
+  }
 
 #ifdef BREAKDOWN
   index.PrintBreakdown();
@@ -144,6 +177,17 @@ inline void RunMultiYCSBBenchmark(DataVec& init_data, std::vector<int>& ops,
             << ", MiB, total_size:," << PRINT_MIB(index.GetTotalSize())
             << ", MiB, #ops," << ops_size << ", throughput:,"
             << ops_size * 1.0 / latency_ns * 1e9 / 1e3 << ", K ops/s";
+  const ScanStats scan_stats = index.GetScanStats();
+  if (scan_stats.scan_cnt > 0) {
+    std::cout << ", #scans," << scan_stats.scan_cnt << ", scan_keys/s:,"
+              << scan_stats.key_cnt * 1.0 / latency_ns * 1e9
+              << ", keys/scan:,"
+              << scan_stats.key_cnt * 1.0 / scan_stats.scan_cnt
+              << ", pages/scan:,"
+              << scan_stats.page_cnt * 1.0 / scan_stats.scan_cnt
+              << ", ios/scan:,"
+              << scan_stats.io_cnt * 1.0 / scan_stats.scan_cnt;
+  }
   std::cout << std::endl;
   std::cout << "\tfinal res:" << final_res << std::endl;
 }
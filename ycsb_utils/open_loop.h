@@ -0,0 +1,240 @@
+/**
+ * @file open_loop.h
+ * @brief Open-loop runs of the multi-threaded YCSB benchmark
+ * (YCSB_ARRIVAL=constant/poisson). Each thread issues its ops at a fixed share
+ * of a target rate, with constant or exponential gaps, instead of as fast as
+ * it can. The response time of an op is measured from its intended start, so
+ * an op that waited behind a slow one is charged for the wait (no coordinated
+ * omission). The ops are split into one step per target rate, run one after
+ * the other on the same index; the rates are YCSB_RATES (K ops/s,
+ * comma-separated) or, if it is unset, kSweepFractions of the throughput of a
+ * closed-loop first step. Each step prints a throughput-vs-latency point.
+ */
+#ifndef UTILS_OPEN_LOOP_H_
+#define UTILS_OPEN_LOOP_H_
+
+#include <omp.h>
+#include <stdint.h>
+
+#include <algorithm>
+#include <atomic>
+#include <chrono>
+#include <cmath>
+#include <cstdlib>
+#include <iostream>
+#include <random>
+#include <stdexcept>
+#include <string>
+#include <thread>
+#include <vector>
+
+#include "../experiments/latency_histogram.h"
+
+enum ArrivalPattern { kClosedLoop, kConstantRate, kPoissonRate };
+
+struct OpenLoopParams {
+  ArrivalPattern arrival = kClosedLoop;
+  std::vector<double> rates;  // ops/s of all threads; empty: swept
+};
+
+static inline const char* GetArrivalName(ArrivalPattern arrival) {
+  switch (arrival) {
+    case kConstantRate:
+      return "constant";
+    case kPoissonRate:
+      return "poisson";
+    default:
+      return "closed";
+  }
+}
+
+// YCSB_ARRIVAL and YCSB_RATES; closed loop unless YCSB_ARRIVAL is set.
+static inline OpenLoopParams GetOpenLoopParams() {
+  OpenLoopParams params;
+  const char* arrival = std::getenv("YCSB_ARRIVAL");
+  if (arrival && std::string(arrival) == "constant") {
+    params.arrival = kConstantRate;
+  } else if (arrival && std::string(arrival) == "poisson") {
+    params.arrival = kPoissonRate;
+  } else if (arrival && *arrival && std::string(arrival) != "closed") {
+    throw std::invalid_argument(std::string("YCSB_ARRIVAL must be closed, ") +
+                                "constant or poisson, got " + arrival);
+  }
+  const char* rates = std::getenv("YCSB_RATES");
+  while (rates && *rates) {
+    char* end = nullptr;
+    const double rate = std::strtod(rates, &end);
+    if (end == rates || rate <= 0) {
+      throw std::invalid_argument(std::string("invalid YCSB_RATES: ") +
+                                  std::getenv("YCSB_RATES"));
+    }
+    params.rates.push_back(rate * 1e3);
+    rates = *end == ',' ? end + 1 : end;
+  }
+  return params;
+}
+
+// The intended starts of the ops of one thread, in ns after the step starts.
+class ArrivalSchedule {
+ public:
+  ArrivalSchedule(ArrivalPattern arrival, double rate, uint64_t seed)
+      : arrival_(arrival), interval_ns_(1e9 / rate), rng_(seed) {}
+
+  inline uint64_t Next() {
+    next_ns_ += arrival_ == kPoissonRate ? exp_(rng_) * interval_ns_
+                                         : interval_ns_;
+    return next_ns_;
+  }
+
+ private:
+  const ArrivalPattern arrival_;
+  const double interval_ns_;
+  double next_ns_ = 0;
+  std::mt19937_64 rng_;
+  std::exponential_distribution<double> exp_{1.0};
+};
+
+class OpenLoopDriver {
+ public:
+  typedef std::chrono::steady_clock Clock;
+
+  static constexpr double kSweepFractions[] = {0.1, 0.2, 0.3, 0.4, 0.5, 0.6,
+                                               0.7, 0.8, 0.9, 1.0, 1.1, 1.2};
+
+  OpenLoopDriver(const OpenLoopParams& params, uint64_t thread_num,
+                 const std::string& index_name)
+      : params_(params), thread_num_(thread_num), index_name_(index_name) {}
+
+  /**
+   * @brief Runs the ops_size ops through run_op(i, thread_id), one step per
+   * target rate, and returns the time of all the steps in ns.
+   */
+  template <typename F>
+  uint64_t Run(F&& run_op, uint64_t ops_size) {
+    std::vector<double> rates = params_.rates;
+    const bool sweep = rates.empty();
+    const uint64_t step_num =
+        sweep ? 1 + std::size(kSweepFractions) : rates.size();
+    const uint64_t step_ops = ops_size / step_num;
+    uint64_t begin = 0, total_ns = 0;
+    if (sweep) {
+      const Step step = RunStep(run_op, begin, begin + step_ops, kClosedLoop,
+                                0, 0);
+      PrintStep(step, kClosedLoop, 0);
+      for (double fraction : kSweepFractions) {
+        rates.push_back(fraction * step.GetThroughput());
+      }
+      begin += step_ops;
+      total_ns += step.duration_ns;
+    }
+    for (size_t i = 0; i < rates.size(); i++) {
+      const uint64_t end =
+          i + 1 == rates.size() ? ops_size : begin + step_ops;
+      const Step step =
+          RunStep(run_op, begin, end, params_.arrival, rates[i], i + 1);
+      PrintStep(step, params_.arrival, rates[i]);
+      begin = end;
+      total_ns += step.duration_ns;
+    }
+    return total_ns;
+  }
+
+ private:
+  struct Step {
+    uint64_t ops = 0;
+    uint64_t duration_ns = 1;
+    LatencyHistogram latency;
+
+    inline double GetThroughput() const { return ops * 1e9 / duration_ns; }
+  };
+
+  // Sleeps while the intended start is far, then yields.
+  static inline void WaitUntil(Clock::time_point t) {
+    constexpr auto kSpin = std::chrono::microseconds(100);
+    while (true) {
+      const auto now = Clock::now();
+      if (now >= t) {
+        return;
+      }
+      if (t - now > kSpin) {
+        std::this_thread::sleep_for(t - now - kSpin);
+      } else {
+        std::this_thread::yield();
+      }
+    }
+  }
+
+  /**
+   * @brief Whenever one of its arrivals is due, a thread takes the next op of
+   * [begin, end), so that the ops still run in about their order in the
+   * workload (a read does not overtake the insert of its key).
+   */
+  template <typename F>
+  Step RunStep(F&& run_op, uint64_t begin, uint64_t end,
+               ArrivalPattern arrival, double rate, uint64_t seed) {
+    std::vector<LatencyHistogram> latency(thread_num_);
+    std::vector<uint64_t> finish_ns(thread_num_, 1);
+    std::atomic<uint64_t> next_op{begin};
+    Clock::time_point start;
+
+#pragma omp parallel num_threads(thread_num_)
+    {
+      const int thread_id = omp_get_thread_num();
+      ArrivalSchedule schedule(arrival, rate / thread_num_,
+                               seed * thread_num_ + thread_id);
+#pragma omp barrier
+#pragma omp master
+      start = Clock::now();
+#pragma omp barrier
+
+      while (true) {
+        Clock::time_point intended = Clock::now();
+        if (arrival != kClosedLoop) {
+          intended = start + std::chrono::nanoseconds(schedule.Next());
+          WaitUntil(intended);
+        }
+        const uint64_t i = next_op.fetch_add(1, std::memory_order_relaxed);
+        if (i >= end) {
+          break;
+        }
+        run_op(i, thread_id);
+        const auto done = Clock::now();
+        latency[thread_id].Record(
+            std::chrono::duration_cast<std::chrono::nanoseconds>(done -
+                                                                 intended)
+                .count());
+        finish_ns[thread_id] =
+            std::chrono::duration_cast<std::chrono::nanoseconds>(done - start)
+                .count();
+      }
+    }
+
+    Step step;
+    step.ops = end - begin;
+    step.duration_ns = *std::max_element(finish_ns.begin(), finish_ns.end());
+    for (const LatencyHistogram& l : latency) {
+      step.latency.Merge(l);
+    }
+    return step;
+  }
+
+  void PrintStep(const Step& step, ArrivalPattern arrival, double rate) const {
+    const LatencyHistogram& l = step.latency;
+    std::cout << "open-loop, " << index_name_ << ", arrival:,"
+              << GetArrivalName(arrival) << ", thread_num:," << thread_num_
+              << ", target_rate:," << rate / 1e3 << ", K ops/s, #ops,"
+              << step.ops << ", throughput:," << step.GetThroughput() / 1e3
+              << ", K ops/s, avg_lat:," << l.GetAvg() / 1e3 << ", us, p50:,"
+              << l.GetPercentile(0.5) / 1e3 << ", us, p90:,"
+              << l.GetPercentile(0.9) / 1e3 << ", us, p99:,"
+              << l.GetPercentile(0.99) / 1e3 << ", us, p999:,"
+              << l.GetPercentile(0.999) / 1e3 << ", us, max_lat:,"
+              << l.GetMax() / 1e3 << ", us" << std::endl;
+  }
+
+  const OpenLoopParams params_;
+  const uint64_t thread_num_;
+  const std::string index_name_;
+};
+
+#endif  // UTILS_OPEN_LOOP_H_
@@ -5,12 +5,18 @@
 
 #include <fstream>
 #include <iostream>
+#include <limits>
 #include <random>
 
 #include "../key_type.h"
 #include "macro.h"
 
-enum OpsType { READ, UPDATE, SCAN, INSERT };
+enum OpsType { READ, UPDATE, SCAN, INSERT, DELETE };
+
+// The value a delete leaves in the dynamic index of the multi-threaded hybrid
+// index; the next merge drops the key, and Find never returns it.
+template <typename V>
+inline constexpr V kTombstone = std::numeric_limits<V>::max() - 1;
 
 enum FindStatus { kEqualToKey, kLessThanKey, kGreaterThanKey };
 
@@ -50,4 +56,19 @@ struct ResultInfo {
   uint64_t index_cpu_time = 0;
 };
 
+// The range scans of one thread of a multi-threaded index.
+struct alignas(64) ScanStats {
+  uint64_t scan_cnt = 0;
+  uint64_t key_cnt = 0;   // records returned
+  uint64_t page_cnt = 0;  // pages read from disk
+  uint64_t io_cnt = 0;
+
+  inline void Add(const ScanStats& other) {
+    scan_cnt += other.scan_cnt;
+    key_cnt += other.key_cnt;
+    page_cnt += other.page_cnt;
+    io_cnt += other.io_cnt;
+  }
+};
+
 #endif
\ No newline at end of file
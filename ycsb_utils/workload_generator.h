@@ -0,0 +1,314 @@
+/**
+ * @file workload_generator.h
+ * @brief YCSB-style workloads generated in process. The op types and the op
+ * keys are drawn in chunks of kChunkOps ops, each from its own seeded RNG and
+ * by its own OpenMP thread, and written straight into the mmapped _OPS,
+ * _OPS_KEY and _RANGE_LEN files of prepare_ycsb, so there is no YCSB run and
+ * no text trace to parse. The same seed gives the same files for any number of
+ * threads.
+ */
+#ifndef UTILS_WORKLOAD_GENERATOR_H_
+#define UTILS_WORKLOAD_GENERATOR_H_
+
+#include <limits>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+#include "../indexes/film/zipf.h"
+#include "util_lid.h"
+
+enum KeyDistribution { kUniform, kZipfian, kLatest, kHotspot };
+
+// The share of each OpsType, in percent and indexed by it.
+struct OpsMix {
+  int ratio[5] = {0, 0, 0, 0, 0};
+};
+
+/**
+ * @brief The core workloads a-f of YCSB, or a custom mix "R:U:S:I:D" of
+ * read, update, scan, insert and delete percentages. The read-modify-write of
+ * workload f is generated as an update.
+ */
+static inline OpsMix GetOpsMix(const std::string& name) {
+  OpsMix mix;
+  if (name == "a" || name == "f") {
+    mix.ratio[READ] = 50;
+    mix.ratio[UPDATE] = 50;
+  } else if (name == "b") {
+    mix.ratio[READ] = 95;
+    mix.ratio[UPDATE] = 5;
+  } else if (name == "c") {
+    mix.ratio[READ] = 100;
+  } else if (name == "d") {
+    mix.ratio[READ] = 95;
+    mix.ratio[INSERT] = 5;
+  } else if (name == "e") {
+    mix.ratio[SCAN] = 95;
+    mix.ratio[INSERT] = 5;
+  } else {
+    int sum = 0, i = 0;
+    size_t start = 0;
+    for (; i < 5 && start <= name.size(); i++) {
+      size_t end = name.find(':', start);
+      if (end == std::string::npos) {
+        end = name.size();
+      }
+      try {
+        mix.ratio[i] = std::stoi(name.substr(start, end - start));
+      } catch (const std::exception&) {
+        throw std::invalid_argument("invalid ops mix: " + name);
+      }
+      if (mix.ratio[i] < 0) {
+        throw std::invalid_argument("invalid ops mix: " + name);
+      }
+      sum += mix.ratio[i];
+      start = end + 1;
+    }
+    if (i != 5 || start <= name.size() || sum != 100) {
+      throw std::invalid_argument("ops mix must be a-f or R:U:S:I:D summing to "
+                                  "100, got " + name);
+    }
+  }
+  return mix;
+}
+
+static inline KeyDistribution GetKeyDistribution(const std::string& name) {
+  if (name == "uniform") {
+    return kUniform;
+  } else if (name == "zipfian") {
+    return kZipfian;
+  } else if (name == "latest") {
+    return kLatest;
+  } else if (name == "hotspot") {
+    return kHotspot;
+  }
+  throw std::invalid_argument("unknown key distribution: " + name);
+}
+
+/**
+ * @brief The init keys are a sorted random sample of the dataset and the keys
+ * of the inserts are drawn from the rest. The other ops choose among the keys
+ * that exist by then (the init keys and the keys inserted before), following
+ * the definitions of YCSB:
+ *  - uniform: every key alike;
+ *  - zipfian: zipf(kZipfianConstant) ranks, scrambled over the whole key space
+ *    by a hash as in the ScrambledZipfianGenerator of YCSB;
+ *  - latest: zipf ranks counted from the latest insert backwards;
+ *  - hotspot: kHotOpsRatio of the ops on the smallest kHotSetRatio of the
+ *    keys, the others on the rest.
+ */
+class WorkloadGenerator {
+ public:
+  static constexpr uint64_t kChunkOps = 1 << 20;
+  static constexpr int kMaxScanLen = 100;
+  static constexpr double kZipfianConstant = 0.99;
+  static constexpr double kHotSetRatio = 0.2;
+  static constexpr double kHotOpsRatio = 0.8;
+
+  WorkloadGenerator(const OpsMix& mix, KeyDistribution dist, uint64_t seed)
+      : mix_(mix), dist_(dist), seed_(seed) {}
+
+  // keys must be sorted.
+  void Generate(const KeyVec& keys, uint64_t init_num, uint64_t ops_num,
+                const std::string& store_path) {
+    const uint64_t chunk_num = (ops_num + kChunkOps - 1) / kChunkOps;
+    std::vector<uint64_t> insert_base(chunk_num + 1, 0);
+    std::vector<uint64_t> scan_base(chunk_num + 1, 0);
+
+    // op types, and the inserts and scans of each chunk
+    char* ops_file = MapFile<char>(store_path + OPS_SUFFIX,
+                                   sizeof(uint64_t) + ops_num * sizeof(int));
+    int* ops = reinterpret_cast<int*>(ops_file + sizeof(uint64_t));
+    memcpy(ops_file, &ops_num, sizeof(uint64_t));
+#pragma omp parallel for schedule(dynamic, 1)
+    for (uint64_t c = 0; c < chunk_num; c++) {
+      std::mt19937 rng = GetRng(c, 0);
+      std::uniform_int_distribution<int> percent(0, 99);
+      uint64_t inserts = 0, scans = 0;
+      for (uint64_t i = c * kChunkOps; i < GetChunkEnd(c, ops_num); i++) {
+        int p = percent(rng), type = 0;
+        while (p >= mix_.ratio[type]) {
+          p -= mix_.ratio[type++];
+        }
+        ops[i] = type;
+        inserts += type == INSERT;
+        scans += type == SCAN;
+      }
+      insert_base[c + 1] = inserts;
+      scan_base[c + 1] = scans;
+    }
+    for (uint64_t c = 0; c < chunk_num; c++) {
+      insert_base[c + 1] += insert_base[c];
+      scan_base[c + 1] += scan_base[c];
+    }
+    const uint64_t insert_num = insert_base[chunk_num];
+    const uint64_t scan_num = scan_base[chunk_num];
+    if (init_num == 0 || init_num + insert_num > keys.size()) {
+      UnmapFile(ops_file, sizeof(uint64_t) + ops_num * sizeof(int));
+      throw std::invalid_argument(
+          "the dataset has " + std::to_string(keys.size()) + " keys, " +
+          std::to_string(init_num) + " init keys and " +
+          std::to_string(insert_num) + " inserts are needed");
+    }
+
+    SelectKeys(keys, init_num, insert_num);
+    StoreInitData(store_path + INIT_SUFFIX);
+
+    // op keys and scan lengths
+    char* key_file = MapFile<char>(store_path + OPS_KEY_SUFFIX,
+                                   sizeof(uint64_t) + ops_num * sizeof(Key));
+    Key* op_keys = reinterpret_cast<Key*>(key_file + sizeof(uint64_t));
+    memcpy(key_file, &ops_num, sizeof(uint64_t));
+    char* len_file = nullptr;
+    int* lens = nullptr;
+    if (scan_num > 0) {
+      len_file = MapFile<char>(store_path + RANGE_LEN_SUFFIX,
+                               sizeof(uint64_t) + scan_num * sizeof(int));
+      lens = reinterpret_cast<int*>(len_file + sizeof(uint64_t));
+      memcpy(len_file, &scan_num, sizeof(uint64_t));
+    }
+#pragma omp parallel for schedule(dynamic, 1)
+    for (uint64_t c = 0; c < chunk_num; c++) {
+      std::mt19937 rng = GetRng(c, 1);
+      std::uniform_int_distribution<int> scan_len(1, kMaxScanLen);
+      uint64_t key_num = init_num + insert_base[c];
+      uint64_t scan_pos = scan_base[c];
+      zipf_distribution<uint64_t, double> zipf(
+          dist_ == kLatest ? key_num : init_num + insert_num,
+          kZipfianConstant);
+      for (uint64_t i = c * kChunkOps; i < GetChunkEnd(c, ops_num); i++) {
+        if (ops[i] == INSERT) {
+          op_keys[i] = GetKey(key_num++);
+          continue;
+        }
+        op_keys[i] = GetKey(ChooseKey(rng, zipf, key_num));
+        if (ops[i] == SCAN) {
+          lens[scan_pos++] = scan_len(rng);
+        }
+      }
+    }
+
+    UnmapFile(ops_file, sizeof(uint64_t) + ops_num * sizeof(int));
+    UnmapFile(key_file, sizeof(uint64_t) + ops_num * sizeof(Key));
+    std::cout << "store " << ops_num << " ops (" << insert_num << " inserts, "
+              << scan_num << " scans) into " << store_path << OPS_SUFFIX
+              << ", " << store_path << OPS_KEY_SUFFIX << std::endl;
+    if (scan_num > 0) {
+      UnmapFile(len_file, sizeof(uint64_t) + scan_num * sizeof(int));
+      std::cout << "store " << scan_num << " scan lengths into " << store_path
+                << RANGE_LEN_SUFFIX << std::endl;
+    }
+  }
+
+ private:
+  inline std::mt19937 GetRng(uint64_t chunk, uint64_t stream) const {
+    std::seed_seq seq{seed_, chunk, stream};
+    return std::mt19937(seq);
+  }
+
+  static inline uint64_t GetChunkEnd(uint64_t chunk, uint64_t ops_num) {
+    return std::min(ops_num, (chunk + 1) * kChunkOps);
+  }
+
+  // The idx-th key in the order of insertion, the init keys first.
+  inline Key GetKey(uint64_t idx) const {
+    return idx < init_keys_.size() ? init_keys_[idx]
+                                   : rest_keys_[idx - init_keys_.size()];
+  }
+
+  // One of the key_num keys that exist, as an index for GetKey().
+  inline uint64_t ChooseKey(std::mt19937& rng,
+                            zipf_distribution<uint64_t, double>& zipf,
+                            uint64_t key_num) const {
+    switch (dist_) {
+      case kZipfian: {
+        // over all the keys of the workload, as YCSB, skipping the ones not
+        // inserted yet
+        const uint64_t total_num = init_keys_.size() + rest_keys_.size();
+        uint64_t idx;
+        do {
+          idx = FNV1a(zipf(rng) - 1) % total_num;
+        } while (idx >= key_num);
+        return idx;
+      }
+      case kLatest:
+        return key_num - zipf(rng);
+      case kHotspot: {
+        const uint64_t hot_num = std::max<uint64_t>(
+            1, static_cast<uint64_t>(init_keys_.size() * kHotSetRatio));
+        if (hot_num >= key_num ||
+            std::uniform_real_distribution<double>(0, 1)(rng) < kHotOpsRatio) {
+          return std::uniform_int_distribution<uint64_t>(0, hot_num - 1)(rng);
+        }
+        return std::uniform_int_distribution<uint64_t>(hot_num,
+                                                       key_num - 1)(rng);
+      }
+      default:
+        return std::uniform_int_distribution<uint64_t>(0, key_num - 1)(rng);
+    }
+  }
+
+  static inline uint64_t FNV1a(uint64_t val) {
+    uint64_t hash = 0xCBF29CE484222325ULL;
+    for (int i = 0; i < 8; i++) {
+      hash = (hash ^ (val & 0xFF)) * 0x100000001B3ULL;
+      val >>= 8;
+    }
+    return hash;
+  }
+
+  /**
+   * @brief A sorted sample of init_num keys (selection sampling, Knuth's
+   * Algorithm S) and insert_num random keys of the others.
+   */
+  void SelectKeys(const KeyVec& keys, uint64_t init_num, uint64_t insert_num) {
+    std::mt19937_64 rng(seed_);
+    std::uniform_real_distribution<double> dis(0, 1);
+    init_keys_.clear();
+    rest_keys_.clear();
+    init_keys_.reserve(init_num);
+    rest_keys_.reserve(keys.size() - init_num);
+    for (uint64_t i = 0; i < keys.size(); i++) {
+      const uint64_t needed = init_num - init_keys_.size();
+      if ((keys.size() - i) * dis(rng) < needed) {
+        init_keys_.push_back(keys[i]);
+      } else {
+        rest_keys_.push_back(keys[i]);
+      }
+    }
+    for (uint64_t i = 0; i < insert_num; i++) {
+      std::swap(rest_keys_[i], rest_keys_[std::uniform_int_distribution<uint64_t>(
+                                   i, rest_keys_.size() - 1)(rng)]);
+    }
+    rest_keys_.resize(insert_num);
+    rest_keys_.shrink_to_fit();
+    for (uint64_t i = init_num > 10 ? init_num - 10 : 1; i < init_num; i++) {
+      if (init_keys_[i] == UINT64_MAX) {
+        init_keys_[i] = init_keys_[i - 1] + 1;
+      }
+    }
+  }
+
+  void StoreInitData(const std::string& path) const {
+    const uint64_t init_num = init_keys_.size();
+    char* data =
+        MapFile<char>(path, sizeof(uint64_t) + init_num * sizeof(Record));
+    Record* records = reinterpret_cast<Record*>(data + sizeof(uint64_t));
+    memcpy(data, &init_num, sizeof(uint64_t));
+#pragma omp parallel for schedule(static)
+    for (uint64_t i = 0; i < init_num; i++) {
+      records[i] = Record(init_keys_[i], Value(i));
+    }
+    UnmapFile(data, sizeof(uint64_t) + init_num * sizeof(Record));
+    std::cout << "store " << init_num << " records into " << path << std::endl;
+  }
+
+  const OpsMix mix_;
+  const KeyDistribution dist_;
+  const uint64_t seed_;
+  KeyVec init_keys_;  // sorted
+  KeyVec rest_keys_;  // the keys of the inserts, in their order
+};
+
+#endif  // UTILS_WORKLOAD_GENERATOR_H_